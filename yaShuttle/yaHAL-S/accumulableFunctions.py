@@ -63,7 +63,7 @@ def accumulate(PALMAT, array, halsFunctionName, source, instruction, \
             function = sum
             
         if isArrayQuick(array):
-            for e in array[:-1]:
+            for e in array.buffer:
                 if isNaN(accumulate(PALMAT, e, halsFunctionName, source, \
                                     instruction, False, accumulation)):
                     raise Exception("")
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   arrayBackend.py
+Requires:   Python 3.7 or later.  NumPy is optional.
+Purpose:    An optional NumPy-based backend for VECTOR and MATRIX arithmetic
+            and for the DET and INVERSE RTL functions.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+
+Throughout the emulator, VECTOR and MATRIX values are Python lists (or lists
+of lists) of Python numbers, and that doesn't change here:  NumPy arrays exist
+only for the duration of a single operation, and the results are converted
+back to lists of Python numbers before being returned.  What NumPy buys is that
+the loops over the elements are performed by NumPy rather than by Python.
+
+HAL/S SCALAR, VECTOR, and MATRIX values, whether SINGLE or DOUBLE, are carried
+by the emulator as Python floats (i.e., IEEE double precision), while INTEGER
+values are Python ints, so the NumPy dtype for the former is float64.  Only
+operands all of whose elements are Python floats are handled here; anything
+else (uninitialized elements, INTEGER elements left over from literals, ...)
+is left to the list-based code, so as not to change the int-vs-float type of
+any element of a result.
+
+More importantly, the results must be bit-for-bit identical to the list-based
+code, or else test programs would no longer produce the same printouts.  So
+none of NumPy's linear-algebra functions (numpy.dot, numpy.linalg.det, ...)
+are used, because they're free to reorder additions or to use fused
+multiply-adds.  Instead:
+
+    Elementwise operations are exact anyway, since NumPy and Python perform
+        the same IEEE operation on each element.
+    Sums of products (dot products, matrix products, ...) are formed by
+        numpy.cumsum(), which (unlike numpy.sum()) adds strictly from left
+        to right just as the list-based loops do.  The list-based loops begin
+        from 0 rather than from the first term, which only matters if
+        the result is -0.0, so the final sums have 0.0 added to them.
+    DET evaluates the same cofactor expansion as determinant() in
+        unaryFunctions.py, but computes the determinants of all minors of any
+        given size at once, rather than recursively.
+    INVERSE performs the same Gaussian elimination as matrixInverse() in
+        unaryFunctions.py, with the row operations vectorized.
+
+Each function below returns its result, or NaN on error in the same cases
+the list-based code would, or else NotImplemented if the operand(s) aren't
+ones the backend handles; in the latter case, the caller just falls through
+to the list-based code.
+
+For small vectors and matrices (such as the ubiquitous 3-vectors), the
+overhead of converting to and from NumPy exceeds the savings, so the backend
+declines to handle operands with fewer than backend["minElements"] elements,
+or DET or INVERSE of matrices smaller than backend["minDetSize"] or
+backend["minInverseSize"] rows.  Those thresholds are roughly where NumPy
+began to win when measured.  For the same reason, there's nothing here for
+the RTL functions whose cost is linear in the number of elements (ABVAL,
+UNIT, TRACE, TRANSPOSE) or for cross products:  merely converting the
+arguments to NumPy already costs more than the list-based code does.
+"""
+
+import itertools
+from math import nan as NaN
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# The backend is used only if "enabled" is True.  yaHAL-S-FC.py's --no-numpy
+# option clears it.
+backend = {
+    "enabled": numpy != None,
+    "minElements": 16,
+    "minDetSize": 4,
+    "minInverseSize": 16
+    }
+
+# Returns a float64 NumPy array for a VECTOR or MATRIX all of whose elements
+# are Python floats and which has at least minElements elements, or else None.
+def toArray(value, minElements=None):
+    if minElements == None:
+        minElements = backend["minElements"]
+    if not isinstance(value, list) or len(value) == 0:
+        return None
+    if isinstance(value[0], list):
+        if len(value) * len(value[0]) < minElements:
+            return None
+        width = len(value[0])
+        for row in value:
+            if not isinstance(row, list) or len(row) != width:
+                return None
+            for e in row:
+                if type(e) is not float:
+                    return None
+    else:
+        if len(value) < minElements:
+            return None
+        for e in value:
+            if type(e) is not float:
+                return None
+    return numpy.array(value, dtype=numpy.float64)
+
+# A scalar operand of an arithmetic operation on a VECTOR or MATRIX.
+def isScalar(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Sums of products along an axis of an array of terms, in the same order and
+# with the same rounding as the list-based loops.
+def sequentialSum(terms, axis=-1):
+    return numpy.take(numpy.cumsum(terms, axis=axis), -1, axis=axis) + 0.0
+
+def matrixProduct(a, b):
+    return sequentialSum(a[:, :, numpy.newaxis] * b[numpy.newaxis, :, :], 1)
+
+'''
+Arithmetic on two operands, at least one of which is a VECTOR or MATRIX, as
+performed by compatibleArithmetic() in binaryFunctions.py.  The opType and
+the operand types c1 and c2 are as determined by compatibleArithmetic(),
+which has already checked that the operand dimensions are compatible.
+'''
+def arrayArithmetic(operand1, operand2, opType, c1, c2):
+    if not backend["enabled"]:
+        return NotImplemented
+    if c1 == "numeric":
+        array1 = None
+    else:
+        array1 = toArray(operand1)
+        if array1 is None:
+            return NotImplemented
+    if c2 in ["numeric", "integer"]:
+        array2 = None
+    elif array1 is None:
+        array2 = toArray(operand2)
+        if array2 is None:
+            return NotImplemented
+    else:
+        # The first operand already is large enough to make the backend
+        # worthwhile.
+        array2 = toArray(operand2, 1)
+        if array2 is None:
+            return NotImplemented
+    with numpy.errstate(all="ignore"):
+        if array1 is None or array2 is None:
+            if c1 == "numeric":
+                scalar, array = operand1, array2
+            else:
+                scalar, array = operand2, array1
+            if not isScalar(scalar):
+                return NotImplemented
+            if opType == "+":
+                result = array + scalar
+            elif opType == "-":
+                if c1 == "numeric":
+                    result = scalar - array
+                else:
+                    result = array - scalar
+            elif opType == "":
+                result = array * scalar
+            elif opType == "/" and c1 != "numeric":
+                if scalar == 0:
+                    return NaN
+                result = array / scalar
+            elif opType == "**" and c1 == "matrix" and c2 == "integer" \
+                    and scalar >= 1 and array.shape[0] == array.shape[1]:
+                result = array
+                while scalar > 1:
+                    scalar -= 1
+                    result = matrixProduct(result, array)
+            else:
+                return NotImplemented
+        elif c1 == "vector" and c2 == "vector" and opType == "":
+            result = array1[:, numpy.newaxis] * array2[numpy.newaxis, :]
+        elif c1 == "vector" and c2 == "vector!" and opType == ".":
+            return sequentialSum(array1 * array2).item()
+        elif (c1 == "vector" and c2 == "vector!") or \
+                (c1 == "matrix" and c2 == "matrix"):
+            if opType == "+":
+                result = array1 + array2
+            elif opType == "-":
+                result = array1 - array2
+            else:
+                return NotImplemented
+        elif c1 == "matrix" and c2 == "matrix!" and opType == "":
+            result = matrixProduct(array1, array2)
+        elif c1 == "vector" and c2 == "matrix!" and opType == "":
+            result = sequentialSum(array1[:, numpy.newaxis] * array2, 0)
+        elif c1 == "matrix" and c2 == "vector!" and opType == "":
+            result = sequentialSum(array1 * array2[numpy.newaxis, :], 1)
+        else:
+            return NotImplemented
+    return result.tolist()
+
+#----------------------------------------------------------------------------
+# RTL functions of a single MATRIX argument.
+
+'''
+The cofactor expansion performed by determinant() in unaryFunctions.py
+expands along the top row, then along the top row of each minor, and so on.
+The minors encountered at depth k consist of the bottom n-k rows and some
+subset of n-k columns (kept in their original order), so the determinants of
+all of them can be computed at once, from the bottom row upward.  The plans
+for doing so depend only on n, and are cached in detPlans.  detPlans[n] is a
+list, indexed by the size r of the minors, of (columns, children) pairs,
+in which columns[c] are the column indices of minor c, and children[c][p] is
+the index (among the minors of size r-1) of the minor left by deleting the
+p-th of those columns.
+'''
+detPlans = {}
+def getDetPlan(n):
+    if n in detPlans:
+        return detPlans[n]
+    plan = [None]
+    indices = {}
+    for r in range(1, n + 1):
+        columns = list(itertools.combinations(range(n), r))
+        children = []
+        if r > 1:
+            for combination in columns:
+                children.append([indices[combination[:p] + combination[p+1:]] \
+                                 for p in range(r)])
+        indices = {}
+        for c in range(len(columns)):
+            indices[columns[c]] = c
+        plan.append((numpy.array(columns, dtype=numpy.intp),
+                     numpy.array(children, dtype=numpy.intp)))
+    detPlans[n] = plan
+    return plan
+
+def arrayDET(matrix):
+    if not backend["enabled"]:
+        return NotImplemented
+    m = toArray(matrix, 1)
+    if m is None or m.ndim != 2 or m.shape[0] != m.shape[1] or \
+            m.shape[0] < backend["minDetSize"]:
+        return NotImplemented
+    n = m.shape[0]
+    plan = getDetPlan(n)
+    with numpy.errstate(all="ignore"):
+        # Minors of size 1:  just elements of the bottom row.
+        dets = m[n - 1][plan[1][0][:, 0]]
+        for r in range(2, n + 1):
+            columns, children = plan[r]
+            signs = numpy.where(numpy.arange(r) % 2 == 0, 1.0, -1.0)
+            terms = (signs * m[n - r][columns]) * dets[children]
+            dets = sequentialSum(terms, 1)
+    return dets[0].item()
+
+'''
+The same Gaussian elimination as matrixInverse() in unaryFunctions.py, step
+for step, except that the row operations for all of the affected rows at each
+step are performed at once.  The search for the pivot element is left as a
+Python loop, since it must duplicate matrixInverse()'s choice of pivot
+exactly.  Any division by zero (which raises an exception in
+matrixInverse()) results in NaN.
+'''
+def arrayINVERSE(matrix):
+    if not backend["enabled"]:
+        return NotImplemented
+    m = toArray(matrix, 1)
+    if m is None or m.ndim != 2 or m.shape[0] != m.shape[1] or \
+            m.shape[0] < backend["minInverseSize"]:
+        return NotImplemented
+    n = m.shape[0]
+    a = numpy.concatenate((m, numpy.identity(n)), axis=1)
+    with numpy.errstate(all="ignore"):
+        for col in range(n):
+            maxElement = abs(a[col][col])
+            maxRow = col
+            candidates = numpy.abs(a[col, col + 1 : n]).tolist()
+            for i in range(len(candidates)):
+                if candidates[i] > maxElement:
+                    maxElement = candidates[i]
+                    maxRow = col + 1 + i
+            if maxElement == 0:
+                return NaN
+            if maxRow != col:
+                a[[col, maxRow]] = a[[maxRow, col]]
+            if col + 1 < n:
+                if a[col][col] == 0:
+                    return NaN
+                scales = a[col + 1:, col] / a[col][col]
+                rows = numpy.nonzero(scales != 0)[0]
+                a[col + 1 + rows, col:] -= scales[rows, numpy.newaxis] * \
+                                           a[col, col:]
+        for col in range(1, n):
+            if a[col][col] == 0:
+                return NaN
+            scales = a[:col, col] / a[col][col]
+            rows = numpy.nonzero(scales != 0)[0]
+            a[rows, col] = 0
+            a[rows, col + 1:] -= scales[rows, numpy.newaxis] * \
+                                 a[col, col + 1:]
+        diagonal = numpy.diagonal(a[:, :n]).copy()
+        if (diagonal == 0).any():
+            return NaN
+        return (a[:, n:] / diagonal[:, numpy.newaxis]).tolist()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   benchmarkPALMAT.py
+Requires:   Python 3.7 or later.
+Purpose:    Runs the HAL/S benchmark programs (the benchmarks/ directory),
+            records how long the compiler and the emulator take on them,
+            and compares the results against a stored baseline, so that the
+            performance of yaHAL-S-FC can be tracked over time.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+
+Usage:
+    benchmarkPALMAT.py [OPTIONS] [FILE.hal ...]
+
+By default, all of the benchmarks/*.hal programs are run.  Each is compiled
+(and optimized) several times and then executed several times, in a separate Python
+process of its own, so that what one benchmark does can't affect another's
+compiler state or memory usage.  Its output is discarded.  The results are
+printed, and written in JSON form if requested:
+
+    {
+        "python":       Python version,
+        "date":         When run,
+        "runs":         Number of executions of each benchmark,
+        "translate":    True if the PALMAT was translated to Python,
+        "numpy":        True if the NumPy backend was enabled,
+        "benchmarks":   {
+            name:   {
+                "compileSeconds":   Fastest compilation (and optimization),
+                "executeSeconds":   Fastest execution,
+                "executeMean":      Mean execution time,
+                "instructions":     PALMAT instructions executed per run,
+                "peakKilobytes":    Peak memory (resident set) of the process
+                }, ...
+            }
+    }
+
+(or "error" rather than the measurements, for a benchmark which failed to
+compile or run).  The instructions are counted by an extra, profiled run (see
+profilePALMAT.py), which isn't included in the timings.  The peak memory is
+that of the process as a whole, including the compiler, and is None where the
+operating system doesn't provide it.
+
+OPTIONS:
+    --runs=N        Compile and execute each benchmark N times (default 5).
+    --json=F        Write the results to the file F.
+    --baseline=F    Compare the results against those in the file F (as
+                    written earlier by --json), and exit with status 1 if any
+                    benchmark's compile or execution time has regressed.
+    --threshold=P   A regression is a time more than P percent (default 10)
+                    above the baseline, and more than 2 milliseconds above it,
+                    since shorter times are mostly noise.
+    --compiler=F    The compiler's phase 1, as for yaHAL-S-FC.py.
+    --translate     Translate the PALMAT to Python (see translatePALMAT.py)
+                    before executing it.
+    --no-numpy      Don't use NumPy for VECTOR and MATRIX arithmetic.
+"""
+
+import sys
+import os
+import io
+import copy
+import glob
+import json
+import time
+import datetime
+import subprocess
+import contextlib
+import pass1
+from processSource import processSource
+from palmatAux import constructPALMAT, astSourceFile
+from optimizePALMAT import optimizePALMAT
+from executePALMAT import executePALMAT, linkPALMAT
+from translatePALMAT import translatePALMAT
+from profilePALMAT import newProfile
+from arrayBackend import backend
+try:
+    import resource
+except ImportError:
+    resource = None
+
+noiseSeconds = 0.002
+benchmarkDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "benchmarks")
+
+# Peak resident set size of this process, in kilobytes, or None.
+def peakKilobytes():
+    if resource == None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024   # Bytes rather than kilobytes.
+    return peak
+
+# Compiles a benchmark.  Returns the optimized (but unlinked) PALMAT, or None
+# and the compiler's messages on failure.
+def compileBenchmark(filename, halsSource):
+    PALMAT = constructPALMAT()
+    fileIndex = astSourceFile(PALMAT, filename)
+    metadata = []
+    for i in range(len(halsSource)):
+        m = { "file": fileIndex, "lineNumber": i + 1 }
+        if halsSource[i][:1] == "C":
+            m["comment"] = True
+        metadata.append(m)
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        success, ast = processSource(PALMAT, halsSource, metadata)
+        if success:
+            optimizePALMAT(PALMAT, True)
+    if not success:
+        return None, messages.getvalue()
+    return PALMAT, ""
+
+# Compiles and runs a single benchmark, in the process running it.  Returns
+# the dictionary of measurements.
+def runBenchmark(filename, runs, translate):
+    f = open(filename, "r")
+    halsSource = f.readlines()
+    f.close()
+    compileTimes = []
+    for i in range(runs):
+        start = time.perf_counter()
+        PALMAT, messages = compileBenchmark(filename, halsSource)
+        compileTimes.append(time.perf_counter() - start)
+        if PALMAT == None:
+            return { "error": "compilation failed:\n" + messages }
+    discarded = io.StringIO()
+
+    # Each run is of a fresh copy of the PALMAT, since the program changes
+    # the values of its variables.
+    def prepare():
+        copied = copy.deepcopy(PALMAT)
+        linkPALMAT(copied)
+        if translate:
+            translatePALMAT(copied)
+        return copied
+    times = []
+    for i in range(runs):
+        copied = prepare()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(discarded):
+            executePALMAT(copied)
+        times.append(time.perf_counter() - start)
+    profile = newProfile()
+    with contextlib.redirect_stdout(discarded):
+        executePALMAT(prepare(), profile=profile)
+    return {
+        "compileSeconds": min(compileTimes),
+        "executeSeconds": min(times),
+        "executeMean": sum(times) / len(times),
+        "instructions": profile["instructions"],
+        "peakKilobytes": peakKilobytes()
+        }
+
+# Runs a benchmark in a child process (this program, with the --child option),
+# and returns its measurements.
+def runChild(filename, options):
+    command = [sys.executable, os.path.abspath(__file__), "--child"] + \
+              options + [filename]
+    child = subprocess.run(command, stdout=subprocess.PIPE,
+                           stderr=subprocess.STDOUT, universal_newlines=True)
+    lines = child.stdout.strip().split("\n")
+    try:
+        return json.loads(lines[-1])
+    except ValueError:
+        return { "error": child.stdout }
+
+def printResults(results):
+    print("%-20s %10s %10s %10s %12s %10s" % ("benchmark", "compile s",
+          "execute s", "mean s", "instructions", "peak KB"))
+    for name in sorted(results["benchmarks"]):
+        r = results["benchmarks"][name]
+        if "error" in r:
+            print("%-20s %s" % (name, r["error"].strip().split("\n")[-1]))
+            continue
+        print("%-20s %10.3f %10.3f %10.3f %12d %10s" % (name,
+              r["compileSeconds"], r["executeSeconds"], r["executeMean"],
+              r["instructions"], r["peakKilobytes"]))
+
+# Compares the results against the baseline.  Returns True if there are no
+# regressions.
+def compareResults(results, baseline, threshold):
+    print("Compared to the baseline (%s, %s):" % (baseline.get("date", "?"),
+                                                  baseline.get("python", "?")))
+    print("%-20s %10s %10s %14s" % ("benchmark", "compile", "execute",
+                                     "instructions"))
+    limit = 1 + threshold / 100.0
+    regressions = 0
+    for name in sorted(results["benchmarks"]):
+        r = results["benchmarks"][name]
+        b = baseline.get("benchmarks", {}).get(name)
+        if b == None or "error" in b or "error" in r:
+            print("%-20s (not comparable)" % name)
+            continue
+        fields = []
+        for key in ["compileSeconds", "executeSeconds"]:
+            if b[key] > 0:
+                ratio = r[key] / b[key]
+            else:
+                ratio = 1.0
+            field = "%+.1f%%" % (100 * (ratio - 1))
+            if ratio > limit and r[key] - b[key] > noiseSeconds:
+                field += " !"
+                regressions += 1
+            fields.append(field)
+        fields.append("%+d" % (r["instructions"] - b["instructions"]))
+        print("%-20s %10s %10s %14s" % tuple([name] + fields))
+    if regressions > 0:
+        print("%d regression(s) of more than %g%%." % (regressions, threshold))
+    return regressions == 0
+
+if __name__ == "__main__":
+    runs = 5
+    jsonFile = None
+    baselineFile = None
+    threshold = 10.0
+    translate = False
+    child = False
+    childOptions = []
+    files = []
+    for param in sys.argv[1:]:
+        if param == "--help":
+            print(__doc__[__doc__.index("Usage:"):])
+            sys.exit(0)
+        elif param[:7] == "--runs=":
+            runs = max(1, int(param[7:]))
+        elif param[:7] == "--json=":
+            jsonFile = param[7:]
+        elif param[:11] == "--baseline=":
+            baselineFile = param[11:]
+        elif param[:12] == "--threshold=":
+            threshold = float(param[12:])
+        elif param[:11] == "--compiler=":
+            pass1.parms["compiler"] = param[11:]
+            childOptions.append(param)
+        elif param == "--translate":
+            translate = True
+        elif param == "--no-numpy":
+            backend["enabled"] = False
+            childOptions.append(param)
+        elif param == "--child":
+            child = True
+        elif param[:1] == "-":
+            print("Unknown parameter:", param)
+            sys.exit(1)
+        else:
+            files.append(param)
+
+    if child:
+        print(json.dumps(runBenchmark(files[0], runs, translate)))
+        sys.exit(0)
+
+    if len(files) == 0:
+        files = sorted(glob.glob(os.path.join(benchmarkDirectory, "*.hal")))
+    childOptions.append("--runs=%d" % runs)
+    if translate:
+        childOptions.append("--translate")
+    results = {
+        "python": sys.version.split()[0],
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "runs": runs,
+        "translate": translate,
+        "numpy": backend["enabled"],
+        "benchmarks": {}
+        }
+    for filename in files:
+        name = os.path.splitext(os.path.basename(filename))[0]
+        print("Running %s ..." % name, flush=True)
+        results["benchmarks"][name] = runChild(filename, childOptions)
+    printResults(results)
+    if jsonFile != None:
+        f = open(jsonFile, "w")
+        json.dump(results, f, indent=4)
+        f.close()
+    if baselineFile != None:
+        try:
+            f = open(baselineFile, "r")
+            baseline = json.load(f)
+            f.close()
+        except (OSError, ValueError):
+            print("Cannot read the baseline", baselineFile)
+            sys.exit(1)
+        if not compareResults(results, baseline, threshold):
+            sys.exit(1)
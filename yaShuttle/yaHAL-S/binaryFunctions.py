@@ -28,6 +28,7 @@ import math
 import copy
 from palmatAux import *
 from unaryFunctions import matrixInverse
+from arrayBackend import arrayArithmetic, backend
 
 def identityMatrix(n):
     result = []
@@ -170,7 +171,12 @@ def compatibleArithmetic(PALMAT, operand1, operand2, opType, compatibility):
         
     # We now have only compatible operands.  c1 and c2 tell us the operand
     # types, while dimensions1 and dimensions2 tell us the geometries.  Let's
-    # perform the operation.
+    # perform the operation, preferably via the NumPy backend if the operands
+    # are VECTOR or MATRIX.
+    if c1 != "numeric" or c2 != "numeric":
+        result = arrayArithmetic(operand1, operand2, opType, c1, c2)
+        if result is not NotImplemented:
+            return result
     result = NaN
     if c1 == "numeric" and c2 == "numeric":
         result = elementary(operand1, operand2)
@@ -407,3 +413,139 @@ def arrayableBinaryRTL(PALMAT, halsFunctionName, operand1, operand2, \
             printError(PALMAT, source, instruction, entry[1])
         return NaN
     return result
+
+#-----------------------------------------------------------------------------
+# Typed fast paths.  When the classes of the operands of a binary operator are
+# known in advance (see annotateOperators() in executePALMAT.py), the emulator
+# calls one of the kernels below instead of going through opBinary(),
+# arrayableBinaryRTL(), binaryOperation(), and compatibleArithmetic(), which
+# between them test for every datatype and geometry an operand could have.
+# The operand classes are:
+#    "numeric"   An INTEGER or SCALAR (a Python int or float).
+#    "vector"    A VECTOR (a list of Python floats).
+#    "bit"       The result of a comparison (hTRUE or hFALSE).
+# A kernel takes operand1 and operand2 in the same order as the RTL functions
+# above, and returns the result.  The classes are only what the declarations
+# of the variables say, and the values may be uninitialized or otherwise
+# unusual, so each kernel checks its operands (cheaply) and returns 
+# NotImplemented for anything other than the ordinary case, as well as for
+# any case in which the general code would report an error, leaving all of 
+# those to the general code.  The results are thus identical either way.
+
+numericClasses = (int, float)
+
+def scalarAddition(operand1, operand2):
+    if operand1.__class__ in numericClasses and \
+            operand2.__class__ in numericClasses:
+        result = operand1 + operand2
+        if result == result:
+            return result
+    return NotImplemented
+
+def scalarSubtraction(operand1, operand2):
+    if operand1.__class__ in numericClasses and \
+            operand2.__class__ in numericClasses:
+        result = operand1 - operand2
+        if result == result:
+            return result
+    return NotImplemented
+
+def scalarMultiplication(operand1, operand2):
+    if operand1.__class__ in numericClasses and \
+            operand2.__class__ in numericClasses:
+        result = operand1 * operand2
+        if result == result:
+            return result
+    return NotImplemented
+
+def scalarDivision(operand1, operand2):
+    if operand1.__class__ in numericClasses and \
+            operand2.__class__ in numericClasses and operand2 != 0:
+        result = operand1 / operand2
+        if result == result:
+            return result
+    return NotImplemented
+
+def scalarExponentiation(operand1, operand2):
+    if operand1.__class__ in numericClasses and \
+            operand2.__class__ in numericClasses and \
+            (operand1 != 0 or operand2 != 0):
+        result = operand1 ** operand2
+        if result.__class__ in numericClasses and result == result:
+            return result
+    return NotImplemented
+
+# The comparisons.  (For numbers, equality is just Python equality; see 
+# isEqualTo() in executePALMAT.py.)
+def scalarComparison(compare):
+    def kernel(operand1, operand2):
+        if operand1.__class__ in numericClasses and \
+                operand2.__class__ in numericClasses:
+            if compare(operand1, operand2):
+                return hTRUE
+            return hFALSE
+        return NotImplemented
+    return kernel
+
+# VECTOR kernels, for elements which are all floats.  (The NumPy backend, 
+# where it applies, computes exactly the same sums and differences.)
+def vectorElementwise(combine):
+    def kernel(operand1, operand2):
+        if operand1.__class__ is not list or operand2.__class__ is not list \
+                or len(operand1) != len(operand2) or len(operand1) == 0:
+            return NotImplemented
+        result = []
+        for e1, e2 in zip(operand1, operand2):
+            if e1.__class__ is not float or e2.__class__ is not float:
+                return NotImplemented
+            r = combine(e1, e2)
+            if r != r:
+                return NotImplemented
+            result.append(r)
+        return result
+    return kernel
+
+# The NumPy backend may sum the products in a different order, so vectors it
+# would handle are left to it.
+def vectorDot(operand1, operand2):
+    if operand1.__class__ is not list or operand2.__class__ is not list \
+            or len(operand1) != len(operand2) or len(operand1) == 0:
+        return NotImplemented
+    if backend["enabled"] and len(operand1) >= backend["minElements"]:
+        return NotImplemented
+    result = 0
+    for e1, e2 in zip(operand1, operand2):
+        if e1.__class__ is not float or e2.__class__ is not float:
+            return NotImplemented
+        r = e1 * e2
+        if r != r:
+            return NotImplemented
+        result += r
+    if result != result:
+        return NotImplemented
+    return result
+
+# The kernels, keyed on (operator, class of operand1, class of operand2), 
+# along with the class of the result.
+binaryKernels = {
+    ("+", "numeric", "numeric"): (scalarAddition, "numeric"),
+    ("-", "numeric", "numeric"): (scalarSubtraction, "numeric"),
+    ("", "numeric", "numeric"): (scalarMultiplication, "numeric"),
+    ("/", "numeric", "numeric"): (scalarDivision, "numeric"),
+    ("**", "numeric", "numeric"): (scalarExponentiation, "numeric"),
+    ("==", "numeric", "numeric"): 
+        (scalarComparison(lambda a, b: a == b), "bit"),
+    ("!=", "numeric", "numeric"): 
+        (scalarComparison(lambda a, b: a != b), "bit"),
+    ("<", "numeric", "numeric"): (scalarComparison(lambda a, b: a < b), "bit"),
+    (">", "numeric", "numeric"): (scalarComparison(lambda a, b: a > b), "bit"),
+    ("<=", "numeric", "numeric"): 
+        (scalarComparison(lambda a, b: a <= b), "bit"),
+    (">=", "numeric", "numeric"): 
+        (scalarComparison(lambda a, b: a >= b), "bit"),
+    ("+", "vector", "vector"): 
+        (vectorElementwise(lambda a, b: a + b), "vector"),
+    ("-", "vector", "vector"): 
+        (vectorElementwise(lambda a, b: a - b), "vector"),
+    (".", "vector", "vector"): (vectorDot, "numeric")
+    }
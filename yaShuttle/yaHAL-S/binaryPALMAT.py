@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:      None - the author (Ron Burkey) declares this software to
+                be in the Public Domain, with no rights reserved.
+Filename:       binaryPALMAT.py
+Purpose:        Reading and writing of PALMAT in a compact binary format,
+                as an alternative to the normal JSON format of PALMAT files.
+Reference:      PALMAT.md, "Binary PALMAT Files".
+
+The JSON form of a PALMAT file is a single line of text, which has to be parsed
+in its entirety before anything at all can be done with it.  For a large
+HAL/S program, that's a lot of parsing before the first PALMAT instruction can
+be executed.  The binary form instead consists of:
+
+    A header (see headerFormat below), beginning with the "magic" bytes
+        b"PALMATB\\0" and a version number.
+    A string pool, in which every distinct string appearing in the PALMAT
+        (identifiers, labels, stringified numbers, ...) appears just once.
+        It consists of a table of numStrings+1 offsets (unsigned 32-bit),
+        followed by the UTF-8 bytes of all of the strings.  String i
+        occupies bytes offsets[i] through offsets[i+1]-1 of the latter.
+    A scope table, with one fixed-width record (see scopeFormat below) per
+        scope.
+    An instruction table, with one fixed-width record (see
+        instructionFormat below) per PALMAT instruction.  The instructions of
+        each scope are contiguous, and the scope's record tells where they
+        begin and how many there are.
+
+All integers are little-endian.  Anything which doesn't fit into the
+fixed-width records --- a scope's identifiers, for example, or a 'vector'
+instruction's value --- is stored as JSON text in the string pool.
+
+readBinaryPALMAT() memory-maps the file, and decodes nothing other than the
+header and scope table until it's actually needed:  each scope is decoded the
+first time anything inside of it is accessed.
+"""
+
+import json
+import mmap
+import struct
+from halArray import halArrayToJSON, halArraysFromJSON
+
+binaryMagic = b"PALMATB\0"
+binaryVersion = 1
+
+# Magic, version, reserved, numStrings, stringTableOffset, stringDataOffset,
+# numScopes, scopeTableOffset, numInstructions, instructionTableOffset,
+# string index of the JSON for top-level keys other than "scopes".
+headerFormat = "<8sHHIIIIIIII"
+# Parent (-1 for None), self, index of first instruction, number of
+# instructions, string index of the JSON for the remainder of the scope.
+scopeFormat = "<iiIIi"
+# Opcode, operand kind, flags, reserved, operand A, operand B, source file,
+# source line, source column, string index of label (or -1), string index of
+# JSON for any remaining keys (or -1).
+instructionFormat = "<BBBBiiiiiii"
+headerSize = struct.calcsize(headerFormat)
+scopeSize = struct.calcsize(scopeFormat)
+instructionSize = struct.calcsize(instructionFormat)
+
+# The PALMAT instruction names.  The opcode stored in an instruction record is
+# the index into this list, so new names must only ever be appended.
+instructionNames = ["debug", "empty", "fill", "string", "boolean", "number",
+                    "vector", "matrix", "array", "+><", "sentinel", "operator",
+                    "fetch", "unravel", "fetchp", "store", "storepop",
+                    "substore", "substorepop", "pop", "read", "write",
+                    "iocontrol", "shaping", "modern", "function", "goto",
+                    "calloffset", "returnoffset", "case", "iffalse", "iftrue",
+                    "noop", "run", "call", "return", "halt", "automatics",
+                    "partition", "schedule", "wait", "set", "reset", "signal",
+                    "terminate", "cancel", "update", "process",
+                    "storeconstant", "compute", "computestore",
+                    "computeiffalse", "computeiftrue", "fetchiffalse",
+                    "fetchiftrue", "loopstep"]
+instructionNumbers = {}
+for i in range(len(instructionNames)):
+    instructionNumbers[instructionNames[i]] = i
+
+# Operand kinds.
+kindTrue = 0        # The value is just True.
+kindString = 1      # Operand B is a string index.
+kindInteger = 2     # Operand B is the value.
+kindPairString = 3  # The value is [A, string B].
+kindPairInteger = 4 # The value is [A, B].
+kindJSON = 5        # Operand B is the string index of the value's JSON.
+
+# Flags.
+flagSource = 1      # The instruction has a "source" field.
+
+minInt32 = -(1 << 31)
+maxInt32 = (1 << 31) - 1
+def isInt32(value):
+    return isinstance(value, int) and not isinstance(value, bool) and \
+           minInt32 <= value <= maxInt32
+
+# Check whether a file (or bytes) is binary PALMAT.
+def isBinaryPALMAT(data):
+    return data[:len(binaryMagic)] == binaryMagic
+
+#-----------------------------------------------------------------------------
+# Writing.
+
+# Saves a PALMAT to a file in binary form.  Returns True on success, False
+# on failure.  Any keys in the PALMAT other than "scopes", "linked",
+# "translated", "watches", and "layouts" are saved as is.
+def writeBinaryPALMAT(PALMAT, filename):
+    strings = []
+    stringIndices = {}
+
+    def intern(string):
+        if string not in stringIndices:
+            stringIndices[string] = len(strings)
+            strings.append(string)
+        return stringIndices[string]
+
+    scopeRecords = []
+    instructionRecords = []
+    for scope in PALMAT["scopes"]:
+        rest = {}
+        for key in scope:
+            if key not in ["parent", "self", "instructions"]:
+                rest[key] = scope[key]
+        parent = scope["parent"]
+        if parent == None:
+            parent = -1
+        instructions = scope["instructions"]
+        scopeRecords.append(struct.pack(scopeFormat, parent, scope["self"],
+                                        len(instructionRecords),
+                                        len(instructions),
+                                        intern(json.dumps(rest, default=halArrayToJSON))))
+        for instruction in instructions:
+            for name in instructionNames:
+                if name in instruction:
+                    break
+            else:
+                return False
+            value = instruction[name]
+            a = 0
+            b = 0
+            if value is True:
+                kind = kindTrue
+            elif isinstance(value, str):
+                kind = kindString
+                b = intern(value)
+            elif isInt32(value):
+                kind = kindInteger
+                b = value
+            elif isinstance(value, (list, tuple)) and len(value) == 2 and \
+                    isInt32(value[0]) and isinstance(value[1], str):
+                kind = kindPairString
+                a = value[0]
+                b = intern(value[1])
+            elif isinstance(value, (list, tuple)) and len(value) == 2 and \
+                    isInt32(value[0]) and isInt32(value[1]):
+                kind = kindPairInteger
+                a, b = value
+            else:
+                kind = kindJSON
+                b = intern(json.dumps(value, default=halArrayToJSON))
+            flags = 0
+            sourceFile, sourceLine, sourceColumn = 0, 0, 0
+            if "source" in instruction:
+                flags |= flagSource
+                sourceFile, sourceLine, sourceColumn = instruction["source"]
+            label = -1
+            if isinstance(instruction.get("label"), str):
+                label = intern(instruction["label"])
+            rest = {}
+            for key in instruction:
+                if key == name or key == "source" or \
+                        (key == "label" and label != -1):
+                    continue
+                rest[key] = instruction[key]
+            if len(rest) == 0:
+                rest = -1
+            else:
+                rest = intern(json.dumps(rest, default=halArrayToJSON))
+            instructionRecords.append(struct.pack(instructionFormat,
+                            instructionNumbers[name], kind, flags, 0, a, b,
+                            sourceFile, sourceLine, sourceColumn, label, rest))
+    top = {}
+    for key in PALMAT:
+        if key not in ["scopes", "linked", "translated", "watches",
+                       "layouts"]:
+            top[key] = PALMAT[key]
+    top = intern(json.dumps(top, default=halArrayToJSON))
+
+    # Lay out the file.
+    encoded = []
+    offsets = [0]
+    for string in strings:
+        encoded.append(string.encode("utf-8"))
+        offsets.append(offsets[-1] + len(encoded[-1]))
+    stringTable = struct.pack("<%dI" % len(offsets), *offsets)
+    stringData = b"".join(encoded)
+    stringTableOffset = headerSize
+    stringDataOffset = stringTableOffset + len(stringTable)
+    scopeTableOffset = stringDataOffset + len(stringData)
+    instructionTableOffset = scopeTableOffset + scopeSize * len(scopeRecords)
+    header = struct.pack(headerFormat, binaryMagic, binaryVersion, 0,
+                         len(strings), stringTableOffset, stringDataOffset,
+                         len(scopeRecords), scopeTableOffset,
+                         len(instructionRecords), instructionTableOffset, top)
+    try:
+        f = open(filename, "wb")
+        f.write(header)
+        f.write(stringTable)
+        f.write(stringData)
+        f.write(b"".join(scopeRecords))
+        f.write(b"".join(instructionRecords))
+        f.close()
+        return True
+    except:
+        return False
+
+#-----------------------------------------------------------------------------
+# Reading.
+
+'''
+A scope whose contents are decoded from the binary PALMAT only when something
+in it is first accessed.  Once decoded, it's just an ordinary dictionary.
+'''
+class LazyScope(dict):
+
+    def __init__(self, loader, scopeNumber):
+        super().__init__()
+        self.loader = loader
+        self.scopeNumber = scopeNumber
+
+    def materialize(self):
+        loader = self.loader
+        if loader != None:
+            self.loader = None
+            super().update(loader.decodeScope(self.scopeNumber))
+
+    def __missing__(self, key):
+        if self.loader == None:
+            raise KeyError(key)
+        self.materialize()
+        return self[key]
+
+    def __contains__(self, key):
+        self.materialize()
+        return super().__contains__(key)
+
+    def __iter__(self):
+        self.materialize()
+        return super().__iter__()
+
+    def __len__(self):
+        self.materialize()
+        return super().__len__()
+
+    def __repr__(self):
+        self.materialize()
+        return super().__repr__()
+
+    def get(self, key, default=None):
+        self.materialize()
+        return super().get(key, default)
+
+    def keys(self):
+        self.materialize()
+        return super().keys()
+
+    def values(self):
+        self.materialize()
+        return super().values()
+
+    def items(self):
+        self.materialize()
+        return super().items()
+
+    def pop(self, *args):
+        self.materialize()
+        return super().pop(*args)
+
+    def __copy__(self):
+        self.materialize()
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        import copy
+        self.materialize()
+        return copy.deepcopy(dict(self), memo)
+
+# Decodes the parts of a binary PALMAT, given the raw data as an mmap or bytes.
+class BinaryPALMATLoader:
+
+    def __init__(self, data):
+        self.data = data
+        (magic, version, dummy, self.numStrings, self.stringTableOffset,
+         self.stringDataOffset, self.numScopes, self.scopeTableOffset,
+         self.numInstructions, self.instructionTableOffset, self.top) = \
+            struct.unpack_from(headerFormat, data, 0)
+        if magic != binaryMagic:
+            raise Exception("Not a binary PALMAT file")
+        if version > binaryVersion:
+            raise Exception("Unsupported binary PALMAT version %d" % version)
+        self.strings = [None] * self.numStrings
+
+    def getString(self, index):
+        string = self.strings[index]
+        if string == None:
+            start, end = struct.unpack_from("<II", self.data,
+                                            self.stringTableOffset + 4 * index)
+            string = str(self.data[self.stringDataOffset + start : \
+                                   self.stringDataOffset + end], "utf-8")
+            self.strings[index] = string
+        return string
+
+    def decodeInstruction(self, index):
+        opcode, kind, flags, dummy, a, b, sourceFile, sourceLine, \
+            sourceColumn, label, rest = struct.unpack_from(instructionFormat,
+                    self.data, self.instructionTableOffset + \
+                    instructionSize * index)
+        if kind == kindTrue:
+            value = True
+        elif kind == kindString:
+            value = self.getString(b)
+        elif kind == kindInteger:
+            value = b
+        elif kind == kindPairString:
+            value = [a, self.getString(b)]
+        elif kind == kindPairInteger:
+            value = [a, b]
+        else:
+            value = json.loads(self.getString(b))
+        instruction = { instructionNames[opcode]: value }
+        if rest != -1:
+            instruction.update(json.loads(self.getString(rest)))
+        if flags & flagSource:
+            instruction["source"] = [sourceFile, sourceLine, sourceColumn]
+        if label != -1:
+            instruction["label"] = self.getString(label)
+        return instruction
+
+    def decodeScope(self, scopeNumber):
+        parent, selfIndex, first, count, rest = struct.unpack_from(scopeFormat,
+                self.data, self.scopeTableOffset + scopeSize * scopeNumber)
+        if parent == -1:
+            parent = None
+        scope = { "parent": parent, "self": selfIndex }
+        scope.update(json.loads(self.getString(rest)))
+        if "identifiers" in scope:
+            halArraysFromJSON(scope["identifiers"])
+        instructions = []
+        for i in range(first, first + count):
+            instructions.append(self.decodeInstruction(i))
+        scope["instructions"] = instructions
+        return scope
+
+    def PALMAT(self):
+        PALMAT = { "scopes": [] }
+        for i in range(self.numScopes):
+            PALMAT["scopes"].append(LazyScope(self, i))
+        PALMAT.update(json.loads(self.getString(self.top)))
+        return PALMAT
+
+# Loads a binary PALMAT from raw data (bytes or mmap).  Scopes are decoded
+# lazily.
+def loadBinaryPALMAT(data):
+    return BinaryPALMATLoader(data).PALMAT()
+
+# Loads a binary PALMAT file via mmap.  Returns None on failure.
+def readBinaryPALMAT(filename):
+    try:
+        f = open(filename, "rb")
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        f.close()
+        return loadBinaryPALMAT(data)
+    except:
+        return None
+
+# Has a scope been decoded yet?  (Scopes not loaded from binary PALMAT always
+# have been.)
+def isMaterialized(scope):
+    return not isinstance(scope, LazyScope) or scope.loader == None
+
+# Forces decoding of all scopes, after which the PALMAT is entirely
+# independent of the file it was loaded from.
+def materializePALMAT(PALMAT):
+    for scope in PALMAT["scopes"]:
+        if isinstance(scope, LazyScope):
+            scope.materialize()
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   compileCache.py
+Requires:   Python 3.7 or later.
+Purpose:    A content-addressed cache for the compiler, so that recompiling
+            a large HAL/S project after a small edit only has to regenerate
+            what was actually edited.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+
+The cache is a directory of files, each named by the SHA-256 digest of what
+went into producing it, and it's enabled by setting the directory with
+setCacheDirectory() (the --cache=D command-line option of yaHAL-S-FC.py).
+There are two kinds of entries:
+
+    *.ast       The abstract syntax tree of an entire compilation, keyed on
+                the preprocessed source text (i.e., what's written to
+                yaHAL-S-FC.tmp, with all REPLACE macros already expanded)
+                and on the compiler front end used to parse it.
+    *.block     The PALMAT generated for a single top-level PROGRAM, FUNCTION,
+                PROCEDURE, COMPOOL, or TASK definition, keyed on the AST of
+                the block and on the context in which it was compiled.
+
+The context of a block is everything outside of the block which the code
+generator may consult while compiling it:  the identifiers (other than labels)
+and structure templates of the root scope, the identifiers of any COMPOOLs
+already compiled, and the generator's state history.  The identifiers include
+all of the attributes, such as datatypes, CONSTANT values, and the parameters
+of FUNCTIONs and PROCEDUREs already defined, so if any of those change then
+so does the context, and the block is simply regenerated.  The digest of the
+compiler's own source code is also part of every key, so that changes to the
+compiler invalidate the entire cache.  Line numbers within the block are
+taken relative to the first line of the block, so that a block which has
+merely moved (because of editing elsewhere) is still found in the cache.
+
+A cached block is a "fragment" of PALMAT:  the scopes which the block
+created, plus whatever the block added to or changed in the root scope
+(principally the identifier of the block itself).  Those scopes were
+numbered consecutively starting at whatever len(PALMAT["scopes"]) happened
+to be when the block was compiled, and that's unlikely to be the same when
+the fragment is reused, so splicing the fragment into the PALMAT means
+relocating it:
+
+    *   Scope numbers, wherever they appear (the "self", "parent", and
+        "children" of scopes, the "label" and "scope" attributes of
+        identifiers, the scope halves of (scope, identifier) operands, and
+        "returnoffset" operands), are shifted if they're within the fragment.
+        Scope numbers outside the fragment can only refer to the root scope or
+        to COMPOOLs, and are left alone.
+    *   Compiler-generated labels are named after the scope in which they
+        reside (see constructLabel() in palmatAux.py), as in "^ue_12^", and
+        are renamed accordingly.  The exceptions are "^dc_N^" labels, which
+        are numbered within their own scope, and "^ud_N^" variables, which are
+        numbered by palmatAux.uniqueVariableCounter, and are shifted by the
+        difference in that counter instead.
+    *   The line numbers in "source" fields are shifted by however far the
+        block has moved.
+
+Blocks whose generation failed or printed any messages (whose line numbers
+would be wrong if the block were reused elsewhere), or which affect the
+PALMAT in any way other than those just described, are never cached.
+
+Since the entire compilation is still preprocessed and parsed (unless none
+of it has changed at all), the time for a rebuild isn't strictly proportional
+to the size of the edit, but those are the inexpensive steps of compilation;
+the expensive step, code generation, is.
+"""
+
+import os
+import re
+import io
+import json
+import glob
+import pickle
+import hashlib
+import contextlib
+import palmatAux
+from halArray import halArrayToJSON
+
+cache = {
+    "directory": None,  # None if caching is disabled
+    "compiler": None,   # Digest of the compiler's source code
+    "recording": None,  # AST of the block being generated for the cache
+    "hits": 0,
+    "misses": 0
+}
+
+# Bump this if the format of cache entries changes.
+cacheVersion = "1"
+
+def setCacheDirectory(directory):
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        print("Cannot create cache directory %s, caching disabled." % \
+              directory)
+        return False
+    cache["directory"] = directory
+    return True
+
+def cacheEnabled():
+    return cache["directory"] != None
+
+# Digest of everything the generated PALMAT depends on other than the source
+# code, namely the compiler itself.
+def compilerDigest():
+    if cache["compiler"] == None:
+        digest = hashlib.sha256(cacheVersion.encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for filename in sorted(glob.glob(os.path.join(here, "*.py"))):
+            f = open(filename, "rb")
+            digest.update(f.read())
+            f.close()
+        cache["compiler"] = digest.hexdigest()
+    return cache["compiler"]
+
+def cacheKey(*parts):
+    digest = hashlib.sha256(compilerDigest().encode())
+    for part in parts:
+        digest.update(b"\0")
+        digest.update(part.encode())
+    return digest.hexdigest()
+
+def cacheLoad(key, suffix):
+    filename = os.path.join(cache["directory"], key + suffix)
+    try:
+        f = open(filename, "rb")
+        entry = pickle.load(f)
+        f.close()
+        return entry
+    except:
+        return None
+
+# Entries are written to a temporary file which is then renamed, so that
+# simultaneous compilations sharing a cache never see a partial entry.
+def cacheStore(key, suffix, entry):
+    filename = os.path.join(cache["directory"], key + suffix)
+    temporary = "%s.%d" % (filename, os.getpid())
+    try:
+        f = open(temporary, "wb")
+        pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+        os.replace(temporary, filename)
+    except:
+        try:
+            f.close()
+            os.remove(temporary)
+        except:
+            pass
+
+#-----------------------------------------------------------------------------
+# The AST cache.
+
+def astKey(text, compiler):
+    try:
+        status = os.stat(compiler)
+        compiler += " %d %d" % (status.st_size, status.st_mtime_ns)
+    except OSError:
+        pass
+    return cacheKey("ast", compiler, text)
+
+# An AST is nested far too deeply (one level per statement of the 
+# compilation) to be pickled as-is, so it's stored in postorder as a flat 
+# list instead:  strings are themselves, while each node is a tuple of its
+# lbnfLabel, number of components, and lineNumber and columnNumber if any,
+# following its components.
+def flattenAST(ast):
+    flat = []
+    stack = [ast]
+    while len(stack) > 0:
+        node = stack.pop()
+        if isinstance(node, tuple):
+            flat.append(node)
+        elif isinstance(node, str):
+            flat.append(node)
+        else:
+            if "lineNumber" in node:
+                stack.append((node["lbnfLabel"], len(node["components"]), 
+                              node["lineNumber"], node["columnNumber"]))
+            else:
+                stack.append((node["lbnfLabel"], len(node["components"])))
+            stack.extend(reversed(node["components"]))
+    return flat
+
+def unflattenAST(flat):
+    stack = []
+    for item in flat:
+        if isinstance(item, str):
+            stack.append(item)
+            continue
+        count = item[1]
+        node = { "lbnfLabel": item[0], "components": [] }
+        if count > 0:
+            node["components"] = stack[-count:]
+            del stack[-count:]
+        if len(item) > 2:
+            node["lineNumber"] = item[2]
+            node["columnNumber"] = item[3]
+        stack.append(node)
+    return stack[0]
+
+# Returns the AST and the front end's messages, or None, None.
+def loadAST(text, compiler):
+    entry = cacheLoad(astKey(text, compiler), ".ast")
+    if entry == None:
+        return None, None
+    return unflattenAST(entry["ast"]), entry["stderr"]
+
+def storeAST(text, compiler, ast, stderr):
+    cacheStore(astKey(text, compiler), ".ast", 
+               {"ast": flattenAST(ast), "stderr": stderr})
+
+#-----------------------------------------------------------------------------
+# The block cache.
+
+# Returns the line number of the first line of the block, the text of its
+# AST with line numbers relative to that, and the set of names (sans the 
+# identifier-mangling prefixes) which the block uses.
+def blockText(ast):
+    firstLine = None
+    fields = []
+    names = set()
+    stack = [ast]
+    while len(stack) > 0:
+        node = stack.pop()
+        if node == None:
+            fields.append(")")
+        elif type(node) == str:
+            fields.append(node)
+            if node[:1] == "^":
+                names.add(baseName(node))
+        else:
+            fields.append("(" + node["lbnfLabel"])
+            if "lineNumber" in node:
+                # The first line number in the block is the first one found.
+                if firstLine == None:
+                    firstLine = node["lineNumber"]
+                fields.append("%d,%d" % (node["lineNumber"] - firstLine,
+                                         node.get("columnNumber", -1)))
+            stack.append(None)
+            stack.extend(reversed(node["components"]))
+    if firstLine == None:
+        firstLine = 0
+    return firstLine, " ".join(fields), names
+
+mangledName = re.compile("^\\^(?:[a-z]+_)?(.*)\\^$")
+def baseName(identifier):
+    match = mangledName.match(identifier)
+    if match == None:
+        return identifier
+    return match.group(1)
+
+def serialize(value):
+    return json.dumps(value, sort_keys=True, default=halArrayToJSON)
+
+# Returns the text of the context in which a block at the top level is being
+# compiled, given the set of names used by the block.  That's the attributes
+# of all identifiers in the root scope which the block could possibly be 
+# referring to, either directly or (for structure templates) indirectly.
+# Labels aren't included, since a block can't jump out of itself, nor are 
+# the scope numbers of FUNCTIONs and PROCEDUREs, since CALLs refer to the 
+# scopes in which their identifiers reside rather than to the scopes of the
+# subroutines themselves.
+def blockContext(PALMAT, state, names):
+    scopes = PALMAT["scopes"]
+    root = scopes[0]
+    fields = [serialize(state["history"]),
+              serialize(root["structureTemplates"])]
+    for identifier, attributes in root["identifiers"].items():
+        if "label" in attributes or generatedName.match(identifier) != None:
+            continue
+        if "template" not in attributes and baseName(identifier) not in names:
+            continue
+        if "scope" in attributes:
+            attributes = dict(attributes)
+            attributes.pop("scope")
+        fields.append(identifier)
+        fields.append(serialize(attributes))
+    compools = [scope for scope in scopes if scope["type"] == "compool"]
+    if len(compools) > 0:
+        fields.append("%d" % len(root["children"]))
+        for scope in compools:
+            fields.append("%d" % scope["self"])
+            fields.append(serialize(scope["identifiers"]))
+    return "\n".join(fields)
+
+# A snapshot of the root scope, for determining afterward what a block has
+# changed in it.
+def rootSnapshot(root):
+    snapshot = {}
+    for identifier, attributes in root["identifiers"].items():
+        if "label" in attributes:
+            snapshot[identifier] = list(attributes["label"])
+        else:
+            snapshot[identifier] = serialize(attributes)
+    return snapshot
+
+# Determines what a block that has just been generated changed in the root
+# scope, relative to the snapshot returned by rootSnapshot(), given that the
+# block's own scopes start at base.  Returns a dictionary of the new or
+# changed identifiers, or None if the block did something we don't know how
+# to reproduce.  New labels in the root scope itself are only acceptable if
+# rootLength (the length of the root scope's instructions before the block)
+# is given, and then only if they're for instructions the block added there,
+# which spliceFragment() relocates.  The "value" which setUninitialized() in
+# palmatAux.py gives to an existing FUNCTION's identifier whenever it's called
+# from the root scope's DECLAREs isn't a change, since it's merely the slot for
+# a value that's never used.
+def rootChanges(root, snapshot, base, rootLength=None):
+    identifiers = root["identifiers"]
+    changes = {}
+    existing = 0
+    for identifier, attributes in identifiers.items():
+        if identifier not in snapshot:
+            if "label" in attributes:
+                scope, offset = attributes["label"]
+                if scope == 0:
+                    if rootLength == None or offset < rootLength:
+                        return None
+                elif scope < base:
+                    return None
+            changes[identifier] = attributes
+            continue
+        existing += 1
+        if "label" in attributes:
+            if attributes["label"] != snapshot[identifier]:
+                return None
+            continue
+        serialized = serialize(attributes)
+        if serialized == snapshot[identifier]:
+            continue
+        if "function" in attributes and "value" in attributes:
+            unvalued = dict(attributes)
+            unvalued.pop("value")
+            if serialize(unvalued) == snapshot[identifier]:
+                continue
+        changes[identifier] = attributes
+    if existing != len(snapshot):
+        return None # Something was removed.
+    return changes
+
+# Relocation of a fragment. The relocation is a dictionary of the scope
+# number at which the fragment originally started ("base"), and the offsets
+# to be added to scope numbers within the fragment ("scopes"), to
+# uniqueVariableCounter-numbered variables at or above "counter"
+# ("variables"), to line numbers ("lines"), and to the offsets of labels in
+# the root scope, for fragments with "rootInstructions" ("rootOffset",
+# relative to the fragment's "rootLength").  Optionally, it may also map
+# scope numbers outside of the fragment ("external") and indices into
+# PALMAT["sourceFiles"] ("files") to new values; see palmatObject.py.
+generatedName = re.compile("^(\\^?)([a-z]+)_([0-9]+)(\\^?)$")
+def relocateName(name, relocation):
+    match = generatedName.match(name)
+    if match == None:
+        return name
+    prefix, xx, number, suffix = match.groups()
+    number = int(number)
+    if xx == "ud":
+        if number < relocation["counter"]:
+            return name
+        number += relocation["variables"]
+    elif xx == "dc" or number < relocation["base"]:
+        return name
+    else:
+        number += relocation["scopes"]
+    return "%s%s_%d%s" % (prefix, xx, number, suffix)
+
+def relocateScope(index, relocation):
+    if index == None:
+        return index
+    if index < relocation["base"]:
+        if "external" in relocation:
+            return relocation["external"].get(index, index)
+        return index
+    return index + relocation["scopes"]
+
+def relocateOperand(value, relocation):
+    if isinstance(value, tuple):
+        if len(value) == 2 and isinstance(value[0], int) and \
+                isinstance(value[1], str):
+            return (relocateScope(value[0], relocation),
+                    relocateName(value[1], relocation))
+        return tuple(relocateOperand(v, relocation) for v in value)
+    if isinstance(value, list):
+        return [relocateOperand(v, relocation) for v in value]
+    if isinstance(value, dict):
+        return {k: relocateOperand(v, relocation) for k, v in value.items()}
+    return value
+
+def relocateInstruction(instruction, relocation):
+    for key, value in instruction.items():
+        if key == "source":
+            file = value[0]
+            if "files" in relocation:
+                file = relocation["files"][file]
+            instruction[key] = [file, value[1] + relocation["lines"]] + \
+                               value[2:]
+        elif key == "label":
+            instruction[key] = relocateName(value, relocation)
+        elif key == "returnoffset":
+            instruction[key] = relocateScope(value, relocation)
+        elif isinstance(value, (tuple, list, dict)):
+            instruction[key] = relocateOperand(value, relocation)
+
+def relocateIdentifiers(identifiers, relocation):
+    relocated = {}
+    for identifier, attributes in identifiers.items():
+        if "label" in attributes:
+            label = attributes["label"]
+            if label[0] == 0:
+                attributes["label"] = [0, label[1] + relocation["rootOffset"]]
+            else:
+                attributes["label"] = [relocateScope(label[0], relocation),
+                                       label[1]]
+        if "scope" in attributes:
+            attributes["scope"] = relocateScope(attributes["scope"],
+                                                relocation)
+        relocated[relocateName(identifier, relocation)] = attributes
+    return relocated
+
+# Note that a scope's "attributes" is the same object as the identifier of
+# the block in its parent's identifiers, and is relocated there.  A fragment
+# may also have instructions to be appended to those of the root scope
+# ("rootInstructions"), though cached blocks never do.
+def relocateFragment(fragment, relocation):
+    for scope in fragment["scopes"]:
+        scope["self"] = relocateScope(scope["self"], relocation)
+        scope["parent"] = relocateScope(scope["parent"], relocation)
+        scope["children"] = [relocateScope(child, relocation) \
+                             for child in scope["children"]]
+        scope["identifiers"] = relocateIdentifiers(scope["identifiers"],
+                                                   relocation)
+        for instruction in scope["instructions"]:
+            relocateInstruction(instruction, relocation)
+    for instruction in fragment.get("rootInstructions", []):
+        relocateInstruction(instruction, relocation)
+    fragment["root"] = relocateIdentifiers(fragment["root"], relocation)
+
+def spliceFragment(fragment, PALMAT, firstLine, external=None, files=None):
+    scopes = PALMAT["scopes"]
+    root = scopes[0]
+    counter = palmatAux.uniqueVariableCounter
+    relocation = {
+        "base": fragment["base"],
+        "scopes": len(scopes) - fragment["base"],
+        "counter": fragment["counter"],
+        "variables": counter - fragment["counter"],
+        "lines": firstLine - fragment["firstLine"],
+        "rootOffset": len(root["instructions"]) - \
+                      fragment.get("rootLength", 0)
+    }
+    if external != None:
+        relocation["external"] = external
+    if files != None:
+        relocation["files"] = files
+    relocateFragment(fragment, relocation)
+    for scope in fragment["scopes"]:
+        if scope["parent"] == 0:
+            root["children"].append(scope["self"])
+    scopes.extend(fragment["scopes"])
+    root["identifiers"].update(fragment["root"])
+    root["instructions"].extend(fragment.get("rootInstructions", []))
+    PALMAT.update(fragment["PALMAT"])
+    palmatAux.uniqueVariableCounter = counter + fragment["variables"]
+
+'''
+Generates the PALMAT for a top-level block definition, from the cache if
+possible.  The arguments and return value are those of generatePALMAT(),
+which is itself the first argument (to avoid circular imports);
+generatePALMAT() calls this function, and this function calls
+generatePALMAT() back.
+'''
+def generateBlock(generatePALMAT, ast, PALMAT, state, trace, endLabels, depth,
+                  trace4):
+    scopes = PALMAT["scopes"]
+    root = scopes[0]
+    firstLine, text, names = blockText(ast)
+    context = blockContext(PALMAT, state, names)
+    key = cacheKey("block", "%d" % palmatAux.astSourceIndex, text, context)
+    fragment = cacheLoad(key, ".block")
+    if fragment != None:
+        cache["hits"] += 1
+        spliceFragment(fragment, PALMAT, firstLine)
+        return True, PALMAT
+    cache["misses"] += 1
+
+    snapshot = rootSnapshot(root)
+    base = len(scopes)
+    counter = palmatAux.uniqueVariableCounter
+    rootLength = len(root["instructions"])
+    rootChildren = len(root["children"])
+    # New top-level keys go into the fragment, except for the structure
+    # layouts (see structureLayout() in palmatAux.py), a mere cache.
+    palmatKeys = set(PALMAT)
+    enclosing = [(e["used"], e.get("recycle")) for e in endLabels]
+    output = io.StringIO()
+    cache["recording"] = ast
+    try:
+        with contextlib.redirect_stdout(output):
+            success, PALMAT = generatePALMAT(ast, PALMAT, state, trace,
+                                             endLabels, depth, trace4)
+    finally:
+        cache["recording"] = None
+    output = output.getvalue()
+    print(output, end="")
+    if not success or output != "":
+        return success, PALMAT
+
+    # Don't cache blocks whose effects we can't reproduce.
+    changes = rootChanges(root, snapshot, base)
+    if changes == None or len(root["instructions"]) != rootLength or \
+            any(child < base for child in root["children"][rootChildren:]) or \
+            enclosing != [(e["used"], e.get("recycle")) for e in endLabels]:
+        return success, PALMAT
+    fragment = {
+        "base": base,
+        "counter": counter,
+        "variables": palmatAux.uniqueVariableCounter - counter,
+        "firstLine": firstLine,
+        "scopes": scopes[base:],
+        "root": changes,
+        "PALMAT": {k: PALMAT[k] for k in PALMAT \
+                   if k not in palmatKeys and k != "layouts"}
+    }
+    cacheStore(key, ".block", fragment)
+    return success, PALMAT
+
+# Is ast a block definition whose PALMAT should come from the cache?
+def isCacheableBlock(lbnfLabel, ast, state, trace, trace4):
+    return lbnfLabel == "block_definition" and \
+            cache["directory"] != None and \
+            cache["recording"] is not ast and \
+            state["scopeIndex"] == 0 and \
+            "stateMachine" not in state and \
+            not trace and not trace4
@@ -30,7 +30,6 @@ Well, at least I tried!
 
 """
 
-import re
 import math
 import random
 import time
@@ -38,9 +37,13 @@ import datetime
 import copy
 from palmatAux import *
 from unaryFunctions import arrayableUnaryRTL, unaryRTL
-from binaryFunctions import arrayableBinaryRTL, binaryRTL
+from binaryFunctions import arrayableBinaryRTL, binaryRTL, binaryKernels
 from accumulableFunctions import accumulate, accumulableFunctions
 from saveValueToVariable import *
+from binaryPALMAT import isMaterialized
+from profilePALMAT import chargeProfile, chargeCall
+from tracePALMAT import recordRing, dumpRing
+from ioChannels import channels, readItem, writeRecord, flushChannels
 
 '''
 Categorization of the HAL/S built-in functions by the number of arguments
@@ -100,13 +103,13 @@ This function does two things:
 def jump(PALMAT, source, scopeNumber, instructionDict, instructionName):
     si, s = instructionDict[instructionName]
     if isinstance(s, str):
-        attributes = PALMAT["scopes"][si]["identifiers"][s]
-        if attributes == None or "label" not in attributes:
+        label = resolveLabel(PALMAT, si, s)
+        if label == None:
             printError(PALMAT, source, str(instructionDict), \
                        "Cannot find target label " + s)
             return None
         instructionDict["symbolicLabel"] = instructionDict[instructionName]
-        instructionDict[instructionName] = attributes["label"]
+        instructionDict[instructionName] = list(label)
     s = instructionDict[instructionName]
     return tuple(s)
 
@@ -123,15 +126,16 @@ def clonePALMAT(rawPALMAT):
     instantiationNumber += 1
     scopeIndex = 0
     
-    # For the specified scope, make sure its identifiers are a deep copy
-    # rather than a shallow copy.  Except for COMPOOLs.
-    def deepcopyDescendents(scopeIndex):
+    # For the specified scope, make sure its identifiers are a copy-on-write
+    # copy (see shareIdentifiers() in palmatAux.py) rather than a shallow 
+    # copy.  Except for COMPOOLs.
+    def shareDescendents(scopeIndex):
         rawScope = rawPALMAT["scopes"][scopeIndex]
         scope = PALMAT["scopes"][scopeIndex]
         if rawScope["type"] != "compool":
-            scope["identifiers"] = copy.deepcopy(rawScope["identifiers"])
+            scope["identifiers"] = shareIdentifiers(rawScope["identifiers"])
         for childIndex in scope["children"]:
-            deepcopyDescendents(childIndex)
+            shareDescendents(childIndex)
     
     # After the following operation, both PALMAT and PALMAT["scopes"] are
     # entirely new, but each of the individual scopes PALMAT["scopes"][i]
@@ -142,29 +146,37 @@ def clonePALMAT(rawPALMAT):
         "scopes": [],
         "instantiation": instantiationNumber
         }
+    if "sourceFiles" in rawPALMAT:
+        PALMAT["sourceFiles"] = rawPALMAT["sourceFiles"]
+    if "watches" in rawPALMAT:
+        PALMAT["watches"] = rawPALMAT["watches"]
+    # The structure layouts don't depend on the values of variables, so the
+    # clones can share them.
+    PALMAT["layouts"] = rawPALMAT.setdefault("layouts", {})
     for scope in rawPALMAT["scopes"]:
         PALMAT["scopes"].append(copy.copy(scope))
-    # Now correct the shallowly-copied indentifiers to deep copies where needed.
-    deepcopyDescendents(scopeIndex)
+    # Now correct the shallowly-copied indentifiers to copy-on-write copies
+    # where needed.
+    shareDescendents(scopeIndex)
     return PALMAT
 
-# For WRITE statements.
-def printVectorOrMatrix(vOrM):
+# For WRITE statements.  These append the formatted value to the list of 
+# strings comprising the output record.
+def printVectorOrMatrix(vOrM, record):
     if isinstance(vOrM, list):
         for v in vOrM:
-            printVectorOrMatrix(v)
+            printVectorOrMatrix(v, record)
         return
     elif vOrM == None:
         value = "X.X"
     elif isinstance(vOrM, (int, float)):
         value = formatNumberAsString(vOrM)
-    print(" " + value + " ", end="")
+    record.append(" " + value + " ")
 
-# For WRITE statements.
-def printArray(array):
-    if isinstance(array, list) and len(array) > 1 and array[-1] == "a":
-        for a in array[:-1]:
-            printArray(a)
+def printArray(array, record):
+    if isinstance(array, HalArray):
+        for a in array.buffer:
+            printArray(a, record)
         return
     elif array == None:
         value = 'None'
@@ -182,35 +194,11 @@ def printArray(array):
     elif isinstance(array, str):
         value = '"' + array + '"'
     elif isVector(array) or isMatrix(array):
-        printVectorOrMatrix(array)
+        printVectorOrMatrix(array, record)
         return
     else:
         value = "(unimplemented)"
-    print(" " + value + " ", end="")
-
-'''
-For READ statements.  Read next value (in string form) from LUN 5 ... i.e., 
-stdin.  The individual values in the input stream are delimited by commas 
-and/or whitespace.  Commas/whitespace are used only for this purpose and are 
-not returned by the function.  If a semicolon is encountered in the input
-stream, it is returned whether or not it is delimited.  Semicolons are supposed
-to be treated as the end of an input record and thus terminate a READ statement,
-possibly prematurely.  However, this is the purview of the calling code, and
-all readItemLUN5() does is to insure that the semicolon is returned.
-'''
-readLineFields = [] # Buffered data for READ statements
-def readItemLUN5(PALMAT, source):
-    global readLineFields
-    while len(readLineFields) == 0:
-        line = input("READ  > ").replace(";", " ; ").strip()
-        if line == "":
-            continue
-        if "`" in line:
-            printError(PALMAT, source, "{'read': True, 'lun': 5}", \
-                "The back-tick (`) is not a legal character for input data in a READ statement.")
-            continue
-        readLineFields = re.split(r"\s*,\s*|\s+", line.strip())
-    return readLineFields.pop(0)
+    record.append(" " + value + " ")
 
 # Apply the INTEGER or SCALAR shaping function (with no subscripts) to a 
 # single INTEGER, SCALAR, BIT(N), CHARACTER(N), VECTOR(N), MATRIX(N,M), or 
@@ -218,9 +206,10 @@ def readItemLUN5(PALMAT, source):
 def toIntegerOrScalar(object, toInteger=True):
     if object == None:
         return None
-    elif isArrayQuick(object):
-        for i in range(len(object)-1):
-            object[i] = toIntegerOrScalar(object[i], toInteger)
+    elif isinstance(object, HalArray):
+        buffer = object.buffer
+        for i in range(len(buffer)):
+            buffer[i] = toIntegerOrScalar(buffer[i], toInteger)
         return object
     elif isinstance(object, (int, float)):
         if toInteger:
@@ -269,16 +258,14 @@ there are less subscripts than dimensions, the remainder is filled up as if *
 were used.  No conversions are performed.  Returns NaN on failure.
 '''
 def sliceIt(object, subscripts):
+    if isinstance(object, HalArray):
+        return sliceArray(object, subscripts)
     if not isinstance(object, list) or isBitArray(object):
         if len(subscripts) == 0:
             return copy.deepcopy(object)
         else: # Too many subscripts for the object.
             return NaN
-    isArray = (object[-1] == "a")
-    if isArray:
-        width = len(object) - 1
-    else:
-        width = len(object)
+    width = len(object)
     if len(subscripts) == 0: # Not enough subscripts, so use entire level.
         thisLevelSubscripts = list(range(width))
     else:
@@ -308,10 +295,65 @@ def sliceIt(object, subscripts):
         newObject.append(newLevel)
     if len(newObject) == 1:
         newObject = newObject[0]
-    elif isArray:
-        newObject.append("a")
     return newObject
 
+'''
+The same as sliceIt(), for an ARRAY.  The leading subscripts (one per ARRAY
+dimension) select elements of the ARRAY's buffer by index arithmetic, while 
+any remaining subscripts are applied by sliceIt() to each of the selected
+elements.  As in sliceIt(), a dimension from which only a single index is 
+selected disappears from the result, and if that leaves no dimensions, the
+result is just the (sliced) element rather than an ARRAY.
+'''
+def sliceArray(array, subscripts):
+    shape = array.shape
+    numDimensions = len(shape)
+    elementSubscripts = subscripts[numDimensions:]
+    indices = []
+    newShape = []
+    whole = True
+    try:
+        for d in range(numDimensions):
+            width = shape[d]
+            if d >= len(subscripts) or subscripts[d] == {'fill'}:
+                selected = range(width)
+            else:
+                whole = False
+                s = subscripts[d]
+                if isinstance(s, list): # This is an AT-slice.
+                    s1 = unpound(s[1], width)
+                    selected = range(s1 - 1, s1 - 1 + s[0])
+                elif isinstance(s, tuple): # This is a TO-slice.
+                    selected = range(unpound(s[0], width) - 1, \
+                                     unpound(s[1], width))
+                else: # This is a single index.
+                    s = unpound(s, width) - 1
+                    selected = range(s, s + 1)
+            if len(selected) == 0 or selected[0] < 0 or selected[-1] >= width:
+                return NaN
+            if len(selected) != 1:
+                newShape.append(len(selected))
+            indices.append(selected)
+    except:
+        return NaN
+    buffer = array.buffer
+    if len(newShape) == 0:
+        return sliceIt(buffer[array.offset([s[0] for s in indices])], \
+                       elementSubscripts)
+    if whole and len(newShape) == numDimensions:
+        elements = buffer
+    else:
+        elements = [buffer[o] for o in arrayOffsets(array, indices)]
+    if len(elementSubscripts) == 0:
+        return HalArray(newShape, copyElements(elements))
+    newElements = []
+    for e in elements:
+        e = sliceIt(e, elementSubscripts)
+        if isNaN(e):
+            return NaN
+        newElements.append(e)
+    return HalArray(newShape, newElements)
+
 '''
 Computes the HAL/S "=" relational operator (PALMAT "==").
 Returns True or False or None.  None is returned of the operands are 
@@ -375,33 +417,25 @@ def isEqualTo(operand1, operand2):
     
     def doesArrayEqualLeaf(array, leaf):
         retVal = True
-        if isArrayQuick(array):
-            for a in array[:-1]:
-                r = doesArrayEqualLeaf(a, leaf)
-                if r == None:
-                    return None
-                retVal &= r
-            return retVal
-        else:
-            # "array" at this point is a leaf, and in spite of the designation
-            # "array", is not itself an ARRAY.
-            return areLeavesEqual(array, leaf)
+        for a in array.buffer:
+            r = areLeavesEqual(a, leaf)
+            if r == None:
+                return None
+            retVal &= r
+        return retVal
     
-    # We already know that the arrays match in dimensionality, so we can 
-    # recurse through them at the same time.  Returns the usual True, False,
-    # or None (for incomparability).
+    # Compare two arrays element by element.  Returns the usual True, False,
+    # or None (for incomparability, including mismatched dimensions).
     def areTwoArraysEqual(array1, array2):
+        if array1.shape != array2.shape:
+            return None
         retVal = True
-        if isArrayQuick(array1):
-            for i in range(len(array1)-1):
-                r = areTwoArraysEqual(array1[i], array2[i])
-                if r == None:
-                    return None
-                retVal &= r
-            return retVal
-        else:
-            # Both arrays have recursed down to the leaves.
-            return areLeavesEqual(array1, array2);
+        for i in range(len(array1.buffer)):
+            r = areLeavesEqual(array1.buffer[i], array2.buffer[i])
+            if r == None:
+                return None
+            retVal &= r
+        return retVal
     
     isArray1 = isArrayQuick(operand1)
     isArray2 = isArrayQuick(operand2)
@@ -427,44 +461,1783 @@ def simpleMIDVAL(PALMAT, operand1, operand2, operand3):
         return operand3
 
 # Find attributes of an identifier from an identifiers list, possibly with 
-# structure qualifications.
+# structure qualifications.  For a field of a STRUCTURE, the attributes are
+# those of the field in the structure template, plus the field's "value" (or
+# "constant"), plus "field":  (the STRUCTURE's attributes, the indices of the 
+# field in its value), as found via the template's layout (see 
+# structureLayout() in palmatAux.py).
 def getAttributes(PALMAT, scopeIndex, qualifications, identifier):
     identifiers = PALMAT["scopes"][scopeIndex]["identifiers"]
     if len(qualifications) == 0:
         return identifiers[identifier]
-    identifier = identifier[1:-1]
+    # qualifications[0] is actually the top-level identifier we need to find
+    # since it identifies the DECLARE'd STRUCTURE.  The rest, along with
+    # the identifier, are the path to the field within its template.
+    si, attributes = findIdentifier("^s_" + qualifications[0] + "^", \
+                                    PALMAT, scopeIndex)
+    if attributes == None or "structure" not in attributes:
+        return None
+    layout = structureLayout(PALMAT, si, "^" + attributes["structure"] + "^")
+    if layout == None:
+        return None
+    path = tuple("s_" + q for q in qualifications[1:]) + (identifier[1:-1],)
+    field = layout["fields"].get(path)
+    if field == None:
+        return None
+    indices, fieldAttributes = field
+    key = "value"
+    if "constant" in attributes:
+        key = "constant"
+    value = attributes.get(key)
     try:
-        # qualifications[0] is actually the top-level identifier we need to find
-        # since it identifies the DECLARE'd STRUCTURE.  From that, we have to
-        # find the structure template associated with the STRUCTURE and descend
-        # down into it.
-        si, attributes = findIdentifier("^s_" + qualifications[0] + "^", \
-                                        PALMAT, scopeIndex)
-        if attributes == None or "structure" not in attributes:
-            return None
-        si, template = findIdentifier("^" + attributes["structure"] + "^", \
-                                        PALMAT, si)
-        if template == None or "template" not in template:
+        for i in indices:
+            value = value[i]
+    except:
+        return None
+    fieldAttributes = fieldAttributes.copy()
+    fieldAttributes[key] = value
+    fieldAttributes["field"] = (attributes, indices)
+    return fieldAttributes
+
+'''
+The emulator proper (executePALMAT(), below) originally was a single loop
+containing a giant if/elif chain that tested each PALMAT instruction for each
+of the ~40 possible instruction names in turn, re-examined the instruction's
+dictionary on every execution, and re-converted things like the stringified
+numbers of 'number' instructions every single time they were executed.
+Instructions near the end of that chain ('call', 'return', ...) were
+therefore the slowest ones of all.
+
+What we do instead is to "decode" each PALMAT scope's list of instructions the
+first time control enters it, converting each instruction to a tuple
+    (opcode, operand, instruction, source)
+in which:
+    opcode          Is an index into the table of handler functions, handlers[]
+                    (see the end of this module).
+    operand         Is the value of the instruction, in whatever preprocessed
+                    form is most convenient for the handler.  For example, the
+                    operand of a 'number' instruction is the actual int or
+                    float rather than its stringified form, and the operands
+                    of jump-like instructions are already resolved to
+                    (scope, offset) pairs wherever possible.
+    instruction     Is the original instruction dictionary, which is needed
+                    only for error messages and for tracing.
+    source          Is the instruction's "source" field, or None if it has none.
+The emulator's loop then just fetches the tuple and calls
+handlers[opcode](...).
+
+Each handler function has the form
+    handler(vm, operand, instruction, scopeNumber, instructionIndex)
+where vm is a dictionary holding the state of the emulation (the PALMAT, the
+computation stack, and so on; see executePALMAT()), scopeNumber is the index
+of the scope containing the instruction, and instructionIndex is the offset
+of the instruction *following* the one being executed.  The handler returns:
+    None            To continue on to the next instruction.
+    (scope,offset)  To transfer control to the given location.
+    False           If emulation is to end, whether due to an error or due
+                    to a 'halt'.  (executePALMAT() then returns None.)
+'''
+
+# Names of the PALMAT instructions, in the order of priority with which they're
+# recognized in an instruction dictionary.  The entries following "partition"
+# are pseudo-instructions which don't appear in PALMAT, but which 'operator'
+# instructions are decoded to, according to the kind of operator involved, 
+# or (for "watched") which stores into watched variables are decoded to.
+opcodeNames = ["debug", "empty", "fill", "string", "boolean", "number",
+               "vector", "matrix", "array", "+><", "sentinel", "operator",
+               "fetch", "unravel", "fetchp", "store", "storepop", "substore",
+               "substorepop", "pop", "read", "write", "iocontrol", "shaping",
+               "modern", "function", "goto", "calloffset", "returnoffset",
+               "case", "iffalse", "iftrue", "noop", "run", "call", "return",
+               "halt", "automatics", "schedule", "wait", "set", "reset",
+               "signal", "terminate", "cancel", "update", "process",
+               "storeconstant", "compute", "computestore", "computeiffalse",
+               "computeiftrue", "fetchiffalse", "fetchiftrue", "loopstep",
+               "partition", "operator#", "operatorDotted", "operatorSubscripts",
+               "operatorUnary", "operatorBinary", "operatorTyped",
+               "operatorUnknown", "watched", "unknown"]
+opcodes = {}
+for i in range(len(opcodeNames)):
+    opcodes[opcodeNames[i]] = i
+operatorOpcodes = {
+    "#": opcodes["operator#"],
+    "dotted": opcodes["operatorDotted"],
+    "subscripts": opcodes["operatorSubscripts"]
+    }
+for operator in ["U-", "NOT"]:
+    operatorOpcodes[operator] = opcodes["operatorUnary"]
+for operator in ["+", "-", "", "/", "**", ".", "*", "C||", "OR", "AND", "==",
+                 "!=", "<", ">", "<=", ">=", "B||", "ORNOT"]:
+    operatorOpcodes[operator] = opcodes["operatorBinary"]
+jumpOpcodes = { opcodes["goto"], opcodes["iffalse"], opcodes["iftrue"] }
+# Instructions whose operand is (scope index, unmangled identifier).
+variableOpcodes = { opcodes["fetch"], opcodes["unravel"], opcodes["fetchp"],
+                    opcodes["store"], opcodes["storepop"], opcodes["substore"],
+                    opcodes["substorepop"], opcodes["+><"], opcodes["run"],
+                    opcodes["call"], opcodes["set"], opcodes["reset"],
+                    opcodes["signal"], opcodes["process"] }
+# The instructions implemented only by the real-time scheduler (see 
+# schedulePALMAT.py).
+realTimeOpcodes = { opcodes["schedule"], opcodes["wait"], opcodes["set"],
+                    opcodes["reset"], opcodes["signal"], opcodes["terminate"],
+                    opcodes["cancel"], opcodes["update"], opcodes["process"] }
+# The only instructions allowed to consume subscripts or structure
+# qualifications.
+subscriptableOpcodes = { opcodes["fetch"], opcodes["fetchp"],
+                         opcodes["shaping"], opcodes["unravel"] }
+qualifiableOpcodes = { opcodes["fetch"], opcodes["unravel"], opcodes["fetchp"],
+                       opcodes["store"], opcodes["storepop"],
+                       opcodes["substore"], opcodes["substorepop"] }
+
+# Returns (scope, offset) for a symbolic label, or None if it cannot be found.
+def resolveLabel(PALMAT, si, label):
+    attributes = PALMAT["scopes"][si]["identifiers"].get(label)
+    if attributes == None or "label" not in attributes:
+        return None
+    return tuple(attributes["label"])
+
+# The operand of a jump-like instruction, as described for decodeInstruction().
+def decodeTarget(PALMAT, target):
+    si, s = target
+    if isinstance(s, str):
+        # If the label can't be resolved now, the handler will try again
+        # (and complain) at runtime.
+        return resolveLabel(PALMAT, si, s)
+    return tuple(target)
+
+def decodeNumber(s):
+    try:
+        return int(s)
+    except:
+        return stringifiedToFloat(s)
+
+# The operand of a variableOpcodes instruction, as described for 
+# decodeInstruction().
+def decodeVariable(PALMAT, operand):
+    si, identifier = operand
+    identifier = "^" + identifier + "^"
+    attributes = None
+    if si != -1:
+        attributes = PALMAT["scopes"][si]["identifiers"].get(identifier)
+    return (si, identifier, attributes)
+
+# The "operands" of a superinstruction are 'number' or 'fetch' instructions,
+# which are decoded to (isNumber, operand, instruction).
+def decodeOperands(PALMAT, operands):
+    decoded = []
+    for instruction in operands:
+        if "number" in instruction:
+            decoded.append((True, decodeNumber(instruction["number"]), 
+                            instruction))
+        else:
+            decoded.append((False, decodeVariable(PALMAT, 
+                                                  instruction["fetch"]),
+                            instruction))
+    return tuple(decoded)
+
+# Resolves a (scope index, unmangled identifier) pair to the same 
+# (si, mangled identifier, attributes) form as the operands of variableOpcodes.
+def decodeReference(PALMAT, reference):
+    si, identifier = reference
+    identifier = "^" + identifier + "^"
+    return (si, identifier, PALMAT["scopes"][si]["identifiers"].get(identifier))
+
+# Decode a single PALMAT instruction into the (opcode, operand, instruction,
+# source) form described above.
+def decodeInstruction(PALMAT, scopeNumber, instruction):
+    source = instruction.get("source")
+    for name in opcodeNames:
+        if name in instruction:
+            break
+    else:
+        return (opcodes["unknown"], None, instruction, source)
+    opcode = opcodes[name]
+    operand = instruction[name]
+    if name == "number":
+        operand = decodeNumber(operand)
+    elif name == "operator":
+        opcode = operatorOpcodes.get(operand, opcodes["operatorUnknown"])
+    elif name == "array":
+        operand = nestedToHalArray(operand)
+    elif opcode in jumpOpcodes:
+        operand = decodeTarget(PALMAT, operand)
+    elif opcode in variableOpcodes:
+        # The operand becomes (si, mangled identifier, attributes), where the
+        # attributes are those found in the identifiers of scope si, or None
+        # if they can't be found there (or if si is -1, in which case the 
+        # identifier is an alias in a procedure call, resolvable only at 
+        # runtime).
+        operand = decodeVariable(PALMAT, operand)
+    elif name == "storeconstant":
+        # The operand becomes (value, variable, storepop instruction), and
+        # similarly for the other superinstructions below.  The instructions
+        # which were fused are reconstructed, since the handlers they're
+        # passed to need them for error messages.  The operands of 'compute',
+        # 'computestore', 'computeiffalse', and 'computeiftrue' end with the 
+        # kernel for the operator (see operandsKernel() below), or None.
+        operand = (decodeNumber(instruction["value"]),
+                   decodeVariable(PALMAT, operand), { "storepop": operand })
+    elif name == "compute":
+        operands = decodeOperands(PALMAT, instruction["operands"])
+        operand = (operand, operands, { "operator": operand },
+                   operandsKernel(operand, operands))
+    elif name == "computestore":
+        operator = instruction["op"]
+        operands = decodeOperands(PALMAT, instruction["operands"])
+        operand = (operator, operands, { "operator": operator }, 
+                   decodeVariable(PALMAT, operand), { "storepop": operand },
+                   operandsKernel(operator, operands))
+    elif name in ["computeiffalse", "computeiftrue"]:
+        operator = instruction["op"]
+        operands = decodeOperands(PALMAT, instruction["operands"])
+        operand = (operator, operands, { "operator": operator }, 
+                   decodeTarget(PALMAT, operand), { name[7:]: operand },
+                   operandsKernel(operator, operands))
+    elif name in ["fetchiffalse", "fetchiftrue"]:
+        operand = (decodeOperands(PALMAT, instruction["operands"]),
+                   decodeTarget(PALMAT, operand), { name[5:]: operand })
+    elif name == "loopstep":
+        increment = instruction["increment"]
+        operand = (decodeOperands(PALMAT, instruction["operands"]),
+                   decodeVariable(PALMAT, increment), { "+><": increment },
+                   decodeTarget(PALMAT, operand), { "iftrue": operand })
+    elif name == "schedule":
+        # The operand becomes (task, options), where the task is a decoded
+        # reference (see decodeReference()) and the options are the
+        # instruction's other fields, with any event expressions decoded.
+        options = {}
+        for key in instruction:
+            if key in ["schedule", "source", "label"]:
+                continue
+            value = instruction[key]
+            if isinstance(value, list):
+                value = [decodeInstruction(PALMAT, scopeNumber, i) \
+                         for i in value]
+            options[key] = value
+        operand = (decodeReference(PALMAT, operand), options)
+    elif name == "wait":
+        if isinstance(operand, list):
+            operand = [decodeInstruction(PALMAT, scopeNumber, i) \
+                       for i in operand]
+    elif name in ["terminate", "cancel"]:
+        if isinstance(operand, list):
+            operand = [decodeReference(PALMAT, r) for r in operand]
+    elif name == "update":
+        if isinstance(operand, list):
+            operand = decodeReference(PALMAT, operand)
+    elif name == "calloffset":
+        identifiers = PALMAT["scopes"][scopeNumber]["identifiers"]
+        if operand in identifiers:
+            operand = identifiers[operand]["label"][1]
+        else:
+            operand = None
+    elif name == "case":
+        # The operand becomes (prefix, table, elseOffset, exitOffset), where 
+        # the table relates CASE numbers to offsets of the corresponding 
+        # labels.  Recall that the labels are named like "^prefixN^", 
+        # "^prefixelse^", and "^prefixexit^".
+        prefix = operand
+        identifiers = PALMAT["scopes"][scopeNumber]["identifiers"]
+        table = {}
+        for identifier in identifiers:
+            if identifier[1:len(prefix)+1] != prefix:
+                continue
+            suffix = identifier[len(prefix)+1:-1]
+            if suffix.isdigit() and suffix == str(int(suffix)):
+                table[int(suffix)] = identifiers[identifier]["label"][1]
+        otherwise = None
+        exit = None
+        if "^" + prefix + "else^" in identifiers:
+            otherwise = identifiers["^" + prefix + "else^"]["label"][1]
+        if "^" + prefix + "exit^" in identifiers:
+            exit = identifiers["^" + prefix + "exit^"]["label"][1]
+        operand = (prefix, table, otherwise, exit)
+    return (opcode, operand, instruction, source)
+
+'''
+Typed fast paths for the binary operators.  Where the classes of the operands
+of an operator (see binaryKernels in binaryFunctions.py) can be determined
+from the declarations of the variables involved, the operator is annotated 
+with the kernel for those classes, and the emulator then calls the kernel 
+directly rather than opBinary(), falling back on opBinary() only if the
+kernel declines.  For the 'compute' superinstructions, whose operands are
+fused into them, the kernel is appended to the decoded operand.  For other
+'operator' instructions, annotateOperators() tracks the classes of the values
+pushed onto the computation stack by straight-line code, and decodes the
+operators whose operands' classes it knows to the pseudo-instruction 
+"operatorTyped", whose operand is (operator, kernel).
+'''
+
+# The class of a variable, given its decoded (si, identifier, attributes), or
+# None if not known.
+def variableClass(variable):
+    attributes = variable[2]
+    if attributes == None or "array" in attributes:
+        return None
+    if "scalar" in attributes or "integer" in attributes:
+        return "numeric"
+    if "vector" in attributes:
+        return "vector"
+    return None
+
+# The entry of binaryKernels for a 'compute' superinstruction's operator and
+# its decoded operands, or None.  (The first operand is operand2, and the 
+# second is operand1, since the latter is atop the stack.)
+def operandsEntry(operator, operands):
+    classes = []
+    for isNumber, operand, instruction in operands:
+        if isNumber:
+            classes.append("numeric")
+        else:
+            classes.append(variableClass(operand))
+    return binaryKernels.get((operator, classes[1], classes[0]))
+
+def operandsKernel(operator, operands):
+    entry = operandsEntry(operator, operands)
+    if entry == None:
+        return None
+    return entry[0]
+
+def annotateOperators(decoded):
+    literals = { opcodes[name] for name in ["string", "boolean", "vector",
+                    "matrix", "array", "empty", "fill", "sentinel", 
+                    "partition"] }
+    neutral = { opcodes[name] for name in ["debug", "noop", "store",
+                    "storeconstant", "computestore", "computeiffalse",
+                    "computeiftrue", "fetchiffalse", "fetchiftrue"] }
+    popping = { opcodes[name] for name in ["storepop", "iffalse", "iftrue"] }
+    # The classes of the topmost values on the stack, as far as known.  
+    # Anything deeper is unknown.
+    classes = []
+    def pop():
+        if len(classes) > 0:
+            return classes.pop()
+        return None
+    previous = None
+    for i in range(len(decoded)):
+        opcode, operand, instruction, source = decoded[i]
+        if "label" in instruction:
+            # Control may arrive from elsewhere.
+            classes = []
+        if opcode == opcodes["number"]:
+            classes.append("numeric")
+        elif opcode in literals:
+            classes.append(None)
+        elif opcode == opcodes["fetch"]:
+            if previous in [opcodes["operatorDotted"], 
+                            opcodes["operatorSubscripts"]]:
+                classes.append(None)
+            else:
+                classes.append(variableClass(operand))
+        elif opcode == opcodes["compute"]:
+            entry = operandsEntry(operand[0], operand[1])
+            if entry == None:
+                classes.append(None)
+            else:
+                classes.append(entry[1])
+        elif opcode == opcodes["operatorBinary"]:
+            entry = binaryKernels.get((operand, pop(), pop()))
+            if entry == None:
+                classes.append(None)
+            else:
+                decoded[i] = (opcodes["operatorTyped"], (operand, entry[0]),
+                              instruction, source)
+                classes.append(entry[1])
+        elif opcode == opcodes["operatorUnary"]:
+            if operand == "U-":
+                classes.append(pop())
+            else:
+                pop()
+                classes.append(None)
+        elif opcode in popping:
+            pop()
+        elif opcode not in neutral:
+            classes = []
+        previous = opcode
+
+'''
+Watchpoints.  PALMAT["watches"], if present, relates the (scope number, 
+mangled identifier) of each watched variable to a dictionary of the form
+    { "name": name, "stop": True or False, "hits": count }
+When a scope is decoded, each instruction which stores into a watched 
+variable (whether a 'store', 'storepop', 'substore', or 'substorepop', the
+increment of a DO FOR loop variable, or a superinstruction including one of
+those) is decoded instead to the pseudo-instruction "watched", whose operand
+is (opcode, operand, variable, watch), the first two being what it would 
+otherwise have been decoded to.  The handler for that, opWatched(), executes
+the original instruction, and whenever the variable's value changes, reports
+the position in the HAL/S source code along with the old and new values, and
+if "stop" is True, ends the emulation.  Since only those instructions are 
+affected, everything else runs exactly as fast as before.  Stores which can
+only be resolved at runtime (to the parameters of PROCEDUREs, or via READ) 
+aren't watched.
+
+watchVariable() and unwatchVariable() discard the linkage and translation of
+the PALMAT (see unlinkPALMAT() in palmatAux.py), which must be linked again
+for the change to take effect.
+'''
+
+# The positions of the decoded variables within the decoded operands of the
+# instructions which store into them, or None if it's the operand itself.
+storingOpcodes = { opcodes["store"]: None, opcodes["storepop"]: None,
+                   opcodes["substore"]: None, opcodes["substorepop"]: None,
+                   opcodes["+><"]: None, opcodes["storeconstant"]: 1,
+                   opcodes["computestore"]: 3, opcodes["loopstep"]: 1 }
+
+def watchVariable(PALMAT, si, identifier, stop=False):
+    watches = PALMAT.setdefault("watches", {})
+    watches[(si, identifier)] = { "name": identifier[1:-1], "stop": stop,
+                                  "hits": 0 }
+    unlinkPALMAT(PALMAT)
+
+# Stops watching the variable, or all variables if identifier is None.
+def unwatchVariable(PALMAT, si=None, identifier=None):
+    watches = PALMAT.get("watches", {})
+    if identifier == None:
+        watches.clear()
+    else:
+        watches.pop((si, identifier), None)
+    unlinkPALMAT(PALMAT)
+
+def instrumentWatches(PALMAT, decoded):
+    watches = PALMAT.get("watches")
+    if not watches:
+        return
+    for i in range(len(decoded)):
+        opcode, operand, instruction, source = decoded[i]
+        if opcode not in storingOpcodes:
+            continue
+        position = storingOpcodes[opcode]
+        if position == None:
+            variable = operand
+        else:
+            variable = operand[position]
+        watch = watches.get((variable[0], variable[1]))
+        if watch != None and variable[2] != None:
+            decoded[i] = (opcodes["watched"], 
+                          (opcode, operand, variable, watch), 
+                          instruction, source)
+
+def decodeScope(PALMAT, scopeNumber):
+    decoded = []
+    for instruction in PALMAT["scopes"][scopeNumber]["instructions"]:
+        decoded.append(decodeInstruction(PALMAT, scopeNumber, instruction))
+    annotateOperators(decoded)
+    instrumentWatches(PALMAT, decoded)
+    return decoded
+
+'''
+The link pass.  This decodes every scope of the PALMAT in advance, resolving 
+all labels and identifiers (other than aliases and structure fields) to direct
+references, and attaches the result to the PALMAT as PALMAT["linked"], where
+any subsequent executePALMAT() will use it rather than decoding the scopes all
+over again.  It's intended to be run after optimizePALMAT() or readPALMAT().
+Scopes of a binary PALMAT file (see binaryPALMAT.py) which haven't been 
+decoded from the file yet are left alone, and are linked instead the first
+time they're executed.
+Anything which afterward changes the PALMAT's instructions or identifiers 
+must discard the linkage, via unlinkPALMAT() (see palmatAux.py), and the 
+linkage is not saved by writePALMAT().  If only the linkage of some of the
+scopes has been discarded, only those scopes are linked again.
+'''
+def linkPALMAT(PALMAT):
+    linked = PALMAT.get("linked", {})
+    for i in range(len(PALMAT["scopes"])):
+        if i not in linked and isMaterialized(PALMAT["scopes"][i]):
+            linked[i] = decodeScope(PALMAT, i)
+    PALMAT["linked"] = linked
+
+# Shorthand for error messages within the handlers.
+def vmError(vm, instruction, msg):
+    printError(vm["PALMAT"], vm["source"], instruction, msg)
+
+# The opcode of the instruction following the one being executed, or None.
+def nextOpcode(vm, scopeNumber, instructionIndex):
+    decoded = vm["decodedScopes"][scopeNumber]
+    if instructionIndex < len(decoded):
+        return decoded[instructionIndex][0]
+    return None
+
+'''
+As originally designed, both structure qualifications and subscripts are
+intended to persist only until the very next instruction (usually, 'fetch').
+Rather than checking for them before every instruction, the 'dotted' and
+'subscripts' operators leave them in the "registers" vm["qualifications"],
+vm["subscripts"], vm["subscripts2"], and vm["fullSubscripts"], having first
+checked that the next instruction is one which can make use of them.  The
+instructions using them then reset the registers to empty via the functions
+below.  But what if there are both qualifications and subscripts?  We need to
+do something to account for that possibility but, for now, I'm just
+pretending that at most one of those two is present.
+'''
+def takeQualifications(vm):
+    qualifications = vm["qualifications"]
+    if len(qualifications) > 0:
+        vm["qualifications"] = []
+    return qualifications
+
+def takeSubscripts(vm):
+    subscripts = vm["subscripts"]
+    subscripts2 = vm["subscripts2"]
+    fullSubscripts = vm["fullSubscripts"]
+    if len(fullSubscripts) > 0:
+        vm["subscripts"] = []
+        vm["subscripts2"] = []
+        vm["fullSubscripts"] = []
+    return subscripts, subscripts2, fullSubscripts
+
+#----------------------------------------------------------------------------
+# The instruction handlers.
+
+def opNothing(vm, operand, instruction, scopeNumber, instructionIndex):
+    pass
+
+def opEmpty(vm, operand, instruction, scopeNumber, instructionIndex):
+    vm["stack"].append(None)
+
+def opFill(vm, operand, instruction, scopeNumber, instructionIndex):
+    vm["stack"].append({"fill"})
+
+def opSentinel(vm, operand, instruction, scopeNumber, instructionIndex):
+    vm["stack"].append({"sentinel"})
+
+def opPartition(vm, operand, instruction, scopeNumber, instructionIndex):
+    vm["stack"].append({"semicolon"})
+
+# For string, boolean, number, vector, matrix, array.
+def opLiteral(vm, operand, instruction, scopeNumber, instructionIndex):
+    vm["stack"].append(operand)
+
+def opIncrementAndTest(vm, operand, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    si, identifier, attributes = operand
+    if len(computationStack) < 2:
+        vmError(vm, instruction, \
+                "Implementation error, not enough operands for '+><'.")
+        return False
+    operand1 = computationStack.pop()
+    negativeIncrement = (operand1 < 0)
+    operand2 = computationStack[-1]
+    if attributes == None:
+        vmError(vm, instruction, \
+            "Implementation error, variable (%s) not found." \
+              % identifier[1:-1])
+        return False
+    if "integer" not in attributes and "scalar" not in attributes:
+        vmError(vm, instruction, \
+                "Implementation error in '+><': Not a number.")
+        return False
+    if "value" not in attributes:
+        vmError(vm, instruction, \
+            "Implementation error in '+><': Uninitialized variable.")
+        return False
+    operand1 += attributes["value"]
+    if "integer" in attributes:
+        attributes["value"] = hround(operand1)
+    else:
+        attributes["value"] = operand1
+    if negativeIncrement:
+        computationStack[-1] = convertToBitArray(operand1 < operand2)
+    else:
+        computationStack[-1] = convertToBitArray(operand1 > operand2)
+
+def opRepeat(vm, operand, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    if len(computationStack) < 2:
+        vmError(vm, instruction, \
+            ("\tImplementation error, not enough operands " + \
+            "for operator \"%s\"") % operand)
+        return False
+    operand1 = hround(computationStack.pop())
+    # Recall that if a single item is being repeated, it is present
+    # as itself, but if a group of items are being repeated then
+    # that group appears on the computation stack in the form of
+    # a single item because the group is wrapped in [(...)].  That
+    # particular wrapping is chosen because it's distinguishable
+    # from VECTOR, MATRIX, and ARRAY.
+    if computationStack[-1] == {'sentinel'}:
+        computationStack.pop()
+        operands2 = [None]
+    else:
+        operands2 = []
+        while True:
+            value = computationStack.pop()
+            if value == {'sentinel'}:
+                break
+            flatten(value, operands2)
+    while operand1 > 0:
+        # I want to insert all the elements in operands2 into
+        # computation stack.  If I use the list .extend method
+        # for this, I find they end up in reversed order, so I
+        # want to do the insertion at the beginning rather than
+        # at the end.  I want to do this in place, without
+        # creating a new computationStack object.
+        computationStack.extend(reversed(operands2))
+        operand1 -= 1
+
+def opDotted(vm, operand, instruction, scopeNumber, instructionIndex):
+    # Structure qualifications.  These are the strings "A", "B", "C"
+    # in structure refrences like A.B.C.X.
+    computationStack = vm["stack"]
+    q = []
+    while True:
+        value = computationStack.pop()
+        if value == {"sentinel"}:
+            break
+        q[0:0] = [value] # Insert the qualification at position 0.
+    # If the next instruction is not one that uses qualifications, they're
+    # simply discarded.
+    if nextOpcode(vm, scopeNumber, instructionIndex) in qualifiableOpcodes:
+        vm["qualifications"] = q
+
+def opSubscripts(vm, operand, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    subscripts = []
+    subscripts2 = []
+    s = subscripts
+    while True:
+        value = computationStack.pop()
+        if value == {"sentinel"}:
+            break
+        if value == {"semicolon"}:
+            s = subscripts2
+            continue
+        s.append(value)
+    if len(subscripts + subscripts2) < 1:
+        vmError(vm, instruction, "Subscript operator without subscripts.")
+        return False
+    # It's not an error for the subscripts to be the very last thing, since 
+    # the compiler sometimes evaluates them alone at compile-time.
+    opcode = nextOpcode(vm, scopeNumber, instructionIndex)
+    if opcode != None and opcode not in subscriptableOpcodes:
+        vmError(vm, instruction, \
+            "Implementation error, subscript (%s) without variable in instruction" \
+            % subscripts)
+        return False
+    vm["subscripts"] = subscripts
+    vm["subscripts2"] = subscripts2
+    vm["fullSubscripts"] = subscripts + subscripts2
+
+def opUnary(vm, operator, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    if len(computationStack) < 1:
+        vmError(vm, instruction, \
+            ("\tImplementation error, not enough operands " + \
+            "for operator \"%s\"") % operator)
+        return False
+    operand = computationStack[-1]
+    if operator == "U-":
+        result = arrayableUnaryRTL(vm["PALMAT"], "Negation", operand, \
+                                   vm["source"], instruction)
+        if isNaN(result):
+            return False
+    elif operator == "NOT":
+        if not isBitArray(operand):
+            vmError(vm, instruction, "Not bit array: " + str(operand))
+            return False
+        value, length = parseBitArray(operand)
+        result = formBitArray(~value, length)
+    else:
+        vmError(vm, instruction, \
+                ("Implementation error, unary operator (%s) " + \
+               "not yet implemented") % operator)
+        return False
+    computationStack[-1] = result
+
+def opBinary(vm, operator, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    if len(computationStack) < 2:
+        vmError(vm, instruction, \
+            ("Implementation error, not enough operands " + \
+            "for operator \"%s\"") % operator)
+        return False
+    result = None
+    operand1 = computationStack[-1]
+    operand2 = computationStack[-2]
+    computationStack.pop()
+    computationStack[-1] = None
+    if operator in ["==", "!=", "<", ">", "<=", ">="] and \
+            (not isCompletelyInitialized(operand1) or \
+             not isCompletelyInitialized(operand2)):
+        vmError(vm, instruction, "Cannot compare uninitialized values")
+        return False
+    # Common arithmetical operators ... both arrayed and
+    # non-arrayed operations.
+    if operator in binaryRTL:
+        result = arrayableBinaryRTL(vm["PALMAT"], operator, operand1, \
+                                    operand2, vm["source"], instruction)
+        if isNaN(result):
+            return False
+    else:
+        if operator == "C||": # string concatenation.
+            result = operand1 + operand2
+        elif operator in ["AND", "OR", "ORNOT", "B|N" ]:
+            if not isBitArray(operand1):
+                vmError(vm, instruction, "Not bit array: " + str(operand1))
+                return False
+            if not isBitArray(operand2):
+                vmError(vm, instruction, "Not bit array: " + str(operand2))
+                return False
+            value1, length1 = parseBitArray(operand1)
+            value2, length2 = parseBitArray(operand2)
+            if operator == "OR":
+                numbits = min(length1, length2)
+                result = formBitArray(value1 | value2, numbits)
+            elif operator == "AND":
+                numbits = min(length1, length2)
+                result = formBitArray(value1 & value2, numbits)
+            elif operator == "ORNOT":
+                numbits = min(length1, length2)
+                result = formBitArray(value1 | ~value2, numbits)
+            elif operator == "B||":
+                numbits = length1 + length2
+                result = formBitArray((value1 << length2) | value2,\
+                                       numbits)
+        elif operator == "==":
+            result = convertToBitArray(isEqualTo(operand1, operand2))
+        elif operator == "!=":
+            result = convertToBitArray(not isEqualTo(operand1, operand2))
+        elif operator == "<":
+            result = convertToBitArray(operand1 < operand2)
+        elif operator == ">":
+            result = convertToBitArray(operand1 > operand2)
+        elif operator == "<=":
+            result = convertToBitArray(operand1 <= operand2)
+        elif operator == ">=":
+            result = convertToBitArray(operand1 >= operand2)
+        else:
+            vmError(vm, instruction, \
+                ("Implementation error, binary operator \"%s\" " + \
+                "not yet implemented") % operator)
+            return False
+        if result == None:
+            vmError(vm, instruction, "Uninitialized values in expression.")
+            return False
+    computationStack[-1] = result
+
+# For operatorTyped, and for the 'compute' superinstructions.  (See
+# annotateOperators() above.)
+def typedBinary(vm, operator, kernel, instruction, scopeNumber, 
+                instructionIndex):
+    computationStack = vm["stack"]
+    if kernel != None and len(computationStack) >= 2:
+        result = kernel(computationStack[-1], computationStack[-2])
+        if result is not NotImplemented:
+            computationStack.pop()
+            computationStack[-1] = result
             return None
-        template = expandStructureTemplate(PALMAT, si, template)
-        print("*1", qualifications[0], template)
-        if template == None:
+    return opBinary(vm, operator, instruction, scopeNumber, instructionIndex)
+
+def opTyped(vm, operand, instruction, scopeNumber, instructionIndex):
+    operator, kernel = operand
+    return typedBinary(vm, operator, kernel, instruction, scopeNumber, 
+                       instructionIndex)
+
+def opUnknownOperator(vm, operator, instruction, scopeNumber,
+                      instructionIndex):
+    vmError(vm, instruction, "Unknown operator \"%s\"" % operator)
+
+def opUnknown(vm, operand, instruction, scopeNumber, instructionIndex):
+    vmError(vm, instruction, \
+            "Implementation error, unknown PALMAT: " + str(instruction))
+    return False
+
+'''
+Common code for fetch, unravel, fetchp, store, storepop, substore, and
+substorepop: Find the attributes of the variable referenced by the
+instruction, following procedure-call aliases as necessary.  Returns
+(si, attributes, identifier), where the identifier is mangled, or else None on
+failure.  Usually the link pass has already found the attributes, and the 
+only work left to do here is for aliases and structure qualifications.
+'''
+def findVariable(vm, operand, instruction, scopeNumber):
+    si, identifier, attributes = operand
+    if attributes != None and len(vm["qualifications"]) == 0:
+        return (si, attributes, identifier)
+    PALMAT = vm["PALMAT"]
+    identifier = identifier[1:-1]
+    dummyScope = vm["scopes"][scopeNumber]
+    while si == -1:
+        '''
+        If si == -1, then the variable being assigned is itself a
+        local alias in a procedure call.  So we have to seek upstream
+        to find the variable to which it's actually referring.
+
+        The reason we're in a "while si" rather than an "if si" is that
+        we may have *nested* procedure calls, so once we find the
+        upstream variable to which our alias refers, it may itself be
+        an alias for another variable upstream of the calling code
+        (which may be a scope that's not necessarily an ancestor of
+        the procedure's scope), and so on.
+        '''
+        while "assignments" not in dummyScope:
+            if dummyScope["parent"] == None:
+                vmError(vm, instruction, "Cannot find identifier " + identifier)
+                return None
+            dummyScope = PALMAT["scopes"][dummyScope["parent"]]
+        if identifier not in dummyScope["assignments"]:
+            vmError(vm, instruction, \
+                    ("Identifier \"%s\" not found") % identifier[1:-1])
             return None
-        for j in range(1, len(qualifications)):
-            q = qualifications[j]
-            if "template" in template:
-                fieldNames = template["template"][0]
-                fieldAttributes = template["template"][1]
-                i = fieldNames.index("s_" + q)
-                template = fieldAttributes[i]
-            else:
+        si, identifier = dummyScope["assignments"][identifier]
+        if si == -1:
+            if "return" not in dummyScope:
+                vmError(vm, instruction, \
+                    "Cannot trace nested assignments (%s in %s)" % \
+                    (identifier, dummyScope["name"]))
                 return None
-        fieldNames = template["template"][0]
-        fieldAttributes = template["template"][1]
-        i = fieldNames.index(identifier)
-        return fieldAttributes[i]
+            dummyScope = PALMAT["scopes"][dummyScope["return"][0]]
+    identifier = "^" + identifier + "^"
+    qualifications = takeQualifications(vm)
+    try:
+        attributes = getAttributes(PALMAT, si, qualifications, identifier)
+        if attributes == None:
+            raise Exception("Problem fetching attributes")
     except:
+        vmError(vm, instruction, "Undiagnosed problem with PALMAT instruction")
+        print("\t\tnum scopes =", len(PALMAT["scopes"]))
+        print("\t\ttype of si =", type(si))
+        print("\t\tscope number =", si, " identifier =", identifier)
+        print("\t\tidentifiers =", PALMAT["scopes"][si]["identifiers"])
+        print("\t\tqualifications =", qualifications)
         return None
+    return (si, attributes, identifier)
+
+# For fetch and unravel.
+def opFetch(vm, operand, instruction, scopeNumber, instructionIndex):
+    subscripts, subscripts2, fullSubscripts = takeSubscripts(vm)
+    found = findVariable(vm, operand, instruction, scopeNumber)
+    if found == None:
+        return False
+    si, attributes, identifier = found
+    if "constant" in attributes:
+        value = sliceIt(attributes["constant"], fullSubscripts)
+    else:
+        value = sliceIt(attributes["value"], fullSubscripts)
+    if isNaN(value):
+        vmError(vm, instruction, \
+            "Slicing error %s%s." % (identifier, str(fullSubscripts)))
+        return False
+    vm["stack"].append(value)
+
+def opUnravel(vm, operand, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    if opFetch(vm, operand, instruction, scopeNumber, instructionIndex) \
+            == False:
+        return False
+    onto = []
+    flatten(computationStack.pop(), onto)
+    computationStack.extend(reversed(onto))
+
+def opFetchp(vm, operand, instruction, scopeNumber, instructionIndex):
+    takeSubscripts(vm)
+    found = findVariable(vm, operand, instruction, scopeNumber)
+    if found == None:
+        return False
+    si, attributes, identifier = found
+    vm["stack"].append( [si, identifier, 'p'] )
+
+# For store, storepop, substore, and substorepop.
+def storeCommon(vm, operand, instruction, scopeNumber, pop, lhsSubscripts):
+    computationStack = vm["stack"]
+    lhsSubscriptList = []
+    if lhsSubscripts:
+        subscript = computationStack.pop()
+        while subscript != {"sentinel"}:
+            if subscript != {"semicolon"}:
+                lhsSubscriptList.append(subscript)
+            subscript = computationStack.pop()
+    found = findVariable(vm, operand, instruction, scopeNumber)
+    if found == None:
+        return False
+    si, attributes, identifier = found
+    if len(computationStack) < 1:
+        vmError(vm, instruction, \
+                "Implementation error, stack too short for " +
+                "STOREXXX instruction")
+        return False
+    value = copy.deepcopy(computationStack[-1])
+    if pop:
+        computationStack.pop()
+    if "constant" in attributes:
+        vmError(vm, instruction, \
+                "Cannot change value of constant %s." % identifier[1:-1])
+        return False
+    if "array" in attributes and "parameter" in attributes \
+            and len(attributes["array"]) == 1 and \
+            isArrayQuick(value) and \
+            len(getArrayDimensions(value)[0]) == 1 and \
+            (attributes["array"][0] == "*" \
+             or "flex" in attributes):
+        attributes["value"] = value
+        attributes["array"], dummy = getArrayDimensions(value)
+        attributes["flex"] = True
+    elif "field" in attributes:
+        # A field of a STRUCTURE (see getAttributes()), whose new value must
+        # be put back into the STRUCTURE.
+        structureAttributes, indices = attributes["field"]
+        unshareValue(structureAttributes)
+        container = structureAttributes["value"]
+        for i in indices[:-1]:
+            container = container[i]
+        attributes["value"] = container[indices[-1]]
+        if not saveValueToVariable(vm["PALMAT"], vm["source"], value, \
+                                   identifier[1:-1], attributes, \
+                                   lhsSubscriptList):
+            return False
+        container[indices[-1]] = attributes["value"]
+    elif not saveValueToVariable(vm["PALMAT"], vm["source"], value, \
+                                 identifier[1:-1], attributes, \
+                                 lhsSubscriptList):
+        return False
+
+def opStore(vm, operand, instruction, scopeNumber, instructionIndex):
+    return storeCommon(vm, operand, instruction, scopeNumber, False, False)
+
+def opStorepop(vm, operand, instruction, scopeNumber, instructionIndex):
+    return storeCommon(vm, operand, instruction, scopeNumber, True, False)
+
+def opSubstore(vm, operand, instruction, scopeNumber, instructionIndex):
+    return storeCommon(vm, operand, instruction, scopeNumber, False, True)
+
+def opSubstorepop(vm, operand, instruction, scopeNumber, instructionIndex):
+    return storeCommon(vm, operand, instruction, scopeNumber, True, True)
+
+def opPop(vm, value, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    stackSize = len(computationStack)
+    if value <= stackSize:
+        while value > 0:
+            computationStack.pop()
+            value -= 1
+    else:
+        vmError(vm, instruction, \
+            "Implementation error, too many POPs: %d vs %d" \
+            % (value, stackSize))
+        return False
+
+def opRead(vm, lun, instruction, scopeNumber, instructionIndex):
+    PALMAT = vm["PALMAT"]
+    source = vm["source"]
+    computationStack = vm["stack"]
+    if lun in channels:
+        # If this instruction is within a subroutine, then we can
+        # only regress in the computation stack until finding the
+        # return address, because we want to use that later (for
+        # returning!) rather than using it now for printing.
+        start = 0
+        for i in range(len(computationStack)-1, -1, -1):
+            entry = computationStack[i]
+            if isinstance(entry, list) and len(entry) == 3 and \
+                    isinstance(entry[0], int) and \
+                    isinstance(entry[1], str) and \
+                    entry[2] == 'p':
+                continue
+            start = i + 1
+            break
+        if start < len(computationStack):
+            semicolon = False
+            for value in computationStack[start:]:
+                if semicolon:
+                    break
+                # In reality, we could have subscripted VECTOR, MATRIX,
+                # or ARRAY variables here. For now, I'm just ignoring
+                # that possibility and implementing unsubscripted
+                # variables.
+                # Recall that "pointers" to variables, which is what
+                # should be on the computation stack at this point,
+                # are of the form [index, identifier, 'p'].
+                si = value[0]
+                identifier = value[1]
+                attributes = \
+                    PALMAT["scopes"][si]["identifiers"][identifier]
+                unshareValue(attributes)
+                if "vector" in attributes:
+                    rowLength = attributes["vector"]
+                    for i in range(rowLength):
+                        value = readItem(PALMAT, source, lun)
+                        if value == ";":
+                            semicolon = True
+                            break
+                        if value == "":
+                            continue
+                        attributes["value"][i] = float(value)
+                elif "matrix" in attributes:
+                    numRows, numCols = attributes["matrix"]
+                    for i in range(numRows):
+                        if semicolon:
+                            break
+                        for j in range(numCols):
+                            value = readItem(PALMAT, source, lun)
+                            if value == ";":
+                                semicolon = True
+                                break
+                            if value == "":
+                                continue
+                            attributes["value"][i][j] = float(value)
+                elif "integer" in attributes:
+                    value = readItem(PALMAT, source, lun)
+                    if value == ";":
+                        semicolon = True
+                    elif value == "":
+                        attributes["value"] == None
+                    else:
+                        attributes["value"] = int(value)
+                elif "scalar" in attributes:
+                    value = readItem(PALMAT, source, lun)
+                    if value == ";":
+                        semicolon = True
+                    elif value == "":
+                        attributes["value"] == None
+                    else:
+                        attributes["value"] = float(value)
+                elif "bit" in attributes:
+                    value = readItem(PALMAT, source, lun)
+                    bitLength = attributes["bit"]
+                    if value == ";":
+                        semicolon = True
+                    elif value == "":
+                        attributes["value"] == [(None, bitLength)]
+                    else:
+                        value = int(value) & ((1 << bitLength) - 1)
+                        attributes["value"] = [(value, bitLength)]
+        while len(computationStack) > start:
+            computationStack.pop()
+
+def opWrite(vm, lun, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    if lun in channels:
+        record = ["%*s" % (vm["indent"], "")]
+        for value in computationStack:
+            if value == None:
+                record.append(" None ")
+            elif isArrayQuick(value):
+                printArray(value, record)
+            elif isBitArray(value):
+                record.append(" " + bin(parseBitArray(value)[0])[2:])
+            elif isinstance(value, (int, float, list)):
+                printVectorOrMatrix(value, record)
+            elif isinstance(value, str):
+                record.append(value.replace("''", "'"))
+            else:
+                record.append(str(value))
+        computationStack.clear()
+        writeRecord(lun, "".join(record))
+
+def opIocontrol(vm, operand, instruction, scopeNumber, instructionIndex):
+    # We just ignore all i/o controls in WRITE for now.
+    if len(vm["stack"]) > 0:
+        vm["stack"].pop()
+
+def opShaping(vm, shapingFunction, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    subscripts, subscripts2, fullSubscripts = takeSubscripts(vm)
+    if shapingFunction == "sliceAT":
+        sliceLength = hround(computationStack.pop())
+        sliceStart = hround(computationStack[-1])
+        computationStack[-1] = [sliceLength, sliceStart]
+        return
+    if shapingFunction == "sliceTO":
+        sliceStart = hround(computationStack.pop())
+        sliceEnd = hround(computationStack[-1])
+        computationStack[-1] = (sliceStart, sliceEnd)
+        return
+    if shapingFunction not in ["integer", "scalar", "vector", "matrix",
+                               "doubleinteger", "doublescalar",
+                               "doublevector", "doublematrix"]:
+        vmError(vm, instruction, \
+            "Implementation error, unknown shaping function: " + \
+            shapingFunction)
+        return False
+    dimensions = subscripts + subscripts2
+    if len(dimensions) == 0:
+        if shapingFunction in ["vector", "doublevector"]:
+            dimensions.append(3)
+        elif shapingFunction in ["matrix", "doublematrix"]:
+            dimensions.append(3)
+            dimensions.append(3)
+    # We now have the dimensionality, so let's create a Python
+    # object to hold the data.  If the dimension list is empty,
+    # there are a number of special cases (presumably originally
+    # intended as convenience features for the code) that we need
+    # to consider.
+    if len(dimensions) == 0:
+        # The shaping function has no subscripts, and the
+        # shaping function is integer or scalar, single or
+        # double precision, though in this Python implementation
+        # single and double precision are treated as identical.
+        object = []
+        operand = computationStack.pop()
+        if computationStack[-1] == {"sentinel"}:
+            # If we're here, it's because there's a single
+            # argument to the shaping function, currently
+            # stored in operand.
+            computationStack[-1] = \
+                toIntegerOrScalar(operand, \
+                                  shapingFunction in \
+                                  ["integer", "doubleinteger"])
+        else:
+            # If we're here, then there are multiple arguments
+            # to the shaping functions, none of which we've yet
+            # pulled from the stack and we're supposed to
+            # produce a variable-length ARRAY by unraveling all
+            # of the arguments.
+            fill = False # TBD ... *do* something with fill!
+            while operand != {"sentinel"}:
+                if operand == {"fill"}:
+                    fill = True
+                    operand = computationStack.pop()
+                    continue
+                flatten(operand, object)
+                operand = computationStack.pop()
+            if shapingFunction in ["integer", "doubleinteger"]:
+                for i in range(len(object)):
+                    if object[i] != None:
+                        object[i] = int(object[i])
+            elif shapingFunction in ["scalar", "doublescalar"]:
+                for i in range(len(object)):
+                    if object[i] != None:
+                        object[i] = float(object[i])
+            computationStack.append(HalArray([len(object)], object))
+        return
+    '''
+    So if we've gotten to here, then the object we're trying to
+    construct has dimensionality; i.e., it's one of VECTOR,
+    MATRIX, ARRAY INTEGER|SCALAR, ARRAY VECTOR, or ARRAY MATRIX.
+    The function assignCompositeSubscripted()
+    in the module saveValueToVariable is ideal for initializing
+    such an object starting from an unraveled set of data, except
+    for the fact that it requires an object of the correct
+    dimensionality but with uninitialized elements as input.
+    Fortunately, the function uninitializedComposite() in the
+    palmatAux module can be used to construct the uninitialized
+    object.
+    '''
+    if shapingFunction in ["vector", "doublevector",
+                           "matrix", "doublematrix"]:
+        datatype = "scalar"
+        subscripts2 = dimensions
+        subscripts = []
+    elif shapingFunction in ["integer", "doubleinteger"]:
+        datatype = "integer"
+    else:
+        datatype = "scalar"
+    composite = uninitializedComposite(subscripts, subscripts2)
+    unraveled = []
+    while True:
+        value = computationStack.pop()
+        if value == {'sentinel'}:
+            break
+        flatten(value, unraveled)
+    subscriptedLHS = []
+    for i in subscripts + subscripts2:
+        subscriptedLHS.append(list(range(1, i + 1)))
+    if not assignCompositeSubscripted(None, composite, subscriptedLHS, \
+                                      datatype, -1, unraveled):
+        vmError(vm, instruction, "Cannot convert or too few values")
+        return False
+    computationStack.append(composite)
+
+def opModern(vm, modern, instruction, scopeNumber, instructionIndex):
+    # These are like RTL built-in functions, but are invented by me for
+    # the "modern" compiler/interpreter.  They do things to make
+    # debugging the compiler or performing validation testing on it
+    # easier.  Note that in distinction to real RTL built-in functions,
+    # in HAL/S their names are always lower-case, so they hopefully
+    # won't collide with any actual HAL/S code.  We'll see eventually,
+    # I suppose.
+    PALMAT = vm["PALMAT"]
+    computationStack = vm["stack"]
+    stackSize = len(computationStack)
+    if modern == "INITIALIZED":
+        if stackSize < 1:
+            vmError(vm, instruction, "Not enough arguments on stack.")
+            return False
+        if isCompletelyInitialized(computationStack[-1]):
+            computationStack[-1] = hTRUE
+        else:
+            computationStack[-1] = hFALSE
+    elif modern == "TYPEOF":
+        if stackSize < 1:
+            vmError(vm, instruction, "Not enough arguments on stack.")
+            return False
+        operand = computationStack[-1]
+        if not isinstance(operand, str):
+            vmError(vm, instruction, "Argument must be a string.")
+            return False
+        result = [""]*20
+        i, mangled = flexFindIdentifier(operand, PALMAT, scopeNumber)
+        if i == -1:
+            a = None
+        else:
+            i, a = findIdentifier(mangled, PALMAT, i)
+        if a == None:
+            a = {}
+            result[0] = "MISSING"
+        elif "bit" in a:
+            result[0] = "BIT"
+            result[1] = str(a["bit"])
+        elif "character" in a:
+            result[0] = "CHARACTER"
+            result[1] = str(a["character"])
+        elif "vector" in a:
+            result[0] = "VECTOR"
+            result[1] = str(a["vector"])
+        elif "matrix" in a:
+            result[0] = "MATRIX"
+            result[1] = str(a["matrix"][0])
+            result[2] = str(a["matrix"][1])
+        elif "scalar" in a:
+            result[0] = "SCALAR"
+        elif "integer" in a:
+            result[0] = "INTEGER"
+        elif "structure" in a:
+            result[0] = "STRUCTURE"
+        elif "label" in a:
+            result[0] = "LABEL"
+        else:
+            result[0] = "?"
+        if "constant" in a:
+            if result[0] == "BIT":
+                value, length = parseBitArray(a["constant"])
+                result[3] = "%d, %d" % (value, length)
+            elif result[0] in ["VECTOR", "MATRIX"]:
+                result[3] = presentify(a['constant'])
+            else:
+                result[3] = str(a["constant"])
+        if "initial" in a:
+            if result[0] == "BIT":
+                value, length = parseBitArray(a["initial"])
+                result[4] = "%d, %d" % (value, length)
+            elif result[0] in ["VECTOR", "MATRIX"]:
+                result[4] = presentify(a['initial'])
+            else:
+                result[4] = str(a["initial"])
+        if "double" in a:
+            result[5] = "DOUBLE"
+        if "array" in a:
+            dimensions = a["array"]
+            i = 15
+            for d in dimensions:
+                if i > 20:
+                    break
+                result[i] = str(d)
+                i += 1
+        computationStack[-1] = HalArray([len(result)], result)
+    elif modern == "TYPEOFV":
+        # Same as TYPEOF, except analyzes the value atop the
+        # computation stack, rather than an identifier.
+        if stackSize < 1:
+            vmError(vm, instruction, "Not enough arguments on stack")
+            return False
+        operand = computationStack[-1]
+        result = [""]*20
+        if isinstance(operand, list) and len(operand) == 3 and \
+                operand[-1] == 'p':
+            result[0] = "POINTER"
+        elif isinstance(operand, HalArray):
+            i = 15
+            for d in operand.shape:
+                result[i] = str(d)
+                i += 1
+                if i > 20:
+                    break
+            operand = operand.buffer[0]
+        if operand == None:
+            result[0] = "NONE"
+        elif isinstance(operand, int):
+            result[0] = "INTEGER"
+        elif isinstance(operand, float):
+            result[0] = "SCALAR"
+        elif isinstance(operand, str):
+            result[0] = "CHARACTER"
+            result[1] = str(len(operand))
+        elif isBitArray(operand):
+            result[0] = "BIT"
+            dummy, result[1] = parseBitArray(operand)
+        elif isVector(operand, False):
+            result[0] = "VECTOR"
+            result[1] = str(len(operand))
+        elif isMatrix(operand, False):
+            result[0] = "MATRIX"
+            result[1] = str(len(operand))
+            result[2] = str(len(operand[0]))
+        elif isinstance(operand, dict):
+            result[0] = "STRUCTURE"
+        elif operand == {"sentinel"}:
+            result[0] = "SENTINEL"
+        elif operand == {"fill"}:
+            result[0] = "*"
+        elif result[0] == "":
+            result[0] = "?"
+        computationStack[-1] = HalArray([len(result)], result)
+
+def opFunction(vm, function, instruction, scopeNumber, instructionIndex):
+    PALMAT = vm["PALMAT"]
+    source = vm["source"]
+    computationStack = vm["stack"]
+    stackSize = len(computationStack)
+    # First check all of the no-argument functions.
+    if function in builtIns[0]:
+        if function == "RANDOM":
+            # Note that this returns a number in the range [0, 1),
+            # and therefore cannot return exactly 1.  The HAL/S
+            # documentation isn't entirely clear whether values
+            # that are *exactly* 0 or 1 should be returned.
+            computationStack.append(random.random())
+        elif function == "RANDOMG":
+            computationStack.append(random.gauss(0.0, 1.0))
+        elif function == "RUNTIME":
+            computationStack.append(1.0e-9 * \
+                                    (time.time_ns() - vm["timeOrigin"]))
+        elif function == "CLOCKTIME":
+            rightNow = datetime.datetime.now(datetime.timezone.utc)
+            timeOfDay = 3600 * rightNow.hour + \
+                        60 * rightNow.minute + rightNow.second + \
+                        rightNow.microsecond * 1E-6
+            computationStack.append(timeOfDay)
+        elif function == "DATE":
+            rightNow = datetime.datetime.now(datetime.timezone.utc)
+            d = 10000 * rightNow.year + 100 * rightNow.month + \
+                rightNow.day
+            computationStack.append(d)
+        elif function == "ERRGRP":
+            computationStack.append(vm["errorGroup"])
+        elif function == "ERRNUM":
+            computationStack.append(vm["errorNum"])
+        else:
+            vmError(vm, instruction, "HAL/S built-in function " + function + \
+                    " not yet implemented")
+            return False
+    # Now all of the one-argument functions.
+    elif function in builtIns[1]:
+        if stackSize < 1:
+            vmError(vm, instruction, \
+                    "Not enough arguments on stack for function " + function)
+            return False
+        operand = computationStack[-1]
+        if function in unaryRTL: # See unaryFunctions.py module.
+            result = arrayableUnaryRTL(PALMAT, function, operand, \
+                                       source, instruction)
+            if isNaN(result):
+                return False
+            computationStack[-1] = result
+        elif function in accumulableFunctions: # See accumulableFunctions.py
+            result = accumulate(PALMAT, operand, function, source, \
+                                instruction)
+            if isNaN(result):
+                return False
+            computationStack[-1] = result
+        elif function == "SIZE":
+            if isArrayQuick(operand):
+                dimensions, value = getArrayDimensions(operand)
+                if len(dimensions) == 1:
+                    computationStack[-1] = dimensions[0]
+                else:
+                    vmError(vm, instruction, \
+                            "Array for SIZE must be one-dimensional.")
+                    return False
+            else:
+                vmError(vm, instruction, "SIZE function requires an array")
+                return False
+        elif function == "LENGTH":
+            operand = str(operand)
+            computationStack[-1] = len(operand)
+        elif function == "TRIM":
+            operand = str(operand)
+            computationStack[-1] = operand.strip()
+        else:
+            vmError(vm, instruction, "HAL/S built-in function " + function + \
+                    "not yet implemented")
+            return False
+    # Now all of the two-argument functions.
+    elif function in builtIns[2]:
+        if stackSize < 2:
+            vmError(vm, instruction, \
+                    "Not enough arguments on stack for function " + function)
+            return False
+        operand1 = computationStack.pop()
+        operand2 = computationStack[-1]
+        if function in binaryRTL:
+            result = arrayableBinaryRTL(PALMAT, function, operand1, \
+                                        operand2, source, instruction)
+            if isNaN(result):
+                return False
+            computationStack[-1] = result
+        elif function == "XOR":
+            if not isBitArray(operand1):
+                vmError(vm, instruction, "Not bit array: " + str(operand1))
+                return False
+            if not isBitArray(operand2):
+                vmError(vm, instruction, "Not bit array: " + str(operand2))
+                return False
+            value1, length1 = parseBitArray(operand1)
+            value2, length2 = parseBitArray(operand2)
+            numbits = max(length1, length2)
+            computationStack[-1] = formBitArray(value1^value2, numbits)
+        elif function == "SHL":
+            operand1 = hround(operand1)
+            operand2 = hround(operand2)
+            computationStack[-1] = operand1 << operand2
+        elif function == "SHR":
+            operand1 = hround(operand1)
+            operand2 = hround(operand2)
+            computationStack[-1] = operand1 >> operand2
+        elif function == "INDEX":
+            # In Python, the character positions within the string are
+            # indexed from 0 (with -1 being "not present"), while in
+            # HAL/S indexing is from 1 (with 0 being "not present").
+            operand1 = str(operand1)
+            operand2 = str(operand2)
+            computationStack[-1] = 1 + operand1.find(operand2)
+        elif function == "LJUST":
+            operand1 = str(operand1)
+            operand2 = hround(operand2)
+            if operand2 < len(operand1):
+                computationStack[-1] = operand1[:operand2]
+                # This is also supposed to signal an error, which
+                # I have no idea about right now, so I'll have to come
+                # back to it later.
+                # TBD
+            else:
+                computationStack[-1] = "%*s" % (-operand2, operand1)
+        elif function == "RJUST":
+            operand1 = str(operand1)
+            operand2 = hround(operand2)
+            if operand2 < len(operand1):
+                computationStack[-1] = operand1[:operand2]
+                # This is also supposed to signal an error, which
+                # I have no idea about right now, so I'll have to come
+                # back to it later.
+                # TBD
+            else:
+                computationStack[-1] = "%*s" % (operand2, operand1)
+        else:
+            vmError(vm, instruction, "HAL/S built-in function " + function + \
+                    " not yet implemented")
+            return False
+    # Now all of the three-argument functions.
+    elif function in builtIns[3]:
+        if stackSize < 3:
+            vmError(vm, instruction, \
+                    "Not enough arguments on stack for function " + function)
+            return False
+        operand1 = computationStack.pop()
+        operand2 = computationStack.pop()
+        operand3 = computationStack[-1]
+        if function == "MIDVAL":
+            result = trinaryOperation(PALMAT, simpleMIDVAL, operand1, \
+                                      operand2, operand3)
+            if isNaN(result):
+                vmError(vm, instruction, \
+                        "Incompatible operands for MIDVAL function")
+                return False
+            computationStack[-1] = result
+        else:
+            vmError(vm, instruction, "HAL/S built-in function " + function \
+                    + "not yet implemented")
+            return False
+    else:
+        vmError(vm, instruction, "Implementation error, function " + function)
+        return False
+
+# For goto, iffalse, and iftrue, when the decoder couldn't resolve the
+# target in advance.
+def unresolvedJump(vm, instruction, scopeNumber, instructionName):
+    target = jump(vm["PALMAT"], vm["source"], scopeNumber, instruction, \
+                  instructionName)
+    if target == None:
+        return False
+    return target
+
+def opGoto(vm, target, instruction, scopeNumber, instructionIndex):
+    if target == None:
+        return unresolvedJump(vm, instruction, scopeNumber, "goto")
+    return target
+
+def opIffalse(vm, target, instruction, scopeNumber, instructionIndex):
+    value, dummy = parseBitArray(vm["stack"].pop())
+    if (value & 1) == 0:
+        if target == None:
+            return unresolvedJump(vm, instruction, scopeNumber, "iffalse")
+        return target
+
+def opIftrue(vm, target, instruction, scopeNumber, instructionIndex):
+    value, dummy = parseBitArray(vm["stack"].pop())
+    if (value & 1) != 0:
+        if target == None:
+            return unresolvedJump(vm, instruction, scopeNumber, "iftrue")
+        return target
+
+def opCalloffset(vm, target, instruction, scopeNumber, instructionIndex):
+    if target == None:
+        vmError(vm, instruction, \
+                "Implementation error, identifier %s not found" \
+                % instruction["calloffset"])
+        return False
+    vm["scopes"][scopeNumber]["returnoffset"] = instructionIndex
+    return (scopeNumber, target)
+
+def opReturnoffset(vm, i, instruction, scopeNumber, instructionIndex):
+    scopes = vm["scopes"]
+    if i == -1:
+        i = scopeNumber
+        while i != None and "returnoffset" not in scopes[i]:
+            i = scopes[i]["parent"]
+        if i == None:
+            vmError(vm, instruction, \
+                    "Implementation error, cannot find returnoffset.")
+            return False
+    scope = scopes[i]
+    if "returnoffset" in scope:
+        return (i, scope.pop("returnoffset"))
+    vmError(vm, instruction, "Implementation error, returnoffset not in scope.")
+    for key in sorted(scope):
+        print("\t%s:" % key, scope[key])
+    return False
+
+def opCase(vm, operand, instruction, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    prefix, table, otherwise, exit = operand
+    if len(computationStack) < 1:
+        vmError(vm, instruction, "Computation stack too short in CASE.")
+        return False
+    caseNumber = computationStack.pop()
+    if isinstance(caseNumber, float):
+        caseNumber = hround(caseNumber)
+    if not isinstance(caseNumber, int):
+        vmError(vm, instruction, "Non-numeric CASE key.")
+        return False
+    offset = None
+    if caseNumber >= 1:
+        offset = table.get(caseNumber)
+    if offset == None:
+        offset = otherwise
+    if offset == None:
+        offset = exit
+    if offset == None:
+        vmError(vm, instruction, \
+            "Implementation error, no accessible labels in CASE")
+        return False
+    return (scopeNumber, offset)
+
+def opRun(vm, operand, instruction, scopeNumber, instructionIndex):
+    si, identifier, attributes = operand
+    if attributes == None:
+        vmError(vm, instruction, "Target of RUN not found: " + identifier)
+        return False
+    if "program" not in attributes:
+        vmError(vm, instruction, "RUN target is not a PROGRAM: " + identifier)
+        return False
+    return (attributes["scope"], 0)
+
+def opCall(vm, operand, instruction, scopeNumber, instructionIndex):
+    scopes = vm["scopes"]
+    si, identifier, attributes = operand
+    if attributes == None:
+        vmError(vm, instruction, "Target of CALL not found: " + identifier)
+        return False
+    if "function" not in attributes and "procedure" not in attributes:
+        vmError(vm, instruction, \
+                "CALL to neither a FUNCTION nor PROCEDURE: " + identifier)
+        return False
+    si = attributes["scope"]
+    scope = scopes[si]
+    if "return" in scope:
+        printError(vm["PALMAT"], vm["source"], identifier, \
+                   "Recursion in subroutine %s not allowed." \
+                   % identifier[1:-1])
+        return False
+    if "assignments" in instruction:
+        scope["assignments"] = copy.deepcopy(instruction["assignments"])
+    # The return address.
+    scope["return"] = (scopeNumber, instructionIndex)
+    return (si, 0)
+
+def opReturn(vm, operand, instruction, scopeNumber, instructionIndex):
+    scopes = vm["scopes"]
+    enclosure = scopes[scopeNumber]
+    while True:
+        if "return" in enclosure:
+            target = enclosure.pop("return")
+            if "assignments" in enclosure:
+                enclosure.pop("assignments")
+            return target
+        if enclosure["parent"] == None:
+            break
+        enclosure = scopes[enclosure["parent"]]
+    vmError(vm, instruction, "Implementation error, no return address")
+    return False
+
+def opHalt(vm, operand, instruction, scopeNumber, instructionIndex):
+    # Ends emulation.
+    printError(vm["PALMAT"], vm["source"], None, "Normal program termination")
+    return False
+
+# The real-time instructions (SCHEDULE, WAIT, SET, ...) are replaced by 
+# working ones in the dispatch table used by the scheduler.
+def opRealTime(vm, operand, instruction, scopeNumber, instructionIndex):
+    vmError(vm, instruction, \
+            "Real-time instruction encountered outside of the scheduler.")
+    return False
+
+#----------------------------------------------------------------------------
+# The superinstructions.  Each does exactly what the sequence of instructions
+# fused into it would have done (see fuseSuperinstructions() in 
+# optimizePALMAT.py), by way of the same handlers, but with only a single 
+# trip through the emulator's loop.
+
+# Pushes the decoded "operands" of a superinstruction.  Returns False on error.
+def pushOperands(vm, operands, scopeNumber):
+    for isNumber, operand, instruction in operands:
+        if isNumber:
+            vm["stack"].append(operand)
+        elif opFetch(vm, operand, instruction, scopeNumber, 0) == False:
+            return False
+    return True
+
+def opStoreconstant(vm, operand, instruction, scopeNumber, instructionIndex):
+    value, variable, storeInstruction = operand
+    vm["stack"].append(value)
+    return storeCommon(vm, variable, storeInstruction, scopeNumber, True, False)
+
+def opCompute(vm, operand, instruction, scopeNumber, instructionIndex):
+    operator, operands, operatorInstruction, kernel = operand
+    if not pushOperands(vm, operands, scopeNumber):
+        return False
+    return typedBinary(vm, operator, kernel, operatorInstruction, scopeNumber,
+                       instructionIndex)
+
+def opComputestore(vm, operand, instruction, scopeNumber, instructionIndex):
+    operator, operands, operatorInstruction, variable, storeInstruction, \
+        kernel = operand
+    if not pushOperands(vm, operands, scopeNumber):
+        return False
+    if typedBinary(vm, operator, kernel, operatorInstruction, scopeNumber, 
+                   instructionIndex) == False:
+        return False
+    return storeCommon(vm, variable, storeInstruction, scopeNumber, True, False)
+
+def opComputeiffalse(vm, operand, instruction, scopeNumber, instructionIndex):
+    operator, operands, operatorInstruction, target, jumpInstruction, \
+        kernel = operand
+    if not pushOperands(vm, operands, scopeNumber):
+        return False
+    if typedBinary(vm, operator, kernel, operatorInstruction, scopeNumber, 
+                   instructionIndex) == False:
+        return False
+    return opIffalse(vm, target, jumpInstruction, scopeNumber, 
+                     instructionIndex)
+
+def opComputeiftrue(vm, operand, instruction, scopeNumber, instructionIndex):
+    operator, operands, operatorInstruction, target, jumpInstruction, \
+        kernel = operand
+    if not pushOperands(vm, operands, scopeNumber):
+        return False
+    if typedBinary(vm, operator, kernel, operatorInstruction, scopeNumber, 
+                   instructionIndex) == False:
+        return False
+    return opIftrue(vm, target, jumpInstruction, scopeNumber, instructionIndex)
+
+def opFetchiffalse(vm, operand, instruction, scopeNumber, instructionIndex):
+    operands, target, jumpInstruction = operand
+    if not pushOperands(vm, operands, scopeNumber):
+        return False
+    return opIffalse(vm, target, jumpInstruction, scopeNumber, 
+                     instructionIndex)
+
+def opFetchiftrue(vm, operand, instruction, scopeNumber, instructionIndex):
+    operands, target, jumpInstruction = operand
+    if not pushOperands(vm, operands, scopeNumber):
+        return False
+    return opIftrue(vm, target, jumpInstruction, scopeNumber, instructionIndex)
+
+def opLoopstep(vm, operand, instruction, scopeNumber, instructionIndex):
+    operands, variable, incrementInstruction, target, jumpInstruction = \
+        operand
+    if not pushOperands(vm, operands, scopeNumber):
+        return False
+    if opIncrementAndTest(vm, variable, incrementInstruction, scopeNumber, 
+                          instructionIndex) == False:
+        return False
+    return opIftrue(vm, target, jumpInstruction, scopeNumber, instructionIndex)
+
+# For watchpoints.  (See instrumentWatches() above.)
+def formatWatched(value):
+    if value == None:
+        return "(uninitialized)"
+    if isinstance(value, (int, float)):
+        return formatNumberAsString(value).strip()
+    if isBitArray(value):
+        return "BIN'%s'" % bin(parseBitArray(value)[0])[2:]
+    if isinstance(value, str):
+        return "'" + value + "'"
+    return str(value)
+
+def opWatched(vm, operand, instruction, scopeNumber, instructionIndex):
+    opcode, original, variable, watch = operand
+    attributes = variable[2]
+    old = copy.deepcopy(attributes.get("value"))
+    transfer = handlers[opcode](vm, original, instruction, scopeNumber, 
+                                instructionIndex)
+    new = attributes.get("value")
+    if new != old:
+        watch["hits"] += 1
+        printError(vm["PALMAT"], vm["source"], None, 
+                   "WATCH %s:  %s -> %s" % (watch["name"], formatWatched(old), 
+                                           formatWatched(new)))
+        if watch["stop"]:
+            return False
+    return transfer
+
+def opAutomatics(vm, operand, instruction, scopeNumber, instructionIndex):
+    identifiers = vm["scopes"][scopeNumber]["identifiers"]
+    for identifier in identifiers:
+        attributes = identifiers[identifier]
+        if "initial" in attributes and "automatic" in attributes:
+            attributes["value"] = copy.deepcopy(attributes["initial"])
+
+# The dispatch table, indexed by opcode.
+handlers = [None] * len(opcodeNames)
+for name, handler in [("debug", opNothing), ("empty", opEmpty),
+                      ("fill", opFill), ("string", opLiteral),
+                      ("boolean", opLiteral), ("number", opLiteral),
+                      ("vector", opLiteral), ("matrix", opLiteral),
+                      ("array", opLiteral), ("+><", opIncrementAndTest),
+                      ("sentinel", opSentinel), ("operator", opUnknownOperator),
+                      ("fetch", opFetch), ("unravel", opUnravel),
+                      ("fetchp", opFetchp), ("store", opStore),
+                      ("storepop", opStorepop), ("substore", opSubstore),
+                      ("substorepop", opSubstorepop), ("pop", opPop),
+                      ("read", opRead), ("write", opWrite),
+                      ("iocontrol", opIocontrol), ("shaping", opShaping),
+                      ("modern", opModern), ("function", opFunction),
+                      ("goto", opGoto), ("calloffset", opCalloffset),
+                      ("returnoffset", opReturnoffset), ("case", opCase),
+                      ("iffalse", opIffalse), ("iftrue", opIftrue),
+                      ("noop", opNothing), ("run", opRun), ("call", opCall),
+                      ("return", opReturn), ("halt", opHalt),
+                      ("automatics", opAutomatics),
+                      ("schedule", opRealTime), ("wait", opRealTime),
+                      ("set", opRealTime), ("reset", opRealTime),
+                      ("signal", opRealTime), ("terminate", opRealTime),
+                      ("cancel", opRealTime), ("update", opRealTime),
+                      ("process", opRealTime),
+                      ("storeconstant", opStoreconstant),
+                      ("compute", opCompute),
+                      ("computestore", opComputestore),
+                      ("computeiffalse", opComputeiffalse),
+                      ("computeiftrue", opComputeiftrue),
+                      ("fetchiffalse", opFetchiffalse),
+                      ("fetchiftrue", opFetchiftrue),
+                      ("loopstep", opLoopstep), ("partition", opPartition),
+                      ("operator#", opRepeat), ("operatorDotted", opDotted),
+                      ("operatorSubscripts", opSubscripts),
+                      ("operatorUnary", opUnary), ("operatorBinary", opBinary),
+                      ("operatorTyped", opTyped), ("watched", opWatched),
+                      ("operatorUnknown", opUnknownOperator),
+                      ("unknown", opUnknown)]:
+    handlers[opcodes[name]] = handler
 
 '''
 This is the main emulator loop.  Basically, you feed it an entire PALMAT
@@ -475,12 +2248,12 @@ to 0, 0), and the emulation just runs until it runs out of PALMAT instructions;
 i.e., until the next instruction to be executed is outside of the range of its
 scope.
 
-There are also a couple of flourishes:  If newInstantiation is True, then 
+There are also a couple of flourishes:  If newInstantiation is True, then
 the PALMAT dataspaces are cloned prior to execution, so that any changes to
 values of variables do not affect any other copies of the PALMAT structure.
 In other words, you can have multiple instances running at the same time, and
-they run independently.  However, PALMAT instruction lists and COMPOOLs are 
-shared among instances, thus minimizing the amount of memory needed for the 
+they run independently.  However, PALMAT instruction lists and COMPOOLs are
+shared among instances, thus minimizing the amount of memory needed for the
 clones, as well as leaving open the possibility of sharing some memory (in the
 COMPOOLs).  By default, however, newInstantiation is False, so any time that
 executePALMAT() is run it can change variable values in a way that persists.
@@ -490,18 +2263,210 @@ an actual flight program, it returns the current computation stack.
 That would normally be empty if full statements had been executed.
 However, this allows executing (say) just a single expression without popping
 the value from the stack at the end, which is useful for the compiler
-since it can then use it to compute things like INITIAL(...) or 
+since it can then use it to compute things like INITIAL(...) or
 CONSTANT(...) for DECLARE statements.  If there is failure, for example
-the use of an unimplemented built-in function or referencing an 
+the use of an unimplemented built-in function or referencing an
 uninitialized variable, then None is returned instead.
+
+Unless the PALMAT has been linked (see linkPALMAT() above), scopes are decoded
+(see decodeScope() above) lazily, as control first enters them, and the decoded
+forms are retained only for the duration of this call to executePALMAT(), since
+the compiler may alter the PALMAT between calls.
+
+If profile is given (see newProfile() in profilePALMAT.py), the execution is
+profiled into it, unless tracing.  Otherwise, if ring is given (see newRing()
+in tracePALMAT.py), a compact record of each instruction executed is kept in
+it.  Otherwise, if the PALMAT has been translated to Python (see 
+translatePALMAT.py), the translation is run instead.
 '''
+
+# The emulator loops proper.  There are four versions of it, identical except
+# that one prints a trace of each instruction as it's executed, another 
+# profiles the execution, and another records each instruction in a trace
+# ring, so that ordinary emulation doesn't pay anything for the possibility
+# of tracing or profiling.  (A fifth, emulateTranslated(), runs the 
+# translation of the PALMAT to Python instead.)  Each returns the 
+# computation stack, or None on error or 'halt'.
+def emulate(vm, scopeNumber, instructionIndex):
+    decodedScopes = vm["decodedScopes"]
+    decoded = decodedScopes[scopeNumber]
+    while instructionIndex < len(decoded):
+        opcode, operand, instruction, source = decoded[instructionIndex]
+        if source != None:
+            vm["source"] = source
+        instructionIndex += 1
+        transfer = handlers[opcode](vm, operand, instruction, scopeNumber,
+                                    instructionIndex)
+        if transfer != None:
+            if transfer is False:
+                return None
+            scopeNumber, instructionIndex = transfer
+            if scopeNumber not in decodedScopes:
+                decodedScopes[scopeNumber] = decodeScope(vm["PALMAT"], 
+                                                         scopeNumber)
+            decoded = decodedScopes[scopeNumber]
+    return vm["stack"]
+
+def emulateTraced(vm, scopeNumber, instructionIndex):
+    computationStack = vm["stack"]
+    decodedScopes = vm["decodedScopes"]
+    decoded = decodedScopes[scopeNumber]
+    while instructionIndex < len(decoded):
+        opcode, operand, instruction, source = decoded[instructionIndex]
+        if source != None:
+            vm["source"] = source
+        print("\tTRACE:  ", computationStack, \
+              " (%d,%d):" % (scopeNumber, instructionIndex), instruction)
+        instructionIndex += 1
+        transfer = handlers[opcode](vm, operand, instruction, scopeNumber,
+                                    instructionIndex)
+        if transfer != None:
+            if transfer is False:
+                return None
+            scopeNumber, instructionIndex = transfer
+            if scopeNumber not in decodedScopes:
+                decodedScopes[scopeNumber] = decodeScope(vm["PALMAT"], 
+                                                         scopeNumber)
+            decoded = decodedScopes[scopeNumber]
+    print("\tTRACE:  ", computationStack, \
+          " (%d,%d):" % (scopeNumber, instructionIndex), "(end)")
+    return computationStack
+
+# The profiling version (see profilePALMAT.py) reads the clock whenever the
+# source-code position changes or control is transferred, and keeps track of
+# the FUNCTIONs and PROCEDUREs called.
+def emulateProfiled(vm, scopeNumber, instructionIndex, profile):
+    decodedScopes = vm["decodedScopes"]
+    decoded = decodedScopes[scopeNumber]
+    callOpcode = opcodes["call"]
+    returnOpcode = opcodes["return"]
+    profile["runs"] += 1
+    stack = (scopeNumber,)
+    source = vm["source"]
+    count = 0
+    start = time.perf_counter_ns()
+    while instructionIndex < len(decoded):
+        opcode, operand, instruction, newSource = decoded[instructionIndex]
+        if newSource != None and newSource != source:
+            start = chargeProfile(profile, stack, scopeNumber, source, count,
+                                  start, newSource)
+            count = 0
+            source = newSource
+            vm["source"] = source
+        instructionIndex += 1
+        count += 1
+        transfer = handlers[opcode](vm, operand, instruction, scopeNumber,
+                                    instructionIndex)
+        if transfer != None:
+            start = chargeProfile(profile, stack, scopeNumber, source, count,
+                                  start)
+            count = 0
+            if transfer is False:
+                return None
+            if opcode == callOpcode:
+                stack = stack + (transfer[0],)
+                chargeCall(profile, transfer[0])
+            elif opcode == returnOpcode and len(stack) > 1:
+                stack = stack[:-1]
+            scopeNumber, instructionIndex = transfer
+            if scopeNumber not in decodedScopes:
+                decodedScopes[scopeNumber] = decodeScope(vm["PALMAT"], 
+                                                         scopeNumber)
+            decoded = decodedScopes[scopeNumber]
+    chargeProfile(profile, stack, scopeNumber, source, count, start)
+    return vm["stack"]
+
+# The ring is dumped on error or 'halt', or if a handler raises an exception.
+def emulateRinged(vm, scopeNumber, instructionIndex, ring):
+    computationStack = vm["stack"]
+    decodedScopes = vm["decodedScopes"]
+    decoded = decodedScopes[scopeNumber]
+    ring["opcodes"] = opcodeNames
+    ring["sourceFiles"] = vm["PALMAT"].get("sourceFiles", [])
+    try:
+        while instructionIndex < len(decoded):
+            opcode, operand, instruction, source = decoded[instructionIndex]
+            if source != None:
+                vm["source"] = source
+            offset = instructionIndex
+            instructionIndex += 1
+            transfer = handlers[opcode](vm, operand, instruction, scopeNumber,
+                                        instructionIndex)
+            recordRing(ring, scopeNumber, offset, opcode, vm["source"],
+                       computationStack)
+            if transfer != None:
+                if transfer is False:
+                    dumpRing(ring)
+                    return None
+                scopeNumber, instructionIndex = transfer
+                if scopeNumber not in decodedScopes:
+                    decodedScopes[scopeNumber] = decodeScope(vm["PALMAT"], 
+                                                             scopeNumber)
+                decoded = decodedScopes[scopeNumber]
+    except BaseException:
+        dumpRing(ring)
+        raise
+    return vm["stack"]
+
+# Runs the blocks of PALMAT["translated"] (see translatePALMAT.py).  Where
+# control arrives at an instruction which doesn't start a block, or in a scope
+# which hasn't been translated, instructions are executed one at a time just
+# as in emulate(), until arriving at one that does.
+def emulateTranslated(vm, scopeNumber, instructionIndex):
+    translated = vm["PALMAT"]["translated"]
+    decodedScopes = vm["decodedScopes"]
+    blocks = translated.get(scopeNumber, {})
+    while True:
+        block = blocks.get(instructionIndex)
+        if block != None:
+            transfer = block(vm)
+            if transfer.__class__ is int:
+                instructionIndex = transfer
+                continue
+        else:
+            if scopeNumber not in decodedScopes:
+                decodedScopes[scopeNumber] = decodeScope(vm["PALMAT"], 
+                                                         scopeNumber)
+            decoded = decodedScopes[scopeNumber]
+            if instructionIndex >= len(decoded):
+                return vm["stack"]
+            opcode, operand, instruction, source = decoded[instructionIndex]
+            if source != None:
+                vm["source"] = source
+            instructionIndex += 1
+            transfer = handlers[opcode](vm, operand, instruction, scopeNumber,
+                                        instructionIndex)
+            if transfer == None:
+                continue
+        if transfer is False:
+            return None
+        scopeNumber, instructionIndex = transfer
+        blocks = translated.get(scopeNumber, {})
+
+# The state of an emulation, as used by the handlers.  Each process run by the
+# real-time scheduler (see schedulePALMAT.py) has one of its own.
+def newVM(PALMAT, decodedScopes, indent=0):
+    return {
+        "PALMAT": PALMAT,
+        "scopes": PALMAT["scopes"],
+        "decodedScopes": decodedScopes,
+        "stack": [],
+        "source": [0, -1, -1],
+        "indent": indent,
+        # Some values needed for RTL functions.
+        "timeOrigin": time.time_ns(), # For RUNTIME
+        "errorGroup": 0,              # For ERRGRP
+        "errorNum": 0,                # For ERRNUM
+        # Registers for structure qualifications and subscripts.  See 
+        # takeQualifications() and takeSubscripts() above.
+        "qualifications": [],
+        "subscripts": [],
+        "subscripts2": [],
+        "fullSubscripts": []
+        }
+
 def executePALMAT(rawPALMAT, pcScope=0, pcOffset=0, newInstantiation=False, \
-                  trace=False, indent=0):
-    # Some values needed for RTL functions.
-    timeOrigin = time.time_ns() # For RUNTIME
-    errorGroup = 0              # For ERRGRP
-    errorNum = 0                # For ERRNUM
-    
+                  trace=False, indent=0, profile=None, ring=None):
     if newInstantiation:
         PALMAT = clonePALMAT(rawPALMAT)
     else:
@@ -512,1259 +2477,30 @@ def executePALMAT(rawPALMAT, pcScope=0, pcOffset=0, newInstantiation=False, \
             scope.pop("return")
         if "returnoffset" in scope:
             scope.pop("returnoffset")
-    scopeNumber = pcScope
-    instructionIndex = pcOffset
-    scope = scopes[scopeNumber]
-    scope0 = scopes[0]
-    computationStack = []
-    source = [0, -1, -1]
-    # Execute the PALMAT instructions, one by one.
-    while instructionIndex < len(scope["instructions"]):
-        identifiers = scope["identifiers"]
-        instructions = scope["instructions"]
-        instruction = instructions[instructionIndex]
-        if "source" in instruction:
-            source = instruction["source"]
-        # As originally designed, both structure qualifications and and 
-        # subscripts are intended to persist only until the very next 
-        # instruction (usually, 'fetch').  But what if there are both?
-        # We need to do something here to account for the possibility that 
-        # both subscripts and structure qualifications are present; but for 
-        # now, I'm just pretending that at most one of those two is present.
-        qualifications = []
-        if "qualifications" in scope0:
-            qualifications = scope0["qualifications"]
-            scope0.pop("qualifications")
-        fullSubscripts = []
-        if "subscripts" in scope0:
-            fullSubscripts.extend(scope0["subscripts"])
-        if "subscripts2" in scope0:
-            fullSubscripts.extend(scope0["subscripts2"])
-        if len(fullSubscripts) > 0 and "fetch" not in instruction and \
-                "fetchp" not in instruction and "shaping" not in instruction \
-                and "unravel" not in instruction:
-            printError(PALMAT, source, instruction, 
-                "Implementation error, subscript (%s) without variable in instruction" \
-                % scope0["subscripts"])
-            return None
-        if "subscripts" in scope0:
-            subscripts = scope0.pop("subscripts")
-        else:
-            subscripts = []
-        if "subscripts2" in scope0:
-            subscripts2 = scope0.pop("subscripts2")
-        else:
-            subscripts2 = []
+    # Use the PALMAT's linkage (see linkPALMAT()) if it has any, and otherwise
+    # decode scopes lazily.
+    if "linked" in PALMAT:
+        decodedScopes = PALMAT["linked"]
+    else:
+        decodedScopes = {}
+    if pcScope not in decodedScopes:
+        decodedScopes[pcScope] = decodeScope(PALMAT, pcScope)
+    vm = newVM(PALMAT, decodedScopes, indent)
+    # Whatever output the I/O channels are holding back (see ioChannels.py)
+    # is written out however the emulation ends.
+    try:
+        if "realTime" in PALMAT:
+            # The program uses TASKs, EVENTs, WAIT, and so on.
+            from schedulePALMAT import schedulePALMAT
+            return schedulePALMAT(vm, pcScope, pcOffset, trace)
         if trace:
-            print("\tTRACE:  ", computationStack, \
-                  " (%d,%d):" % (scopeNumber, instructionIndex), instruction)
-        instructionIndex += 1
-        stackSize = len(computationStack)
-        if "debug" in instruction:
-            pass
-        elif "empty" in instruction:
-            computationStack.append(None)
-        elif "fill" in instruction:
-            computationStack.append({"fill"})
-        elif "string" in instruction:
-            computationStack.append(instruction["string"])
-        elif "boolean" in instruction:
-            computationStack.append(instruction["boolean"])
-        elif "number" in instruction:
-            try:
-                value = int(instruction["number"])
-            except:
-                value = stringifiedToFloat(instruction["number"])
-            computationStack.append(value)
-        elif "vector" in instruction:
-            computationStack.append(instruction["vector"])
-        elif "matrix" in instruction:
-            computationStack.append(instruction["matrix"])
-        elif "array" in instruction:
-            computationStack.append(instruction["array"])
-        #elif "bitarray" in instruction:
-        #    computationStack.append(parseBitArray(instruction["bitarray"])[0])
-        elif "+><" in instruction:
-            si, identifier = instruction["+><"]
-            identifier = "^" + identifier + "^"
-            if stackSize < 2:
-                printError(PALMAT, source, instruction, \
-                        "Implementation error, not enough operands for '+><'.")
-                return None
-            operand1 = computationStack.pop()
-            negativeIncrement = (operand1 < 0)
-            operand2 = computationStack[-1]
-            attributes = PALMAT["scopes"][si]["identifiers"][identifier]
-            if attributes == None:
-                printError(PALMAT, source, instruction, \
-                    "Implementation error, variable (%s) not found." \
-                      % identifier[1:-1])
-                return None
-            if "integer" not in attributes and "scalar" not in attributes:
-                printError(PALMAT, source, instruction, \
-                           "Implementation error in '+><': Not a number.")
-                return None
-            if "value" not in attributes:
-                printError(PALMAT, source, instruction, \
-                    "Implementation error in '+><': Uninitialized variable.")
-                return None
-            operand1 += attributes["value"]
-            if "integer" in attributes:
-                attributes["value"] = hround(operand1)
-            else:
-                attributes["value"] = operand1
-            if negativeIncrement:
-                computationStack[-1] = convertToBitArray(operand1 < operand2)
-            else:
-                computationStack[-1] = convertToBitArray(operand1 > operand2)
-        elif "sentinel" in instruction:
-            computationStack.append({"sentinel"})
-        elif "operator" in instruction:
-            operator = instruction["operator"]
-            if False:
-                pass
-            elif operator == "#":
-                if stackSize < 2:
-                    printError(PALMAT, source, instruction, \
-                        ("\tImplementation error, not enough operands " + \
-                        "for operator \"%s\"") % operator)
-                    return None
-                operand1 = hround(computationStack.pop())
-                # Recall that if a single item is being repeated, it is present
-                # as itself, but if a group of items are being repeated then
-                # that group appears on the computation stack in the form of 
-                # a single item because the group is wrapped in [(...)].  That
-                # particular wrapping is chosen because it's distinguishable 
-                # from VECTOR, MATRIX, and ARRAY.
-                if computationStack[-1] == {'sentinel'}:
-                    computationStack.pop()
-                    operands2 = [None]
-                else:
-                    operands2 = []
-                    while True:
-                        value = computationStack.pop()
-                        if value == {'sentinel'}:
-                            break
-                        flatten(value, operands2)
-                while operand1 > 0:
-                    # I want to insert all the elements in operands2 into
-                    # computation stack.  If I use the list .extend method
-                    # for this, I find they end up in reversed order, so I
-                    # want to do the insertion at the beginning rather than
-                    # at the end.  I want to do this in place, without 
-                    # creating a new computationStack object.
-                    #computationStack.extend(operands2)
-                    #computationStack[0:0] = operands2
-                    computationStack.extend(reversed(operands2))
-                    operand1 -= 1
-            elif operator == "dotted":
-                # Structure qualifications.  These are the strings "A", "B", "C"
-                # in structure refrences like A.B.C.X.
-                q = []
-                while True:
-                    value = computationStack.pop()
-                    if value == {"sentinel"}:
-                        break
-                    q[0:0] = [value] # Insert the qualification at position 0.
-                scope0["qualifications"] = q
-            elif operator == "subscripts":
-                subscripts = []
-                subscripts2 = []
-                s = subscripts
-                while True:
-                    value = computationStack.pop()
-                    if value == {"sentinel"}:
-                        break
-                    if value == {"semicolon"}:
-                        s = subscripts2
-                        continue
-                    s.append(value)
-                if len(subscripts + subscripts2) < 1:
-                    printError(PALMAT, source, instruction, \
-                               "Subscript operator without subscripts.")
-                    return None
-                scope0["subscripts"] = subscripts
-                scope0["subscripts2"] = subscripts2
-            elif operator in ["U-", "NOT"]: # Unary operators.
-                if stackSize < 1:
-                    printError(PALMAT, source, instruction, \
-                        ("\tImplementation error, not enough operands " + \
-                        "for operator \"%s\"") % operator)
-                    return None
-                operand = computationStack[-1]
-                #arrayDim, v = getArrayDimensions(operand)
-                #isi,iss,isv,ism = checkArithmeticalDatatype(v)
-                #isn = isi or iss
-                if operator == "U-":
-                    result = arrayableUnaryRTL(PALMAT, "Negation", operand, \
-                                               source, instruction)
-                    if isNaN(result):
-                        return None
-                elif operator == "NOT":
-                    if not isBitArray(operand):
-                        printError(PALMAT, source, instruction, \
-                                   "Not bit array: " + operand)
-                        return None
-                    value, length = parseBitArray(operand)
-                    result = formBitArray(~value, length)
-                else:
-                    printError(PALMAT, source, instruction, \
-                            ("Implementation error, unary operator (%s) " + \
-                           "not yet implemented") % operator)
-                    return None
-                computationStack[-1] = result
-            elif operator in ["+", "-", "", "/", "**", ".", "*", "C||", "OR", 
-                              "AND", "==", "!=", "<", ">", "<=", ">=", "B||",
-                              "ORNOT"]: 
-                # binary operators.
-                if stackSize < 2:
-                    printError(PALMAT, source, instruction, \
-                        ("Implementation error, not enough operands " + \
-                        "for operator \"%s\"") % operator)
-                    return None
-                result = None
-                operand1 = computationStack[-1]
-                operand2 = computationStack[-2]
-                computationStack.pop()
-                computationStack[-1] = None
-                if operator in ["==", "!=", "<", ">", "<=", ">="] and \
-                        (not isCompletelyInitialized(operand1) or \
-                         not isCompletelyInitialized(operand2)):
-                    printError(PALMAT, source, instruction, \
-                        "Cannot compare uninitialized values")
-                    return None
-                # Common arithmetical operators ... both arrayed and
-                # non-arrayed operations.
-                if operator in binaryRTL:
-                    result = arrayableBinaryRTL(PALMAT, operator, operand1, \
-                                                operand2, \
-                                                source, instruction)
-                    if isNaN(result):
-                        return None
-                else:
-                    if operator == "C||": # string concatenation.
-                        result = operand1 + operand2
-                    elif operator in ["AND", "OR", "ORNOT", "B|N" ]:
-                        if not isBitArray(operand1):
-                            printError(PALMAT, source, instruction, \
-                                       "Not bit array: " + str(operand1))
-                            return None
-                        if not isBitArray(operand2):
-                            printError(PALMAT, source, instruction, \
-                                       "Not bit array: " + str(operand2))
-                            return None
-                        value1, length1 = parseBitArray(operand1)
-                        value2, length2 = parseBitArray(operand2)
-                        if operator == "OR":
-                            numbits = min(length1, length2)
-                            result = formBitArray(value1 | value2, numbits)
-                        elif operator == "AND":
-                            numbits = min(length1, length2)
-                            result = formBitArray(value1 & value2, numbits)
-                        elif operator == "ORNOT":
-                            numbits = min(length1, length2)
-                            result = formBitArray(value1 | ~value2, numbits)
-                        elif operator == "B||":
-                            numbits = length1 + length2
-                            result = formBitArray((value1 << length2) | value2,\
-                                                   numbits)
-                    elif operator == "==":
-                        result = \
-                            convertToBitArray(isEqualTo(operand1, operand2))
-                    elif operator == "!=":
-                        result = \
-                            convertToBitArray(not isEqualTo(operand1, operand2))
-                    elif operator == "<":
-                        result = convertToBitArray(operand1 < operand2)
-                    elif operator == ">":
-                        result = convertToBitArray(operand1 > operand2)
-                    elif operator == "<=":
-                        result = convertToBitArray(operand1 <= operand2)
-                    elif operator == ">=":
-                        result = convertToBitArray(operand1 >= operand2)
-                    elif operator == ".":
-                        if isv1 and isv2 \
-                                and len(operand1) == len(operand2):
-                            result = 0
-                            for i in range(len(operand1)):
-                                result += operand1[i] * operand2[i]
-                    elif operator == "*":
-                        if isv1 and isv2 \
-                                and len(operand1) == 3 and len(operand2) == 3:
-                            result = [
-                                operand1[1]*operand2[2]-operand1[2]*operand2[1],
-                                operand1[2]*operand2[0]-operand1[0]*operand2[2],
-                                operand1[0]*operand2[1]-operand1[1]*operand2[0]                                
-                                ]
-                        else:
-                            printError(PALMAT, source, instruction, \
-                                "Operands of * must be initialized 3-vectors.")
-                            return None
-                    else:
-                        printError(PALMAT, source, instruction, \
-                            ("Implementation error, binary operator \"%s\" " + \
-                            "not yet implemented") % operator)
-                        return None
-                    if result == None:
-                        printError(PALMAT, source, instruction, \
-                                   "Uninitialized values in expression.")
-                        return None
-                computationStack[-1] = result
-            else:
-                printError(PALMAT, source, instruction, \
-                           "Unknown operator \"%s\"" % operator)
-        elif "fetch" in instruction or "unravel" in instruction \
-                or "fetchp" in instruction or \
-                "store" in instruction or "storepop" in instruction or \
-                "substore" in instruction or "substorepop" in instruction:
-            erroredUp = False
-            fetch = False
-            fetchp = False
-            pop = False
-            unravel = False
-            lhsSubscripts = False
-            stackPos = 1
-            if "fetch" in instruction:
-                si, identifier = instruction["fetch"]
-                fetch = True
-            elif "unravel" in instruction:
-                si, identifier = instruction["unravel"]
-                fetch = True
-                unravel = True
-            elif "fetchp" in instruction:
-                si, identifier = instruction["fetchp"]
-                fetchp = True
-            elif "store" in instruction:
-                si, identifier = instruction["store"]
-            elif "storepop" in instruction:
-                si, identifier = instruction["storepop"]
-                pop = True
-            elif "substore" in instruction:
-                si, identifier = instruction["substore"]
-                lhsSubscripts = True
-            elif "substorepop" in instruction:
-                si, identifier = instruction["substorepop"]
-                pop = True
-                lhsSubscripts = True
-            lhsSubscriptList = []
-            if lhsSubscripts:
-                subscript = computationStack.pop()
-                while subscript != {"sentinel"}:
-                    if subscript != {"semicolon"}:
-                        lhsSubscriptList.append(subscript)
-                    subscript = computationStack.pop()
-            dummyScope = scope
-            while si == -1:
-                '''
-                If si == -1, then the variable being assigned is itself a
-                local alias in a procedure call.  So we have to seek upstream
-                to find the variable to which it's actually referring.
-                
-                The reason we're in a "while si" rather than an "if si" is that
-                we may have *nested* procedure calls, so once we find the 
-                upstream variable to which our alias refers, it may itself be
-                an alias for another variable upstream of the calling code
-                (which may be a scope that's not necessarily an ancestor of 
-                the procedure's scope), and so on. 
-                '''
-                while "assignments" not in dummyScope:
-                    if dummyScope["parent"] == None:
-                        printError(PALMAT, source, instruction, \
-                                   "Cannot find identifier " + identifier)
-                        return None
-                    dummyScope = PALMAT["scopes"][dummyScope["parent"]]
-                if identifier not in dummyScope["assignments"]:
-                    printError(PALMAT, source, instruction, \
-                        ("Identifier \"%s\" " + \
-                        "not found") % identifier[1:-1])
-                    return None
-                si, identifier = dummyScope["assignments"][identifier]
-                if si == -1:
-                    if "return" not in dummyScope:
-                        printError(PALMAT, source, instruction, \
-                            "Cannot trace nested assignments (%s in %s)" % \
-                            (identifier, dummyScope["name"]))
-                        return None
-                    dummyScope = PALMAT["scopes"][dummyScope["return"][0]]
-            identifier = "^" + identifier + "^"
-            try:
-                attributes = getAttributes(PALMAT, si, qualifications, identifier)
-                if attributes == None:
-                    raise Exception("Problem fetching attributes")
-            except:
-                printError(PALMAT, source, instruction, \
-                           "Undiagnosed problem with PALMAT instruction")
-                print("\t\tnum scopes =", len(PALMAT["scopes"]))
-                print("\t\ttype of si =", type(si))
-                print("\t\tscope number =", si, " identifier =", identifier)
-                print("\t\tidentifiers =", PALMAT["scopes"][si]["identifiers"])
-                print("\t\tqualifications =", qualifications)
-                return None
-            erroredUp = True
-            if fetch:
-                print("!!", attributes)
-                if "constant" in attributes:
-                    value = sliceIt(attributes["constant"], fullSubscripts)
-                else:
-                    value = sliceIt(attributes["value"], fullSubscripts)
-                if isNaN(value):
-                    printError(PALMAT, source, instruction, \
-                        "Slicing error %s%s." % (identifier, str(fullSubscripts)))
-                    return None
-                if unravel:
-                    onto = []
-                    flatten(value, onto)
-                    computationStack.extend(reversed(onto))
-                else:
-                    computationStack.append(value)
-            elif fetchp:
-                computationStack.append( [si, identifier, 'p'] )
-            else: # store
-                if len(computationStack) < stackPos:
-                    printError(PALMAT, source, instruction, \
-                               "Implementation error, stack too short for " +
-                               "STOREXXX instruction")
-                    return None
-                value = copy.deepcopy(computationStack[-stackPos])
-                if pop:
-                    computationStack.pop(-stackPos)
-                if "constant" in attributes:
-                    printError(PALMAT, source, instruction, \
-                               "Cannot change value of constant %s." \
-                               % identifier[1:-1])
-                    return None
-                if True:
-                    if "array" in attributes and "parameter" in attributes \
-                            and len(attributes["array"]) == 1 and \
-                            isArrayQuick(value) and \
-                            len(getArrayDimensions(value)[0]) == 1 and \
-                            (attributes["array"][0] == "*" \
-                             or "flex" in attributes):
-                        attributes["value"] = value
-                        attributes["array"], dummy = getArrayDimensions(value)
-                        attributes["flex"] = True
-                    # This is my new, possibly-improved method.
-                    elif not saveValueToVariable(PALMAT, source, value, \
-                                               identifier[1:-1], \
-                                               attributes, \
-                                               lhsSubscriptList):
-                        return None
-                else:
-                    # This my original, incomplete, imperfect method.
-                    # Apply conversions to the data as necessary, if the datatype
-                    # found on the computation stack was not precisely what the
-                    # variable being assigned expects.
-                    dimensions = []
-                    if value == None:
-                        pass
-                    elif isinstance(value, str):
-                        if "character" not in attributes:
-                            printError(PALMAT, source, instruction, \
-                                       "Cannot store string in non-CHARACTER " +
-                                       "variable %s." % identifier[1:-1])
-                            return None
-                        maxlen = attributes["character"]
-                        value = value[:maxlen]
-                    elif isinstance(value, (float, int)):
-                        if "integer" in attributes:
-                            value = hround(value)
-                        elif "scalar" in attributes or \
-                                ("vector" in attributes and len(lhsSubscriptList) == 1) or \
-                                ("matrix" in attributes and len(lhsSubscriptList) == 2):
-                            value = float(value)
-                        elif "bit" in attributes:
-                            value = hround(value) & ((1 << attributes["bit"])-1)
-                        elif "character" in attributes:
-                            # TBD
-                            printError(PALMAT, source, instruction, \
-                                "Storing number in CHARACTER not yet implemented.")
-                            value = "?"
-                    elif isBitArray(value) and "bit" in attributes:
-                        value = formBitArray(parseBitArray(value)[0], \
-                                             attributes["bit"])
-                    elif isVector(value, False) and "vector" in attributes \
-                            and not lhsSubscripts:
-                        numRows = len(value)
-                        dimensions = [numRows]
-                        if numRows != attributes["vector"]:
-                            printError(PALMAT, source, instruction, \
-                                    "Vector length mismatch in store operation: " \
-                                    + identifier[1:-1])
-                            return None
-                    elif isMatrix(value, False) and "matrix" in attributes \
-                            and not lhsSubscripts:
-                        dimensions = [len(value), len(value[0])]
-                        if dimensions != attributes["matrix"]:
-                            printError(PALMAT, source, instruction, \
-                                "Matrix geometry mismatch in store operation: " + \
-                                identifier[1:-1])
-                            return None
-                    elif "array" in attributes:
-                        dimensions = attributes["array"]
-                        if not lhsSubscripts and \
-                                not isArrayGeometry(value, dimensions):
-                            printError(PALMAT, source, instruction, \
-                                    "Array geometry wrong in store operation: " \
-                                    + identifier[1:-1])
-                            return None
-                    else:
-                        printError(PALMAT, source, instructions, \
-                                   "Mismatched datatypes in instruction: %s vs %s" \
-                                   % (str(instruction), str(value)))
-                        return None
-                    if lhsSubscriptList == []:
-                        if "bit" in attributes and not isBitArray(value):
-                            value = formBitArray(value, attributes["bit"])
-                        elif "character" in attributes and \
-                                "array" not in attributes and \
-                                "vector" not in attributes and \
-                                "matrix" not in attributes:
-                            value = str(value)[:attributes["character"]]
-                        attributes["value"] = value
-                    else:
-                        if "array" in attributes:
-                            sdimensions = attributes["array"]
-                        elif "vector" in attributes:
-                            sdimensions = [attributes["vector"]]
-                        elif "matrix" in attributes:
-                            sdimensions = attributes["matrix"]
-                        else:
-                            sdimensions = []
-                        if dimensions != sdimensions[len(lhsSubscriptList):]:
-                            printError(PALMAT, source, instruction, \
-                                       "Dimensionality mismatch in assignment.")
-                            return None
-                        if len(lhsSubscriptList) != len(sdimensions):
-                            printError(PALMAT, source, instruction, \
-                                    "Dimensionality of value and variable differ.")
-                            return None
-                        for i in range(len(dimensions)):
-                            if lhsSubscriptList[i] < 1 or \
-                                    lhsSubscriptList[i] > dimensions[i]:
-                                printError(PALMAT, source, instruction, \
-                                           "Subscript out of range in assignment")
-                                return None
-                        # Recall that in python, the following manipulations of 
-                        # "row" operate on pointers.  So the final "row" we end up 
-                        # with is actually a pointer to a stored row existing 
-                        # already in the VECTOR, MATRIX, or ARRAY variable.
-                        # Recall also that HAL/S indexes from 1 while Python indexes
-                        # from 0.  Recall finally that even uninitialized composite
-                        # data in our HAL/S scopes have the proper dimensionality,
-                        # but with unused elements set to None, so the sought row
-                        # does actually exist.
-                        row = attributes["value"]
-                        for i in range(len(dimensions)-1):
-                            row = row[lhsSubscriptList[i]-1]
-                        row[lhsSubscriptList[-1]-1] = value
-            if not erroredUp:
-                printError(PALMAT, source, instruction, \
-                    "Identifier (%s) not in any accessible scope" \
-                    % identifier[1:-1])
-                return None
-        elif "pop" in instruction:
-            value = instruction["pop"]
-            if value <= stackSize:
-                while value > 0:
-                    computationStack.pop()
-                    value -= 1
-            else:
-                printError(PALMAT, source, instruction, \
-                    "Implementation error, too many POPs: %d vs %d" \
-                    % (value, stackSize))
-                return None
-        elif "read" in instruction:
-            lun = instruction["read"]
-            if lun == '5':
-                # If this instruction is within a subroutine, then we can 
-                # only regress in the computation stack until finding the 
-                # return address, because we want to use that later (for 
-                # returning!) rather than using it now for printing.
-                start = 0
-                for i in range(len(computationStack)-1, -1, -1):
-                    entry = computationStack[i]
-                    if isinstance(entry, list) and len(entry) == 3 and \
-                            isinstance(entry[0], int) and \
-                            isinstance(entry[1], str) and \
-                            entry[2] == 'p':
-                        continue
-                    start = i + 1
-                    break
-                if start < len(computationStack):
-                    semicolon = False
-                    for value in computationStack[start:]:
-                        if semicolon:
-                            break
-                        # In reality, we could have subscripted VECTOR, MATRIX,
-                        # or ARRAY variables here. For now, I'm just ignoring 
-                        # that possibility and implementing unsubscripted
-                        # variables.
-                        # Recall that "pointers" to variables, which is what
-                        # should be on the computation stack at this point,
-                        # are of the form [index, identifier, 'p'].
-                        si = value[0]
-                        identifier = value[1]
-                        attributes = \
-                            PALMAT["scopes"][si]["identifiers"][identifier]
-                        if "vector" in attributes:
-                            rowLength = attributes["vector"]
-                            for i in range(rowLength):
-                                value = readItemLUN5(PALMAT, source)
-                                if value == ";":
-                                    semicolon = True
-                                    break
-                                if value == "":
-                                    continue
-                                attributes["value"][i] = float(value)
-                        elif "matrix" in attributes:
-                            numRows, numCols = attributes["matrix"]
-                            for i in range(numRows):
-                                if semicolon:
-                                    break
-                                for j in range(numCols):
-                                    value = readItemLUN5(source)
-                                    if value == ";":
-                                        semicolon = True
-                                        break
-                                    if value == "":
-                                        continue
-                                    attributes["value"][i][j] = float(value)
-                        elif "integer" in attributes:
-                            value = readItemLUN5(source)
-                            if value == ";":
-                                semicolon = True
-                            elif value == "":
-                                attributes["value"] == None
-                            else:
-                                attributes["value"] = int(value)
-                        elif "scalar" in attributes:
-                            value = readItemLUN5(source)
-                            if value == ";":
-                                semicolon = True
-                            elif value == "":
-                                attributes["value"] == None
-                            else:
-                                attributes["value"] = float(value)
-                        elif "bit" in attributes:
-                            value = readItemLUN5(PALMAT, source)
-                            bitLength = attributes["bit"]
-                            if value == ";":
-                                semicolon = True
-                            elif value == "":
-                                attributes["value"] == [(None, bitLength)]
-                            else:
-                                value = int(value) & ((1 << bitLength) - 1)
-                                attributes["value"] = [(value, bitLength)]
-                while len(computationStack) > start:
-                    computationStack.pop()
-        elif "write" in instruction:
-            lun = instruction["write"]
-            if lun == '6':
-                print("%*s" % (indent, ""), end="")
-                for value in computationStack:
-                    if value == None:
-                        print(" None ", end="")
-                    elif isArrayQuick(value):
-                        printArray(value)
-                    elif isBitArray(value):
-                        print(" " + bin(parseBitArray(value)[0])[2:], end="")
-                    elif isinstance(value, (int, float, list)):
-                        printVectorOrMatrix(value)
-                    elif isinstance(value, str):
-                        print(value.replace("''", "'"), end="")
-                    else:
-                        print(value, end="")
-                computationStack.clear()
-                print()
-        elif "iocontrol" in instruction:
-            # We just ignore all i/o controls in WRITE for now.
-            if len(computationStack) > 0:
-                computationStack.pop()
-        elif "shaping" in instruction:
-            shapingFunction = instruction["shaping"]
-            if shapingFunction == "sliceAT":
-                sliceLength = hround(computationStack.pop())
-                sliceStart = hround(computationStack[-1])
-                computationStack[-1] = [sliceLength, sliceStart]
-            elif shapingFunction == "sliceTO":
-                sliceStart = hround(computationStack.pop())
-                sliceEnd = hround(computationStack[-1])
-                computationStack[-1] = (sliceStart, sliceEnd)
-            elif shapingFunction in ["integer", "scalar", "vector", "matrix",
-                                   "doubleinteger", "doublescalar",
-                                   "doublevector", "doublematrix"]:
-                dimensions = subscripts + subscripts2
-                if len(dimensions) == 0:
-                    if shapingFunction in ["vector", "doublevector"]:
-                        dimensions.append(3)
-                    elif shapingFunction in ["matrix", "doublematrix"]:
-                        dimensions.append(3)
-                        dimensions.append(3)
-                # We now have the dimensionality, so let's create a Python
-                # object to hold the data.  If the dimension list is empty,
-                # there are a number of special cases (presumably originally
-                # intended as convenience features for the code) that we need
-                # to consider.
-                if len(dimensions) == 0:
-                        # The shaping function has no subscripts, and the 
-                        # shaping function is integer or scalar, single or 
-                        # double precision, though in this Python implementation
-                        # single and double precision are treated as identical.
-                        object = []
-                        operand = computationStack.pop()
-                        if computationStack[-1] == {"sentinel"}:
-                            # If we're here, it's because there's a single
-                            # argument to the shaping function, currently 
-                            # stored in operand.
-                            computationStack[-1] = \
-                                toIntegerOrScalar(operand, \
-                                                  shapingFunction in \
-                                                  ["integer", "doubleinteger"])
-                        else:
-                            # If we're here, then there are multiple arguments
-                            # to the shaping functions, none of which we've yet
-                            # pulled from the stack and we're supposed to 
-                            # produce a variable-length ARRAY by unraveling all
-                            # of the arguments.
-                            fill = False # TBD ... *do* something with fill!
-                            while operand != {"sentinel"}:
-                                if operand == {"fill"}:
-                                    fill = True
-                                    operand = computationStack.pop()
-                                    continue
-                                flatten(operand, object)
-                                operand = computationStack.pop()
-                            if shapingFunction in ["integer", "doubleinteger"]:
-                                for i in range(len(object)):
-                                    if object[i] != None:
-                                        object[i] = int(object[i])
-                            elif shapingFunction in ["scalar", "doublescalar"]:
-                                for i in range(len(object)):
-                                    if object[i] != None:
-                                        object[i] = float(object[i])
-                            computationStack.append(object + ["a"])
-                        continue
-                '''
-                So if we've gotten to here, then the object we're trying to
-                construct has dimensionality; i.e., it's one of VECTOR, 
-                MATRIX, ARRAY INTEGER|SCALAR, ARRAY VECTOR, or ARRAY MATRIX.  
-                The function assignCompositeSubscripted()
-                in the module saveValueToVariable is ideal for initializing
-                such an object starting from an unraveled set of data, except
-                for the fact that it requires an object of the correct 
-                dimensionality but with uninitialized elements as input.
-                Fortunately, the function uninitializedComposite() in the 
-                palmatAux module can be used to construct the uninitialized
-                object.
-                '''
-                if shapingFunction in ["vector", "doublevector",
-                                       "matrix", "doublematrix"]:
-                    datatype = "scalar"
-                    subscripts2 = dimensions
-                    subscripts = []
-                elif shapingFunction in ["integer", "doubleinteger"]:
-                    datatype = "integer"
-                elif shapingFunction in ["scalar", "doublescalar"]:
-                    datatype = "scalar"
-                else:
-                    printError(PALMAT, source, instruction, \
-                               "Unimplemented shaping function.")
-                    return None
-                composite = uninitializedComposite(subscripts, subscripts2)
-                unraveled = []
-                while True:
-                    value = computationStack.pop()
-                    if value == {'sentinel'}:
-                        break
-                    flatten(value, unraveled)
-                subscriptedLHS = []
-                for i in subscripts + subscripts2:
-                    subscriptedLHS.append(list(range(1, i + 1)))
-                if not assignCompositeSubscripted(None, composite, \
-                                                  subscriptedLHS, \
-                               datatype, -1, unraveled):
-                    printError(PALMAT, source, instruction, \
-                               "Cannot convert or too few values")
-                    return None
-                computationStack.append(composite)
-                continue
-            else:
-                printError(PALMAT, source, instruction, \
-                    "Implementation error, unknown shaping function: " + \
-                    shapingFunction)
-                return None
-        elif "modern" in instruction:
-            # These are like RTL built-in functions, but are invented by me for
-            # the "modern" compiler/interpreter.  They do things to make 
-            # debugging the compiler or performing validation testing on it
-            # easier.  Note that in distinction to real RTL built-in functions,
-            # in HAL/S their names are always lower-case, so they hopefully 
-            # won't collide with any actual HAL/S code.  We'll see eventually,
-            # I suppose.
-            modern = instruction["modern"]
-            if modern == "INITIALIZED":
-                if stackSize < 1:
-                    printError(PALMAT, source, instruction, \
-                            "Not enough arguments on stack.")
-                    return None
-                if isCompletelyInitialized(computationStack[-1]):
-                    computationStack[-1] = hTRUE
-                else:
-                    computationStack[-1] = hFALSE
-            elif modern == "TYPEOF":
-                if stackSize < 1:
-                    printError(PALMAT, source, instruction, \
-                               "Not enough arguments on stack.")
-                    return None
-                operand = computationStack[-1]
-                if not isinstance(operand, str):
-                    printError(PALMAT, source, instruction, \
-                               "Argument must be a string.")
-                    return None
-                result = [""]*20
-                i, mangled = flexFindIdentifier(operand, PALMAT, scopeNumber)
-                if i == -1:
-                    a = None
-                else:
-                    i, a = findIdentifier(mangled, PALMAT, i)
-                if a == None:
-                    a = {}
-                    result[0] = "MISSING"
-                elif "bit" in a:
-                    result[0] = "BIT"
-                    result[1] = str(a["bit"])
-                elif "character" in a:
-                    result[0] = "CHARACTER"
-                    result[1] = str(a["character"])
-                elif "vector" in a:
-                    result[0] = "VECTOR"
-                    result[1] = str(a["vector"])
-                elif "matrix" in a:
-                    result[0] = "MATRIX"
-                    result[1] = str(a["matrix"][0])
-                    result[2] = str(a["matrix"][1])
-                elif "scalar" in a:
-                    result[0] = "SCALAR"
-                elif "integer" in a:
-                    result[0] = "INTEGER"
-                elif "structure" in a:
-                    result[0] = "STRUCTURE"
-                elif "label" in a:
-                    result[0] = "LABEL"
-                else:
-                    result[0] = "?"
-                if "constant" in a:
-                    if result[0] == "BIT":
-                        value, length = parseBitArray(a["constant"])
-                        result[3] = "%d, %d" % (value, length)
-                    elif result[0] in ["VECTOR", "MATRIX"]:
-                        result[3] = str(a["constant"])
-                        result[3] = presentify(a['constant'])
-                    else:
-                        result[3] = str(a["constant"])
-                if "initial" in a:
-                    if result[0] == "BIT":
-                        value, length = parseBitArray(a["initial"])
-                        result[4] = "%d, %d" % (value, length)
-                    elif result[0] in ["VECTOR", "MATRIX"]:
-                        result[4] = str(a["initial"])
-                        result[4] = presentify(a['initial'])
-                    else:
-                        result[4] = str(a["initial"])
-                if "double" in a:
-                    result[5] = "DOUBLE"
-                if "array" in a:
-                    dimensions = a["array"]
-                    i = 15
-                    for d in dimensions:
-                        if i > 20:
-                            break
-                        result[i] = str(d)
-                        i += 1
-                computationStack[-1] = result + ["a"]
-            elif modern == "TYPEOFV":
-                # Same as TYPEOF, except analyzes the value atop the 
-                # computation stack, rather than an identifier.
-                if stackSize < 1:
-                    printError(PALMAT, source, instruction, \
-                               "Not enough arguments on stack")
-                    return None
-                operand = computationStack[-1]
-                result = [""]*20
-                if isinstance(operand, list) and len(operand) == 3 and \
-                        operand[-1] == 'p':
-                    result[0] = "POINTER"
-                elif isinstance(operand, list) and operand[-1:] == ['a']:
-                    dummy = operand
-                    dimensions = []
-                    while isinstance(dummy, list) and dummy[-1:] == ['a']:
-                        dimensions.append(len(dummy)-1)
-                        dummy = dummy[0]
-                    if isArrayGeometry(operand, dimensions):
-                        i = 15
-                        for d in dimensions:
-                            result[i] = str(d)
-                            i += 1
-                            if i > 20:
-                                break
-                        operand = dummy
-                    else:
-                        result[0] = "?"
-                if operand == None:
-                    result[0] = "NONE"
-                elif isinstance(operand, int):
-                    result[0] = "INTEGER"
-                elif isinstance(operand, float):
-                    result[0] = "SCALAR"
-                elif isinstance(operand, str):
-                    result[0] = "CHARACTER"
-                    result[1] = str(len(operand))
-                elif isBitArray(operand):
-                    result[0] = "BIT"
-                    dummy, result[1] = parseBitArray(operand)
-                elif isVector(operand, False):
-                    result[0] = "VECTOR"
-                    result[1] = str(len(operand))
-                elif isMatrix(operand, False):
-                    result[0] = "MATRIX"
-                    result[1] = str(len(operand))
-                    result[2] = str(len(operand[0]))
-                elif isinstance(operand, dict):
-                    result[0] = "STRUCTURE"
-                elif operand == {"sentinel"}:
-                    result[0] = "SENTINEL"
-                elif operand == {"fill"}:
-                    result[0] = "*"
-                elif result[0] == "":
-                    result[0] = "?"
-                computationStack[-1] = result + ["a"]
-        elif "function" in instruction:
-            function = instruction["function"]
-            # First check all of the no-argument functions.
-            if function in builtIns[0]:
-                if function == "RANDOM":
-                    # Note that this returns a number in the range [0, 1),
-                    # and therefore cannot return exactly 1.  The HAL/S
-                    # documentation isn't entirely clear whether values
-                    # that are *exactly* 0 or 1 should be returned.
-                    computationStack.append(random.random())
-                elif function == "RANDOMG":
-                    computationStack.append(random.gauss(0.0, 1.0))
-                elif function == "RUNTIME":
-                    computationStack.append(1.0e-9 * \
-                                            (time.time_ns() - timeOrigin))
-                elif function == "CLOCKTIME":
-                    rightNow = datetime.datetime.now(datetime.timezone.utc)
-                    timeOfDay = 3600 * rightNow.hour + \
-                                60 * rightNow.minute + rightNow.second + \
-                                rightNow.microsecond * 1E-6
-                    computationStack.append(timeOfDay)
-                elif function == "DATE":
-                    rightNow = datetime.datetime.now(datetime.timezone.utc)
-                    d = 10000 * rightNow.year + 100 * rightNow.month + \
-                        rightNow.day
-                    computationStack.append(d)
-                elif function == "ERRGRP":
-                    computationStack.append(errorGroup)
-                elif function == "ERRNUM":
-                    computationStack.append(errorNum)
-                else:
-                    printError(PALMAT, source, instruction, \
-                            "HAL/S built-in function " + function + \
-                            " not yet implemented")
-                    return None
-            # Now all of the one-argument functions.
-            elif function in builtIns[1]:
-                if stackSize < 1:
-                    printError(PALMAT, source, instruction, \
-                        "Not enough arguments on stack for function " + \
-                        function)
-                    return None
-                operand = computationStack[-1]
-                if function in unaryRTL: # See unaryFunctions.py module.
-                    result = arrayableUnaryRTL(PALMAT, function, \
-                                               operand, \
-                                               source, instruction)
-                    if isNaN(result):
-                        return None
-                    computationStack[-1] = result
-                elif function in accumulableFunctions: # See accumulableFunctions.py
-                    result = accumulate(PALMAT, operand, function, source, \
-                                        instruction)
-                    if isNaN(result):
-                        return None
-                    computationStack[-1] = result
-                elif function == "SIZE":
-                    if isArrayQuick(operand):
-                        dimensions, value = getArrayDimensions(operand)
-                        if len(dimensions) == 1:
-                            computationStack[-1] = dimensions[0]
-                        else:
-                            printError(PALMAT, source, instruction, \
-                                "Array for SIZE must be one-dimensional.")
-                            return None
-                    else:
-                        printError(PALMAT, source, instruction, \
-                                   "SIZE function requires an array")
-                        return None
-                elif function == "LENGTH":
-                    operand = str(operand)
-                    computationStack[-1] = len(operand)
-                elif function == "TRIM":
-                    operand = str(operand)
-                    computationStack[-1] = operand.strip()
-                else:
-                    printError(PALMAT, source, instruction, \
-                               "HAL/S built-in function " + function + \
-                               "not yet implemented")
-                    return None
-            # Now all of the two-argument functions.
-            elif function in builtIns[2]:
-                if stackSize < 2:
-                    printError(PALMAT, source, instruction, \
-                               "Not enough arguments on stack for function " + \
-                               function)
-                    return None
-                operand1 = computationStack.pop()
-                operand2 = computationStack[-1]
-                if function in binaryRTL:
-                    result = arrayableBinaryRTL(PALMAT, function, operand1, \
-                                                operand2, \
-                                                source, instruction)
-                    if isNaN(result):
-                        return None
-                    computationStack[-1] = result
-                elif function == "XOR":
-                    if not isBitArray(operand1):
-                        printError(PALMAT, source, instruction, \
-                                   "Not bit array: " + str(operand1))
-                        return None
-                    if not isBitArray(operand2):
-                        printError(PALMAT, source, instruction, \
-                                   "Not bit array: " + str(operand2))
-                        return None
-                    value1, length1 = parseBitArray(operand1)
-                    value2, length2 = parseBitArray(operand2)
-                    numbits = max(length1, length2)
-                    computationStack[-1] = formBitArray(value1^value2, numbits)
-                elif function == "SHL":
-                    operand1 = hround(operand1)
-                    operand2 = hround(operand2)
-                    computationStack[-1] = operand1 << operand2
-                elif function == "SHR":
-                    operand1 = hround(operand1)
-                    operand2 = hround(operand2)
-                    computationStack[-1] = operand1 >> operand2
-                elif function == "INDEX":
-                    # In Python, the character positions within the string are
-                    # indexed from 0 (with -1 being "not present"), while in 
-                    # HAL/S indexing is from 1 (with 0 being "not present").
-                    operand1 = str(operand1)
-                    operand2 = str(operand2)
-                    computationStack[-1] = 1 + operand1.find(operand2)
-                elif function == "LJUST":
-                    operand1 = str(operand1)
-                    operand2 = hround(operand2)
-                    if operand2 < len(operand1):
-                        computationStack[-1] = operand1[:operand2]
-                        # This is also supposed to signal an error, which
-                        # I have no idea about right now, so I'll have to come
-                        # back to it later.
-                        # TBD
-                    else:
-                        computationStack[-1] = "%*s" % (-operand2, operand1)
-                elif function == "RJUST":
-                    operand1 = str(operand1)
-                    operand2 = hround(operand2)
-                    if operand2 < len(operand1):
-                        computationStack[-1] = operand1[:operand2]
-                        # This is also supposed to signal an error, which
-                        # I have no idea about right now, so I'll have to come
-                        # back to it later.
-                        # TBD
-                    else:
-                        computationStack[-1] = "%*s" % (operand2, operand1)
-                else:
-                    printError(PALMAT, source, instruction, \
-                               "HAL/S built-in function " + function + \
-                               " not yet implemented")
-                    return None
-            # Now all of the three-argument functions.
-            elif function in builtIns[3]:
-                if stackSize < 3:
-                    printError(PALMAT, source, instruction, \
-                               "Not enough arguments on stack for function " \
-                               + function)
-                    return None
-                operand1 = computationStack.pop()
-                operand2 = computationStack.pop()
-                operand3 = computationStack[-1]
-                if function == "MIDVAL":
-                    result = trinaryOperation(PALMAT, simpleMIDVAL, operand1, \
-                                              operand2, operand3)
-                    if isNaN(result):
-                        printError(PALMAT, source, instruction, \
-                                   "Incompatible operands for MIDVAL function")
-                        return None
-                    computationStack[-1] = result
-                else:
-                    printError(PALMAT, source, instruction, \
-                               "HAL/S built-in function " + function \
-                               + "not yet implemented")
-                    return None
-            else:
-                printError(PALMAT, source, instruction, \
-                           "Implementation error, function " + function)
-                return None
-        elif "goto" in instruction:
-            scopeNumber, instructionIndex = \
-                    jump(PALMAT, source, scopeNumber, instruction, "goto")
-            scope = scopes[scopeNumber]
-        elif "calloffset" in instruction:
-            identifier = instruction["calloffset"]
-            if identifier not in identifiers:
-                printError(PALMAT, source, instruction, \
-                           "Implementation error, identifier %s not found" \
-                           % identifier)
-                return None
-            scope["returnoffset"] = instructionIndex;
-            instructionIndex = identifiers[identifier]["label"][1]
-        elif "returnoffset" in instruction:
-            i = instruction["returnoffset"]
-            if i == -1:
-                i = scopeNumber
-                while i != None and "returnoffset" not in scopes[i]:
-                    i = scopes[i]["parent"]
-                if i == None:
-                    printError(PALMAT, source, instruction, \
-                               "Implementation error, cannot find returnoffset.")
-                    return None
-            scope = scopes[i]
-            if "returnoffset" in scope:
-                instructionIndex = scope.pop("returnoffset")
-                scopeNumber = i
-            else:
-                printError(PALMAT, source, instruction, \
-                           "Implementation error, returnoffset not in scope.")
-                for key in sorted(scope):
-                    print("\t%s:" % key, scope[key])
-                return None
-        elif "case" in instruction:
-            if len(computationStack) < 1:
-                printError(PALMAT, source, instruction, \
-                           "Computation stack too short in CASE.")
-                return None
-            prefix = instruction["case"]
-            caseNumber = computationStack.pop()
-            if isinstance(caseNumber, float):
-                caseNumber = hround(caseNumber)
-            if not isinstance(caseNumber, int):
-                printError(PALMAT, source, instruction, "Non-numeric CASE key.")
-                return None
-            if caseNumber >= 1:
-                identifier = "^%s%d^" % (prefix, caseNumber)
-                if identifier not in identifiers:
-                    identifier = "^" + prefix + "else^"
-            else:
-                identifier = "^" + prefix + "else^"
-            if identifier not in identifiers:
-                identifier = "^" + prefix + "exit^"
-            if identifier not in identifiers:
-                printError(PALMAT, source, instruction, \
-                    "Implementation error, no accessible labels in CASE")
-                return None
-            instructionIndex = identifiers[identifier]["label"][1]
-        elif "iffalse" in instruction:
-            value, dummy = parseBitArray(computationStack.pop())
-            if (value & 1) == 0:
-                scopeNumber, instructionIndex = \
-                    jump(PALMAT, source, scopeNumber, instruction, "iffalse")
-                scope = scopes[scopeNumber]
-        elif "iftrue" in instruction:
-            value, dummy = parseBitArray(computationStack.pop())
-            if (value & 1) != 0:
-                scopeNumber, instructionIndex = \
-                    jump(PALMAT, source, scopeNumber, instruction, "iftrue")
-                scope = scopes[scopeNumber]
-        elif "noop" in instruction:
-            pass # Nothing to do!
-        elif "run" in instruction:
-            si, identifier = instruction["run"]
-            identifier = "^" + identifier + "^"
-            attributes = PALMAT["scopes"][si]["identifiers"][identifier]
-            if attributes == None:
-                printError(PALMAT, source, instruction, \
-                           "Target of RUN not found: " + identifier)
-                return None
-            if "program" not in attributes:
-                printError(PALMAT, source, instruction, \
-                           "RUN target is not a PROGRAM: " + identifier)
-                return None
-            scopeNumber = attributes["scope"]
-            instructionIndex = 0;
-            scope = scopes[scopeNumber]
-        elif "call" in instruction:
-            si, identifier = instruction["call"]
-            identifier = "^" + identifier + "^"
-            attributes = PALMAT["scopes"][si]["identifiers"][identifier]
-            if attributes == None:
-                printError(PALMAT, source, instruction, \
-                           "Target of CALL not found: " + identifier)
-                return None
-            if "function" not in attributes and "procedure" not in attributes:
-                printError(PALMAT, source, instruction, \
-                           "CALL to neither a FUNCTION nor PROCEDURE: " \
-                           + identifier)
-                return None
-            si = attributes["scope"]
-            s = scopes[si]
-            if "return" in s:
-                printError(PALMAT, source, identifier, \
-                           "Recursion in subroutine %s not allowed." \
-                           % identifier[1:-1])
-                return None
-            # The return address.
-            returnAddress = (scopeNumber, instructionIndex)
-            #computationStack.append((scopeNumber, instructionIndex))
-            # Transfer control.
-            scopeNumber = si
-            instructionIndex = 0
-            scope = s
-            if "assignments" in instruction:
-                scope["assignments"] = copy.deepcopy(instruction["assignments"])
-            scope["return"] = returnAddress
-        elif "return" in instruction:
-            enclosure = scope
-            while enclosure != None:
-                if "return" in enclosure:
-                    scopeNumber, instructionIndex = enclosure["return"]
-                    enclosure.pop("return")
-                    if "assignments" in enclosure:
-                        enclosure.pop("assignments")
-                    break
-                enclosure = PALMAT["scopes"][enclosure["parent"]]
-            if enclosure == None:
-                printError(PALMAT, source, instruction, \
-                           "Implementation error, no return address")
-                return None
-            #scopeNumber, instructionIndex = computationStack.pop(-stackPos)
-            scope = scopes[scopeNumber]
-        elif "halt" in instruction:
-            # Ends emulation.
-            printError(PALMAT, source, None, "Normal program termination")
-            return None
-        elif "automatics" in instruction:
-            for identifier in identifiers:
-                attributes = identifiers[identifier]
-                if "initial" in attributes and "automatic" in attributes:
-                    attributes["value"] = copy.deepcopy(attributes["initial"])
-        elif "partition" in instruction:
-            computationStack.append({"semicolon"})
-        else:
-            printError(PALMAT, source, instruction, \
-                       "Implementation error, unknown PALMAT: " + instruction)
-            return None
-    if trace:
-        print("\tTRACE:  ", computationStack, \
-              " (%d,%d):" % (scopeNumber, instructionIndex), "(end)")
-    return computationStack
+            return emulateTraced(vm, pcScope, pcOffset)
+        if profile != None:
+            return emulateProfiled(vm, pcScope, pcOffset, profile)
+        if ring != None:
+            return emulateRinged(vm, pcScope, pcOffset, ring)
+        if "translated" in PALMAT:
+            return emulateTranslated(vm, pcScope, pcOffset)
+        return emulate(vm, pcScope, pcOffset)
+    finally:
+        flushChannels()
@@ -87,6 +87,12 @@ def expressionSM(stage, ast, PALMAT, state, trace, depth, \
             else:
                 appendInstruction(expression, { "string": sp[1:-1] }, source)
             internalState = "normal"
+        elif internalState == "waitLabel":
+            # The name of a TASK or PROGRAM, as the argument of NEXTIME.
+            si, attributes = \
+                    findIdentifier(lbnfLabel, PALMAT, state["scopeIndex"])
+            appendInstruction(expression, { "process": (si, sp) }, source)
+            internalState = "normal"
         elif internalState == "waitFunctionName":
             si, attributes = \
                     findIdentifier(lbnfLabel, PALMAT, state["scopeIndex"])
@@ -127,6 +133,10 @@ def expressionSM(stage, ast, PALMAT, state, trace, depth, \
             # temporaryInstructions properly.
             instruction = expression.pop()
             appendInstruction(temporaryInstructions, instruction, source)
+            if "function" in instruction and \
+                    instruction["function"] in ["PRIO", "NEXTIME"]:
+                # Only the process scheduler implements these.
+                PALMAT["realTime"] = True
             if compileTimeComputable:
                 if "fetchp" in instruction:
                     compileTimeComputable = False
@@ -147,7 +157,7 @@ def expressionSM(stage, ast, PALMAT, state, trace, depth, \
                 elif "function" in instruction and \
                         instruction["function"] in \
                             ["RANDOM", "RANDOMG", "DATE", "RUNTIME", 
-                             "CLOCKTIME"]:
+                             "CLOCKTIME", "PRIO", "NEXTIME"]:
                     compileTimeComputable = False
                 elif "call" in instruction:
                     compileTimeComputable = False
@@ -187,6 +197,8 @@ def expressionSM(stage, ast, PALMAT, state, trace, depth, \
                 "type"          : "compiler"
             }
             temporaryPALMAT = { "scopes": [temporaryScope] }
+            if "sourceFiles" in PALMAT:
+                temporaryPALMAT["sourceFiles"] = PALMAT["sourceFiles"]
             computationStack = \
                 executePALMAT(temporaryPALMAT, 0, 0, False, traceCompileTime, 8)
             if computationStack == None:
@@ -214,7 +226,7 @@ def expressionSM(stage, ast, PALMAT, state, trace, depth, \
                                       {"string": value }, source)
                 elif isArrayQuick(value):
                     appendInstruction(temporaryInstructions, \
-                                      {"array": value }, source)               
+                                      {"array": value.toNested() }, source)               
                 elif isinstance(value, list) and len(value) > 0:
                     if isinstance(value[0], list):
                         appendInstruction(temporaryInstructions, \
@@ -278,8 +290,10 @@ def expressionSM(stage, ast, PALMAT, state, trace, depth, \
         elif lbnfLabel[:9] == "ioControl":
             appendInstruction(expression, { "iocontrol": lbnfLabel[9:].upper()},\
                                source)
-        elif lbnfLabel in ["identifier", "char_id", "bit_id"]:
+        elif lbnfLabel in ["identifier", "char_id", "bit_id", "event"]:
             internalState = "waitIdentifier"
+        elif lbnfLabel == "label":
+            internalState = "waitLabel"
         elif lbnfLabel in ["level", "number", "compound_number", 
                            "simple_number"]:
             internalState = "waitNumber"
@@ -20,6 +20,7 @@ from expressionSM import expressionSM
 from doForSM import doForSM
 from p_Functions import expressionComponents, doForComponents
 from saveValueToVariable import convertSimpleAttributes
+from compileCache import isCacheableBlock, generateBlock
 
 def traceIt(state, endLabels, lbnfLabel, beforeAfter="before", trace=True, depth=0):
     if not trace:
@@ -117,10 +118,11 @@ def embiggenArrayList(arrayList, attributes):
     return True
 
 # "Inflates" an unraveled list of data values into a properly-dimensioned
-# array, in-place. It is known prior to entry that the number of values and 
-# their datatypes are correct, so no error checking or conversion is done.  This 
-# function is *not* recursive.  It works from the bottom up rather than the 
-# topp down.
+# array, which is returned. It is known prior to entry that the number of 
+# values and their datatypes are correct, so no error checking or conversion 
+# is done.  This function is *not* recursive.  The VECTOR or MATRIX elements 
+# (if any) are built in-place from the bottom up rather than the topp down, 
+# after which the list of elements is simply the buffer of the ARRAY.
 def inflateArray(arrayList, attributes):
     dimensions = []
     if "vector" in attributes:
@@ -132,12 +134,7 @@ def inflateArray(arrayList, attributes):
         for i in range(numElements // width):
             vector = arrayList[i:i+width]
             arrayList[i:i+width] = [vector]
-    for width in reversed(attributes["array"][1:]):
-        numElements = len(arrayList)
-        for i in range(numElements // width):
-            vector = arrayList[i:i+width] + ["a"]
-            arrayList[i:i+width] = [vector]
-    arrayList.append("a")
+    return HalArray(attributes["array"], arrayList)
 
 '''
 # This is a recursive function used for fixing CALL instructions targeting
@@ -211,6 +208,57 @@ labels encountered.  I call this list the "history".  The entry state in
 which no statement is yet being processed is state={ "history" : [] }.
 '''
 
+# Returns a list of all of the identifiers (i.e., strings of the form ^...^)
+# in an AST, in order.
+def astIdentifiers(ast):
+    identifiers = []
+    if isinstance(ast, str):
+        if ast[:1] == "^":
+            identifiers.append(ast)
+    else:
+        for component in ast["components"]:
+            identifiers += astIdentifiers(component)
+    return identifiers
+
+# For the TASK or EVENT named by the first identifier in an AST (or by an
+# identifier itself), returns the (scope, name) operand of a real-time 
+# PALMAT instruction, or None (with a message) if there is no such TASK or 
+# EVENT.
+def realTimeReference(PALMAT, ast, scopeIndex, kind):
+    if isinstance(ast, str):
+        identifier = ast
+    else:
+        identifier = astIdentifiers(ast)[0]
+    si, attributes = findIdentifier(identifier, PALMAT, scopeIndex)
+    if attributes == None or kind not in attributes:
+        print("\t%s %s not found." % (kind.upper(), identifier[3:-1]))
+        return None
+    return (si, identifier[1:-1])
+
+# Lists of statements (of a compilation unit, of a block, or of a DO ... END
+# group) are left-recursive in the grammar, so the AST of a list of N
+# statements is a chain of N nested list components, each of whose first
+# component is the rest of the list.  Code generation for the list components
+# themselves does nothing other than to process their components, so rather
+# than recursing once per statement, generatePALMAT() processes the whole
+# chain as if it were a single list component:  the components of the 
+# innermost list component (which begin the list), followed by those of
+# the others, outermost last.  Otherwise, the size of a unit would be limited
+# by Python's recursion limit.  Returns the components of the chain.
+statementLists = ["compilation", "block_body", "doGroupHeadStatement"]
+
+def statementList(ast, lbnfLabel):
+    rests = []
+    while len(ast["components"]) > 0 and \
+            isinstance(ast["components"][0], dict) and \
+            astToLbnf(ast["components"][0])[0] == lbnfLabel:
+        rests.append(ast["components"][1:])
+        ast = ast["components"][0]
+    components = list(ast["components"])
+    for rest in reversed(rests):
+        components += rest
+    return components
+
 lastExpressionSM = None
 def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 }, 
                    trace=False, endLabels=[], depth=-1, trace4=False):
@@ -218,6 +266,9 @@ def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 },
     depth += 1
     newState = state
     lbnfLabel, source = astToLbnf(ast)
+    if isCacheableBlock(lbnfLabel, ast, state, trace, trace4):
+        return generateBlock(generatePALMAT, ast, PALMAT, state, trace, 
+                             endLabels, depth - 1, trace4)
     scopes = PALMAT["scopes"]
     preservedScopeIndex = state["scopeIndex"]
     currentScope = scopes[preservedScopeIndex]
@@ -230,7 +281,8 @@ def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 },
     expressionFlush = []
     endLabels.append({"lbnfLabel": lbnfLabel, 
                       "used": False,
-                      "expressionFlush": expressionFlush})
+                      "expressionFlush": expressionFlush,
+                      "firstInstruction": len(currentScope["instructions"])})
 
     # Is this a DO ... END block?  If it is, then we have to do several things:
     # create a new child scope and make it current, and add a goto PALMAT 
@@ -338,7 +390,12 @@ def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 },
             "label": [currentScope["self"], len(currentScope["instructions"])]}
         appendInstruction(currentScope["instructions"], \
                           {'noop': True, 'label': identifier}, source)
-    for component in ast["components"]:
+    components = ast["components"]
+    # State machines (such as that of a DO FOR) see every component, so a
+    # list is only processed as a whole if none is active.
+    if lbnfLabel in statementLists and "stateMachine" not in state:
+        components = statementList(ast, lbnfLabel)
+    for component in components:
         if isinstance(component, str):
             if component[:1] == "^":
                 traceIt(newState, endLabels, component, "before", trace, depth)
@@ -511,6 +568,9 @@ def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 },
             elif dummy["type"] == 'program':
                 stackPos = -1
                 break
+            elif dummy["type"] == 'task':
+                stackPos = -2
+                break
             i = dummy["parent"]
         if stackPos == 0:
             print("\tRETURN without parent FUNCTION or PROCEDURE")
@@ -520,10 +580,129 @@ def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 },
             # Return from a PROGRAM. 
             appendInstruction(currentScope["instructions"], \
                 {'halt': True}, source)
+        elif stackPos == -2:
+            # Return from a TASK.
+            appendInstruction(currentScope["instructions"], \
+                {'terminate': True}, source)
         else:
             # Return from a FUNCTION or PROCEDURE.
             appendInstruction(currentScope["instructions"], \
                               {'return': stackPos}, source)
+    elif lbnfLabel in ["scheduleHeadLabel", "scheduleHeadAt", "scheduleHeadIn",
+                       "scheduleHeadOn"]:
+        # The components of SCHEDULE statements just accumulate options in
+        # substate["schedule"], for basicStatementSchedule to use.  The
+        # values of arithmetic clauses are left on the computation stack, but
+        # event expressions have to be removed from the instruction stream,
+        # since the scheduler evaluates them whenever it sees fit.
+        instructions = currentScope["instructions"]
+        options = substate.setdefault("schedule", {})
+        if lbnfLabel == "scheduleHeadLabel":
+            task = realTimeReference(PALMAT, ast, currentIndex, "task")
+            if task == None:
+                endLabels.pop()
+                return False, PALMAT
+            options["task"] = task
+        elif lbnfLabel == "scheduleHeadAt":
+            options["at"] = True
+        elif lbnfLabel == "scheduleHeadIn":
+            options["in"] = True
+        else:
+            mark = substate["scheduleMark"]
+            options["on"] = instructions[mark:]
+            instructions[mark:] = []
+        substate["scheduleMark"] = len(instructions)
+    elif lbnfLabel == "schedule_phrase":
+        options = substate.setdefault("schedule", {})
+        if ast["lbnfLabel"][:2] == "AB":
+            options["priority"] = True
+        elif ast["lbnfLabel"][:2] == "AC":
+            options["dependent"] = True
+    elif lbnfLabel in ["timingEvery", "timingAfter", "timing"]:
+        options = substate.setdefault("schedule", {})
+        repeatKinds = {
+                "timingEvery": "every",
+                "timingAfter": "after",
+                "timing": "repeat"
+            }
+        options[repeatKinds[lbnfLabel]] = True
+    elif lbnfLabel == "stopping":
+        options = substate.setdefault("schedule", {})
+        instructions = currentScope["instructions"]
+        if "AAwhileKeyWhile" in ast["components"]:
+            key = "while"
+        else:
+            key = "until"
+        if ast["lbnfLabel"][:2] == "AB":
+            first = endLabels[-1]["firstInstruction"]
+            options[key] = instructions[first:]
+            instructions[first:] = []
+        elif key == "while":
+            print("\tWHILE in SCHEDULE requires an event expression.")
+            endLabels.pop()
+            return False, PALMAT
+        else:
+            options[key] = True
+    elif lbnfLabel == "basicStatementSchedule":
+        options = substate.pop("schedule")
+        substate.pop("scheduleMark", None)
+        instruction = { "schedule": options.pop("task") }
+        instruction.update(options)
+        appendInstruction(currentScope["instructions"], instruction, source)
+        PALMAT["realTime"] = True
+    elif lbnfLabel == "basicStatementWait":
+        instructions = currentScope["instructions"]
+        prefix = ast["lbnfLabel"][:2]
+        if prefix == "AV":
+            operand = "dependent"
+        elif prefix == "AX":
+            operand = "until"
+        elif prefix == "AY":
+            first = endLabels[-1]["firstInstruction"]
+            operand = instructions[first:]
+            instructions[first:] = []
+        else:
+            operand = True
+        appendInstruction(instructions, { "wait": operand }, source)
+        PALMAT["realTime"] = True
+    elif lbnfLabel == "basicStatementSignal":
+        signalKinds = { "AA": "set", "AB": "reset", "AC": "signal" }
+        kind = signalKinds[ast["components"][0]["lbnfLabel"][:2]]
+        event = realTimeReference(PALMAT, ast, currentIndex, "event")
+        if event == None:
+            endLabels.pop()
+            return False, PALMAT
+        appendInstruction(currentScope["instructions"], { kind: event }, \
+                          source)
+        PALMAT["realTime"] = True
+    elif lbnfLabel == "basicStatementTerminator":
+        if "AAterminatorTerminate" in ast["components"]:
+            kind = "terminate"
+        else:
+            kind = "cancel"
+        operand = True
+        if ast["lbnfLabel"][:2] == "BA":
+            operand = []
+            for name in astIdentifiers(ast):
+                task = realTimeReference(PALMAT, name, currentIndex, "task")
+                if task == None:
+                    endLabels.pop()
+                    return False, PALMAT
+                operand.append(task)
+        appendInstruction(currentScope["instructions"], { kind: operand }, \
+                          source)
+        PALMAT["realTime"] = True
+    elif lbnfLabel == "basicStatementUpdate":
+        operand = True
+        if ast["lbnfLabel"][:2] == "BC":
+            operand = realTimeReference(PALMAT, ast["components"][0], \
+                                        currentIndex, "task")
+            if operand == None:
+                endLabels.pop()
+                return False, PALMAT
+        appendInstruction(currentScope["instructions"], \
+                          { "update": operand }, source)
+        PALMAT["realTime"] = True
     elif lbnfLabel in ["case_else", "doGroupHeadCase"]:
         currentScope["type"] = "do case"
         currentScope["caseCounter"] = 1
@@ -543,13 +722,17 @@ def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 },
         state["scopeIndex"] = parentIndex
         currentScope = PALMAT["scopes"][parentIndex]
     elif lbnfLabel in ["blockHeadFunction", "blockHeadProcedure", 
-                       "blockHeadProgram", "blockHeadCompool"]:
+                       "blockHeadProgram", "blockHeadCompool", 
+                       "blockHeadTask"]:
         blockTypes = {
                 "blockHeadFunction": "function",
                 "blockHeadProcedure": "procedure",
                 "blockHeadProgram": "program",
-                "blockHeadCompool": "compool"
+                "blockHeadCompool": "compool",
+                "blockHeadTask": "task"
             }
+        if lbnfLabel == "blockHeadTask":
+            PALMAT["realTime"] = True
         blockIdentifier = substate["currentIdentifier"]
         identifierDict = currentScope["identifiers"][blockIdentifier]
         if lbnfLabel == "blockHeadFunction" and \
@@ -860,10 +1043,10 @@ def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 },
                     identifiers.pop(currentIdentifier)
                     endLabels.pop()
                     return False, PALMAT
-                inflateArray(arrayList, identifierDict)
-                identifierDict[key] = arrayList
+                array = inflateArray(arrayList, identifierDict)
+                identifierDict[key] = array
                 if key == "initial":
-                    identifierDict["value"] = copy.deepcopy(arrayList)
+                    identifierDict["value"] = copy.deepcopy(array)
     elif lbnfLabel in ["char_spec", "bitSpecBoolean",  
                        "sQdQName_doublyQualNameHead_literalExpOrStar",
                        "arraySpec_arrayHead_literalExpOrStar"] and \
@@ -948,7 +1131,7 @@ def generatePALMAT(ast, PALMAT, state={ "history":[], "scopeIndex":0 },
             i = currentScope["self"]
             while i != None and label not in PALMAT["scopes"][i]["identifiers"]:
                 if PALMAT["scopes"][i]["type"] in \
-                        ["program", "function", "procedure"]:
+                        ["program", "function", "procedure", "task"]:
                     i = None
                     break
                 i = PALMAT["scopes"][i]["parent"]
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   halArray.py
+Requires:   Python 3.7 or later.
+Purpose:    The in-memory representation of HAL/S ARRAY values.
+References: PALMAT.md.
+
+In PALMAT files, and in the operands of PALMAT "array" instructions, an ARRAY
+is a nested list with a trailing "a" marker at each level.  For example, an
+ARRAY(2,3) INTEGER might be
+
+    [[1, 2, 3, "a"], [4, 5, 6, "a"], "a"]
+
+However, walking that structure recursively on every access is slow, so in
+memory (i.e., as the value, initial value, or constant of a variable, or on the
+computation stack of the emulator), an ARRAY is instead a HalArray object:
+
+    shape       The list of ARRAY dimensions, such as [2, 3].
+    strides     For each dimension, the distance in the buffer between
+                consecutive indices, such as [3, 1].
+    buffer      A flat list of all of the ARRAY's elements, in the usual HAL/S
+                order (i.e., with the last subscript varying fastest), such as
+                [1, 2, 3, 4, 5, 6].
+
+The elements themselves are just as they'd be in a nested list:  None for an
+uninitialized element, Python ints or floats for INTEGER or SCALAR, lists for
+VECTOR, MATRIX, or BIT, strings for CHARACTER, and so on.  That's why the
+buffer is a list rather than an array.array or numpy array, which couldn't
+hold any of those other than INTEGER or SCALAR, nor uninitialized elements.
+
+An element (with 0-based indices i, j, ...) is thus always just
+
+    array.buffer[i * array.strides[0] + j * array.strides[1] + ...]
+
+halArrayToJSON() and halArraysFromJSON() convert between the two forms, and are
+used when PALMAT is written to or read from files.
+"""
+
+import copy
+
+# Element types which never need to be copied.
+immutableTypes = (int, float, str, type(None))
+
+class HalArray:
+    __slots__ = ("shape", "strides", "buffer")
+
+    def __init__(self, shape, buffer=None):
+        self.shape = list(shape)
+        self.strides = [1] * len(shape)
+        for i in range(len(shape) - 2, -1, -1):
+            self.strides[i] = self.strides[i + 1] * shape[i + 1]
+        if buffer == None:
+            size = 1
+            for width in shape:
+                size *= width
+            buffer = [None] * size
+        self.buffer = buffer
+
+    # Buffer offset of the element with the given (0-based) indices.
+    def offset(self, indices):
+        offset = 0
+        for i in range(len(indices)):
+            offset += indices[i] * self.strides[i]
+        return offset
+
+    def toNested(self):
+        return halArrayToJSON(self)
+
+    def __deepcopy__(self, memo):
+        return HalArray(self.shape, copyElements(self.buffer, memo))
+
+    def __eq__(self, other):
+        if not isinstance(other, HalArray):
+            return NotImplemented
+        return self.shape == other.shape and self.buffer == other.buffer
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.toNested())
+
+# A copy of a list of elements, deep-copying any elements that are mutable.
+def copyElements(elements, memo=None):
+    for e in elements:
+        if not isinstance(e, immutableTypes):
+            break
+    else:
+        return list(elements)
+    result = []
+    for e in elements:
+        if isinstance(e, immutableTypes):
+            result.append(e)
+        else:
+            result.append(copy.deepcopy(e, memo))
+    return result
+
+# Lists of buffer offsets (in order) selected by a list, for each dimension,
+# of the (0-based) indices selected in that dimension.
+def arrayOffsets(array, indices):
+    offsets = [0]
+    for d in range(len(indices)):
+        stride = array.strides[d]
+        offsets = [o + i * stride for o in offsets for i in indices[d]]
+    return offsets
+
+# Conversion of a HalArray (or of anything containing HalArrays, such as a
+# STRUCTURE) to the nested-list form used in PALMAT files.  Suitable for use
+# as the default= parameter of json.dumps().
+def halArrayToJSON(object):
+    if isinstance(object, HalArray):
+        if len(object.buffer) == 0:
+            return ["a"]
+        elements = []
+        for e in object.buffer:
+            if isinstance(e, (list, HalArray)):
+                e = halArrayToJSON(e)
+            elements.append(e)
+        for width in reversed(object.shape):
+            elements = [elements[i : i + width] + ["a"] \
+                        for i in range(0, len(elements), width)]
+        return elements[0]
+    if isinstance(object, list):
+        return [halArrayToJSON(e) if isinstance(e, (list, HalArray)) else e \
+                for e in object]
+    raise TypeError("Object of type %s is not JSON serializable" % \
+                    type(object).__name__)
+
+# Is something the nested-list form of an ARRAY?
+def isNestedArray(object):
+    return isinstance(object, list) and len(object) > 1 and object[-1] == "a"
+
+# The reverse of halArrayToJSON().
+def nestedToHalArray(object):
+    if isNestedArray(object):
+        shape = []
+        level = object
+        while isNestedArray(level):
+            shape.append(len(level) - 1)
+            level = level[0]
+        buffer = []
+        def unnest(level, depth):
+            if depth < len(shape):
+                for e in level[:-1]:
+                    unnest(e, depth + 1)
+            else:
+                buffer.append(nestedToHalArray(level))
+        unnest(object, 0)
+        return HalArray(shape, buffer)
+    if isinstance(object, list):
+        return [nestedToHalArray(e) for e in object]
+    return object
+
+# Converts the values of all variables in a dictionary of identifiers, as read
+# from a PALMAT file, in-place.
+def halArraysFromJSON(identifiers):
+    for identifier in identifiers:
+        attributes = identifiers[identifier]
+        if not isinstance(attributes, dict):
+            continue
+        for key in ["value", "initial", "constant"]:
+            if key in attributes and isinstance(attributes[key], list):
+                attributes[key] = nestedToHalArray(attributes[key])
@@ -57,12 +57,18 @@ import re
 import atexit
 from processSource import processSource
 from palmatAux import constructPALMAT, writePALMAT, readPALMAT, \
-        collectGarbage, findIdentifier, astSourceFile, expandStructureTemplate
+        collectGarbage, findIdentifier, astSourceFile, \
+        expandStructureTemplate, unlinkPALMAT
 from p_Functions import removeIdentifier, removeAllIdentifiers, substate, \
         resetStatement, printTemplate
-from executePALMAT import executePALMAT
+from executePALMAT import executePALMAT, linkPALMAT, watchVariable, \
+                          unwatchVariable
+from schedulePALMAT import printProcesses
 from replaceBy import bareIdentifierPattern
 from optimizePALMAT import optimizePALMAT
+from profilePALMAT import newProfile, printHotSpots, writeFlameGraph
+from translatePALMAT import translatePALMAT
+from tracePALMAT import newRing, dumpRing
 
 # The following makes the buffer for user input persistent, or at least tries
 # to.  It works for me anyway.
@@ -77,7 +83,7 @@ if rlModule != None:
 
 def printScopeHeading(PALMAT, i):
     scope = PALMAT["scopes"][i]
-    if scope["type"] in ["function", "procedure", "program"]:
+    if scope["type"] in ["function", "procedure", "program", "task"]:
         if scope["parent"] == None:
             print("Scope %d, %s %s (deleted):" % \
                   (i, scope["type"].upper(), 
@@ -137,7 +143,8 @@ helpMenu = \
 \t                 brightcyan, or brightwhite.
 \t`NOCOLORIZE      Disable colorized output.
 \t`WRITE F         Write current PALMAT to a file named F.
-\t`READ F          Read PALMAT from a file named F.
+\t`WRITE F BINARY  Same, but in binary rather than JSON form.
+\t`READ F          Read PALMAT (JSON or binary) from a file named F.
 \t`DATA            Inspect identifiers in root scope.
 \t`DATA N          Inspect identifiers in scope N (integer).
 \t`DATA *          Inspect identifiers in all scopes.
@@ -149,6 +156,8 @@ helpMenu = \
 \t`EXECUTE         (Re)execute already-compiled PALMAT.
 \t`CLONE           Same as EXECUTE, but clone instantiation.
 \t`SCOPES          Inspect scope hierarchy.
+\t`PROCESSES       Show the TASKs etc. of the most-recently
+\t                 run real-time program, with statistics.
 \t`GARBAGE         Perform "garbage collection".  This is
 \t                 done automatically prior to processing
 \t                 any newly-input HAL/S, but it may be
@@ -171,6 +180,33 @@ helpMenu = \
 \t`NOTRACE3        Disable execution tracing.
 \t`TRACE4          Enable tracing of compile-time calculations.
 \t`NOTRACE4        Disable compile-time calculation tracing.
+\t`PROFILE         Enable profiling of execution, discarding
+\t                 any profile collected so far.
+\t`NOPROFILE       Disable profiling of execution.
+\t`HOTSPOTS [N]    Show the N (default 20) most time-consuming
+\t                 statements, scopes, and call stacks, and the
+\t                 most-called FUNCTIONs and PROCEDUREs, from the
+\t                 profile.
+\t`FLAMEGRAPH F    Write the profile's call stacks to a file 
+\t                 named F, in the "folded" form used for
+\t                 flame graphs.
+\t`WATCH X [STOP]  Report every change to the value of variable X
+\t                 (in any scope or COMPOOL), along with the 
+\t                 HAL/S source line, and with STOP, end the
+\t                 execution as well.
+\t`UNWATCH [X]     Stop watching variable X, or all variables.
+\t`WATCHES         List the variables being watched.
+\t`RING [N]        Keep a compact record of the last N (default
+\t                 65536) instructions executed, written to the
+\t                 file yaHAL-S-FC.ring on error or on halt.
+\t                 Decode it with tracePALMAT.py.
+\t`NORING          Stop keeping the record.
+\t`DUMPRING [F]    Write the record to the file F (by default,
+\t                 yaHAL-S-FC.ring).
+\t`TRANSLATE       Translate PALMAT to Python, and run that
+\t                 rather than emulating it (except when 
+\t                 tracing or profiling).
+\t`NOTRANSLATE     Emulate PALMAT instruction by instruction.
 \t`LBNF            Show abstract syntax trees in LBNF.
 \t`BNF             Show abstract syntax trees in BNF.
 \t`NOAST           Don't show abstract syntax trees.
@@ -188,7 +224,8 @@ helpMenu = \
 \t                 the interpreter's input prompt.'''
 
 def interpreterLoop(shouldColorize=False, \
-                    xeq=True, lbnf=False, bnf=False, ansiWrapper=True):
+                    xeq=True, lbnf=False, bnf=False, ansiWrapper=True, \
+                    profileFile=None, translate=False, ringFile=None):
 
     macros = [{"@": 0}]
     spooling = False
@@ -201,6 +238,15 @@ def interpreterLoop(shouldColorize=False, \
     trace2 = False
     trace3 = False
     trace4 = False
+    profile = newProfile()
+    profiling = (profileFile != None)
+    translating = translate
+    ring = None
+    if ringFile != None:
+        ring = newRing(filename=ringFile)
+    else:
+        ringFile = "yaHAL-S-FC.ring"
+    ringing = (ring != None)
     expand = False
     halCode = False
     quitting = False
@@ -299,7 +345,9 @@ def interpreterLoop(shouldColorize=False, \
                         else:
                             print("\tRunning as the primary thread.")
                         executePALMAT(PALMAT, attributes["scope"], 0, \
-                                      secondary, trace3, 8)
+                                      secondary, trace3, 8, \
+                                      profile if profiling else None,
+                                      ring if ringing else None)
                     else:
                         print("\tCannot find program", fields[1])
                     continue
@@ -332,7 +380,8 @@ def interpreterLoop(shouldColorize=False, \
                         removeIdentifier(PALMAT, macros, 0, identifier)
                     continue
                 elif firstWord == "WRITE" and len(fields) > 1:
-                    if writePALMAT(PALMAT, fields[1]):
+                    binary = len(fields) > 2 and fields[2].upper() == "BINARY"
+                    if writePALMAT(PALMAT, fields[1], binary):
                         print("\tSuccess!")
                     else:
                         print("\tFailure!")
@@ -343,6 +392,9 @@ def interpreterLoop(shouldColorize=False, \
                         print("\tFailure!")
                     else:
                         PALMAT = newPALMAT
+                        linkPALMAT(PALMAT)
+                        if translating:
+                            translatePALMAT(PALMAT)
                         print("\tSuccess!")
                     continue
                 elif firstWord == "DATA":
@@ -475,6 +527,97 @@ def interpreterLoop(shouldColorize=False, \
                     print("\tTRACE4 off.")
                     trace4 = False
                     continue
+                elif firstWord == "PROFILE":
+                    print("\tPROFILE on.")
+                    profile = newProfile()
+                    profiling = True
+                    continue
+                elif firstWord == "NOPROFILE":
+                    print("\tPROFILE off.")
+                    profiling = False
+                    continue
+                elif firstWord in ["WATCH", "UNWATCH"]:
+                    if len(fields) > 1:
+                        identifier = "^" + fields[1] + "^"
+                        found = False
+                        for i in range(len(PALMAT["scopes"])):
+                            attributes = \
+                                PALMAT["scopes"][i]["identifiers"].get(identifier)
+                            if attributes == None or "value" not in attributes \
+                                    or "constant" in attributes:
+                                continue
+                            found = True
+                            if firstWord == "WATCH":
+                                watchVariable(PALMAT, i, identifier, 
+                                    len(fields) > 2 and fields[2] == "STOP")
+                            else:
+                                unwatchVariable(PALMAT, i, identifier)
+                        if not found:
+                            print("\tNo variable named", fields[1])
+                    elif firstWord == "UNWATCH":
+                        unwatchVariable(PALMAT)
+                    linkPALMAT(PALMAT)
+                    if translating:
+                        translatePALMAT(PALMAT)
+                    continue
+                elif firstWord == "WATCHES":
+                    watches = PALMAT.get("watches", {})
+                    if len(watches) == 0:
+                        print("\tNo variables are being watched.")
+                    for si, identifier in sorted(watches):
+                        watch = watches[(si, identifier)]
+                        print("\t%s in scope %d, %d change(s)%s" % \
+                              (watch["name"], si, watch["hits"],
+                               ", STOP" if watch["stop"] else ""))
+                    continue
+                elif firstWord == "RING":
+                    if len(fields) > 1 and fields[1].isdigit() and \
+                            int(fields[1]) > 0:
+                        ring = newRing(int(fields[1]), ringFile)
+                    else:
+                        ring = newRing(filename=ringFile)
+                    print("\tRING on, %d instructions." % ring["entries"])
+                    ringing = True
+                    continue
+                elif firstWord == "NORING":
+                    print("\tRING off.")
+                    ringing = False
+                    continue
+                elif firstWord == "DUMPRING":
+                    if ring == None:
+                        print("\tNo instructions have been recorded.")
+                        continue
+                    if len(fields) > 1:
+                        success = dumpRing(ring, fields[1])
+                    else:
+                        success = dumpRing(ring)
+                    if success:
+                        print("\tSuccess!")
+                    else:
+                        print("\tFailure!")
+                    continue
+                elif firstWord == "TRANSLATE":
+                    print("\tTRANSLATE on.")
+                    translating = True
+                    translatePALMAT(PALMAT)
+                    continue
+                elif firstWord == "NOTRANSLATE":
+                    print("\tTRANSLATE off.")
+                    translating = False
+                    PALMAT.pop("translated", None)
+                    continue
+                elif firstWord == "HOTSPOTS":
+                    if len(fields) > 1 and fields[1].isdigit():
+                        printHotSpots(PALMAT, profile, int(fields[1]))
+                    else:
+                        printHotSpots(PALMAT, profile)
+                    continue
+                elif firstWord == "FLAMEGRAPH" and len(fields) > 1:
+                    if writeFlameGraph(PALMAT, profile, fields[1]):
+                        print("\tSuccess!")
+                    else:
+                        print("\tFailure!")
+                    continue
                 elif firstWord == "EXPAND":
                     print("\tEXPAND on.")
                     expand = True
@@ -544,6 +687,18 @@ def interpreterLoop(shouldColorize=False, \
                         print("\tTRACE4                   (vs NOTRACE4)")
                     else:
                         print("\tNOTRACE4                 (vs TRACE4)")
+                    if profiling:
+                        print("\tPROFILE                  (vs NOPROFILE)")
+                    else:
+                        print("\tNOPROFILE                (vs PROFILE)")
+                    if ringing:
+                        print("\tRING %-19d (vs NORING)" % ring["entries"])
+                    else:
+                        print("\tNORING                   (vs RING)")
+                    if translating:
+                        print("\tTRANSLATE                (vs NOTRANSLATE)")
+                    else:
+                        print("\tNOTRANSLATE              (vs TRANSLATE)")
                     if expand:
                         print("\tEXPAND                   (vs NOEXPAND)")
                     else:
@@ -564,10 +719,17 @@ def interpreterLoop(shouldColorize=False, \
                         print("\tNOAST                    (vs BNF or LBNF)")
                     continue
                 elif firstWord == "EXECUTE":
-                    executePALMAT(PALMAT, 0, 0, False, trace3, 8)
+                    executePALMAT(PALMAT, 0, 0, False, trace3, 8,
+                                  profile if profiling else None,
+                                  ring if ringing else None)
                     continue
                 elif firstWord == "CLONE":
-                    executePALMAT(PALMAT, 0, 0, True, trace3, 8)
+                    executePALMAT(PALMAT, 0, 0, True, trace3, 8,
+                                  profile if profiling else None,
+                                  ring if ringing else None)
+                    continue
+                elif firstWord == "PROCESSES":
+                    printProcesses()
                     continue
                 elif firstWord == "SCOPES":
                     used = set()
@@ -584,6 +746,10 @@ def interpreterLoop(shouldColorize=False, \
                             print("\tattributes:", scope["attributes"])
                             if "return" in scope:
                                 print("\treturn:    ", scope["return"])
+                        if "eliminated" in scope:
+                            print("\teliminated:", scope["eliminated"])
+                        if "generation" in scope:
+                            print("\tgeneration:", scope["generation"])
                     continue
                 elif firstWord == "GARBAGE":
                     collectGarbage(PALMAT)
@@ -671,6 +837,8 @@ def interpreterLoop(shouldColorize=False, \
         # which might still be useful.
         collectGarbage(PALMAT)
         resetStatement()
+        firstScope = len(PALMAT["scopes"])
+        rootIdentifiers = dict(identifiers)
         
         # We want to get rid of all macros, except those for scope 0 which
         # directly relate to the identifiers now present in scope 0.  There
@@ -704,8 +872,18 @@ def interpreterLoop(shouldColorize=False, \
         success, ast = processSource(PALMAT, halsSource, metadata, noCompile, \
                          lbnf, bnf, trace1, wine, trace2, 8, macros, trace4, \
                          strict, trace0)
+        # Only the new scopes need to be optimized and linked, unless the 
+        # statement replaced or removed identifiers of the root scope, which
+        # the existing linkage may refer to.
+        for identifier in rootIdentifiers:
+            if identifiers.get(identifier) is not rootIdentifiers[identifier]:
+                unlinkPALMAT(PALMAT)
+                break
         if optimize:
-            optimizePALMAT(PALMAT)
+            optimizePALMAT(PALMAT, False, firstScope)
+        linkPALMAT(PALMAT)
+        if translating:
+            translatePALMAT(PALMAT)
         if len(substate["warnings"]):
             for warning in substate["warnings"]:
                 print("\tWarning:", warning)
@@ -713,4 +891,12 @@ def interpreterLoop(shouldColorize=False, \
             for warning in substate["errors"]:
                 print("\tError:", warning)
         if len(substate["errors"]) == 0 and xeq:
-            executePALMAT(PALMAT, 0, 0, False, trace3, 8)
+            executePALMAT(PALMAT, 0, 0, False, trace3, 8,
+                          profile if profiling else None,
+                          ring if ringing else None)
+    
+    # With --profile, the profile is reported on the way out.
+    if profileFile != None:
+        printHotSpots(PALMAT, profile)
+        if not writeFlameGraph(PALMAT, profile, profileFile):
+            print("\tCannot write profile to %s." % profileFile)
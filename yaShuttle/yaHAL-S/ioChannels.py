@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   ioChannels.py
+Requires:   Python 3.7 or later.
+Purpose:    The input/output channels used by the READ and WRITE statements
+            of the PALMAT emulator, one per logical unit number (LUN).
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+            [HPG] HAL/S Programmer's Guide, chapter 13.
+
+The emulator's 'write' and 'read' instructions (see opWrite() and opRead() in
+executePALMAT.py) don't deal with stdin and stdout themselves, but with
+whatever channel is attached to their LUN.  Initially, LUN 5 (input) and
+LUN 6 (output) are attached to the console, and other LUNs are attached to
+nothing, so that READ and WRITE on them are simply ignored, as they always
+have been.  Any LUN can be attached (by attachChannel()) to a channel of
+one of these kinds:
+
+    consoleChannel()    stdin and stdout, with a "READ  > " prompt for input,
+                        and each WRITE output immediately, so that it's
+                        properly interleaved with the interpreter's own
+                        messages.
+    fileChannel(F)      The file F, opened for input on the first READ or
+                        for output on the first WRITE.
+    bufferChannel(T)    In-memory text, where the string T is the input,
+                        and the output is retrieved by channelText().
+    queueChannel(I, O)  A pair of queue.Queue objects, for exchanging data
+                        with other Python threads.  Each item taken from the
+                        inbound queue I is either a string of input text or
+                        a list (or tuple) of values, each of which is a
+                        single input field, while each WRITE puts a string
+                        (the output record, without a newline) into the
+                        outbound queue O.  By default, neither ever waits:
+                        READ treats an empty inbound queue as the end of
+                        the input, and records for a full outbound queue
+                        are held back until there's room.
+
+Output other than to the console is block-buffered, i.e. held by the channel
+until it amounts to at least its "capacity" characters (64K by default), and
+then written all at once.  Everything held back is written by flushChannels(),
+which executePALMAT() calls whenever it returns, and by detachChannel(), as
+well as when Python exits.  Input other than from the console is read a block
+at a time, and the entire block is split into fields at once.
+
+Input text consists of fields separated by commas and/or whitespace, which
+are used only for that purpose and are not returned by readItem().  A
+semicolon, whether delimited or not, is returned as a field of its own, since
+it marks the end of an input record and thus terminates a READ statement,
+possibly prematurely (which is the purview of opRead()).  At the end of the
+input, readItem() returns nothing but semicolons.
+"""
+
+import sys
+import re
+import io
+import queue
+import atexit
+from collections import deque
+from palmatAux import printError
+
+fieldSeparators = re.compile(r"\s*,\s*|\s+")
+
+def newChannel(kind, capacity):
+    return {
+        "kind": kind,
+        "fields": deque(),  # Input fields not yet returned by readItem().
+        "partial": "",      # The incomplete line at the end of the last block.
+        "ended": False,     # True once the input is exhausted.
+        "pending": [],      # Output not yet written.
+        "size": 0,          # Number of characters in "pending".
+        "capacity": capacity,
+        "input": None,
+        "output": None
+        }
+
+def consoleChannel():
+    return newChannel("console", 0)
+
+def fileChannel(filename, capacity=65536):
+    channel = newChannel("file", capacity)
+    channel["filename"] = filename
+    return channel
+
+def bufferChannel(text="", capacity=65536):
+    channel = newChannel("buffer", capacity)
+    channel["input"] = io.StringIO(text)
+    channel["output"] = io.StringIO()
+    return channel
+
+def queueChannel(inbound=None, outbound=None, block=False, capacity=65536):
+    channel = newChannel("queue", capacity)
+    channel["input"] = inbound
+    channel["output"] = outbound
+    channel["block"] = block
+    return channel
+
+# The channels, by LUN.  The LUNs are strings, as in the operands of the
+# 'read' and 'write' instructions.
+channels = {
+    "5": consoleChannel(),
+    "6": consoleChannel()
+    }
+
+def attachChannel(lun, channel):
+    detachChannel(lun)
+    channels[str(lun)] = channel
+
+# Flushes the channel and closes any file it opened.  Returns the channel,
+# or None if nothing was attached to the LUN.
+def detachChannel(lun):
+    channel = channels.pop(str(lun), None)
+    if channel == None:
+        return None
+    flushChannel(channel, True)
+    if channel["kind"] == "file":
+        for key in ["input", "output"]:
+            if channel[key] != None:
+                channel[key].close()
+                channel[key] = None
+    return channel
+
+# The output of a buffer channel so far.
+def channelText(lun):
+    channel = channels.get(str(lun), None)
+    if channel == None or channel["kind"] != "buffer":
+        return ""
+    flushChannel(channel)
+    return channel["output"].getvalue()
+
+# Attaches a file channel as specified by the --lun=N:F command-line option
+# of yaHAL-S-FC.py.  Returns True on success, False on failure.
+def attachFromOption(option):
+    fields = option.split(":", 1)
+    if len(fields) != 2 or not fields[0].isdigit() or fields[1] == "":
+        return False
+    attachChannel(fields[0], fileChannel(fields[1]))
+    return True
+
+#-----------------------------------------------------------------------------
+# Output.
+
+# Writes one output record (the output of a WRITE statement), which shouldn't
+# include a newline.  Returns False if no channel is attached to the LUN.
+def writeRecord(lun, record):
+    channel = channels.get(lun, None)
+    if channel == None:
+        return False
+    kind = channel["kind"]
+    if kind == "console":
+        sys.stdout.write(record + "\n")
+        return True
+    if kind != "queue":
+        record += "\n"
+    channel["pending"].append(record)
+    channel["size"] += len(record)
+    if channel["size"] >= channel["capacity"]:
+        flushChannel(channel)
+    return True
+
+# Writes out whatever output the channel is holding back.  For a queue
+# channel, whatever doesn't fit in the queue is still held back, unless
+# final is True, in which case it waits for room.
+def flushChannel(channel, final=False):
+    pending = channel["pending"]
+    if len(pending) == 0:
+        return
+    kind = channel["kind"]
+    if kind == "queue":
+        outbound = channel["output"]
+        if outbound != None:
+            while len(pending) > 0:
+                try:
+                    outbound.put(pending[0], final or channel["block"])
+                except queue.Full:
+                    break
+                pending.pop(0)
+        channel["size"] = sum(len(record) for record in pending)
+        return
+    if kind == "file" and channel["output"] == None:
+        channel["output"] = open(channel["filename"], "w")
+    channel["output"].write("".join(pending))
+    channel["output"].flush()
+    pending.clear()
+    channel["size"] = 0
+
+def flushChannels():
+    for channel in channels.values():
+        if len(channel["pending"]) > 0:
+            flushChannel(channel)
+
+def closeChannels():
+    for lun in list(channels):
+        detachChannel(lun)
+
+atexit.register(closeChannels)
+
+#-----------------------------------------------------------------------------
+# Input.
+
+# Adds the fields of a line of input text to those the channel is holding.
+def splitFields(channel, line):
+    line = line.replace(";", " ; ").strip()
+    if line != "":
+        channel["fields"].extend(fieldSeparators.split(line))
+
+# Reads the next block of input, if any, into the channel's fields.  Returns
+# False at the end of the input.
+def refillChannel(channel):
+    if channel["ended"]:
+        return False
+    kind = channel["kind"]
+    if kind == "queue":
+        inbound = channel["input"]
+        items = []
+        try:
+            if inbound != None:
+                items.append(inbound.get(channel["block"]))
+                # Take whatever else is already there, too.
+                while len(items) < 1024:
+                    items.append(inbound.get_nowait())
+        except queue.Empty:
+            pass
+        if len(items) == 0:
+            return False
+        for item in items:
+            if isinstance(item, str):
+                for line in item.split("\n"):
+                    splitFields(channel, line)
+            else:
+                channel["fields"].extend(str(value) for value in item)
+        return True
+    if kind == "file" and channel["input"] == None:
+        channel["input"] = open(channel["filename"], "r")
+    block = channel["input"].read(max(channel["capacity"], 1))
+    if block == "":
+        channel["ended"] = True
+        splitFields(channel, channel["partial"])
+        channel["partial"] = ""
+        return len(channel["fields"]) > 0
+    lines = (channel["partial"] + block).split("\n")
+    channel["partial"] = lines.pop()
+    for line in lines:
+        splitFields(channel, line)
+    return True
+
+'''
+For READ statements.  Returns the next field (in string form) from the input
+of the channel attached to the LUN, or a semicolon at the end of the input.
+The PALMAT and source (the position in the HAL/S source code) are just for
+error messages.  Returns None if no channel is attached to the LUN.
+'''
+def readItem(PALMAT, source, lun):
+    channel = channels.get(lun, None)
+    if channel == None:
+        return None
+    fields = channel["fields"]
+    if channel["kind"] == "console":
+        while len(fields) == 0:
+            line = input("READ  > ").replace(";", " ; ").strip()
+            if line == "":
+                continue
+            if "`" in line:
+                printError(PALMAT, source, "{'read': True, 'lun': %s}" % lun, \
+                    "The back-tick (`) is not a legal character for input data in a READ statement.")
+                continue
+            fields.extend(fieldSeparators.split(line.strip()))
+        return fields.popleft()
+    while len(fields) == 0:
+        if not refillChannel(channel):
+            return ";"
+    return fields.popleft()
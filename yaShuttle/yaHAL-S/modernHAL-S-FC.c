@@ -9,6 +9,23 @@
   Reference:    http://www.ibibio.org/apollo
   Mods:         2022-12-12 RSB  Adapted from a makefile auto-generated by
                                 BNF Converter.
+
+  With the --server option, rather than parsing a single source file, the
+  program parses any number of them, one after another, as requested by
+  yaHAL-S-FC.py (see pass1.py), which thus needn't start a new process for
+  every compilation.  The protocol on stdin/stdout is:
+
+        Startup:        The server outputs the line SERVER_READY.
+        Request:        A line containing the decimal length in bytes of
+                        the source code, followed by the source code itself.
+        Response:       Exactly what would have been output to stdout for
+                        a one-shot run, followed by a line containing
+                        SERVER_DONE and the exit code that a one-shot run
+                        would have returned.
+
+  The server exits at end-of-file on stdin.  Messages from the parser (on
+  stderr) are not part of the protocol, so the client should merge stderr
+  into stdout if it wants them.
 */
 
 #include <stdio.h>
@@ -19,12 +36,51 @@
 #include "Printer.h"
 #include "Absyn.h"
 
+#define SERVER_READY "SERVER_READY"
+#define SERVER_DONE "SERVER_DONE"
+
 void usage(void) {
   printf("Usage:\n");
   printf("\tmodernHAL-S-FC [OPTIONS] SOURCEFILE | <SOURCEFILE\n\n");
   printf("The available OPTIONS are:\n");
   printf("\t--help            Print this message and quit.\n");
   printf("\t--trace           Enable parser tracing.\n");
+  printf("\t--server          Parse source code repeatedly, as requested\n");
+  printf("\t                  on stdin.\n");
+}
+
+/* Parses source code as requested on stdin, until end-of-file. */
+int server(void)
+{
+  char header[32];
+  char *source = NULL;
+  size_t allocated = 0, length;
+  COMPILATION parse_tree;
+
+  printf("%s\n", SERVER_READY);
+  fflush(stdout);
+  while (fgets(header, sizeof(header), stdin) != NULL)
+    {
+      length = strtoul(header, NULL, 10);
+      if (length + 1 > allocated)
+        {
+          allocated = length + 1;
+          source = realloc(source, allocated);
+          if (source == NULL)
+            return 1;
+        }
+      if (fread(source, 1, length, stdin) != length)
+        break;
+      source[length] = 0;
+      parse_tree = psCOMPILATION(source);
+      if (parse_tree)
+        printf("%s\n", showCOMPILATION(parse_tree));
+      fflush(stderr);
+      printf("%s %d\n", SERVER_DONE, parse_tree ? 0 : 1);
+      fflush(stdout);
+    }
+  free(source);
+  return 0;
 }
 
 int main(int argc, char ** argv)
@@ -32,6 +88,7 @@ int main(int argc, char ** argv)
   FILE *input;
   COMPILATION parse_tree;
   int quiet = 0;
+  int serve = 0;
   char *filename = NULL;
   int i;
 
@@ -48,6 +105,10 @@ int main(int argc, char ** argv)
           extern int HAL_Sdebug;
           HAL_Sdebug = 1;
         }
+      else if (!strcmp(argv[i], "--server"))
+        {
+          serve = 1;
+        }
       else if (argv[i][0] == '-')
         {
           printf("Unrecognized option %s.\n\n", argv[i]);
@@ -73,6 +134,9 @@ int main(int argc, char ** argv)
         }
     }
 
+  if (serve)
+    return server();
+
   /* The default entry point is used. For other options see Parser.h */
   parse_tree = pCOMPILATION(input);
   if (parse_tree)
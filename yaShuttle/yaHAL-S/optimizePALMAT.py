@@ -13,6 +13,14 @@ charitably.  However, some liberties taken by the code-generation process are
 just such low-hanging fruit that it was too tempting to resist.
 """
 
+import io
+import contextlib
+from palmatAux import unlinkPALMAT
+from executePALMAT import operatorOpcodes, opcodes, builtIns, decodeNumber, \
+    executePALMAT
+from unaryFunctions import unaryRTL
+from binaryFunctions import binaryRTL
+
 #-----------------------------------------------------------------------------
 # This optimization doesn't provide any speedups, but results in a filesize
 # reduction by eliminating "source" fields in instructions without a "label"
@@ -79,13 +87,478 @@ def eliminateUselessNoops(PALMAT, scope):
                 address[1] -= 1
             j = testScope["parent"]
 
+#-----------------------------------------------------------------------------
+# This optimization replaces certain sequences of instructions that the code
+# generator emits very frequently by single "superinstructions", for which
+# the emulator has handlers of their own.  Executing the superinstruction does
+# exactly what executing the sequence would have done, but with only one
+# trip (rather than 2-4 of them) through the emulator's instruction-dispatch
+# loop, which in a Python emulator is a cost comparable to the actual work of
+# the simpler instructions.  Here are the superinstructions:
+#
+#   number, storepop            { 'storeconstant': (si, identifier),
+#                                 'value': n }
+#   A, B, operator              { 'compute': operator, 'operands': [A, B] }
+#   A, B, operator, storepop    { 'computestore': (si, identifier),
+#                                 'op': operator, 'operands': [A, B] }
+#   A, B, operator, iffalse     { 'computeiffalse': (si, label),
+#                                 'op': operator, 'operands': [A, B] }
+#   A, B, operator, iftrue      { 'computeiftrue': ... }
+#   A, iffalse                  { 'fetchiffalse': (si, label),
+#                                 'operands': [A] }
+#   A, iftrue                   { 'fetchiftrue': ... }
+#   A, B, +><, iftrue           { 'loopstep': (si, label), 
+#                                 'increment': (si, identifier),
+#                                 'operands': [A, B] }
+#
+# where A and B are 'number' instructions or unsubscripted 'fetch' 
+# instructions, and operator is any binary operator.  The first of these is 
+# the "Extensions to PALMAT Instruction Set" suggestion in PALMAT.md; the 
+# others are the sequences executed most often by the DO WHILE, DO UNTIL, 
+# DO FOR, IF, and assignment statements of typical code.  (For 'fetchiffalse' 
+# and 'fetchiftrue', A must be a 'fetch'.)
+#
+# No instruction but the first of a fused sequence may be the target of a jump,
+# and the instruction preceding the sequence mustn't be a 'subscripts' or
+# 'dotted' operator, since those apply only to the instruction immediately
+# following them.
+#
+# Returns the number of instructions eliminated.
+
+# The instructions which are allowed to be fused, and the keys they're allowed
+# to have.
+fusibleKeys = {
+    "number": { "number", "source", "label" },
+    "fetch": { "fetch", "source", "label" },
+    "operator": { "operator", "source", "label" },
+    "storepop": { "storepop", "source", "label" },
+    "iffalse": { "iffalse", "source", "label" },
+    "iftrue": { "iftrue", "source", "label" },
+    "+><": { "+><", "source", "label" }
+    }
+binaryOperators = { operator for operator in operatorOpcodes \
+                    if operatorOpcodes[operator] == opcodes["operatorBinary"] }
+
+# Returns the name of a fusible instruction, or None if it isn't fusible.
+def fusibleName(instruction):
+    for name in fusibleKeys:
+        if name in instruction:
+            if instruction.keys() <= fusibleKeys[name]:
+                if name == "operator" and \
+                        instruction["operator"] not in binaryOperators:
+                    return None
+                return name
+            return None
+    return None
+
+# Returns a (superinstruction, count) pair for the longest sequence of 
+# instructions at instructions[i:] that can be fused, where count is the number
+# of instructions fused, or else (None, 0).
+def fuseAt(instructions, i, targets):
+    names = []
+    for j in range(i, min(i + 4, len(instructions))):
+        if j > i and ("label" in instructions[j] or j in targets):
+            break
+        name = fusibleName(instructions[j])
+        if name == None:
+            break
+        names.append(name)
+    pushes = ["number", "fetch"]
+    sequence = instructions[i:i + len(names)]
+    if len(names) >= 3 and names[0] in pushes and names[1] in pushes:
+        operands = [{ names[0]: sequence[0][names[0]] },
+                    { names[1]: sequence[1][names[1]] }]
+        if names[2] == "operator":
+            operator = sequence[2]["operator"]
+            if len(names) == 4 and names[3] == "storepop":
+                return { "computestore": sequence[3]["storepop"],
+                         "op": operator, "operands": operands }, 4
+            if len(names) == 4 and names[3] in ["iffalse", "iftrue"]:
+                return { "compute" + names[3]: sequence[3][names[3]],
+                         "op": operator, "operands": operands }, 4
+            return { "compute": operator, "operands": operands }, 3
+        if names[2] == "+><" and len(names) == 4 and names[3] == "iftrue":
+            return { "loopstep": sequence[3]["iftrue"],
+                     "increment": sequence[2]["+><"],
+                     "operands": operands }, 4
+    if len(names) >= 2:
+        if names[0] == "number" and names[1] == "storepop":
+            return { "storeconstant": sequence[1]["storepop"],
+                     "value": sequence[0]["number"] }, 2
+        if names[0] == "fetch" and names[1] in ["iffalse", "iftrue"]:
+            return { "fetch" + names[1]: sequence[1][names[1]],
+                     "operands": [{ "fetch": sequence[0]["fetch"] }] }, 2
+    return None, 0
+
+# The attributes of all labels in a scope or its ancestors which refer to
+# addresses within the scope.
+def labelsIntoScope(PALMAT, scope):
+    thisScope = scope["self"]
+    labels = []
+    j = thisScope
+    while j != None:
+        testScope = PALMAT["scopes"][j]
+        testIdentifiers = testScope["identifiers"]
+        for identifier in testIdentifiers:
+            attributes = testIdentifiers[identifier]
+            if "label" in attributes and attributes["label"][0] == thisScope:
+                labels.append(attributes)
+        j = testScope["parent"]
+    return labels
+
+# Having rebuilt the instructions of a scope, with newOffsets[i] being the new
+# offset of the instruction at old offset i, fixes up the labels (as returned
+# by labelsIntoScope()) referencing it.  A label referencing the old end of 
+# the scope references the new end.
+def remapLabels(labels, newOffsets, newLength):
+    for attributes in labels:
+        address = attributes["label"]
+        if address[1] < len(newOffsets):
+            address[1] = newOffsets[address[1]]
+        else:
+            address[1] = newLength
+
+def fuseSuperinstructions(PALMAT, scope):
+    instructions = scope["instructions"]
+    labels = labelsIntoScope(PALMAT, scope)
+    targets = { attributes["label"][1] for attributes in labels }
+    fused = []
+    # newOffsets[i] is the new offset of the instruction at old offset i.
+    newOffsets = []
+    i = 0
+    while i < len(instructions):
+        instruction = instructions[i]
+        superinstruction, count = None, 0
+        if i == 0 or \
+                instructions[i - 1].get("operator") not in \
+                    ["subscripts", "dotted"]:
+            superinstruction, count = fuseAt(instructions, i, targets)
+        if superinstruction == None:
+            newOffsets.append(len(fused))
+            fused.append(instruction)
+            i += 1
+            continue
+        # Having executed the superinstruction, the emulator's notion of the
+        # current source-code location must be the same as if the sequence
+        # had been executed.
+        for j in range(i, i + count):
+            newOffsets.append(len(fused))
+            if "source" in instructions[j]:
+                superinstruction["source"] = instructions[j]["source"]
+        if "label" in instruction:
+            superinstruction["label"] = instruction["label"]
+        fused.append(superinstruction)
+        i += count
+    eliminated = len(instructions) - len(fused)
+    if eliminated == 0:
+        return 0
+    remapLabels(labels, newOffsets, len(fused))
+    scope["instructions"] = fused
+    return eliminated
+
+#-----------------------------------------------------------------------------
+# Constant folding.  The code generator (see expressionSM.py) already computes
+# entire expressions at compile time when all of their operands are literals
+# or CONSTANTs, but not the constant subexpressions of expressions having other
+# operands too, such as the `2 PI` in `X = 2 PI R`.  This optimization finds
+# the sequences of instructions which push 1-3 numbers (via `number`
+# instructions, or `fetch` instructions for numeric CONSTANTs) and then 
+# immediately consume them with an operator or arithmetic RTL function, and 
+# replaces each such sequence by a single `number` instruction for the result.
+# The result is computed by the emulator itself, just as expressionSM.py does,
+# so it's exactly what would have been computed at runtime.  Computations that
+# fail (for example, SQRT of a negative number) are simply left in place, and 
+# the error is reported at runtime, if and when they're executed.
+#
+# Returns the number of instructions eliminated.
+
+# Functions that can be folded, with the number of arguments they take.  These
+# are the ones which depend only on their arguments.
+foldableFunctions = {}
+for i in range(1, len(builtIns)):
+    for function in builtIns[i]:
+        if function in unaryRTL or function in binaryRTL or \
+                function == "MIDVAL":
+            foldableFunctions[function] = i
+# Operators that can be folded, with the number of operands they take.
+foldableOperators = {}
+for operator in operatorOpcodes:
+    if operatorOpcodes[operator] == opcodes["operatorUnary"]:
+        foldableOperators[operator] = 1
+    elif operatorOpcodes[operator] == opcodes["operatorBinary"]:
+        foldableOperators[operator] = 2
+
+# If an instruction pushes a compile-time numeric constant, returns a `number`
+# instruction which does so (without any source or label), and otherwise None.
+def constantPush(PALMAT, instruction):
+    if fusibleName(instruction) == "number":
+        return { "number": instruction["number"] }
+    if fusibleName(instruction) == "fetch":
+        si, identifier = instruction["fetch"]
+        if si == -1:
+            return None
+        attributes = PALMAT["scopes"][si]["identifiers"]\
+                                        .get("^" + identifier + "^")
+        if attributes == None or "constant" not in attributes:
+            return None
+        return numberInstruction(attributes["constant"])
+    return None
+
+# A `number` instruction for a value, or None if the value isn't a number
+# that can be represented exactly by one.
+def numberInstruction(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    number = str(value)
+    try:
+        if decodeNumber(number) != value or \
+                type(decodeNumber(number)) != type(value):
+            return None
+    except:
+        return None
+    return { "number": number }
+
+# If an instruction consumes operands that could be folded, returns the 
+# number of operands it consumes, and otherwise 0.
+def foldableArity(instruction):
+    if instruction.keys() <= { "operator", "source", "label" }:
+        return foldableOperators.get(instruction["operator"], 0)
+    if instruction.keys() <= { "function", "source", "label" }:
+        return foldableFunctions.get(instruction["function"], 0)
+    return 0
+
+# Computes the value left on the stack by a list of instructions, without
+# any error messages.  Returns None on failure.
+def computeConstant(instructions):
+    temporaryScope = {
+        "parent"        : None,
+        "self"          : 0,
+        "children"      : [ ],
+        "identifiers"   : { },
+        "instructions"  : instructions,
+        "type"          : "compiler"
+    }
+    # Error messages are discarded, but need a source file to refer to.
+    temporaryPALMAT = { "scopes": [temporaryScope], 
+                        "sourceFiles": ["(constant folding)"] }
+    with contextlib.redirect_stdout(io.StringIO()):
+        computationStack = executePALMAT(temporaryPALMAT)
+    if computationStack == None or len(computationStack) != 1:
+        return None
+    return numberInstruction(computationStack[0])
+
+def foldConstants(PALMAT, scope):
+    instructions = scope["instructions"]
+    labels = labelsIntoScope(PALMAT, scope)
+    targets = { attributes["label"][1] for attributes in labels }
+    folded = []
+    newOffsets = []
+    # The offsets in folded of the consecutive constant pushes immediately 
+    # preceding the current instruction, and the `number` instructions 
+    # equivalent to them.
+    pushes = []
+    numbers = []
+    for i in range(len(instructions)):
+        instruction = instructions[i]
+        if "label" in instruction or i in targets or \
+                (i > 0 and instructions[i - 1].get("operator") in \
+                    ["subscripts", "dotted"]):
+            pushes = []
+            numbers = []
+        newOffsets.append(len(folded))
+        folded.append(instruction)
+        number = constantPush(PALMAT, instruction)
+        if number != None:
+            pushes.append(len(folded) - 1)
+            numbers.append(number)
+            continue
+        arity = foldableArity(instruction)
+        if arity == 0 or arity > len(pushes):
+            pushes = []
+            numbers = []
+            continue
+        operation = dict(instruction)
+        operation.pop("source", None)
+        operation.pop("label", None)
+        result = computeConstant(numbers[-arity:] + [operation])
+        if result == None:
+            pushes = []
+            numbers = []
+            continue
+        # Replace the pushes and the operation by the result.
+        first = pushes[-arity]
+        for j in range(first, len(folded)):
+            if "source" in folded[j]:
+                result["source"] = folded[j]["source"]
+        if "label" in folded[first]:
+            result["label"] = folded[first]["label"]
+        del folded[first:]
+        folded.append(result)
+        j = i
+        while j >= 0 and newOffsets[j] > first:
+            newOffsets[j] = first
+            j -= 1
+        del pushes[-arity:]
+        del numbers[-arity:]
+        pushes.append(first)
+        numbers.append({ "number": result["number"] })
+    eliminated = len(instructions) - len(folded)
+    if eliminated > 0:
+        remapLabels(labels, newOffsets, len(folded))
+        scope["instructions"] = folded
+    return eliminated
+
+#-----------------------------------------------------------------------------
+# Elimination of unreachable code.  Instructions following a `goto`, `return`,
+# `returnoffset`, or `halt` can be reached only by a jump, so they're 
+# eliminated up to the next one which is the target of a label.  (This 
+# happens in practice for code following a RETURN or EXIT in a DO group,
+# for example.)
+#
+# Returns the number of instructions eliminated.
+
+transferOpcodes = { "goto", "return", "returnoffset", "halt" }
+
+def eliminateUnreachableCode(PALMAT, scope):
+    instructions = scope["instructions"]
+    labels = labelsIntoScope(PALMAT, scope)
+    targets = { attributes["label"][1] for attributes in labels }
+    reachable = []
+    newOffsets = []
+    unreachable = False
+    for i in range(len(instructions)):
+        instruction = instructions[i]
+        if "label" in instruction or i in targets:
+            unreachable = False
+        newOffsets.append(len(reachable))
+        if unreachable:
+            continue
+        reachable.append(instruction)
+        for name in transferOpcodes:
+            if name in instruction:
+                unreachable = True
+    eliminated = len(instructions) - len(reachable)
+    if eliminated > 0:
+        remapLabels(labels, newOffsets, len(reachable))
+        scope["instructions"] = reachable
+    return eliminated
+
+#-----------------------------------------------------------------------------
+# Elimination of uncalled FUNCTIONs and PROCEDUREs.  Any FUNCTION or PROCEDURE
+# which isn't the target of a `call` instruction, in scope 0 or any scope that
+# could itself be executed, is removed, in the same way that a FUNCTION or
+# PROCEDURE which has been redefined is removed by the code generator (see 
+# p_Functions.py):  i.e., it's unlinked from its parent scope and its 
+# identifier discarded, though its index in the list of scopes remains in use.
+# PROGRAMs, TASKs, and COMPOOLs are always kept.
+#
+# This is only appropriate when the entire program has been compiled.  It
+# mustn't be done by the interpreter, which may compile a FUNCTION in one 
+# input and a call to it in another.
+#
+# Returns a dictionary whose keys are the indices of the removed scopes, and
+# whose values are the numbers of instructions eliminated by removing them.
+
+def eliminateUncalledScopes(PALMAT):
+    scopes = PALMAT["scopes"]
+    subroutines = { i for i in range(len(scopes)) \
+                    if scopes[i]["type"] in ["function", "procedure"] and \
+                        scopes[i]["parent"] != None }
+    
+    # Can the scope be executed, given the subroutines known to be called?
+    # (Scopes which have already been unlinked from scope 0 can't.)
+    def live(i, called):
+        while i != 0:
+            if i == None or (i in subroutines and i not in called):
+                return False
+            i = scopes[i]["parent"]
+        return True
+    
+    called = set()
+    while True:
+        newlyCalled = set()
+        for i in range(len(scopes)):
+            if not live(i, called):
+                continue
+            for instruction in scopes[i]["instructions"]:
+                if "call" not in instruction:
+                    continue
+                si, identifier = instruction["call"]
+                if si == -1:
+                    continue
+                attributes = scopes[si]["identifiers"]\
+                                    .get("^" + identifier + "^")
+                if attributes != None and "scope" in attributes and \
+                        attributes["scope"] not in called:
+                    newlyCalled.add(attributes["scope"])
+        if len(newlyCalled) == 0:
+            break
+        called |= newlyCalled
+    
+    def countInstructions(i):
+        count = len(scopes[i]["instructions"])
+        for child in scopes[i]["children"]:
+            count += countInstructions(child)
+        return count
+    
+    eliminated = {}
+    for i in sorted(subroutines - called):
+        scope = scopes[i]
+        parent = scope["parent"]
+        if parent == None or not live(parent, called):
+            # Already removed along with an ancestor.
+            continue
+        eliminated[i] = countInstructions(i)
+        scopes[parent]["children"].remove(i)
+        scopes[parent]["identifiers"].pop(scope["name"], None)
+        scope["parent"] = None
+    return eliminated
+
 #-----------------------------------------------------------------------------
 # This is the top-level optimization function.  The optimizations are done
-# in-place on the provided PALMAT structure.
-def optimizePALMAT(PALMAT):
+# in-place on the provided PALMAT structure.  Each scope from which any 
+# instructions are eliminated gets (or adds to) an "eliminated" key whose
+# value is a dictionary of the number of instructions eliminated, by 
+# optimization.  The `SCOPES command of the interpreter displays it.
+#
+# The wholeProgram parameter should be True only if PALMAT contains the entire
+# program, since it enables the elimination of uncalled subroutines.
+#
+# Only the root scope and the scopes from firstScope onward are optimized,
+# so that the interpreter, which optimizes after compiling each statement,
+# needn't optimize all over again the scopes of the statements before it.
+# (Which it couldn't improve on anyway, since the optimizations are 
+# confined to individual scopes and don't find anything more to do in a 
+# scope already optimized.)
+def optimizePALMAT(PALMAT, wholeProgram=False, firstScope=1):
+    
+    def countEliminated(scope, optimization, eliminated):
+        if eliminated > 0:
+            counts = scope.setdefault("eliminated", {})
+            counts[optimization] = counts.get(optimization, 0) + eliminated
+    
+    scopes = PALMAT["scopes"][:1] + PALMAT["scopes"][firstScope:]
+    if wholeProgram:
+        unlinkPALMAT(PALMAT)
+    else:
+        unlinkPALMAT(PALMAT, [scope["self"] for scope in scopes])
     
     # Here are optimizations confined to individual scopes, more-or-less.
-    for scope in PALMAT["scopes"]:
+    for scope in scopes:
         eliminateRedundantCrossReferences(scope)
         eliminateUselessNoops(PALMAT, scope)
+        countEliminated(scope, "folding", foldConstants(PALMAT, scope))
+        countEliminated(scope, "unreachable", 
+                        eliminateUnreachableCode(PALMAT, scope))
+    
+    if wholeProgram:
+        eliminated = eliminateUncalledScopes(PALMAT)
+        for i in eliminated:
+            countEliminated(PALMAT["scopes"][i], "uncalled", eliminated[i])
+    
+    # Fusing superinstructions must come last, since the other optimizations
+    # don't know about superinstructions.
+    for scope in scopes:
+        countEliminated(scope, "fusion", fuseSuperinstructions(PALMAT, scope))
+        eliminateRedundantCrossReferences(scope)
         
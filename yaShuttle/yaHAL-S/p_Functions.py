@@ -59,7 +59,7 @@ to pop the final value from the runtime execution stack.
 import sys
 import copy
 from palmatAux import addAttribute, findIdentifier, removeAncestors, \
-                      notUnmarkedScalars
+                      notUnmarkedScalars, unlinkPALMAT, hFALSE
 
 # This is persistent statelike information, unlike the "state" parameter
 # used for functions that propagates only *into* the recursive descent and
@@ -262,6 +262,7 @@ def updateCurrentIdentifierAttribute(PALMAT, state, attribute=None, value=True):
 # do in HAL/S, but there are interpreter commands for it.
 # The identifier name is unmangled and not carat-quoted.
 def removeIdentifier(PALMAT, macros, scopeIndex, identifier):
+    unlinkPALMAT(PALMAT)
     scope = PALMAT["scopes"][scopeIndex]
     macros0 = macros[scopeIndex]
     mangled = identifier
@@ -280,6 +281,7 @@ def removeIdentifier(PALMAT, macros, scopeIndex, identifier):
         print("Identifier not found: %s (%s)" % (identifier, mangled))
 
 def removeAllIdentifiers(PALMAT, macros, scopeIndex):
+    unlinkPALMAT(PALMAT)
     scope = PALMAT["scopes"][scopeIndex]
     macros0 = macros[scopeIndex]
     identifiers = scope["identifiers"]
@@ -473,6 +475,14 @@ def stringLiteral(PALMAT, state, s):
         identifiers[s].update(substate["commonAttributes"])
         if s[1:3] == "s_":
             identifiers[s]["structure"] = True
+        for eventLabel in eventDeclarations:
+            if eventLabel in history:
+                # Events are BIT(1) variables, but set only by SET, RESET,
+                # and SIGNAL.
+                identifiers[s]["event"] = True
+                identifiers[s]["bit"] = 1
+                identifiers[s]["value"] = copy.deepcopy(hFALSE)
+                break
         if "declaration_labelToken_function" in history or \
                 "nameId_bitFunctionIdentifierToken" in history or \
                 "nameId_charFunctionIdentifierToken" in history or \
@@ -509,7 +519,8 @@ def stringLiteral(PALMAT, state, s):
         elif "parameter_list" in history:
             identifiers[identifier]["parameters"].append(s[1:-1])
     elif "function_name" in history or "procedure_name" in history or \
-            "blockHeadProgram" in history or "blockHeadCompool" in history:
+            "blockHeadProgram" in history or "blockHeadCompool" in history or \
+            "blockHeadTask" in history:
         for i in scope["children"]:
             if "name" in PALMAT["scopes"][i] and \
                     s == PALMAT["scopes"][i]["name"]:
@@ -531,6 +542,8 @@ def stringLiteral(PALMAT, state, s):
             addAttribute(identifiers, s, "program", True)
         elif "blockHeadCompool" in history:
             addAttribute(identifiers, s, "compool", True)
+        elif "blockHeadTask" in history:
+            addAttribute(identifiers, s, "task", True)
         addAttribute(identifiers, s, "scope", len(scopes))
     elif state1 == "label_definition":
         identifiers[s] = { "label" : [scopeIndex, len(instructions)] }
@@ -619,6 +632,7 @@ augmentationCandidates = [
     "blockHeadFunction",
     "blockHeadProcedure",
     "blockHeadProgram",
+    "blockHeadTask",
     "call_assign_list",
     "call_key",
     "charExpCat",
@@ -626,6 +640,10 @@ augmentationCandidates = [
     "declaration_labelToken_function",
     "declaration_labelToken_function_minorAttrList",
     "declaration_labelToken_procedure",
+    "declaration_eventToken_event",
+    "declaration_eventToken_event_minorAttrList",
+    "declaration_eventToken",
+    "declaration_eventToken_minorAttrList",
     "declaration_list",
     "declareBody_attributes_declarationList",
     "declareBody_declarationList",
@@ -677,6 +695,12 @@ augmentationCandidates = [
     "write_arg",
     "write_key",
     ]
+eventDeclarations = [
+    "declaration_eventToken_event",
+    "declaration_eventToken_event_minorAttrList",
+    "declaration_eventToken",
+    "declaration_eventToken_minorAttrList",
+    ]
 def augmentHistory(state, lbnfLabel):
     if lbnfLabel not in augmentationCandidates:
         return state
@@ -20,9 +20,14 @@ History:        2023-01-10 RSB  Split off from PALMAT.py.
 import json
 import re
 import copy
+import itertools
 import math
 from math import nan as NaN
 from decimal import Decimal, ROUND_HALF_UP
+from binaryPALMAT import binaryMagic, isBinaryPALMAT, writeBinaryPALMAT, \
+                         readBinaryPALMAT, materializePALMAT
+from halArray import HalArray, arrayOffsets, copyElements, halArrayToJSON, \
+                     halArraysFromJSON, isNestedArray, nestedToHalArray
 
 # The following patterns are used the same way as "\\b" would be used in a 
 # regex at the start and end of a pattern to indicate a word boundary.  The 
@@ -45,7 +50,8 @@ fqEnd = "\\b(?!\\s*\\.)"
 # out the hard way since it's not documented in the Python docs, which implies
 # that it works on anything.  So it must be modified as follows.
 def isNaN(object):
-    if object == None or isinstance(object, (list, tuple, dict, set, str)):
+    if object == None or \
+            isinstance(object, (list, tuple, dict, set, str, HalArray)):
         return False
     return math.isnan(object)
 
@@ -105,13 +111,15 @@ def appendInstruction(instructions, instruction, source, insert=-1):
     else:
         instructions.append(instruction)
 
-# Configures HAL/S source-file name for astToLbnf() (see below).
+# Configures HAL/S source-file name for astToLbnf() (see below).  Returns
+# the index of the file in PALMAT["sourceFiles"].
 astSourceIndex = -1
 def astSourceFile(PALMAT, filename):
     global astSourceIndex
     if filename not in PALMAT["sourceFiles"]:
         PALMAT["sourceFiles"].append(filename)
     astSourceIndex = PALMAT["sourceFiles"].index(filename)
+    return astSourceIndex
 
 # Using some state machines (expressionSM, doForSM) which are passed an ast
 # object, it's necessary to construct an lbnfLabel and a source list (which
@@ -235,32 +243,22 @@ def isCompletelyInitialized(object):
         for element in object:
             if not isCompletelyInitialized(element):
                 return False
+    elif isinstance(object, HalArray):
+        for element in object.buffer:
+            if not isCompletelyInitialized(element):
+                return False
     return True
 
-# Quick check if value is array.  Fuller test is isArrayGeometry() in
-# executePALMAT.
+# Check if value is an ARRAY.  (See halArray.py.)
 def isArrayQuick(value):
-    if not isinstance(value, list) or len(value) < 2 or value[-1] != "a":
-        return False
-    return True
+    return isinstance(value, HalArray)
 
-# Get dimensions of an Array.  Doesn't check that it *is* and ARRAY, but just
-# gets the dimensions assuming that it is.  The return value is the list of
+# Get dimensions of an ARRAY.  The return value is the list of
 # dimensions and a representative value of the array's entries.  If this
 # is not an uninitialized value, we can use it very quickly to determine some
 # gross aspects of the datatype.  If it is uninitialized ... well, too bad.
 def getArrayDimensions(value):
-    dimensions = []
-    while isArrayQuick(value):
-        dimensions.append(len(value) - 1)
-        value = value[0]
-    if value == None: # This particular value uninitialized?
-        unraveled = []
-        flatten(value, unraveled)
-        for value in unraveled:
-            if value != None:
-                break
-    return dimensions, value
+    return list(value.shape), value.buffer[0]
 
 # Test if a value on the computation stack is a boolean.
 def isBitArray(value):
@@ -274,24 +272,21 @@ on error.  Python None is a proper return, because it signifies an uninitialized
 value rather than an illegal operation.)
 '''
 def unaryOperation(PALMAT, function, array):
-    if isArrayQuick(array):
-        dimensions, dummy = getArrayDimensions(array)
-    else:
-        dimensions = []
-    if len(dimensions) > 0:
+    if isinstance(array, HalArray):
         result = []
-        for a in array[:-1]:
-            r = unaryOperation(PALMAT, function, a)
+        for a in array.buffer:
+            if a == None:
+                result.append(None)
+                continue
+            r = function(PALMAT, a)
             if isNaN(r):
                 return NaN
             result.append(r)
-        result.append("a")
-    else:
-        # We're at a leaf element, apply the function to it.
-        if array == None:
-            return None
-        return function(PALMAT, array)
-    return result
+        return HalArray(array.shape, result)
+    # We're at a leaf element, apply the function to it.
+    if array == None:
+        return None
+    return function(PALMAT, array)
 
 '''
 Apply a binary function to two objects, either or both of which being arrays
@@ -304,48 +299,33 @@ Python None is a proper return, because it signifies an uninitialized
 value rather than an illegal operation.) 
 '''
 def binaryOperation(PALMAT, function, array1, array2):
-    if isArrayQuick(array1):
-        dimensions1, dummy = getArrayDimensions(array1)
-    else:
-        dimensions1 = []
-    if isArrayQuick(array2):
-        dimensions2, dummy = getArrayDimensions(array2)
-    else:
-        dimensions2 = []
-    # The list called "dimensions" will be the array dimensions if either 
-    # operand (and thus the output result) are to be arrays.  If dimensions==[],
-    # then neither the operands nor the output is an array.
-    if dimensions1 == []:
-        dimensions = dimensions2
-    elif dimensions2 == []:
-        dimensions = dimensions1
-    elif dimensions1 != dimensions2:
-        return NaN
-    else:
-        dimensions = dimensions1
-    if len(dimensions) > 0:
-        result = []
-        for i in range(dimensions[0]):
-            if dimensions1 == []:
-                child1 = array1
-            else:
-                child1 = array1[i]
-            if dimensions2 == []:
-                child2 = array2
-            else:
-                child2 = array2[i]
-            r = binaryOperation(PALMAT, function, child1, child2)
-            if isNaN(r):
-                return NaN
-            result.append(r)
-        result.append("a")
-    else:
-        # We're at a leaf element, so apply the function right now and 
-        # stop recursing.
+    isArray1 = isinstance(array1, HalArray)
+    isArray2 = isinstance(array2, HalArray)
+    if not isArray1 and not isArray2:
         if array1 == None or array2 == None:
             return None
-        result = function(PALMAT, array1, array2)
-    return result
+        return function(PALMAT, array1, array2)
+    if isArray1 and isArray2:
+        if array1.shape != array2.shape:
+            return NaN
+        shape = array1.shape
+        pairs = zip(array1.buffer, array2.buffer)
+    elif isArray1:
+        shape = array1.shape
+        pairs = [(a, array2) for a in array1.buffer]
+    else:
+        shape = array2.shape
+        pairs = [(array1, a) for a in array2.buffer]
+    result = []
+    for child1, child2 in pairs:
+        if child1 == None or child2 == None:
+            result.append(None)
+            continue
+        r = function(PALMAT, child1, child2)
+        if isNaN(r):
+            return NaN
+        result.append(r)
+    return HalArray(shape, result)
 
 '''
 Apply a trinary function to three objects, any of which can be arrays
@@ -360,60 +340,39 @@ As far as I know, the only use-case for trinaryOperation() is the RTL
 function MIDVAL().
 '''
 def trinaryOperation(PALMAT, function, array1, array2, array3):
-    if isArrayQuick(array1):
-        dimensions1, dummy = getArrayDimensions(array1)
-    else:
-        dimensions1 = []
-    if isArrayQuick(array2):
-        dimensions2, dummy = getArrayDimensions(array2)
-    else:
-        dimensions2 = []
-    if isArrayQuick(array3):
-        dimensions3, dummy = getArrayDimensions(array3)
-    else:
-        dimensions3 = []
-    # The list called "dimensions" will be the array dimensions if any 
-    # operand (and thus the output result) are to be arrays.  If dimensions==[],
-    # then neither the operands nor the output are arrays.
-    if dimensions1 != []:
-        dimensions = dimensions1
-        if (dimensions2 != [] and dimensions2 != dimensions1) or \
-                (dimensions3 != [] and dimensions3 != dimensions1):
-            return NaN
-    elif dimensions2 != []:
-        dimensions = dimensions2
-        if dimensions3 != [] and dimensions3 != dimensions2:
-            return NaN
-    else:
-        dimensions = dimensions3
-        
-    if len(dimensions) > 0:
-        result = []
-        for i in range(dimensions[0]):
-            if dimensions1 == []:
-                child1 = array1
-            else:
-                child1 = array1[i]
-            if dimensions2 == []:
-                child2 = array2
-            else:
-                child2 = array2[i]
-            if dimensions3 == []:
-                child3 = array3
-            else:
-                child3 = array3[i]
-            r = trinaryOperation(PALMAT, function, child1, child2, child3)
-            if isNaN(r):
+    operands = [array1, array2, array3]
+    shape = None
+    for operand in operands:
+        if isinstance(operand, HalArray):
+            if shape == None:
+                shape = operand.shape
+            elif operand.shape != shape:
                 return NaN
-            result.append(r)
-        result.append("a")
-    else:
-        # We're at a leaf element, so apply the function right now and 
-        # stop recursing.
+    if shape == None:
+        # No ARRAYs at all, so apply the function right now.
         if array1 == None or array2 == None or array3 == None:
             return None
-        result = function(PALMAT, array1, array2, array3)
-    return result
+        return function(PALMAT, array1, array2, array3)
+    # Each operand as a list of elements, which for non-ARRAYs are all the 
+    # same.
+    size = 1
+    for width in shape:
+        size *= width
+    for i in range(3):
+        if isinstance(operands[i], HalArray):
+            operands[i] = operands[i].buffer
+        else:
+            operands[i] = [operands[i]] * size
+    result = []
+    for child1, child2, child3 in zip(*operands):
+        if child1 == None or child2 == None or child3 == None:
+            result.append(None)
+            continue
+        r = function(PALMAT, child1, child2, child3)
+        if isNaN(r):
+            return NaN
+        result.append(r)
+    return HalArray(shape, result)
 
 def formBitArray(value, length):
     if isinstance(value, int):
@@ -432,11 +391,18 @@ def parseBitArray(bitArray):
     return bitArray[0], bitArray[1]
 
 # "Flatten" a composite object (VECTOR, MATRIX, ARRAY) onto the end of a list.
-# Not sure what to do about STRUCTURE yet.
+# Not sure what to do about STRUCTURE yet.  ARRAYs in the nested-list form of 
+# PALMAT "array" instructions are accepted as well as HalArrays.
 def flatten(object, onto):
     if isBitArray(object):
         onto.append(object)
-    elif isArrayQuick(object):
+    elif isinstance(object, HalArray):
+        for e in object.buffer:
+            if isinstance(e, list):
+                flatten(e, onto)
+            else:
+                onto.append(e)
+    elif isNestedArray(object):
         for e in object[:-1]:
             flatten(e, onto)
     elif isinstance(object, list):
@@ -472,66 +438,149 @@ def addAttribute(identifiers, identifier, attribute, \
 # interpreter, there is an assumulation of PALMAT scopes which can no longer
 # accessed, as well as an accumulation of compiler-created identifiers used
 # with those inaccessible scopes.  This subroutine eliminates those.
+#
+# It's called before every statement is compiled, so to keep its cost from
+# growing as the session does, it's incremental:  each collection is a new
+# "generation" (counted by the "generation" key of the root scope), and marks
+# the scopes it finds to be new, namely those lacking a "generation" key,
+# with it.  Since scopes are only ever appended, those are always the final
+# scopes, and since every collection removes all compiler-created identifiers
+# from the root scope, the only candidates among the root scope's identifiers
+# are those added since the last collection, which (since dictionaries keep
+# the order of insertion) follow the ones present at the time.  Their number
+# and the last of them are noted as "collected" and "lastIdentifier" of the
+# root scope.  Older scopes are looked at again only
+# if they're at the end, in case they've become unreachable since, and so can
+# be removed.
 autocreatedLabelPattern = "\\^[a-z][a-z]_[0-9]+\\^"
 def isAutocreatedLabel(identifier):
     return None != re.fullmatch(autocreatedLabelPattern, identifier)
 
 def collectGarbage(PALMAT):
+    scopes = PALMAT["scopes"]
+    root = scopes[0]
+    generation = root.get("generation", 0) + 1
+    root["generation"] = generation
     
-    # Recursive function that marks scopes as unreachable.  Scope 0 is always
-    # reachable, as are any PROGRAM, FUNCTION, PROCEDURE, COMPOOL, etc. blocks
-    # with identifiers in scope 0.  However, DO, DO FOR, DO WHILE, DO UNTIL,
-    # and IF blocks that are children of scope 0 are not.  And all the children
-    # of all blocks unreachable from block 0 are unreachable as well.
-    def findUnreachableScopes(scopeIndex=0, level=0):
-        scope = PALMAT["scopes"][scopeIndex]
-        if level == 0:
-            # This scope (the root, scopeIndex=0) is a keeper, but its
-            # descendents may not be.
-            pass
-        elif level == 1 and scope["type"] not in \
-                ["do", "do for", "do for discrete", "do until", "do while", "if"]:
-            # This scope and all of its descendents are keepers.
-            return
-        else:
-            # This scope and all of its descendents are doomed. 
-            # DOOMED, I tell you!
-            scope["unreachable"] = True
-        for child in scope["children"]:
-            findUnreachableScopes(child, level+1)
-    
-    def findObsoleted(scopeIndex):
-        scope = PALMAT["scopes"][scopeIndex]
-        scope["unreachable"] = True
-        for i in scope["children"]:
-            findObsoleted(i)
+    # Scope 0 is always reachable, as are any PROGRAM, FUNCTION, PROCEDURE, 
+    # COMPOOL, etc. blocks with identifiers in scope 0.  However, DO, DO FOR,
+    # DO WHILE, DO UNTIL, and IF blocks that are children of scope 0 are not. 
+    # And all the descendents of unreachable blocks, as well as of blocks 
+    # which have been disconnected from the tree, are unreachable as well.
+    def isUnreachable(scopeIndex):
+        scope = scopes[scopeIndex]
+        while True:
+            if "unreachable" in scope:
+                return True
+            parent = scope["parent"]
+            if parent == None:
+                return True
+            if parent == 0:
+                return scope["type"] in ["do", "do for", "do for discrete", 
+                                         "do until", "do while", "if"]
+            scope = scopes[parent]
     
-    # Scopes disconnected from the root of the tree are unreachable.
-    for i in range(1, len(PALMAT["scopes"])):
-        if PALMAT["scopes"][i]["parent"] == None:
-            findObsoleted(i)
+    first = len(scopes)
+    while first > 1 and "generation" not in scopes[first - 1]:
+        first -= 1
+    for i in range(first, len(scopes)):
+        scopes[i]["generation"] = generation
+        if isUnreachable(i):
+            scopes[i]["unreachable"] = True
     
-    # Now look at the still-connected scopes.
-    findUnreachableScopes()
-    children0 = PALMAT["scopes"][0]["children"]
-    for i in range(len(PALMAT["scopes"])-1, 0, -1):
-        if "unreachable" not in PALMAT["scopes"][i]:
-            break
-        PALMAT["scopes"].pop()
-        if i in children0:
+    # Remove the unreachable scopes at the end.
+    children0 = root["children"]
+    removed = [0]
+    while len(scopes) > 1 and isUnreachable(len(scopes) - 1):
+        i = len(scopes) - 1
+        scopes.pop()
+        if len(children0) > 0 and children0[-1] == i:
+            children0.pop()
+        elif i in children0:
             children0.remove(i)
+        removed.append(i)
+    unlinkPALMAT(PALMAT, removed)
     
     # Get rid of all PALMAT instructions in scope 0.
-    PALMAT["scopes"][0]["instructions"].clear()
+    root["instructions"].clear()
     
     # Eliminate all identifiers that are compiler-generated 
     # identifiers, since every single one of them refers to unreachable blocks,
     # or no-longer-existent PALMAT instructions.
-    identifiers = PALMAT["scopes"][0]["identifiers"]
-    for identifier in list(identifiers.keys()):
+    identifiers = root["identifiers"]
+    count = root.get("collected", 0)
+    if count > len(identifiers) or (count > 0 and \
+            next(itertools.islice(identifiers, count - 1, None)) != \
+                root.get("lastIdentifier")):
+        # Something older has been removed or replaced, so look at them all.
+        count = 0
+    autocreated = []
+    for identifier in itertools.islice(identifiers, count, None):
         if isAutocreatedLabel(identifier):
-            identifiers.pop(identifier)
+            autocreated.append(identifier)
+    for identifier in autocreated:
+        identifiers.pop(identifier)
+    root["collected"] = len(identifiers)
+    if len(identifiers) > 0:
+        root["lastIdentifier"] = next(itertools.islice(identifiers, 
+                                                       len(identifiers) - 1,
+                                                       None))
     
+# Discard the linkage created by linkPALMAT() (see executePALMAT.py), along 
+# with any translation of it (see translatePALMAT.py), which must be done 
+# whenever the PALMAT's instructions or identifiers change.  If scopeNumbers 
+# (a list of scope numbers) is given, only the linkage of those scopes is 
+# discarded, and the rest is kept.
+def unlinkPALMAT(PALMAT, scopeNumbers=None):
+    # Structure layouts (see structureLayout()) may involve any scopes.
+    PALMAT.pop("layouts", None)
+    for key in ["linked", "translated"]:
+        if key in PALMAT:
+            if scopeNumbers == None:
+                PALMAT.pop(key)
+            else:
+                linked = PALMAT[key]
+                for i in scopeNumbers:
+                    linked.pop(i, None)
+
+'''
+Copy-on-write variable frames, as used by clonePALMAT() (see executePALMAT.py)
+for new instantiations.  shareIdentifiers() returns a new identifiers 
+dictionary for a scope in which each variable has its own attributes 
+dictionary, but in which the values of the variables are still those of the 
+original identifiers dictionary, marked by a "copyOnWrite" attribute.  (Labels
+and constants, which are never modified at runtime, share their attributes
+too.)  Nothing else in the attributes is ever modified in-place (though
+attributes may be added or replaced), so that's all that needs to be copied
+up-front.  (The attributes dictionaries of variables themselves can't be
+shared, because the decoded PALMAT instructions hold direct references to
+them.)
+
+Anything which changes a variable's value in-place, rather than simply 
+replacing it, must first call unshareValue() on the variable's attributes, 
+which makes a private copy of the value the first time it's called for the 
+variable.  Structure templates contain the values of their fields, deeply
+nested, so they're simply copied up-front as before.
+'''
+def shareIdentifiers(identifiers):
+    shared = {}
+    for identifier, attributes in identifiers.items():
+        if "label" in attributes or "constant" in attributes:
+            pass
+        elif "template" in attributes:
+            attributes = copy.deepcopy(attributes)
+        else:
+            attributes = attributes.copy()
+            if "value" in attributes:
+                attributes["copyOnWrite"] = True
+        shared[identifier] = attributes
+    return shared
+
+def unshareValue(attributes):
+    if "copyOnWrite" in attributes:
+        attributes.pop("copyOnWrite")
+        attributes["value"] = copy.deepcopy(attributes["value"])
+
 # Compute the length of the instructions array, sans 'debug' instructions.
 def lenInstructions(instructions):
     i = 0
@@ -551,23 +600,40 @@ def popInstruction(instructions):
 # Save an internal PALMAT object to a file. (Actually, it's just a conversion
 # of *any* Python object to JSON for writing it to a file, but our use for it
 # just happens to be for Python objects representing PALMAT datasets.)
-# Returns True for success, False for failure.
-def writePALMAT(PALMAT, filename):
+# Alternatively, if binary is True, the file is in the binary format described
+# in binaryPALMAT.py.  Returns True for success, False for failure.
+def writePALMAT(PALMAT, filename, binary=False):
+    if binary:
+        return writeBinaryPALMAT(PALMAT, filename)
+    materializePALMAT(PALMAT)
     try:
         f = open(filename, "w")
-        print(json.dumps(PALMAT), file=f)
+        unlinked = {}
+        for key in PALMAT:
+            if key not in ["linked", "translated", "watches", "layouts"]:
+                unlinked[key] = PALMAT[key]
+        print(json.dumps(unlinked, default=halArrayToJSON), file=f)
         f.close()
         return True
     except:
         return False
 
 # Load a PALMAT object from a file into internal storage.  Returns either the
-# PALMAT object on success, or None on failure.
+# PALMAT object on success, or None on failure.  The file may be either JSON
+# or binary PALMAT (see binaryPALMAT.py); in the latter case, scopes are 
+# decoded only as needed.
 def readPALMAT(filename):
     try:
+        f = open(filename, "rb")
+        magic = f.read(len(binaryMagic))
+        f.close()
+        if isBinaryPALMAT(magic):
+            return readBinaryPALMAT(filename)
         f = open(filename, "r")
         PALMAT = json.loads(f.readline())
         f.close()
+        for scope in PALMAT["scopes"]:
+            halArraysFromJSON(scope["identifiers"])
         return PALMAT
     except:
         return None
@@ -714,6 +780,71 @@ def expandStructureTemplate(PALMAT, scopeIndex, template):
                                                          fieldAttributes[i])
     return newTemplate
 
+'''
+Structure layouts.  Rather than descending through a structure template (and
+the templates it refers to) every time a STRUCTURE is declared or one of its
+fields is referenced, structureLayout() does it just once for each template,
+producing a layout:
+
+    {
+        "template":     The template's attributes,
+        "fields":       { path: (indices, attributes), ... },
+        "blank":        An uninitialized STRUCTURE (see uninitializedStructure())
+    }
+
+The path of a field is the tuple of field names (as in the templates, so with
+"s_" prefixes for the names of minor structures) leading to it, such as
+("s_B", "C") for the field A.B.C of the STRUCTURE A, and the indices are the
+positions of the successive fields within the (nested) lists comprising the
+STRUCTURE's value, so that the field's value is simply
+value[indices[0]][indices[1]]...  Minor structures appear in "fields" as well
+as their own fields do.
+
+The layouts are kept in PALMAT["layouts"], by the scope number and the mangled,
+carat-quoted template name as looked up from that scope, and are discarded
+along with the linkage by unlinkPALMAT().  Returns the layout, or None if the
+template or any template it refers to cannot be found.
+'''
+def structureLayout(PALMAT, scopeIndex, templateName):
+    layouts = PALMAT.setdefault("layouts", {})
+    key = (scopeIndex, templateName)
+    if key in layouts:
+        return layouts[key]
+    si, template = findIdentifier(templateName, PALMAT, scopeIndex)
+    if template == None or "template" not in template:
+        return None
+    fields = {}
+    def addFields(si, template, path, indices):
+        fieldNames = template["template"][0]
+        fieldAttributes = template["template"][1]
+        for i in range(len(fieldNames)):
+            fieldPath = path + (fieldNames[i],)
+            fieldIndices = indices + (i,)
+            attributes = fieldAttributes[i]
+            fields[fieldPath] = (fieldIndices, attributes)
+            if "structure" in attributes:
+                subSi, sub = findIdentifier("^s_" + \
+                                            attributes["structure"][:-10] + "^",
+                                            PALMAT, si)
+                if sub == None or "template" not in sub:
+                    return False
+                if not addFields(subSi, sub, fieldPath, fieldIndices):
+                    return False
+            elif "template" in attributes:
+                if not addFields(si, attributes, fieldPath, fieldIndices):
+                    return False
+        return True
+    if not addFields(si, template, (), ()):
+        return None
+    layout = {
+        "template": template,
+        "fields": fields,
+        "blank": newStructure(PALMAT, PALMAT["scopes"][si], \
+                              templateName[1:-1], template)
+        }
+    layouts[key] = layout
+    return layout
+
 # This is for searching for identifiers when the proper name-mangling prefix
 # isn't known.  All it does is to return a tuple consisting of the scope index
 # and the mangled identifier, or else -1 if not found.
@@ -824,7 +955,7 @@ def exitDo(PALMAT, source, fromIndex, toIndex):
 # identifiers not explicitly declared as some other type.
 notUnmarkedScalars = ("scalar", "integer", "vector", "matrix", "bit",
                       "character", "template", "structure", "label", 
-                      "procedure", "program", "compool")
+                      "procedure", "program", "compool", "task", "event")
 def isUnmarkedScalar(identifierDict):
     for s in notUnmarkedScalars:
         if s in identifierDict:
@@ -841,10 +972,11 @@ def markUnmarkedScalars(identifiers):
 def uninitializedComposite(arrayDimensions, dimensions):
     composite = []
     if len(arrayDimensions) > 0:
-        for i in range(arrayDimensions[0]):
-            composite.append(uninitializedComposite(arrayDimensions[1:], \
-                                                    dimensions))
-        composite.append("a")
+        composite = HalArray(arrayDimensions)
+        if len(dimensions) > 0:
+            buffer = composite.buffer
+            for i in range(len(buffer)):
+                buffer[i] = uninitializedComposite([], dimensions)
         return composite
     if len(dimensions) > 0:
         for i in range(dimensions[0]):
@@ -854,8 +986,30 @@ def uninitializedComposite(arrayDimensions, dimensions):
     return None
 
 # Returns an uninitialized STRUCTURE, given the attributes of the associated
-# structure template, or NaN on error.
+# structure template, or NaN on error.  When the template is one found by name
+# (as for a DECLARE), the STRUCTURE is copied from the one made the first time,
+# which is kept in the template's layout (see structureLayout()).
 def uninitializedStructure(PALMAT, currentScope, templateName, templateAttributes):
+    if templateName[:2] == "s_" and "template" in templateAttributes:
+        layout = structureLayout(PALMAT, currentScope["self"], \
+                                 "^" + templateName + "^")
+        if layout != None and layout["template"] is templateAttributes:
+            return copyStructure(layout["blank"])
+    return newStructure(PALMAT, currentScope, templateName, templateAttributes)
+
+# A copy of an uninitialized STRUCTURE (much faster than copy.deepcopy()).
+def copyStructure(structure):
+    copied = []
+    for element in structure:
+        if isinstance(element, list):
+            copied.append(copyStructure(element))
+        elif isinstance(element, HalArray):
+            copied.append(HalArray(element.shape, copyElements(element.buffer)))
+        else:
+            copied.append(element)
+    return copied
+
+def newStructure(PALMAT, currentScope, templateName, templateAttributes):
     currentIndex = currentScope["self"]
     if "template" in templateAttributes:
         fieldNames = templateAttributes["template"][0]
@@ -874,15 +1028,14 @@ def uninitializedStructure(PALMAT, currentScope, templateName, templateAttribute
         fieldName = fieldNames[i]
         fieldAttribute = fieldAttributes[i]
         if "structure" in fieldAttribute:
-            sub = uninitializedStructure(PALMAT, currentScope, \
-                                         fieldAttribute["structure"][:-10], \
-                                         fieldAttribute)
+            sub = newStructure(PALMAT, currentScope, \
+                               fieldAttribute["structure"][:-10], \
+                               fieldAttribute)
             if sub == NaN:
                 return NaN
             structure.append(sub)
         elif "template" in fieldAttribute:
-            sub = uninitializedStructure(PALMAT, currentScope, "", \
-                                         fieldAttribute)
+            sub = newStructure(PALMAT, currentScope, "", fieldAttribute)
             if sub == NaN:
                 return NaN
             structure.append(sub)
@@ -912,8 +1065,10 @@ def insertNextElement(struct, value):
     # just assuming the datatypes are right.  We *should* be fed the structure
     # template attributes as a paramter, and should be using it.
     # **FIXME**
+    if isinstance(struct, HalArray):
+        struct = struct.buffer
     for i in range(len(struct)):
-        if isinstance(struct[i], list):
+        if isinstance(struct[i], (list, HalArray)):
             if insertNextElement(struct[i], value):
                 return True
         elif struct[i] == None:
@@ -959,19 +1114,19 @@ def completeInitialConstants(currentScope):
             oldValue = None
         if "initial" in identifierDict:
             value = identifierDict["initial"]
-            if not isinstance(value, list):
+            if not isinstance(value, (list, HalArray)):
                 value = []
                 identifierDict["initial"] = value
             isInitial = True
         elif "constant" in identifierDict:
             value = identifierDict["constant"]
-            if not isinstance(value, list):
+            if not isinstance(value, (list, HalArray)):
                 value = []
                 identifierDict["constant"] = value
             isInitial = False
         elif "array" in identifierDict or "vector" in identifierDict \
                 or "matrix" in identifierDict:
-            if not isinstance(oldValue, list):
+            if not isinstance(oldValue, (list, HalArray)):
                 identifierDict["value"] = \
                     uninitializedComposite(arrayDimensions, \
                                            secondaryDimensions)
@@ -1028,20 +1183,6 @@ def setUninitialized(PALMAT, currentScope):
             "parameters" in currentScope["attributes"]:
         parameters = currentScope["attributes"]["parameters"]
     
-    def uninitializeLevel(arrayDimensions, dimensions):
-        level = []
-        if len(arrayDimensions) > 0:
-            for i in range(arrayDimensions[0]):
-                level.append(uninitializeLevel(arrayDimensions[1:], \
-                                               dimensions[1:]))
-            level.append("a")
-        elif len(dimensions) > 0:
-            for i in range(dimensions[0]):
-                level.append(uninitializeLevel([], dimensions[1:]))
-        else:
-            level = None
-        return level
-
     for identifier in identifiers:
         if identifier[1:-1] in parameters:
             # Don't need to "uninitialize" a formal parameter.
@@ -1075,7 +1216,8 @@ def setUninitialized(PALMAT, currentScope):
             if len(dimensions) == 0:
                 value = None
             else:
-                value = uninitializeLevel(arrayDimensions, dimensions)
+                value = uninitializedComposite(arrayDimensions, \
+                                            dimensions[len(arrayDimensions):])
             attributes["value"] = value
 
 # Test if an object is a vector, and (optionally) if all its elements are 
@@ -1118,6 +1260,8 @@ def isMatrix(object, initialization=True):
     return True
 
 def isArrayGeometry(object, dimensions):
+    if isinstance(object, HalArray):
+        return object.shape == dimensions
     if len(dimensions) == 0:
         # Object is an atomic element.  If we want to check that all of the 
         # types of the array elements are the same and/or initialized, this
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:      None - the author (Ron Burkey) declares this software to
+                be in the Public Domain, with no rights reserved.
+Filename:       palmatLink.py
+Purpose:        Links PALMAT object files, as created by yaHAL-S-FC.py
+                --object=F, into a PALMAT file which the interpreter can
+                load (`READ F) and execute.  See palmatObject.py for the 
+                details.
+"""
+
+import sys
+from palmatObject import readObject, linkObjects
+from palmatAux import writePALMAT
+from optimizePALMAT import optimizePALMAT
+
+output = "a.palmat"
+binary = False
+optimize = True
+objectFiles = []
+for param in sys.argv[1:]:
+    if param == "--help":
+        print("""
+        Links PALMAT object files into a PALMAT file.
+        
+        Usage:
+            palmatLink.py [OPTIONS] OBJECT1 [OBJECT2 [...]]
+        
+        The OPTIONS are:
+        
+        --output=F      The name of the PALMAT file to create (default %s).
+        --binary        Create binary rather than JSON PALMAT.
+        --no-optimize   Don't optimize the PALMAT after linking it.
+        
+        The objects containing COMPOOLs are linked first, but otherwise the 
+        objects are linked in the order given.  Every object imported by 
+        another object when it was compiled (--import) must also be linked.
+        """ % output)
+        sys.exit(0)
+    elif param[:9] == "--output=":
+        output = param[9:]
+    elif param == "--binary":
+        binary = True
+    elif param == "--no-optimize":
+        optimize = False
+    elif param[:1] == "-":
+        print("Unknown parameter:", param)
+        sys.exit(1)
+    else:
+        objectFiles.append(param)
+
+units = []
+for objectFile in objectFiles:
+    unit = readObject(objectFile)
+    if unit == None:
+        print("Cannot read PALMAT object file %s." % objectFile)
+        sys.exit(1)
+    units.append(unit)
+PALMAT = linkObjects(units)
+if PALMAT == None:
+    sys.exit(1)
+if optimize:
+    optimizePALMAT(PALMAT, True)
+if not writePALMAT(PALMAT, output, binary):
+    print("Cannot write PALMAT file %s." % output)
+    sys.exit(1)
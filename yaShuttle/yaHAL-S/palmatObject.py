@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   palmatObject.py
+Requires:   Python 3.7 or later.
+Purpose:    PALMAT object files, for compiling HAL/S compilation units
+            separately and linking them afterward (see palmatLink.py).
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+            PALMAT.md, "PALMAT Object Files".
+
+A PALMAT object file holds the PALMAT generated for a single compilation unit
+(one or more HAL/S source files, compiled by yaHAL-S-FC.py --object=F), in
+the form of a "fragment" of PALMAT like those of the compilation cache (see
+compileCache.py):  the scopes the unit created, numbered consecutively from
+"base", plus whatever it added to the root scope.  The file is a single line
+of JSON, like a PALMAT file, containing a dictionary with these keys:
+
+    "object"            The version of the object format (objectVersion).
+    "unit"              The names of the unit's source files.
+    "key"               Digest of everything the object was generated from,
+                        for deciding whether it's up to date.
+    "interface"         Digest of everything other units compiled against
+                        this one could depend on.
+    "sourceFiles"       As for PALMAT, indexed by the "source" fields of the
+                        instructions.
+    "base", "counter", "variables", "firstLine", "scopes", "root", "PALMAT"
+                        As for compileCache.py fragments.
+    "rootInstructions"  Instructions the unit added to the root scope.
+    "rootLength"        The number of instructions the root scope had before
+                        the unit added its own, relative to which the
+                        offsets of the labels it added to the root scope
+                        (as for the DO groups of its top-level code) are
+                        relocated.
+    "macros"            The REPLACE macros and identifier-mangling macros the
+                        preprocessor defined at the top level of the unit,
+                        which must be in effect when compiling units which
+                        import it.
+    "exports"           The symbols the unit defines, for other units:
+                            "labels":    names of PROGRAMs, FUNCTIONs,
+                                         PROCEDUREs, COMPOOLs, TASKs, and
+                                         statement labels at the top level;
+                            "variables": dictionary of COMPOOL names, each
+                                         with a list of the COMPOOL's
+                                         variables ("" for variables
+                                         declared at the top level outside
+                                         of any block);
+                            "templates": names of structure templates.
+    "imports"           The symbols defined elsewhere that the unit uses, in
+                        the same form as "exports", plus:
+                            "compools":  dictionary relating the scope
+                                         numbers (as strings) of COMPOOLs
+                                         the unit's code refers to, to the
+                                         COMPOOLs' names;
+                            "objects":   list of [unit, interface] pairs, for
+                                         the object files the unit was
+                                         compiled against.
+
+The imported objects are those given with --import=F, which are linked
+(linkObject() below) into the PALMAT before the unit is compiled, COMPOOLs
+first as for linkObjects(), so that it can refer to their identifiers and
+COMPOOLs just as if they had been compiled along with it.  Linking an object means relocating its scope numbers,
+generated labels, and source-file indices just as for cached blocks, and in
+addition, renumbering references to COMPOOL scopes to those of the COMPOOLs
+of the same names in the PALMAT being linked into.  A unit is only
+recompiled if its source code, the compiler, or the interface of one of the
+objects it imports has changed, so that rebuilding a large program after
+editing the body of one PROCEDURE means recompiling just that PROCEDURE and
+relinking.
+"""
+
+import json
+import copy
+from halArray import halArrayToJSON, halArraysFromJSON
+import palmatAux
+from processSource import processSource
+from compileCache import rootSnapshot, rootChanges, spliceFragment, \
+                         cacheKey, generatedName, serialize
+
+# Bump this if the format of object files changes.
+objectVersion = 2
+
+# The root-scope identifier for the name of a symbol (as it appears in
+# instruction operands, sometimes with and sometimes without the carats).
+def identifierOf(name):
+    if name[:1] == "^":
+        return name
+    return "^" + name + "^"
+
+# JSON has no tuples, so (scope, identifier) operands read back as lists.
+def pairsToTuples(value):
+    if isinstance(value, list):
+        if len(value) == 2 and type(value[0]) == int and \
+                isinstance(value[1], str):
+            return tuple(value)
+        return [pairsToTuples(v) for v in value]
+    if isinstance(value, dict):
+        return {k: pairsToTuples(v) for k, v in value.items()}
+    return value
+
+# Returns the object read from a file, or None on failure.
+def readObject(filename):
+    try:
+        f = open(filename, "r")
+        unit = json.loads(f.readline())
+        f.close()
+    except:
+        return None
+    if not isinstance(unit, dict) or unit.get("object") != objectVersion:
+        return None
+    halArraysFromJSON(unit["root"])
+    for scope in unit["scopes"]:
+        halArraysFromJSON(scope["identifiers"])
+        scope["instructions"] = [pairsToTuples(instruction) \
+                                 for instruction in scope["instructions"]]
+    # A scope's "attributes" must again be the very same object as its 
+    # identifier in the parent scope, for relocation.
+    base = unit["base"]
+    for scope in unit["scopes"]:
+        if "attributes" in scope:
+            if scope["parent"] < base:
+                identifiers = unit["root"]
+            else:
+                identifiers = unit["scopes"][scope["parent"] - base]\
+                              ["identifiers"]
+            if scope["name"] in identifiers:
+                scope["attributes"] = identifiers[scope["name"]]
+    unit["rootInstructions"] = [pairsToTuples(instruction) \
+                                for instruction in unit["rootInstructions"]]
+    return unit
+
+# Returns True on success, False on failure.
+def writeObject(unit, filename):
+    try:
+        f = open(filename, "w")
+        print(json.dumps(unit, default=halArrayToJSON), file=f)
+        f.close()
+        return True
+    except:
+        return False
+
+#-----------------------------------------------------------------------------
+# Linking.
+
+# The scope numbers of the COMPOOLs in a PALMAT, by name.
+def compoolScopes(PALMAT):
+    compools = {}
+    for identifier, attributes in PALMAT["scopes"][0]["identifiers"].items():
+        if "compool" in attributes:
+            compools[identifier] = attributes["scope"]
+    return compools
+
+'''
+Links an object (as returned by readObject()) into a PALMAT, and the object's
+macros into the outermost macros (if not None).  The object is consumed in
+the process.  Symbols it imports which are defined by objects not yet linked
+aren't checked; see unresolvedSymbols() for that.  Returns True on success,
+or prints a message and returns False on failure.
+'''
+def linkObject(PALMAT, unit, macros=None):
+    scopes = PALMAT["scopes"]
+    identifiers = scopes[0]["identifiers"]
+    name = ", ".join(unit["unit"])
+
+    # COMPOOLs must be linked before the units using them, since the scope
+    # numbers of their variables are needed now.
+    compools = compoolScopes(PALMAT)
+    external = {}
+    for index, compool in unit["imports"]["compools"].items():
+        if compool not in compools:
+            print("Unresolved COMPOOL %s in %s." % (compool[1:-1], name))
+            return False
+        external[int(index)] = compools[compool]
+    for compool, variables in unit["imports"]["variables"].items():
+        if compool == "":
+            continue
+        if compool not in compools:
+            print("Unresolved COMPOOL %s in %s." % (compool[1:-1], name))
+            return False
+        compoolIdentifiers = scopes[compools[compool]]["identifiers"]
+        for identifier in variables:
+            if identifier not in compoolIdentifiers:
+                print("Unresolved %s of COMPOOL %s in %s." % \
+                      (identifier[1:-1], compool[1:-1], name))
+                return False
+    for kind in ["labels", "templates"]:
+        for identifier in unit["exports"][kind]:
+            if identifier in identifiers:
+                print("%s of %s is already defined." % \
+                      (identifier[1:-1], name))
+                return False
+
+    # (astSourceFile() also selects the file for subsequent compilation,
+    # which mustn't change.)
+    sourceIndex = palmatAux.astSourceIndex
+    files = []
+    for sourceFile in unit["sourceFiles"]:
+        files.append(palmatAux.astSourceFile(PALMAT, sourceFile))
+    palmatAux.astSourceIndex = sourceIndex
+    spliceFragment(unit, PALMAT, unit["firstLine"], external, files)
+    if macros != None:
+        macros[0].update(unit["macros"])
+    return True
+
+# Returns a list of the symbols imported by a linked object which aren't
+# defined in the PALMAT.
+def unresolvedSymbols(PALMAT, unit):
+    unresolved = []
+    identifiers = PALMAT["scopes"][0]["identifiers"]
+    for identifier in unit["imports"]["labels"] + \
+            unit["imports"]["templates"] + \
+            unit["imports"]["variables"].get("", []):
+        if identifier not in identifiers:
+            unresolved.append(identifier[1:-1])
+    return unresolved
+
+'''
+Links a list of objects into a new PALMAT, returning the PALMAT, or None
+(after printing messages) on failure.  Objects defining COMPOOLs are linked
+first, but otherwise the order of the list is kept.  Every object must be
+accompanied by the objects it was compiled against, in the same versions.
+'''
+def linkObjects(units):
+    units = compoolsFirst(units)
+    interfaces = {}
+    for unit in units:
+        interfaces[tuple(unit["unit"])] = unit["interface"]
+    success = True
+    for unit in units:
+        for imported, interface in unit["imports"]["objects"]:
+            if tuple(imported) not in interfaces:
+                print("%s requires %s, which isn't being linked." % \
+                      (", ".join(unit["unit"]), ", ".join(imported)))
+                success = False
+            elif interfaces[tuple(imported)] != interface:
+                print("%s was compiled against a different version of %s." % \
+                      (", ".join(unit["unit"]), ", ".join(imported)))
+                success = False
+    if not success:
+        return None
+
+    PALMAT = palmatAux.constructPALMAT()
+    for unit in units:
+        if not linkObject(PALMAT, unit):
+            return None
+    for unit in units:
+        unresolved = unresolvedSymbols(PALMAT, unit)
+        if len(unresolved) > 0:
+            print("Unresolved in %s: %s" % (", ".join(unit["unit"]),
+                                            ", ".join(unresolved)))
+            success = False
+    if not success:
+        return None
+    instructions = PALMAT["scopes"][0]["instructions"]
+    if len(instructions) == 0 or "halt" not in instructions[-1]:
+        instructions.append({"halt": True})
+    return PALMAT
+
+def isCompoolObject(unit):
+    return any(compool != "" for compool in unit["exports"]["variables"])
+
+# The objects defining COMPOOLs, followed by the others, each in their
+# original order.
+def compoolsFirst(units):
+    return [unit for unit in units if isCompoolObject(unit)] + \
+           [unit for unit in units if not isCompoolObject(unit)]
+
+#-----------------------------------------------------------------------------
+# Creating objects.
+
+# The root identifiers a unit has defined, as an "exports" table.
+def exportsOf(PALMAT, changes, snapshot):
+    exports = { "labels": [], "variables": {}, "templates": [] }
+    for identifier, attributes in changes.items():
+        if identifier in snapshot or generatedName.match(identifier) != None:
+            continue
+        if "template" in attributes:
+            exports["templates"].append(identifier)
+        elif "label" in attributes or "scope" in attributes:
+            exports["labels"].append(identifier)
+        else:
+            exports["variables"].setdefault("", []).append(identifier)
+        if "compool" in attributes:
+            exports["variables"][identifier] = \
+                list(PALMAT["scopes"][attributes["scope"]]["identifiers"])
+    return exports
+
+# Finds the scope (if any) an identifier referenced from a given scope
+# resides in, as findIdentifier() in palmatAux.py would at runtime.
+def residence(PALMAT, identifier, scopeIndex, compools):
+    scopes = PALMAT["scopes"]
+    while scopeIndex != None:
+        if identifier in scopes[scopeIndex]["identifiers"]:
+            return scopeIndex
+        scopeIndex = scopes[scopeIndex]["parent"]
+    for index in compools:
+        if identifier in scopes[index]["identifiers"]:
+            return index
+    return None
+
+# The symbols from outside the unit (whose scopes start at base, and whose
+# root-scope identifiers are those not in the snapshot of the root scope taken
+# before it was compiled) which the unit refers to, as an "imports" table sans
+# "objects".
+def importsOf(PALMAT, base, rootLength, snapshot):
+    scopes = PALMAT["scopes"]
+    compools = {v: k for k, v in compoolScopes(PALMAT).items() if v < base}
+    imports = { "labels": set(), "variables": {}, "templates": set(),
+                "compools": {} }
+
+    def addImport(identifier, index):
+        if index == 0:
+            if identifier not in snapshot:
+                return  # Added to the root scope by the unit itself.
+            attributes = scopes[0]["identifiers"][identifier]
+            if "template" in attributes:
+                imports["templates"].add(identifier)
+            elif "label" in attributes or "scope" in attributes:
+                imports["labels"].add(identifier)
+            else:
+                imports["variables"].setdefault("", set()).add(identifier)
+        elif index in compools:
+            imports["compools"]["%d" % index] = compools[index]
+            imports["variables"].setdefault(compools[index],
+                                            set()).add(identifier)
+
+    def findImports(value, scopeIndex):
+        if isinstance(value, tuple):
+            if len(value) == 2 and isinstance(value[0], int) and \
+                    isinstance(value[1], str):
+                identifier = identifierOf(value[1])
+                index = value[0]
+                if index == -1:
+                    index = residence(PALMAT, identifier, scopeIndex, compools)
+                if index != None and 0 <= index < base and \
+                        identifier in scopes[index]["identifiers"]:
+                    addImport(identifier, index)
+            else:
+                for v in value:
+                    findImports(v, scopeIndex)
+        elif isinstance(value, list):
+            for v in value:
+                findImports(v, scopeIndex)
+        elif isinstance(value, dict):
+            for k, v in value.items():
+                if k != "source":
+                    findImports(v, scopeIndex)
+
+    for scope in scopes[base:]:
+        findImports(scope["instructions"], scope["self"])
+        for attributes in scope["identifiers"].values():
+            if "structure" in attributes:
+                identifier = "^" + attributes["structure"] + "^"
+                index = residence(PALMAT, identifier, scope["self"], compools)
+                if index != None and index < base:
+                    addImport(identifier, index)
+    findImports(scopes[0]["instructions"][rootLength:], 0)
+
+    for kind in ["labels", "templates"]:
+        imports[kind] = sorted(imports[kind])
+    for compool in imports["variables"]:
+        imports["variables"][compool] = sorted(imports["variables"][compool])
+    return imports
+
+'''
+Compiles HAL/S source code (given as for processSource()) as a single unit,
+writing the PALMAT object to a file, after first linking in the objects
+named in the list imports.  If the object file is already up to date, it's
+left alone.  Returns True on success, False on failure.  PALMAT is the
+PALMAT (normally empty, other than its "sourceFiles") to compile into, and
+it's modified in place.
+'''
+def compileObject(PALMAT, halsSource, metadata, filename, imports, tabSize=8):
+    unitFiles = list(PALMAT["sourceFiles"])
+    importedUnits = []
+    for importFile in imports:
+        imported = readObject(importFile)
+        if imported == None:
+            print("Cannot read PALMAT object file %s." % importFile)
+            return False
+        importedUnits.append(imported)
+    importedUnits = compoolsFirst(importedUnits)
+    key = cacheKey("object", "\n".join(unitFiles), "%d" % tabSize,
+                   "".join(halsSource),
+                   *[imported["interface"] for imported in importedUnits])
+    existing = readObject(filename)
+    if existing != None and existing["key"] == key:
+        return True
+
+    macros = [{"@": 0}]
+    objects = []
+    for imported in importedUnits:
+        objects.append([imported["unit"], imported["interface"]])
+        if not linkObject(PALMAT, imported, macros):
+            return False
+    scopes = PALMAT["scopes"]
+    root = scopes[0]
+    before = copy.deepcopy(macros[0])
+    snapshot = rootSnapshot(root)
+    base = len(scopes)
+    counter = palmatAux.uniqueVariableCounter
+    rootLength = len(root["instructions"])
+    rootChildren = len(root["children"])
+    palmatKeys = set(PALMAT)
+    templates = serialize(root["structureTemplates"])
+    success, ast = processSource(PALMAT, halsSource, metadata,
+                                 tabSize=tabSize, macros=macros)
+    if not success:
+        print("Compilation of %s failed." % ", ".join(unitFiles))
+        return False
+    changes = rootChanges(root, snapshot, base, rootLength)
+    if changes == None:
+        reason = "it redefines or removes identifiers of its imports"
+    elif any(child < base for child in root["children"][rootChildren:]):
+        reason = "it changes the blocks of its imports"
+    elif serialize(root["structureTemplates"]) != templates:
+        reason = "it changes the structure templates of its imports"
+    else:
+        reason = None
+    if reason != None:
+        print("Cannot make a PALMAT object of %s, since %s." % \
+              (", ".join(unitFiles), reason))
+        return False
+
+    rootInstructions = root["instructions"][rootLength:]
+    if rootInstructions[-1:] == [{"halt": True}]:
+        rootInstructions.pop()
+    macroChanges = {name: macro for name, macro in macros[0].items() \
+                    if name not in before or before[name] != macro}
+    exports = exportsOf(PALMAT, changes, snapshot)
+    importTables = importsOf(PALMAT, base, rootLength, snapshot)
+    importTables["objects"] = objects
+    interface = {
+        "root": {},
+        "macros": macroChanges,
+        "compools": {}
+    }
+    for identifier, attributes in changes.items():
+        attributes = dict(attributes)
+        attributes.pop("scope", None)
+        attributes.pop("label", None)
+        interface["root"][identifier] = attributes
+        if "compool" in changes[identifier]:
+            interface["compools"][identifier] = \
+                scopes[changes[identifier]["scope"]]["identifiers"]
+    unit = {
+        "object": objectVersion,
+        "unit": unitFiles,
+        "key": key,
+        "interface": cacheKey("interface", serialize(interface)),
+        "sourceFiles": PALMAT["sourceFiles"],
+        "base": base,
+        "counter": counter,
+        "variables": palmatAux.uniqueVariableCounter - counter,
+        "firstLine": 0,
+        "scopes": scopes[base:],
+        "root": changes,
+        "rootInstructions": rootInstructions,
+        "rootLength": rootLength,
+        "PALMAT": {k: PALMAT[k] for k in PALMAT \
+                   if k not in palmatKeys and k != "layouts"},
+        "macros": macroChanges,
+        "exports": exports,
+        "imports": importTables
+    }
+    if not writeObject(unit, filename):
+        print("Cannot write PALMAT object file %s." % filename)
+        return False
+    return True
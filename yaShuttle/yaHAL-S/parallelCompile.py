@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   parallelCompile.py
+Requires:   Python 3.7 or later.
+Purpose:    Compiles the HAL/S source files named on the yaHAL-S-FC.py
+            command line in a pool of processes (the --jobs=N option),
+            rather than one after another.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+
+Normally, all of the source files are concatenated and compiled as a single
+unit.  With --jobs, each source file is instead a separate compilation unit,
+and the units are compiled as follows:
+
+    1.  Files containing COMPOOLs are compiled first, in the order given on
+        the command line, in this process.  This is the "base" PALMAT, which
+        the remaining units are compiled against.
+    2.  The remaining files (PROGRAMs, FUNCTIONs, PROCEDUREs, ...) are each
+        preprocessed and compiled against the base by a pool of worker
+        processes, which are forked from this one and thus inherit the base
+        PALMAT and the preprocessor's macros.  Each worker returns the
+        "fragment" of PALMAT its unit produced (see compileCache.py), along
+        with the names the unit defines at the top level.
+    3.  The fragments are spliced into the base in command-line order, with
+        their scope numbers, generated labels, and line numbers relocated
+        just as for cached blocks.
+
+A unit compiled against the base alone is only equivalent to the same unit
+compiled after all of the units preceding it if none of them could have
+affected it, so a fragment is used only if the unit and every unit preceding
+it are independent:  neither defines a top-level name (a FUNCTION, PROCEDURE,
+top-level declaration, REPLACE macro, ...) appearing anywhere in the source
+of the other.  Otherwise, or if the worker's compilation failed, printed any
+messages, or did anything to the PALMAT that can't be reproduced by splicing,
+the unit is simply compiled again here, in its proper turn, against
+everything preceding it.  Cross-references between files therefore don't
+speed up, but it's the independent units (and there are typically many more
+of those) which do, and the PALMAT is the same regardless of the number of
+processes or of which units were compiled where.
+
+It is essentially the same PALMAT as for compiling all of the files as a
+single unit, with these exceptions:
+
+    *   Line numbers count the preprocessed lines of each file separately,
+        whereas the preprocessor attaches comments at the start of a file to
+        the last statement of the preceding file when the files are
+        concatenated.  Line numbers in compiler messages are counted from the
+        start of the file containing the message.
+    *   Each unit starts from the same state of the code generator, rather
+        than from whatever state the preceding unit may have left behind.
+        (See saveSubstate() below.)
+"""
+
+import io
+import os
+import re
+import copy
+import contextlib
+import multiprocessing
+import pass1
+import palmatAux
+from p_Functions import substate
+from processSource import processSource
+from compileCache import rootSnapshot, rootChanges, spliceFragment, \
+                         baseName, generatedName, serialize
+
+# Set by compileInParallel() for the benefit of the forked workers.
+compilation = {
+    "PALMAT": None,
+    "units": [],
+    "macros": None,
+    "substate": None,
+    "tabSize": 8
+}
+
+wordPattern = re.compile("\\w+")
+
+# Does a file define one or more COMPOOLs?  (The label of a block needn't be
+# on the same line as the rest of its header.)
+compoolPattern = re.compile(":\\s*(EXTERNAL\\s+)?COMPOOL\\b")
+def isCompool(unit):
+    text = "\n".join(line for line in unit["source"] if line[:1] != "C")
+    return compoolPattern.search(text) != None
+
+# The macros of the outermost scope, which is all that can leak from one
+# compilation unit into the next, are compared to a copy made beforehand to
+# find those the unit defined.
+def macroChanges(before, after):
+    return {name: macro for name, macro in after.items() \
+            if name not in before or before[name] != macro}
+
+# Names defined at the top level by a unit, given what it changed in the
+# root scope's identifiers and in the outermost macros.
+def definedNames(rootIdentifiers, macros):
+    names = set()
+    for identifier in rootIdentifiers:
+        if generatedName.match(identifier) == None:
+            names.add(baseName(identifier))
+    for name in macros:
+        match = wordPattern.search(name)
+        if match != None:
+            names.add(match.group())
+    return names
+
+
+# The names of the root scope's identifiers which are new or have changed
+# since rootSnapshot() was taken.
+def changedIdentifiers(root, snapshot):
+    changed = []
+    for identifier, attributes in root["identifiers"].items():
+        if identifier not in snapshot or ("label" not in attributes and \
+                serialize(attributes) != snapshot[identifier]):
+            changed.append(identifier)
+    return changed
+
+# processSource() appends a halt to the root scope after compiling, which 
+# must come after anything the next unit adds to the root scope instead.
+def removeHalt(PALMAT):
+    instructions = PALMAT["scopes"][0]["instructions"]
+    if len(instructions) > 0 and instructions[-1] == {"halt": True}:
+        instructions.pop()
+
+def appendHalt(PALMAT):
+    instructions = PALMAT["scopes"][0]["instructions"]
+    if len(instructions) == 0 or "halt" not in instructions[-1]:
+        instructions.append({"halt": True})
+
+# Some of the code generator's persistent state (p_Functions.substate) can 
+# outlast the statement it belongs to, and thus carry over from one unit to 
+# the next.  So that the PALMAT doesn't depend on which units happened to be
+# compiled in which process, each unit other than a COMPOOL starts with that 
+# state as it was after the COMPOOLs were compiled.  Errors and warnings 
+# are simply accumulated.
+def saveSubstate():
+    return {key: copy.deepcopy(value) for key, value in substate.items() \
+            if key not in ["errors", "warnings"]}
+
+def restoreSubstate(saved):
+    for key in list(substate):
+        if key not in saved and key not in ["errors", "warnings"]:
+            substate.pop(key)
+    substate.update(copy.deepcopy(saved))
+
+# Line numbers in a unit's PALMAT count from the start of the unit's
+# preprocessed source, which processSource() leaves in the temporary file.
+def preprocessedLines():
+    try:
+        f = open(pass1.tmpFile, "r")
+        count = f.read().count("\n")
+        f.close()
+        return count
+    except OSError:
+        return 0
+
+def shiftLines(instructions, offset):
+    for instruction in instructions:
+        if "source" in instruction:
+            source = instruction["source"]
+            instruction["source"] = [source[0], source[1] + offset] + \
+                                    source[2:]
+
+# Compiles a unit in this process, against everything already compiled, and
+# with its line numbers starting at offset.  Returns success, the number of
+# lines of preprocessed source, and the names the unit defined.
+def compileHere(PALMAT, unit, macros, tabSize, offset, saved=None):
+    scopes = PALMAT["scopes"]
+    root = scopes[0]
+    removeHalt(PALMAT)
+    if saved != None:
+        restoreSubstate(saved)
+    before = copy.deepcopy(macros[0])
+    snapshot = rootSnapshot(root)
+    base = len(scopes)
+    rootLength = len(root["instructions"])
+    success, ast = processSource(PALMAT, list(unit["source"]),
+                                 copy.deepcopy(unit["metadata"]),
+                                 tabSize=tabSize, macros=macros)
+    for scope in scopes[base:]:
+        shiftLines(scope["instructions"], offset)
+    shiftLines(root["instructions"][rootLength:], offset)
+    defined = definedNames(changedIdentifiers(root, snapshot),
+                           macroChanges(before, macros[0]))
+    return success, preprocessedLines(), defined
+
+def startWorker():
+    # The front-end server and the temporary file belong to the parent.
+    pass1.server["process"] = None
+    pass1.server["unavailable"] = False
+    pass1.tmpFile = "yaHAL-S-FC.%d.tmp" % os.getpid()
+
+# Compiles a unit against the base, in a worker process.  Returns a
+# dictionary of the fragment (or None if it can't be used), the number of 
+# lines of preprocessed source, and the outermost macros the unit defined,
+# or None if the compilation raised an exception.
+def workerCompile(index):
+    PALMAT = compilation["PALMAT"]
+    macros = compilation["macros"]
+    scopes = PALMAT["scopes"]
+    root = scopes[0]
+    removeHalt(PALMAT)
+    restoreSubstate(compilation["substate"])
+    before = copy.deepcopy(macros[0])
+    snapshot = rootSnapshot(root)
+    templates = serialize(root["structureTemplates"])
+    base = len(scopes)
+    counter = palmatAux.uniqueVariableCounter
+    rootLength = len(root["instructions"])
+    rootChildren = len(root["children"])
+    palmatKeys = set(PALMAT)
+    messages = len(substate["errors"]) + len(substate["warnings"])
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            success, ast = processSource(PALMAT, 
+                                list(compilation["units"][index]["source"]),
+                                compilation["units"][index]["metadata"],
+                                tabSize=compilation["tabSize"], macros=macros)
+        lines = preprocessedLines()
+    except Exception:
+        # Whatever went wrong will go wrong again when the unit is compiled
+        # in the parent, where it can be reported properly.
+        return None
+    finally:
+        try:
+            os.remove(pass1.tmpFile)
+        except OSError:
+            pass
+    result = {
+        "fragment": None,
+        "lines": lines,
+        "macros": macroChanges(before, macros[0])
+    }
+    changes = rootChanges(root, snapshot, base)
+    if not success or output.getvalue() != "" or changes == None or \
+            len(substate["errors"]) + len(substate["warnings"]) != messages or\
+            root["instructions"][rootLength:] not in [[], [{"halt": True}]] or\
+            any(child < base for child in root["children"][rootChildren:]) or \
+            serialize(root["structureTemplates"]) != templates:
+        return result
+    result["fragment"] = {
+        "base": base,
+        "counter": counter,
+        "variables": palmatAux.uniqueVariableCounter - counter,
+        "firstLine": 0,
+        "scopes": scopes[base:],
+        "root": changes,
+        "PALMAT": {k: PALMAT[k] for k in PALMAT if k not in palmatKeys}
+    }
+    return result
+
+'''
+Compiles the HAL/S source code given in halsSource and metadata (as for
+processSource()), where files is a list of (start, end) pairs giving the
+range of lines in halsSource of each source file, using up to jobs worker
+processes.  The PALMAT is modified in place.  Returns True on success and
+False on failure.
+'''
+def compileInParallel(PALMAT, halsSource, metadata, files, jobs, tabSize=8):
+    units = []
+    for start, end in files:
+        source = halsSource[start:end]
+        units.append({ "source": source, "metadata": metadata[start:end],
+                       "words": set(wordPattern.findall("\n".join(source))) })
+    compools = [unit for unit in units if isCompool(unit)]
+    others = [unit for unit in units if not isCompool(unit)]
+    macros = [{"@": 0}]
+    allSuccessful = True
+    offset = 0
+    for unit in compools:
+        success, lines, defined = compileHere(PALMAT, unit, macros, tabSize,
+                                              offset)
+        allSuccessful = allSuccessful and success
+        offset += lines
+    
+    # Since the workers are forked, compiling on platforms which can't fork
+    # (i.e., Windows) just continues here one unit at a time.
+    compilation["PALMAT"] = PALMAT
+    compilation["units"] = others
+    compilation["macros"] = macros
+    compilation["substate"] = saveSubstate()
+    compilation["tabSize"] = tabSize
+    if len(others) > 1 and jobs > 1 and \
+            "fork" in multiprocessing.get_all_start_methods():
+        # Each worker compiles a single unit, since compiling it changes the
+        # base.  The pool is done with before anything is compiled here, 
+        # since it forks replacement workers from a thread of its own:  a 
+        # worker forked while this process was starting the compiler's front
+        # end would inherit the pipe subprocess uses to wait for the front 
+        # end to start, and so would block this process forever.
+        pool = multiprocessing.get_context("fork").Pool(\
+                    min(jobs, len(others)), initializer=startWorker,
+                    maxtasksperchild=1)
+        try:
+            results = list(pool.imap(workerCompile, range(len(others))))
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        results = [None] * len(others)
+    
+    # Splice or compile the units in order.  The names defined by each, 
+    # along with the names appearing in it, are accumulated in compiled[] to
+    # determine whether subsequent units depend on it.
+    compiled = []
+    try:
+        for unit, result in zip(others, results):
+            fragment = None
+            if result != None:
+                fragment = result["fragment"]
+            if fragment != None:
+                defined = definedNames(fragment["root"], result["macros"])
+                for words, names in compiled:
+                    if not names.isdisjoint(unit["words"]) or \
+                            not defined.isdisjoint(words):
+                        fragment = None
+                        break
+            if fragment != None:
+                spliceFragment(fragment, PALMAT, offset)
+                macros[0].update(result["macros"])
+                lines = result["lines"]
+            else:
+                success, lines, defined = compileHere(PALMAT, unit, macros,
+                                            tabSize, offset, 
+                                            compilation["substate"])
+                allSuccessful = allSuccessful and success
+            compiled.append((unit["words"], defined))
+            offset += lines
+    finally:
+        compilation["PALMAT"] = None
+        compilation["substate"] = None
+    if allSuccessful:
+        appendHalt(PALMAT)
+    return allSuccessful
@@ -33,6 +33,7 @@ import subprocess
 import re
 import platform
 import os
+import atexit
 
 tmpFile = "yaHAL-S-FC.tmp"
 # Determine the path to the preprocessor script, since that's where auxiliary
@@ -53,15 +54,19 @@ elif platform.system() == "Darwin":
 
 """
  Make the "abstract syntax", obtained as a big string from the compiler 
- front-end, into an actual abstract syntax tree (AST) structure.  This is 
- actually a recursive function.  It assumes that the abstract-syntax
- string passed to it always starts with "(", and it processes until the 
- matching closing parenthesis is reached, which is not necessarily the end
- of the string itself.  It returns
+ front-end, into an actual abstract syntax tree (AST) structure.  It assumes 
+ that the abstract-syntax string passed to it always starts with "(", and it 
+ processes until the matching closing parenthesis is reached, which is not 
+ necessarily the end of the string itself.  It returns
         success, tree, index
  where success is a boolean for success vs failure, tree is the tree structure
- created, and index is an index to the first unprocessed character in the 
- input string.
+ created, and index is an index to the closing parenthesis.
+ 
+ The abstract syntax of a large program can be megabytes long and nested 
+ thousands of levels deep, so rather than recursing for each node, makeTree()
+ splits the string into tokens with a single regular expression, and builds
+ the tree in a single pass through them using a stack of the nodes not yet
+ closed.
  
  The abstract syntax tree itself is in the form of a linked nodes that are 
  dictionaries generally having the form
@@ -98,71 +103,135 @@ elif platform.system() == "Darwin":
     }
 """
 removePrefixedCapitals = 0 # Number of chars to remove from front of LBNF labels
+# The tokens:  an opening parenthesis with the label following it (and perhaps
+# the lineNumber and columnNumber too), a closing parenthesis, a string, or
+# anything else (an atomic lbnfLabel, or the lineNumber or columnNumber of one).
+astTokens = re.compile("\\(([^ ()]+)(?: ([0-9]+) ([0-9]+)(?=[ )]))?|(\\))|" + \
+                       "(\\^[^^]*\\^)|([^ ()]+)")
 def makeTree(abstractSyntax, index=0):
-    ast = None
-    if abstractSyntax[0] != "(":
+    if abstractSyntax[index:index+1] != "(":
         return False, None, 0
-    label = ""
-    startIndex = index
-    index += 1
-    while abstractSyntax[index] not in [" ", ")"]:
-        index += 1
-    label = abstractSyntax[startIndex+1+removePrefixedCapitals:index]
-    ast = { "lbnfLabel" : label, "components" : [] }
-    index += 1
-    # Look here for the lineNumber and columnNumber fields.
-    if abstractSyntax[index].isdigit():
-        start = index;
-        while abstractSyntax[index].isdigit():
-            index += 1
-        ast["lineNumber"] = int(abstractSyntax[start:index])
-        index += 1
-        start = index
-        while abstractSyntax[index].isdigit():
-            index += 1
-        ast["columnNumber"] = int(abstractSyntax[start:index])
-        index += 1
-    if abstractSyntax[index] == ")":
-        return True, ast, index
-    # Loop on the components of this node.
+    # The nodes not yet closed, and the components of the innermost of them.
+    stack = []
+    components = None
+    for match in astTokens.finditer(abstractSyntax, index):
+        label, lineNumber, columnNumber, close, string, atom = match.groups()
+        if label != None:
+            node = { "lbnfLabel" : label[removePrefixedCapitals:], 
+                     "components" : [] }
+            if lineNumber != None:
+                node["lineNumber"] = int(lineNumber)
+                node["columnNumber"] = int(columnNumber)
+            if components != None:
+                components.append(node)
+            stack.append(node)
+            components = node["components"]
+        elif close != None:
+            node = stack.pop()
+            if len(stack) == 0:
+                return True, node, match.start()
+            components = stack[-1]["components"]
+        elif string != None:
+            components.append(string)
+        elif not atom.isdigit():
+            # (Avoiding the lineNumber and columnNumber of the atom, if any.)
+            components.append(atom)
+    print("Internal error: failure to parse abstract syntax.", file=sys.stderr)
+    sys.exit(1)
+
+# The table for translating the _SYMB_n token names appearing in the compiler
+# front end's error messages back into the symbols of the grammar, from 
+# HAL_S.y.  It's read only once, the first time it's needed.
+symbolTokens = None
+def translateTokens(stderr):
+    global symbolTokens
+    if "_SYMB_" not in stderr:
+        return stderr
+    if symbolTokens == None:
+        symbolTokens = {}
+        try:
+            f = open(path + "HAL_S.y")
+            for line in f:
+                if "%token" == line[:6]:
+                    fields = line.split()
+                    if len(fields) >= 4 and "_SYMB_" == fields[1][:6] \
+                            and "/*" == fields[2] and fields[1][6:].isdigit():
+                        symbolTokens[fields[1]] = fields[3]   
+            f.close()
+        except:
+            print("Could not read HAL_S.y; _SYMB_n may not be translated.")
     while True:
-        # There are several possibilities.  As atomic components, we might
-        # have an lbnfLabel or a string (delimited by carats) of a couple of
-        # possible types.  Or else we could have a non-atomic component that
-        # actually has components of its own.  In that case, we must do a 
-        # recursive descent to parse it.
-        if abstractSyntax[index] == "(": # non-atomic
-            success, node, index = makeTree(abstractSyntax, index)
-            if success:
-                ast["components"].append(node)
-            else:
-                print("Internal error: failure to parse abstract syntax.", \
-                        file=sys.stderr)
-                sys.exit(1)
-        elif abstractSyntax[index] == "^": # atomic string.
-            start = index
-            index += 1
-            while abstractSyntax[index] != "^":
-                index += 1
-            ast["components"].append(abstractSyntax[start:index+1])
-        else:
-            start = index
-            while abstractSyntax[index+1] not in [" ", ")"]:
-                index += 1
-            componentName = abstractSyntax[start:index+1]
-            # Avid lineNumber and columnNumber field, if any.
-            if not componentName.isdigit():
-                ast["components"].append(componentName)
-        # At this point, index is pointing to the last character processed,
-        # and the next character should be either " " or ")".
-        index += 1  
-        if abstractSyntax[index] == ")":
-            return True, ast, index
-        if abstractSyntax[index] != " ":
-            print("Internal error: failure to parse abstract syntax.", \
-                    file=sys.stderr)
-            sys.exit(1)
-        index += 1
+        match = re.search("\\b_SYMB_[0-9]+\\b", stderr)
+        if match == None:
+            break
+        key = match.group()
+        if key not in symbolTokens:
+            break
+        stderr = stderr[:match.span()[0]] + symbolTokens[key] + " " + \
+                    stderr[match.span()[1]+1:]
+    return stderr
+
+# Rather than running the compiler front end anew for every compilation
+# (which in the interpreter means for every statement entered), we normally 
+# run a single copy of it, with the --server option, for the entire session,
+# and just pass it the source code and read back the abstract syntax via
+# pipes.  See modernHAL-S-FC.c for the protocol.  The server is started the 
+# first time it's needed.  If it can't be, as for a compiler front end which 
+# predates --server, we fall back to running the front end once per 
+# compilation.  We fall back too when tracing, since the trace is output by
+# the front end itself.
+server = { "process": None, "unavailable": False }
+
+def stopServer():
+    process = server["process"]
+    server["process"] = None
+    if process != None:
+        try:
+            process.stdin.close()
+            process.wait(5)
+        except:
+            process.kill()
+atexit.register(stopServer)
+
+def startServer(compilerAndParameters):
+    try:
+        process = subprocess.Popen(compilerAndParameters + ["--server"],
+                                   stdin=subprocess.PIPE, 
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT)
+        if process.stdout.readline().decode("utf-8").strip() \
+                == "SERVER_READY":
+            server["process"] = process
+            return True
+        process.kill()
+    except:
+        pass
+    server["unavailable"] = True
+    return False
+
+# Returns the list of lines output for the source code by the compiler front
+# end (stdout and stderr combined), or None if the server has failed.
+def serverParse(source):
+    process = server["process"]
+    try:
+        source = source.encode("utf-8")
+        process.stdin.write(b"%d\n" % len(source) + source)
+        process.stdin.flush()
+        output = []
+        while True:
+            line = process.stdout.readline()
+            if len(line) == 0:
+                break
+            line = line.decode("utf-8").rstrip("\n")
+            if line[:11] == "SERVER_DONE":
+                return output
+            output.append(line)
+    except:
+        pass
+    # The server has died, perhaps because of the source code it was given.
+    # We'll start another one next time.
+    stopServer()
+    return None
 
 # Invoke compiler front end.  The source code to be compiled is a list of 
 # strings that will be written to the temporary file (tmpFile), but if the list 
@@ -176,19 +245,6 @@ def makeTree(abstractSyntax, index=0):
 captured = { "stderr" : [] }
 def tokenizeAndParse(sourceList=[], trace=False, wine=False):
     global captured
-    tokens = {}
-    if trace and tokens == {}:
-        try:
-            f = open(path + "HAL_S.y")
-            for line in f:
-                if "%token" == line[:6]:
-                    fields = line.split()
-                    if len(fields) >= 4 and "_SYMB_" == fields[1][:6] \
-                            and "/*" == fields[2] and fields[1][6:].isdigit():
-                        tokens[fields[1]] = fields[3]   
-            f.close()
-        except:
-            print("Could not read HAL_S.y; _SYMB_n may not be translated.")
     captured["stderr"] = []
     try:
         if len(sourceList) > 0:
@@ -199,32 +255,42 @@ def tokenizeAndParse(sourceList=[], trace=False, wine=False):
             compilerAndParameters = ["wine", parms["compiler"]+".exe"]
         else:
             compilerAndParameters = [parms["compiler"]]
-        if trace:
-            compilerAndParameters.append("--trace")
-        compilerAndParameters.append(tmpFile)
-        #print(compilerAndParameters)
-        run =subprocess.run(compilerAndParameters, capture_output=True)
-        if len(run.stderr) > 0:
+        output = None
+        if not trace and not server["unavailable"] and \
+                (server["process"] != None or \
+                 startServer(compilerAndParameters)):
+            if len(sourceList) > 0:
+                source = "".join(sourceList)
+            else:
+                f = open(tmpFile, "r")
+                source = f.read()
+                f.close()
+            output = serverParse(source)
+            if output != None:
+                stdout = []
+                stderr = []
+                for line in output:
+                    if "(" == line[:1]:
+                        stdout.append(line)
+                    else:
+                        stderr.append(line)
+                stderr = "\n".join(stderr).strip()
+        if output == None:
+            if trace:
+                compilerAndParameters.append("--trace")
+            compilerAndParameters.append(tmpFile)
+            #print(compilerAndParameters)
+            run = subprocess.run(compilerAndParameters, capture_output=True)
             stderr = run.stderr.decode("utf-8").strip()
-            while True:
-                match = re.search("\\b_SYMB_[0-9]+\\b", stderr)
-                if match == None:
-                    break
-                key = match.group()
-                if key not in tokens:
-                    break
-                stderr = stderr[:match.span()[0]] + tokens[key] + " " + \
-                            stderr[match.span()[1]+1:]
-            captured["stderr"] = stderr.split("\n")
-            
-        if len(run.stdout) > 0:
-            output = run.stdout.decode("utf-8").strip().split("\n")
-            for line in output:
-                if "(" != line[:1]:
-                    #print(line, file=sys.stderr)
-                    continue
-                else:
-                    return makeTree(line)[:2]
+            stdout = run.stdout.decode("utf-8").strip().split("\n")
+        if len(stderr) > 0:
+            captured["stderr"] = translateTokens(stderr).split("\n")
+        for line in stdout:
+            if "(" != line[:1]:
+                #print(line, file=sys.stderr)
+                continue
+            else:
+                return makeTree(line)[:2]
     except:
         pass
     return False, []
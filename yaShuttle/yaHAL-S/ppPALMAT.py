@@ -6,15 +6,28 @@ Copyright:      None - the author (Ron Burkey) declares this software to
 Filename:       ppPALMAT.py
 Purpose:        Pretty-prints a PALMAT file as created by the "modern" HAL/S
                 compiler yaHAL-S-FC.  (While JSON pretty-printers can do this
-                as well, ppPALMAT.py is more to my own liking.)
+                as well, ppPALMAT.py is more to my own liking.)  Either
+                JSON or binary PALMAT can be pretty-printed, from stdin or
+                from a file named on the command line.
 History:        2023-01-10 RSB  Created. 
 """
 
 import sys
 import json
+from binaryPALMAT import isBinaryPALMAT, loadBinaryPALMAT
 
-# Read JSON from stdin.
-PALMAT = json.loads(sys.stdin.readline())
+# Read PALMAT, JSON or binary, from stdin or from the file named on the 
+# command line.
+if len(sys.argv) > 1:
+    f = open(sys.argv[1], "rb")
+    data = f.read()
+    f.close()
+else:
+    data = sys.stdin.buffer.read()
+if isBinaryPALMAT(data):
+    PALMAT = loadBinaryPALMAT(data)
+else:
+    PALMAT = json.loads(str(data, "utf-8"))
 
 scopes = PALMAT["scopes"]
 errors = []
@@ -44,7 +57,7 @@ for scopeNumber in range(len(scopes)):
     children = scope["children"]
     identifiers = scope["identifiers"]
     instructions = scope["instructions"]
-    scopeType = scope["scopeType"]
+    scopeType = scope["type"]
     
     tabPrint("Type:         %s" % scopeType, tabs)
     tabPrint("Parent:       %s" % str(parent), tabs)
@@ -73,14 +86,15 @@ for scopeNumber in range(len(scopes)):
     
     # Take care of the remaining keys.
     for key in sorted(scope):
-        if key in ["parent", "self", "children", "identifiers", "instructions"]:
+        if key in ["parent", "self", "children", "identifiers", "instructions",
+                   "type", "structureTemplates"]:
             continue
         addError("Unknown object in scope %d: %s" % (scopeNumber, key), tabs)
     tabs = tabs[:-1]
 
 # Handle other keys (non-scopes) in the PALMAT file.
 for key in sorted(PALMAT):
-    if key == "scopes":
+    if key in ["scopes", "instantiation", "sourceFiles"]:
         continue
     addError("Unknown top-level object: %s" % key, tabs)
 
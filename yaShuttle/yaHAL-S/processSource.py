@@ -37,14 +37,14 @@ and updates if it discovers new STRUCTURE statements not already in the library.
 
 """
 
-import sys
-
 import unEMS
 import replaceBy
 import reorganizer
-from pass1 import tokenizeAndParse, tmpFile, astPrint, captured
+import pass1
+from pass1 import tokenizeAndParse, astPrint, captured, parms
 from generatePALMAT import generatePALMAT
 from palmatAux import constructPALMAT
+from compileCache import cacheEnabled, loadAST, storeAST
 
 '''
 Preprocess and compile a set of source lines, according to the global 
@@ -130,16 +130,18 @@ def processSource(PALMAT, halsSource, metadata, noCompile=False, lbnf=False,
 
     # Output the modified source.  If --no-compile, then simply output to
     # stdout. If not --no-compile, then output to a file called yaHAL_S.tmp.
-    if noCompile:
-        f = sys.stdout
-    else:
-        f = open(tmpFile, "w")
+    preprocessed = []
     for i in range(len(halsSource)):
         if len(halsSource[i]) > 0 and halsSource[i][:1] != " ":
-            print(" /*" + halsSource[i] + "*/", file=f)
+            preprocessed.append(" /*" + halsSource[i] + "*/\n")
         else:
-            print(reorganizer.untranslate(halsSource[i]), file=f)
-    if not noCompile:
+            preprocessed.append(reorganizer.untranslate(halsSource[i]) + "\n")
+    preprocessed = "".join(preprocessed)
+    if noCompile:
+        print(preprocessed, end="")
+    else:
+        f = open(pass1.tmpFile, "w")
+        f.write(preprocessed)
         f.close()
 
     # Print final summary of preprocessing.
@@ -160,7 +162,19 @@ def processSource(PALMAT, halsSource, metadata, noCompile=False, lbnf=False,
     if noCompile:
         return True, {}
         
-    success, ast = tokenizeAndParse([], trace1, wine)
+    # If this exact preprocessed source has been parsed before, the AST can
+    # come from the compilation cache instead.
+    ast = None
+    useCache = cacheEnabled() and not trace1 and not wine
+    if useCache:
+        ast, stderr = loadAST(preprocessed, parms["compiler"])
+    if ast != None:
+        success = True
+        captured["stderr"] = stderr
+    else:
+        success, ast = tokenizeAndParse([], trace1, wine)
+        if success and useCache:
+            storeAST(preprocessed, parms["compiler"], ast, captured["stderr"])
     for error in captured["stderr"]:
         fields = error.split(":", 2)
         if len(fields) > 2 and fields[0].strip() == "error":
@@ -187,8 +201,30 @@ def processSource(PALMAT, halsSource, metadata, noCompile=False, lbnf=False,
         print("Compiler pass 1 failure.")
         return False, ast
         
-    success = generatePALMAT(ast, PALMAT, \
+    # The code generator is recursive.  It processes lists of statements
+    # without recursing once per statement, so a unit's length is no problem,
+    # but as a last resort, a unit whose statements or expressions are 
+    # nested too deeply for it fails to compile, and whatever had been 
+    # generated for it is discarded, leaving the PALMAT as it was.
+    scopes = PALMAT["scopes"]
+    root = scopes[0]
+    numScopes = len(scopes)
+    numChildren = len(root["children"])
+    numInstructions = len(root["instructions"])
+    rootIdentifiers = set(root["identifiers"])
+    try:
+        success, PALMAT = generatePALMAT(ast, PALMAT, \
                 { "history" : [], "scopeIndex" : 0 }, trace2, [], -1, trace4)
+    except RecursionError:
+        del scopes[numScopes:]
+        del root["children"][numChildren:]
+        del root["instructions"][numInstructions:]
+        for identifier in list(root["identifiers"]):
+            if identifier not in rootIdentifiers:
+                root["identifiers"].pop(identifier)
+        print("Compiler pass 2 failure:  statements or expressions nested " +
+              "too deeply for the code generator.")
+        return False, ast
     if success:
         for dummy in PALMAT["scopes"]:
             if dummy["type"] in ["program", "root"]:
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   profilePALMAT.py
+Requires:   Python 3.7 or later.
+Purpose:    An execution profiler for the PALMAT emulator, for finding out
+            where the time goes in long runs, where TRACE3 is of no use.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+            https://github.com/brendangregg/FlameGraph
+
+When executePALMAT() is given a profile (as created by newProfile()), it runs
+the emulation with emulateProfiled() rather than emulate().  That counts every
+instruction executed, and reads the clock whenever the source-code position
+(the "source" field of the instructions, [file, line, column]) changes or
+control is transferred, charging the instructions and the time since the last
+reading to:
+
+    *   The source-code position, which is generally the start of a HAL/S
+        statement or of an expression within one.
+    *   The scope being executed (its "self" time, not counting the scopes
+        it calls or contains).
+    *   The stack of FUNCTION and PROCEDURE calls leading to that position,
+        for flame graphs.
+
+as well as counting the calls of each FUNCTION and PROCEDURE.  The profile
+accumulates over any number of executions, until a new one is created.  It
+isn't collected for programs run by the real-time scheduler
+(schedulePALMAT.py), nor for TRACE3 runs.
+
+The profile is a dictionary:
+    "statements"    Dictionary relating (file, line, column) to a list of
+                    [arrivals, instructions, nanoseconds], where arrivals is
+                    the number of times execution reached that position.
+    "scopes"        Dictionary relating scope numbers to a list of
+                    [instructions, nanoseconds].
+    "calls"         Dictionary relating scope numbers of FUNCTIONs and
+                    PROCEDUREs to the number of times they were called.
+    "stacks"        Dictionary relating (call stack, (file, line, column))
+                    to nanoseconds, where the call stack is a tuple of the
+                    scope numbers of the PROGRAM (or whatever scope execution
+                    started in) and of the FUNCTIONs and PROCEDUREs called.
+    "instructions"  Total instructions executed.
+    "nanoseconds"   Total time.
+    "runs"          The number of executions profiled.
+
+printHotSpots() displays the most time-consuming positions, scopes, and so
+on, while writeFlameGraph() writes the stacks in the "folded" format of
+flamegraph.pl (also understood by speedscope and by most other flame-graph
+viewers):  one line per distinct stack, consisting of the frames separated by
+semicolons, a space, and the number of microseconds spent there.
+"""
+
+import os
+import re
+import time
+
+def newProfile():
+    return {
+        "statements": {},
+        "scopes": {},
+        "calls": {},
+        "stacks": {},
+        "instructions": 0,
+        "nanoseconds": 0,
+        "runs": 0
+        }
+
+# Charges the instructions executed at source position source, in scope
+# scopeNumber and with call stack stack, and the time elapsed since start, to
+# the profile.  Returns the time, for the next call.  When the position is
+# about to change to a new one (next), that counts as an arrival at the new
+# position.  Nothing is charged to the placeholder position (line -1) the VM
+# starts with, which isn't that of any statement, nor if no instructions were
+# executed.
+def chargeProfile(profile, stack, scopeNumber, source, instructions, start,
+                  next=None):
+    now = time.perf_counter_ns()
+    elapsed = now - start
+    statements = profile["statements"]
+    if next != None:
+        nextKey = (next[0], next[1], next[2])
+        if nextKey in statements:
+            statements[nextKey][0] += 1
+        else:
+            statements[nextKey] = [1, 0, 0]
+    if instructions == 0 or source[1] < 0:
+        return now
+    key = (source[0], source[1], source[2])
+    if key in statements:
+        entry = statements[key]
+    else:
+        entry = [0, 0, 0]
+        statements[key] = entry
+    entry[1] += instructions
+    entry[2] += elapsed
+    scopes = profile["scopes"]
+    if scopeNumber in scopes:
+        entry = scopes[scopeNumber]
+    else:
+        entry = [0, 0]
+        scopes[scopeNumber] = entry
+    entry[0] += instructions
+    entry[1] += elapsed
+    stacks = profile["stacks"]
+    key = (stack, key)
+    stacks[key] = stacks.get(key, 0) + elapsed
+    profile["instructions"] += instructions
+    profile["nanoseconds"] += elapsed
+    return now
+
+# Counts a call of the FUNCTION or PROCEDURE of scope scopeNumber.
+def chargeCall(profile, scopeNumber):
+    calls = profile["calls"]
+    calls[scopeNumber] = calls.get(scopeNumber, 0) + 1
+
+# Descriptive names for scopes and source-code positions.  Names of blocks
+# are unmangled (see replaceBy.py).
+manglingPrefix = re.compile("^(l|bf|cf|sf|nf)_")
+def scopeName(PALMAT, scopeNumber):
+    scopes = PALMAT["scopes"]
+    if scopeNumber < 0 or scopeNumber >= len(scopes):
+        return "scope %d" % scopeNumber
+    scope = scopes[scopeNumber]
+    if "name" in scope:
+        return manglingPrefix.sub("", scope["name"][1:-1])
+    if scopeNumber == 0:
+        return "(main)"
+    # An unnamed block; name it after the block containing it.
+    i = scope["parent"]
+    while i != None and "name" not in scopes[i]:
+        i = scopes[i]["parent"]
+    if i == None:
+        return "%s %d" % (scope["type"].upper(), scopeNumber)
+    return "%s %d in %s" % (scope["type"].upper(), scopeNumber,
+                            scopeName(PALMAT, i))
+
+def positionName(PALMAT, position):
+    file, line, column = position
+    sourceFiles = PALMAT.get("sourceFiles", [])
+    if isinstance(file, int) and file >= 0 and file < len(sourceFiles):
+        file = os.path.basename(sourceFiles[file])
+    if column < 0:
+        return "%s:%d" % (file, line)
+    return "%s:%d:%d" % (file, line, column)
+
+'''
+Prints the count most time-consuming source-code positions, scopes,
+and call stacks, along with the most frequently called FUNCTIONs and
+PROCEDUREs, from profile.
+'''
+def printHotSpots(PALMAT, profile, count=20):
+    total = profile["nanoseconds"]
+    if profile["runs"] == 0 or total == 0:
+        print("\tNo profile has been collected.")
+        return
+    def percent(nanoseconds):
+        return 100.0 * nanoseconds / total
+    print("\tProfile of %d run(s):  %d instructions in %.3f seconds." % \
+          (profile["runs"], profile["instructions"], total / 1e9))
+
+    print("\tHot spots by source-code position:")
+    print("\t      %      ms     arrivals  instructions  position")
+    statements = profile["statements"]
+    for position in sorted(statements, key=lambda p: -statements[p][2])[:count]:
+        arrivals, instructions, nanoseconds = statements[position]
+        print("\t%7.2f %8.1f %11d %13d  %s" % \
+              (percent(nanoseconds), nanoseconds / 1e6, arrivals,
+               instructions, positionName(PALMAT, position)))
+
+    print("\tHot spots by scope (self time):")
+    print("\t      %      ms  instructions  scope")
+    scopes = profile["scopes"]
+    for scopeNumber in sorted(scopes, key=lambda s: -scopes[s][1])[:count]:
+        instructions, nanoseconds = scopes[scopeNumber]
+        print("\t%7.2f %8.1f %13d  %d, %s" % \
+              (percent(nanoseconds), nanoseconds / 1e6, instructions,
+               scopeNumber, scopeName(PALMAT, scopeNumber)))
+
+    calls = profile["calls"]
+    if len(calls) > 0:
+        print("\tCalls of FUNCTIONs and PROCEDUREs:")
+        print("\t      calls  name")
+        for scopeNumber in sorted(calls, key=lambda s: -calls[s])[:count]:
+            print("\t%11d  %s" % (calls[scopeNumber],
+                                   scopeName(PALMAT, scopeNumber)))
+
+    # Inclusive time of each call stack, i.e. that of the stack plus all of
+    # the stacks extending it.
+    inclusive = {}
+    for stack, position in profile["stacks"]:
+        nanoseconds = profile["stacks"][(stack, position)]
+        for i in range(1, len(stack) + 1):
+            inclusive[stack[:i]] = inclusive.get(stack[:i], 0) + nanoseconds
+    print("\tHot spots by call stack (inclusive time):")
+    print("\t      %      ms  stack")
+    for stack in sorted(inclusive, key=lambda s: -inclusive[s])[:count]:
+        print("\t%7.2f %8.1f  %s" % \
+              (percent(inclusive[stack]), inclusive[stack] / 1e6,
+               " > ".join(scopeName(PALMAT, s) for s in stack)))
+
+# Writes the call stacks of the profile to a file in the folded format used
+# for flame graphs.  Returns True on success, False on failure.
+def writeFlameGraph(PALMAT, profile, filename):
+    def frame(name):
+        return name.replace(";", ":").replace(" ", "_")
+    folded = {}
+    for stack, position in profile["stacks"]:
+        microseconds = profile["stacks"][(stack, position)] // 1000
+        frames = [frame(scopeName(PALMAT, s)) for s in stack]
+        frames.append(frame(positionName(PALMAT, position)))
+        line = ";".join(frames)
+        folded[line] = folded.get(line, 0) + microseconds
+    try:
+        f = open(filename, "w")
+        for line in sorted(folded):
+            if folded[line] > 0:
+                f.write("%s %d\n" % (line, folded[line]))
+        f.close()
+    except OSError:
+        return False
+    return True
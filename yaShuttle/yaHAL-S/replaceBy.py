@@ -130,18 +130,111 @@ mangling = { "BOOLEAN" : "b_", "CHARACTER" : "c_", "INTEGER" : "",
             "PROCEDURE" : "l_", "FUNCTION": "l_", "STRUCTURE": "s_",
             "EVENT" : "e_", "BIT" : "b_" }
 
-def oneReplacement(string, target, replacement):
-    match = re.search("\\b" + target + "\\b", string)
-    if match == None:
-        return string
-    return string[:match.span()[0]] + replacement + string[match.span()[1]:]
-    
-def allReplacement(string, target, replacement):
+# Each macro's "pattern" is compiled just once, rather than being looked up
+# in the re module's cache (which is far too small for thousands of macros) 
+# every time it's used.
+compiledPatterns = {}
+def compiledPattern(pattern):
+    if pattern not in compiledPatterns:
+        compiledPatterns[pattern] = re.compile(pattern)
+    return compiledPatterns[pattern]
+
+# The expansions of macros with arguments, for each combination of macro
+# replacement string, dummy arguments, and actual arguments encountered.
+argumentExpansions = {}
+def expandArguments(macro, newArgs):
+    key = (macro["replacement"], tuple(macro["arguments"]), tuple(newArgs))
+    if key not in argumentExpansions:
+        replacement = macro["replacement"]
+        for j in range(len(newArgs)):
+            replacement = re.sub("\\b" + macro["arguments"][j] + "\\b", \
+                                 lambda match: newArgs[j], replacement)
+        argumentExpansions[key] = replacement
+    return argumentExpansions[key]
+
+# Finds the macro (if any) which a name refers to, taking into account that
+# names in inner scopes hide the same names in outer scopes, that only the
+# innermost maxScopes scopes are searched, and that some names aren't macros
+# at all.  Returns the macro and the depth of the scope it was found in, or 
+# None, -1.
+def findMacro(name, macros, maxScopes):
+    if "-STRUCTURE" in name:
+        return None, -1
+    for depth in range(len(macros) - 1, max(-1, len(macros) - 1 - maxScopes), 
+                       -1):
+        if name in macros[depth]:
+            macro = macros[depth][name]
+            if "ignore" in macro:
+                return None, -1
+            return macro, depth
+    return None, -1
+
+wordPattern = re.compile("\\w+")
+qualifiedPattern = re.compile("\\w+(\\s*[.]\\s*\\w+)+")
+dotPattern = re.compile("\\s*[.]\\s*")
+
+# Makes a single pass through the line from left to right, expanding macros
+# as it finds them.  Every macro's pattern begins at the start of a word, and
+# may be qualified (A.B.C), so it's just a matter of looking up each word
+# and the qualified name (if any) beginning with that word in the macro 
+# tables and then checking the pattern (which may also restrict the context, 
+# or include an argument list) at that position.  Whatever a macro expands to
+# is itself rescanned for further macros.  Returns the new line and a boolean
+# indicating whether any changes were made.
+def expandOnce(line, macros, maxScopes):
+    changed = False
+    position = 0
     while True:
-        newString = oneReplacement(string, target, replacement)
-        if string == newString:
-            return string
-        string = newString
+        match = wordPattern.search(line, position)
+        if match == None:
+            break
+        position = match.start()
+        candidates = []
+        macro, depth = findMacro(match.group(), macros, maxScopes)
+        if macro != None:
+            candidates.append((depth, match.group(), macro))
+        qualified = qualifiedPattern.match(line, position)
+        if qualified != None:
+            name = dotPattern.sub(".", qualified.group())
+            macro, depth = findMacro(name, macros, maxScopes)
+            if macro != None:
+                candidates.append((depth, name, macro))
+        matches = []
+        for depth, macroName, macro in candidates:
+            expansion = compiledPattern(macro["pattern"]).match(line, position)
+            if expansion != None:
+                matches.append((depth, macroName, macro, expansion))
+        if len(matches) == 0:
+            position = match.end()
+            continue
+        if len(matches) > 1:
+            # Use the one that comes first in the macro tables.
+            matches.sort(key=lambda m: (-m[0], list(macros[m[0]]).index(m[1])))
+        depth, macroName, macro, expansion = matches[0]
+        # Prepare the replacement string.
+        newArgs = expansion.group()[len(macroName):].strip()
+        if len(newArgs) == 0:
+            replacement = macro["replacement"]
+            newArgs = []
+        else:
+            newArgs = newArgs.lstrip("(").rstrip(")")
+            # The following will fail if any of the replacement
+            # strings are themselves expressions containing 
+            # commas, such as function calls having their
+            # own argument lists.  Worry about that later if
+            # it turns out to be a problem.
+            newArgs = newArgs.split(",")
+        if len(newArgs) != len(macro["arguments"]):
+            print("Implementation error parsing macro expansion", \
+                    file=sys.stderr)
+            sys.exit(1)
+        if len(newArgs) > 0:
+            for j in range(len(newArgs)):
+                newArgs[j] = newArgs[j].strip()
+            replacement = expandArguments(macro, newArgs)
+        line = line[:position] + replacement + line[expansion.end():]
+        changed = True
+    return line, changed
 
 # Expand macros in input string rawline, returning pair line, changed,
 # where line is the expanded string and changed is a boolean saying if
@@ -153,68 +246,16 @@ def expandMacros(rawline, macros, maxScopes=1000000):
     # Perahaps should not expand macros in a STRUCTURE statement.
     if re.search("^\\s*STRUCTURE\\s", rawline) != None:
         return rawline, False
-    line = copy.deepcopy(rawline)
-    changed = False
-    changedLastLoop = True
+    line = rawline
     blockDepth = len(macros) - 1
+    # Since expandOnce() rescans expansions as it goes, there's normally
+    # nothing left to do after one pass.  But an expansion can also combine
+    # with the text preceding it to form a new match (say, a qualified name),
+    # so we keep going until a pass finds nothing.
+    line, changed = expandOnce(line, macros, maxScopes)
+    changedLastLoop = changed
     while changedLastLoop:
-        changedLastLoop = False
-        macroNamesChecked = []
-        numScopes = maxScopes + 1
-        # Loop on block depths, from innermost to outermost, trying all
-        # of the defined macros at each level.
-        for depth in range(blockDepth, -1, -1):
-            numScopes -= 1
-            if numScopes <= 0:
-                break
-            for macroName in macros[depth]:
-                if macroName == "@":
-                    continue
-                if "-STRUCTURE" in macroName:
-                    continue
-                macro = macros[depth][macroName]
-                if macroName in macroNamesChecked:
-                    # If a macro name of an inner block is the same as
-                    # one in an outer block, ignore the outer block.
-                    continue
-                macroNamesChecked.append(macroName)
-                if "ignore" in macro:
-                    continue
-                # Find all occurrences of the macro name in the line.
-                # Notice that the occurrence *could* be within a string
-                # (i.e., '...'), and I don't check for that.  May fix it
-                # up later if that turns out to be a problem.
-                while True:
-                    match = re.search(macro["pattern"], line)
-             
-                    if match == None: # No match.
-                        break
-                    changed = True
-                    changedLastLoop = True
-                    # Prepare the replacement string.
-                    newArgs = match.group()[len(macroName):].strip()
-                    if len(newArgs) == 0:
-                        newArgs = []
-                    else:
-                        newArgs = newArgs.lstrip("(").rstrip(")")
-                        # The following will fail if any of the replacement
-                        # strings are themselves expressions containing 
-                        # commas, such as function calls having their
-                        # own argument lists.  Worry about that later if
-                        # it turns out to be a problem.
-                        newArgs = newArgs.split(",")
-                    if len(newArgs) != len(macro["arguments"]):
-                        print("Implementation error parsing macro expansion", \
-                                file=sys.stderr)
-                        sys.exit(1)
-                    for j in range(len(newArgs)):
-                        newArgs[j] = newArgs[j].strip()
-                    replacement = copy.deepcopy(macro["replacement"])
-                    for j in range(len(newArgs)):
-                        replacement = allReplacement(replacement, \
-                                    macro["arguments"][j], newArgs[j])
-                    line = line[:match.span()[0]] + replacement \
-                                    + line[match.span()[1]:]
+        line, changedLastLoop = expandOnce(line, macros, maxScopes)
     '''
     There's one thing the loop above wasn't able to do, and that's to
     deal with the dreaded dot product of two vectors, say A.B, in which
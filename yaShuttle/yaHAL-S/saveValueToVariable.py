@@ -133,10 +133,9 @@ sys.exit(1)
 # on success, False on failure.  Note that there's no checking that the input
 # (composite) is actually a list type.
 def convertComposite(composite, datatype, datalength):
-    end = len(composite)
-    if isArrayQuick(composite):
-        end -= 1
-    for i in range(end):
+    if isinstance(composite, HalArray):
+        composite = composite.buffer
+    for i in range(len(composite)):
         value = composite[i]
         if isinstance(value, list) and not isBitArray(value):
             if convertComposite(value, datatype, datalength) == False:
@@ -160,6 +159,19 @@ def assignSimpleSubscripted(value, valueInAttributes, indices, \
         return True
     # Note that since value is not composite and the geometries have already
     # been checked, then we must have len(indices[i])== 1 for each i.
+    if isinstance(valueInAttributes, HalArray):
+        # All of the ARRAY dimensions are consumed at once.
+        numDimensions = len(valueInAttributes.shape)
+        index = valueInAttributes.offset([i[0] - 1 for i in \
+                                          indices[:numDimensions]])
+        if len(indices) == numDimensions:
+            converted = convertSimple(value, datatype, datalength)
+            if isNaN(converted):
+                return False
+            valueInAttributes.buffer[index] = converted
+            return True
+        return assignSimpleSubscripted(value, valueInAttributes.buffer[index],\
+                                indices[numDimensions:], datatype, datalength)
     index = indices[0][0] - 1;  # Recall HAL/S indexes from 1, Python from 0.
     if len(indices) == 1:
         converted = convertSimple(value, datatype, datalength)
@@ -195,10 +207,43 @@ def assignCompositeSubscripted(RHS, preSubscriptedLHS, subscriptsLHS, \
     # of simple values.  Note that unraveledRHS will be altered in-place as
     # the recursion proceeds.
     if unraveledRHS == []:
-        if len(RHS) == 0:
+        if isinstance(RHS, HalArray):
+            if len(RHS.buffer) == 0:
+                return False
+        elif len(RHS) == 0:
             return False
         flatten(RHS, unraveledRHS)
     
+    # Assigns elements of unraveledRHS to the leaves target[offset] for each
+    # of the given offsets in turn.  If there's just one element left, it's
+    # used for all of the leaves.
+    def assignLeaves(target, offsets, unraveledRHS):
+        if len(unraveledRHS) == 1:
+            fillWith = unraveledRHS[0]
+        else:
+            fillWith = None
+        filling = False
+        for offset in offsets:
+            if fillWith != None:
+                converted = fillWith
+            elif filling:
+                converted = None
+            elif len(unraveledRHS) == 0:
+                # Out of unraveled data.
+                return False
+            else:
+                value = unraveledRHS.pop(0)
+                if value == {'fill'}:
+                    filling = True
+                    converted = None
+                else:
+                    converted = convertSimple(value, datatypeLHS, \
+                                              datalengthLHS)
+                    if isNaN(converted):
+                        return False
+            target[offset] = converted
+        return True
+    
     # This recursive function descends through the subscripted LHS entrees
     # in unraveling order.  As it reaches the leaves, it picks off elements of 
     # unraveledRHS to assign to the leaves.  Returns True on success, False
@@ -210,34 +255,40 @@ def assignCompositeSubscripted(RHS, preSubscriptedLHS, subscriptsLHS, \
         print("` subscriptsLHS", subscriptsLHS)
         print("` unraveledRHS", unraveledRHS)
         '''
-        if len(unraveledRHS) == 1:
-            fillWith = unraveledRHS[0]
-        else:
-            fillWith = None
-        filling = False
+        if isinstance(preSubscriptedLHS, HalArray):
+            # All of the ARRAY dimensions are handled at once, but 
+            # processing the lowest ARRAY dimension row-by-row just as for
+            # nested lists.
+            array = preSubscriptedLHS
+            numDimensions = len(array.shape)
+            if len(subscriptsLHS) > numDimensions:
+                indices = [[s - 1 for s in subscriptsAtLevel] \
+                           for subscriptsAtLevel in \
+                               subscriptsLHS[:numDimensions]]
+                for offset in arrayOffsets(array, indices):
+                    if not assignCompositeSubscripted([], \
+                                                array.buffer[offset], \
+                                                subscriptsLHS[numDimensions:], \
+                                                datatypeLHS, datalengthLHS, \
+                                                unraveledRHS):
+                        return False
+                return True
+            indices = [[s - 1 for s in subscriptsAtLevel] \
+                       for subscriptsAtLevel in subscriptsLHS[:-1]]
+            for row in arrayOffsets(array, indices):
+                if len(unraveledRHS) == 0:
+                    return False
+                if not assignLeaves(array.buffer, \
+                                    [row + s - 1 for s in subscriptsLHS[-1]], \
+                                    unraveledRHS):
+                    return False
+            return True
         subscriptsAtLevel = subscriptsLHS[0]
         if len(subscriptsLHS) == 1:
             # At lowest level of subscripts.
-            for s in subscriptsAtLevel:
-                if fillWith != None:
-                    converted = fillWith
-                elif filling:
-                    converted = None
-                elif len(unraveledRHS) == 0:
-                    # Out of unraveled data.
-                    return False
-                else:
-                    value = unraveledRHS.pop(0)
-                    if value == {'fill'}:
-                        filling = True
-                        converted = None
-                    else:
-                        converted = convertSimple(value, datatypeLHS, \
-                                                  datalengthLHS)
-                        if isNaN(converted):
-                            return False
-                preSubscriptedLHS[s-1] = converted
-            return True
+            return assignLeaves(preSubscriptedLHS, \
+                                [s - 1 for s in subscriptsAtLevel], \
+                                unraveledRHS)
         else:
             # Not at lowest subscript level.
             for s in subscriptsAtLevel:
@@ -254,24 +305,21 @@ def assignCompositeSubscripted(RHS, preSubscriptedLHS, subscriptsLHS, \
 
 # Find an initialized array entry, or None if none.
 def findInitializedArrayEntry(object):
-    if isArrayQuick(object):
-        # Recall that if object is an array, then object[-1] == "a".
-        for o in object[:-1]:
-            oo = isArrayQuick(o)
-            if oo != None:
-                return oo
+    if isinstance(object, HalArray):
+        for o in object.buffer:
+            if o != None:
+                return o
         return None
     return object
 
 # Zero out every entry in a composite arithmetical object.  Actually, the 
 # constant stored can be anything, but 0 and 0.0 are what are needed for HAL/S.
 def zeroOutComposite(object, fillValue=0):
-    if not isinstance(object, list):
+    if isinstance(object, HalArray):
+        object = object.buffer
+    elif not isinstance(object, list):
         return
-    width = len(object)
-    if object[-1] == "a":
-        width -= 1
-    for i in range(width):
+    for i in range(len(object)):
         child = object[i]
         if isinstance(child, list):
             zeroOutComposite(child, fillValue)
@@ -282,6 +330,17 @@ def zeroOutComposite(object, fillValue=0):
 def zeroOutCompositeWithSubscripts(object, subscripts, fillValue=0):
     if len(subscripts) < 1:
         return
+    if isinstance(object, HalArray):
+        numDimensions = len(object.shape)
+        indices = [[s - 1 for s in thisLevel] \
+                   for thisLevel in subscripts[:numDimensions]]
+        for offset in arrayOffsets(object, indices):
+            if len(subscripts) > numDimensions:
+                zeroOutCompositeWithSubscripts(object.buffer[offset], \
+                                    subscripts[numDimensions:], fillValue)
+            else:
+                object.buffer[offset] = fillValue
+        return
     thisLevel = subscripts[0]
     if len(subscripts) > 1:
         for s in thisLevel:
@@ -375,33 +434,20 @@ def saveValueToVariable(PALMAT, source, value, identifier, attributes, \
     datalength2 = -1
     typeCheckValue = value
     if isArrayQuick(value):
-        # If the value is an ARRAY, this step quickly determines what the 
-        # ARRAY dimensions must be, but without checking that it actually
-        # is an ARRAY.
-        dummy = value
-        while isArrayQuick(dummy):
-            dimensions.append(len(dummy)-1)
-            dummy = dummy[0]
-        # Now check that the value really is an ARRAY with these dimensions ...
-        # geometrically at least.  There's no check that the array's elements
-        # all have the same (or compatible) datatypes.
-        if not isArrayGeometry(value, dimensions):
-            printError(PALMAT, source, "", \
-                "Implementation error, value of unsupported datatype " + \
-                "cannot be assigned to variable %s"\
-                % identifier)
-            return False
+        # If the value is an ARRAY, its ARRAY dimensions are simply its shape.
+        # There's no check that the array's elements all have the same (or 
+        # compatible) datatypes.
+        dimensions.extend(value.shape)
+        dummy = value.buffer[0]
         isArray2 = True
         dimensions = secondaryDimensions2
         # We must now try to find an initialized array element, because if we
         # can't do that, then we can't guestimate the array's datatype.  We've
-        # already found one element, namely dummy.
+        # already found one element, namely dummy.  If the ARRAY is completely
+        # uninitialized, it's still okay, since all that can be assigned is
+        # "unassigned".
         if dummy == None:
             dummy = findInitializedArrayEntry(value)
-            if dummy == None:
-                # If completely uninitialized it's still okay, since that just
-                # means there's no assignment needing to be done.
-                return True
         typeCheckValue = dummy
     if typeCheckValue == None:
         datatype2 = "unassigned"
@@ -435,6 +481,7 @@ def saveValueToVariable(PALMAT, source, value, identifier, attributes, \
         # anything, even composite objects.
         if value == 0 and datatype in ["integer", "scalar"] and \
                 (len(primaryDimensions) > 0 or len(secondaryDimensions) > 0):
+            unshareValue(attributes)
             zeroOutComposite(attributes["value"])
             return True
         
@@ -485,6 +532,7 @@ def saveValueToVariable(PALMAT, source, value, identifier, attributes, \
     Let's first form a structure that for every dimension of the subscripted 
     variable tells us all of the indices are involved.
     '''
+    unshareValue(attributes)
     dimensionsOfVariable = primaryDimensions + secondaryDimensions
     dimensionsOfValue = primaryDimensions2 + secondaryDimensions2
     indicesAllowed = []
@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   schedulePALMAT.py
+Requires:   Python 3.7 or later.
+Purpose:    A cooperative real-time scheduler for the PALMAT emulator, for
+            HAL/S programs which use TASKs, EVENTs, SCHEDULE, WAIT, and so on.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+            [HPG] HAL/S Programmer's Guide.
+            [PIH] Programming in HAL/S.
+
+executePALMAT() hands the emulation over to schedulePALMAT() whenever the
+PALMAT contains any real-time instructions (which the compiler marks by
+setting PALMAT["realTime"]).  The program being run becomes the first process,
+and every TASK it SCHEDULEs becomes another one.
+
+A HAL/S process shares the data of the PROGRAM containing it, and there's never
+more than one instance of any given TASK active at once, so all of the processes
+run in the same PALMAT rather than in clones of it (see clonePALMAT()).  What
+each process has of its own is a VM (see newVM() in executePALMAT.py), which is
+to say a computation stack and registers, plus a program counter.
+
+Time is virtual rather than the host computer's time.  There's a clock, in
+seconds, which advances by parameters["cycleTime"] for every PALMAT instruction
+executed by any process, and which jumps directly to the next timer whenever no
+process is ready to run.  RUNTIME returns the clock.  So a program which spends
+most of its time in WAIT statements runs as fast as the host can emulate the
+instructions actually executed, and the results don't depend on how fast or
+busy the host is.
+
+The ready process of highest priority runs, and it keeps running until it
+blocks (WAIT, TERMINATE, ...), until a process of higher priority becomes
+ready, or until it has executed parameters["timeSlice"] instructions, in which
+case any other ready processes of the same priority get their turns first.
+However, none of that is checked on every instruction:  the loop in
+runProcess() checks only when control is transferred (i.e., by jumps, calls,
+and returns), as well as for the real-time instructions themselves, which
+ask for a switch of process by setting scheduler["yield"] and then returning
+a transfer to the instruction following them.  Since all loops involve
+transfers, that's often enough.
+
+Pending wakeups (SCHEDULE ... AT/IN, cyclic processes, WAIT) are kept in a
+heap ordered by time, scheduler["timers"], rather than in a timer wheel,
+since the times are floating-point seconds with no natural tick.  Cancelling a
+wakeup merely increments the process's "wake" counter, so that the stale entry
+is discarded when it reaches the top of the heap.
+
+Processes blocked on EVENTs (SCHEDULE ... ON, WAIT FOR, cyclic processes with
+WHILE or UNTIL events) are in scheduler["eventWaiters"], and their event
+expressions are re-evaluated whenever a SET, RESET, or SIGNAL occurs.  The
+compiler embeds those expressions in the real-time instructions (see PALMAT.md)
+rather than in the instruction stream, since they have to be evaluated
+repeatedly and at times of the scheduler's choosing.
+
+Each process is a dictionary:
+    "name"          The TASK or PROGRAM name, unmangled.
+    "scope"         Index of the TASK's scope.
+    "vm"            The process's VM.
+    "pc"            (scope, offset) at which the process will resume.
+    "priority"      Its priority.
+    "state"         "pending" (waiting to begin a cycle), "ready", "running",
+                    "waiting" (in a WAIT), "done", or "halted" (by a 'halt'
+                    or an error, which ends the emulation).
+    "instructions"  The number of PALMAT instructions executed by it so far.
+    "starts"        The number of times it has begun execution.
+    "parent"        The process it's DEPENDENT on, or None.
+    "dependents"    Active processes DEPENDENT on it.
+    "repeat"        None, "every", "after", or "repeat", for cyclic processes.
+    "interval"      The time for REPEAT EVERY or REPEAT AFTER.
+    "untilTime"     No cycle begins at or after this time, if not None.
+    "while", "until" Decoded event expressions for stopping cyclic processes.
+    "on"            Decoded event expression for SCHEDULE ... ON.
+    "waitFor"       Decoded event expression for WAIT FOR, or "dependent".
+    "cancelled"     True after CANCEL.
+    "cycleStart"    Time the current cycle began.
+    "nextTime"      Time at which the next (or latest) cycle is to begin, as
+                    returned by NEXTIME.
+    "wake"          Counter used to invalidate stale timers.
+The per-process instruction counts are what the interpreter's `PROCESSES
+command displays, from lastScheduler, after the fact.
+"""
+
+import heapq
+from executePALMAT import handlers, opcodes, realTimeOpcodes, decodeScope, \
+                          newVM, vmError, findVariable, opFunction
+from palmatAux import hTRUE, hFALSE, parseBitArray, isBitArray, printError, \
+                      hround
+
+parameters = {
+    "cycleTime": 1.0e-6,    # Virtual seconds per PALMAT instruction.
+    "timeSlice": 1000,      # Instructions per turn among equal priorities.
+    "programPriority": 100  # Priority of the PROGRAM itself.
+    }
+
+# The scheduler of the most-recent (or current) emulation.
+lastScheduler = None
+
+#-----------------------------------------------------------------------------
+# Bookkeeping for processes.
+
+def newProcess(scheduler, name, scope, priority):
+    vm = newVM(scheduler["PALMAT"], scheduler["decodedScopes"], \
+               scheduler["indent"])
+    process = {
+        "name": name,
+        "scope": scope,
+        "vm": vm,
+        "pc": (scope, 0),
+        "priority": priority,
+        "state": "done",
+        "instructions": 0,
+        "starts": 0,
+        "parent": None,
+        "dependents": [],
+        "repeat": None,
+        "interval": 0.0,
+        "untilTime": None,
+        "while": None,
+        "until": None,
+        "on": None,
+        "waitFor": None,
+        "cancelled": False,
+        "cycleStart": 0.0,
+        "nextTime": 0.0,
+        "wake": 0
+        }
+    vm["scheduler"] = scheduler
+    vm["process"] = process
+    scheduler["processes"].append(process)
+    return process
+
+def addTimer(scheduler, process, when):
+    process["wake"] += 1
+    scheduler["sequence"] += 1
+    heapq.heappush(scheduler["timers"], \
+                   (when, scheduler["sequence"], process, process["wake"]))
+
+# Discards stale timers from the top of the heap, and returns the time of
+# the next valid one, or None.
+def nextTimer(scheduler):
+    timers = scheduler["timers"]
+    while len(timers) > 0:
+        when, sequence, process, wake = timers[0]
+        if wake == process["wake"]:
+            return when
+        heapq.heappop(timers)
+    return None
+
+def makeReady(scheduler, process):
+    process["state"] = "ready"
+    scheduler["ready"].append(process)
+    current = scheduler["current"]
+    if current != None and process["priority"] > current["priority"]:
+        scheduler["yield"] = True
+
+def addEventWaiter(scheduler, process):
+    if process not in scheduler["eventWaiters"]:
+        scheduler["eventWaiters"].append(process)
+
+def removeEventWaiter(scheduler, process):
+    if process in scheduler["eventWaiters"]:
+        scheduler["eventWaiters"].remove(process)
+
+# Evaluates a decoded event expression on behalf of a process, returning True
+# or False, or None on error.
+def evaluateEvent(scheduler, process, expression):
+    vm = process["vm"]
+    savedStack = vm["stack"]
+    vm["stack"] = []
+    scopeNumber = process["pc"][0]
+    value = None
+    for opcode, operand, instruction, source in expression:
+        if schedulerHandlers[opcode](vm, operand, instruction, scopeNumber, \
+                                     0) is False:
+            break
+    else:
+        if len(vm["stack"]) == 1 and isBitArray(vm["stack"][0]):
+            value = (parseBitArray(vm["stack"][0])[0] & 1) != 0
+        else:
+            vmError(vm, None, "Event expression is not a single BIT(1)")
+    vm["stack"] = savedStack
+    return value
+
+# Begins a cycle of a process whose start time (or start event) has arrived,
+# unless its stopping condition has been met, in which case the process is
+# done.
+def startCycle(scheduler, process):
+    clock = scheduler["clock"]
+    stop = process["cancelled"] or \
+           (process["untilTime"] != None and clock >= process["untilTime"])
+    if not stop and process["while"] != None:
+        stop = not evaluateEvent(scheduler, process, process["while"])
+    if not stop and process["until"] != None:
+        stop = evaluateEvent(scheduler, process, process["until"]) != False
+    if stop:
+        finishProcess(scheduler, process)
+        return
+    process["on"] = None
+    process["starts"] += 1
+    process["cycleStart"] = clock
+    process["pc"] = (process["scope"], 0)
+    if process["repeat"] == "every":
+        process["nextTime"] = clock + process["interval"]
+    makeReady(scheduler, process)
+
+# Arranges for a process to begin a cycle at a given time.
+def startCycleAt(scheduler, process, when):
+    process["state"] = "pending"
+    process["nextTime"] = when
+    addTimer(scheduler, process, when)
+
+# A process has run off the end of its code.
+def completeCycle(scheduler, process):
+    repeat = process["repeat"]
+    if repeat == None or process["cancelled"]:
+        finishProcess(scheduler, process)
+        return
+    clock = scheduler["clock"]
+    if repeat == "every":
+        when = max(clock, process["cycleStart"] + process["interval"])
+    elif repeat == "after":
+        when = clock + process["interval"]
+    else:
+        when = clock
+    startCycleAt(scheduler, process, when)
+
+# Terminates a process, along with all of its dependents.
+def finishProcess(scheduler, process):
+    if process["state"] == "done":
+        return
+    process["state"] = "done"
+    process["wake"] += 1
+    if process in scheduler["ready"]:
+        scheduler["ready"].remove(process)
+    removeEventWaiter(scheduler, process)
+    for dependent in list(process["dependents"]):
+        finishProcess(scheduler, dependent)
+    parent = process["parent"]
+    if parent != None:
+        parent["dependents"].remove(process)
+        process["parent"] = None
+        if parent["state"] == "waiting" and \
+                parent["waitFor"] == "dependent" and \
+                len(parent["dependents"]) == 0:
+            parent["waitFor"] = None
+            makeReady(scheduler, parent)
+
+# Wakes whatever processes are waiting for events which have now occurred.
+def eventsChanged(scheduler):
+    for process in list(scheduler["eventWaiters"]):
+        if process["state"] == "waiting":
+            if evaluateEvent(scheduler, process, process["waitFor"]):
+                removeEventWaiter(scheduler, process)
+                process["waitFor"] = None
+                makeReady(scheduler, process)
+        elif process["state"] == "pending" and process["on"] != None:
+            if evaluateEvent(scheduler, process, process["on"]):
+                removeEventWaiter(scheduler, process)
+                startCycle(scheduler, process)
+
+#-----------------------------------------------------------------------------
+# Handlers for the real-time instructions.  See executePALMAT.py for the
+# calling conventions.  Each of them first brings the scheduler's clock up to
+# date, which the loop in runProcess() otherwise does only when it needs to.
+
+# Finds the process for a decoded reference to a TASK (see decodeReference()
+# in executePALMAT.py), creating it if necessary.
+def findProcess(vm, task, instruction):
+    scheduler = vm["scheduler"]
+    si, identifier, attributes = task
+    if attributes == None or "task" not in attributes:
+        vmError(vm, instruction, "Not a TASK: " + identifier[3:-1])
+        return None
+    scope = attributes["scope"]
+    if scope not in scheduler["tasks"]:
+        scheduler["tasks"][scope] = newProcess(scheduler, identifier[3:-1], \
+                                               scope, 0)
+    return scheduler["tasks"][scope]
+
+def popNumber(vm, instruction):
+    stack = vm["stack"]
+    if len(stack) < 1 or not isinstance(stack[-1], (int, float)):
+        vmError(vm, instruction, "Numeric value expected on stack.")
+        return None
+    return stack.pop()
+
+def opSchedule(vm, operand, instruction, scopeNumber, instructionIndex):
+    scheduler = vm["scheduler"]
+    current = vm["process"]
+    task, options = operand
+    # The values of the clauses were pushed in source order.
+    values = {}
+    for key in ["until", "every", "after", "priority", "in", "at"]:
+        if options.get(key) is True:
+            values[key] = popNumber(vm, instruction)
+            if values[key] == None:
+                return False
+    process = findProcess(vm, task, instruction)
+    if process == None:
+        return False
+    if process["state"] != "done":
+        vmError(vm, instruction, "TASK %s is already active." % \
+                process["name"])
+        return False
+    process["priority"] = hround(values.get("priority", current["priority"]))
+    process["vm"]["stack"] = []
+    process["cancelled"] = False
+    process["repeat"] = None
+    for key in ["every", "after", "repeat"]:
+        if key in options:
+            process["repeat"] = key
+            process["interval"] = float(values.get(key, 0.0))
+    process["untilTime"] = values.get("until")
+    process["while"] = options.get("while")
+    process["until"] = None
+    if isinstance(options.get("until"), list):
+        process["until"] = options["until"]
+    if "dependent" in options:
+        process["parent"] = current
+        current["dependents"].append(process)
+    clock = scheduler["clock"]
+    if "at" in values:
+        startCycleAt(scheduler, process, max(clock, values["at"]))
+    elif "in" in values:
+        startCycleAt(scheduler, process, clock + max(0, values["in"]))
+    elif "on" in options:
+        process["state"] = "pending"
+        process["on"] = options["on"]
+        process["nextTime"] = clock
+        if evaluateEvent(scheduler, process, process["on"]):
+            startCycle(scheduler, process)
+        else:
+            addEventWaiter(scheduler, process)
+    else:
+        process["nextTime"] = clock
+        startCycle(scheduler, process)
+    if scheduler["yield"]:
+        return (scopeNumber, instructionIndex)
+
+def opWait(vm, operand, instruction, scopeNumber, instructionIndex):
+    scheduler = vm["scheduler"]
+    process = vm["process"]
+    if operand == "dependent":
+        if len(process["dependents"]) == 0:
+            return
+        process["waitFor"] = "dependent"
+    elif isinstance(operand, list):
+        value = evaluateEvent(scheduler, process, operand)
+        if value == None:
+            return False
+        if value:
+            return
+        process["waitFor"] = operand
+        addEventWaiter(scheduler, process)
+    else:
+        when = popNumber(vm, instruction)
+        if when == None:
+            return False
+        if operand != "until":
+            when += scheduler["clock"]
+        addTimer(scheduler, process, when)
+    process["state"] = "waiting"
+    scheduler["yield"] = True
+    return (scopeNumber, instructionIndex)
+
+# For set, reset, and signal.
+def setEvent(vm, operand, instruction, scopeNumber, value):
+    found = findVariable(vm, operand, instruction, scopeNumber)
+    if found == None:
+        return False
+    si, attributes, identifier = found
+    if "event" not in attributes:
+        vmError(vm, instruction, "Not an EVENT: " + identifier[3:-1])
+        return False
+    attributes["value"] = list(value)
+    eventsChanged(vm["scheduler"])
+
+def opSet(vm, operand, instruction, scopeNumber, instructionIndex):
+    if setEvent(vm, operand, instruction, scopeNumber, hTRUE) == False:
+        return False
+    if vm["scheduler"]["yield"]:
+        return (scopeNumber, instructionIndex)
+
+def opReset(vm, operand, instruction, scopeNumber, instructionIndex):
+    if setEvent(vm, operand, instruction, scopeNumber, hFALSE) == False:
+        return False
+    if vm["scheduler"]["yield"]:
+        return (scopeNumber, instructionIndex)
+
+# SIGNAL is a momentary SET:  whatever processes are waiting for the event
+# are released, and then the event is RESET.
+def opSignal(vm, operand, instruction, scopeNumber, instructionIndex):
+    if setEvent(vm, operand, instruction, scopeNumber, hTRUE) == False:
+        return False
+    if setEvent(vm, operand, instruction, scopeNumber, hFALSE) == False:
+        return False
+    if vm["scheduler"]["yield"]:
+        return (scopeNumber, instructionIndex)
+
+def opTerminate(vm, operand, instruction, scopeNumber, instructionIndex):
+    scheduler = vm["scheduler"]
+    if operand is True:
+        finishProcess(scheduler, vm["process"])
+    else:
+        for task in operand:
+            process = findProcess(vm, task, instruction)
+            if process == None:
+                return False
+            finishProcess(scheduler, process)
+    if vm["process"]["state"] == "done" or scheduler["yield"]:
+        scheduler["yield"] = True
+        return (scopeNumber, instructionIndex)
+
+# CANCEL lets the current cycle of a process run to completion, but prevents
+# any further ones.
+def opCancel(vm, operand, instruction, scopeNumber, instructionIndex):
+    scheduler = vm["scheduler"]
+    if operand is True:
+        processes = [vm["process"]]
+    else:
+        processes = []
+        for task in operand:
+            process = findProcess(vm, task, instruction)
+            if process == None:
+                return False
+            processes.append(process)
+    for process in processes:
+        process["cancelled"] = True
+        if process["state"] == "pending":
+            finishProcess(scheduler, process)
+
+def opUpdate(vm, operand, instruction, scopeNumber, instructionIndex):
+    scheduler = vm["scheduler"]
+    priority = popNumber(vm, instruction)
+    if priority == None:
+        return False
+    if operand is True:
+        process = vm["process"]
+    else:
+        process = findProcess(vm, operand, instruction)
+        if process == None:
+            return False
+    process["priority"] = hround(priority)
+    # The process now running may no longer be the one of highest priority.
+    scheduler["yield"] = True
+    return (scopeNumber, instructionIndex)
+
+def opProcess(vm, operand, instruction, scopeNumber, instructionIndex):
+    vm["stack"].append(operand)
+
+# RUNTIME, PRIO, and NEXTIME depend on the scheduler.  Everything else is as
+# usual.
+def opSchedulerFunction(vm, function, instruction, scopeNumber, \
+                        instructionIndex):
+    scheduler = vm["scheduler"]
+    if function == "RUNTIME":
+        vm["stack"].append(scheduler["clock"])
+    elif function == "PRIO":
+        vm["stack"].append(vm["process"]["priority"])
+    elif function == "NEXTIME":
+        stack = vm["stack"]
+        if len(stack) < 1 or not isinstance(stack[-1], tuple):
+            vmError(vm, instruction, "NEXTIME requires a TASK name.")
+            return False
+        process = findProcess(vm, stack.pop(), instruction)
+        if process == None:
+            return False
+        stack.append(process["nextTime"])
+    else:
+        return opFunction(vm, function, instruction, scopeNumber, \
+                          instructionIndex)
+
+# The dispatch table used by the scheduler:  the usual one, but with the
+# real-time instructions actually implemented.
+schedulerHandlers = list(handlers)
+for name, handler in [("schedule", opSchedule), ("wait", opWait),
+                      ("set", opSet), ("reset", opReset),
+                      ("signal", opSignal), ("terminate", opTerminate),
+                      ("cancel", opCancel), ("update", opUpdate),
+                      ("process", opProcess),
+                      ("function", opSchedulerFunction)]:
+    schedulerHandlers[opcodes[name]] = handler
+timedOpcodes = realTimeOpcodes | { opcodes["function"] }
+
+#-----------------------------------------------------------------------------
+# The scheduler proper.
+
+'''
+Runs a process until it blocks, is preempted, uses up its time slice, or runs
+off the end of its code.  Returns False if the emulation is to end (due to an
+error or to a 'halt'), or True otherwise.
+'''
+def runProcess(scheduler, process):
+    vm = process["vm"]
+    decodedScopes = vm["decodedScopes"]
+    timers = scheduler["timers"]
+    trace = scheduler["trace"]
+    cycleTime = parameters["cycleTime"]
+    budget = parameters["timeSlice"]
+    clockAtStart = scheduler["clock"]
+    scheduler["current"] = process
+    scheduler["yield"] = False
+    process["state"] = "running"
+    scopeNumber, instructionIndex = process["pc"]
+    if scopeNumber not in decodedScopes:
+        decodedScopes[scopeNumber] = decodeScope(vm["PALMAT"], scopeNumber)
+    decoded = decodedScopes[scopeNumber]
+    count = 0
+    success = True
+    while instructionIndex < len(decoded):
+        opcode, operand, instruction, source = decoded[instructionIndex]
+        if source != None:
+            vm["source"] = source
+        if trace:
+            print("\tTRACE %s:  " % process["name"], vm["stack"], \
+                  " (%d,%d):" % (scopeNumber, instructionIndex), instruction)
+        instructionIndex += 1
+        count += 1
+        if opcode in timedOpcodes:
+            scheduler["clock"] = clockAtStart + count * cycleTime
+        transfer = schedulerHandlers[opcode](vm, operand, instruction, \
+                                             scopeNumber, instructionIndex)
+        if transfer != None:
+            if transfer is False:
+                success = False
+                break
+            scopeNumber, instructionIndex = transfer
+            if scopeNumber not in decodedScopes:
+                decodedScopes[scopeNumber] = decodeScope(vm["PALMAT"],
+                                                         scopeNumber)
+            decoded = decodedScopes[scopeNumber]
+            if scheduler["yield"] or count >= budget or \
+                    (len(timers) > 0 and \
+                     timers[0][0] <= clockAtStart + count * cycleTime):
+                break
+    process["pc"] = (scopeNumber, instructionIndex)
+    process["instructions"] += count
+    scheduler["instructions"] += count
+    scheduler["clock"] = clockAtStart + count * cycleTime
+    scheduler["current"] = None
+    if not success:
+        return False
+    if process["state"] == "running":
+        if instructionIndex >= len(decoded):
+            completeCycle(scheduler, process)
+        else:
+            # Preempted, or out of time.  It goes to the back of the line.
+            process["state"] = "ready"
+            scheduler["ready"].append(process)
+    return True
+
+# Wakes the processes whose timers have expired.
+def fireTimers(scheduler):
+    timers = scheduler["timers"]
+    while True:
+        when = nextTimer(scheduler)
+        if when == None or when > scheduler["clock"]:
+            break
+        when, sequence, process, wake = heapq.heappop(timers)
+        process["wake"] += 1
+        if process["state"] == "pending":
+            startCycle(scheduler, process)
+        elif process["state"] == "waiting":
+            makeReady(scheduler, process)
+
+# The ready process of highest priority, removed from the ready list, or None.
+# Among processes of equal priority, the one which has been waiting longest.
+def pickProcess(scheduler):
+    ready = scheduler["ready"]
+    if len(ready) == 0:
+        return None
+    best = 0
+    for i in range(1, len(ready)):
+        if ready[i]["priority"] > ready[best]["priority"]:
+            best = i
+    return ready.pop(best)
+
+'''
+The replacement for emulate() in executePALMAT(), for programs using the
+real-time features.  The vm is the one executePALMAT() created, which becomes
+that of the PROGRAM's process.  Returns the PROGRAM's computation stack, or
+None on error or 'halt'.
+'''
+def schedulePALMAT(vm, pcScope, pcOffset, trace=False):
+    global lastScheduler
+    PALMAT = vm["PALMAT"]
+    scheduler = {
+        "PALMAT": PALMAT,
+        "decodedScopes": vm["decodedScopes"],
+        "indent": vm["indent"],
+        "trace": trace,
+        "clock": 0.0,
+        "instructions": 0,
+        "timers": [],
+        "sequence": 0,
+        "processes": [],
+        "tasks": {},
+        "ready": [],
+        "eventWaiters": [],
+        "current": None,
+        "yield": False
+        }
+    lastScheduler = scheduler
+    name = PALMAT["scopes"][pcScope].get("name", "^l_(main)^")[3:-1]
+    program = newProcess(scheduler, name, pcScope, \
+                         parameters["programPriority"])
+    # Use the VM we were given, rather than the one newProcess() made.
+    vm["scheduler"] = scheduler
+    vm["process"] = program
+    program["vm"] = vm
+    program["pc"] = (pcScope, pcOffset)
+    program["starts"] = 1
+    makeReady(scheduler, program)
+    while True:
+        fireTimers(scheduler)
+        process = pickProcess(scheduler)
+        if process == None:
+            when = nextTimer(scheduler)
+            if when == None:
+                break
+            # Nothing to do until the next timer expires.
+            scheduler["clock"] = max(scheduler["clock"], when)
+            continue
+        if not runProcess(scheduler, process):
+            process["state"] = "halted"
+            return None
+    if program["state"] != "done":
+        printError(PALMAT, vm["source"], None, \
+                   "No process can proceed; all are waiting for events.")
+        return None
+    return vm["stack"]
+
+# For the interpreter's `PROCESSES command.
+def printProcesses():
+    scheduler = lastScheduler
+    if scheduler == None:
+        print("\tNo real-time program has been run.")
+        return
+    print("\tTime %.6f, %d instructions" % \
+          (scheduler["clock"], scheduler["instructions"]))
+    print("\t%-16s %8s %-8s %8s %12s" % \
+          ("PROCESS", "PRIORITY", "STATE", "STARTS", "INSTRUCTIONS"))
+    for process in scheduler["processes"]:
+        if process["vm"].get("process") != process:
+            continue
+        print("\t%-16s %8d %-8s %8d %12d" % \
+              (process["name"], process["priority"], process["state"], \
+               process["starts"], process["instructions"]))
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   halsTesting.py
+Requires:   Python 3.7 or later.
+Purpose:    Support for the regression tests in this directory, which run
+            yaHAL-S-FC.py and palmatLink.py on small HAL/S programs.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+
+The tests need the compiler's front end (modernHAL-S-FC), which is the one
+named by the environment variable YAHALS_COMPILER if set, or else the one
+yaHAL-S-FC.py would find by default.  The tests are skipped if there's no 
+such executable.  They can be run (from this directory) with
+    python3 -m unittest
+since run from the yaHAL-S directory, its tokenize.py would hide the Python
+library's, on which unittest relies for reporting failures.
+"""
+
+import sys
+import os
+import io
+import platform
+import subprocess
+import contextlib
+import tempfile
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+yaHALS = os.path.dirname(here)
+if yaHALS not in sys.path:
+    sys.path.insert(0, yaHALS)
+
+compiler = os.path.join(yaHALS, "modernHAL-S-FC")
+if platform.system() == "Windows":
+    compiler += ".exe"
+elif platform.system() == "Darwin":
+    compiler += "-macosx"
+compiler = os.environ.get("YAHALS_COMPILER", compiler)
+
+needsCompiler = unittest.skipUnless(os.access(compiler, os.X_OK),
+                                    "no HAL/S compiler front end " + compiler)
+
+# A test case working in a temporary directory of its own, into which HAL/S
+# source files can be written.
+class HalsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, filename):
+        return os.path.join(self.directory.name, filename)
+
+    def writeSource(self, filename, lines):
+        f = open(self.path(filename), "w")
+        for line in lines:
+            print(line, file=f)
+        f.close()
+
+    # Runs one of the yaHAL-S programs (such as "yaHAL-S-FC.py") in the 
+    # temporary directory, returning its exit status and its output.
+    def runProgram(self, program, arguments, input=None):
+        command = [sys.executable, os.path.join(yaHALS, program)]
+        if program == "yaHAL-S-FC.py":
+            command.append("--compiler=" + compiler)
+        result = subprocess.run(command + arguments, input=input, 
+                                cwd=self.directory.name,
+                                stdout=subprocess.PIPE, 
+                                stderr=subprocess.STDOUT,
+                                universal_newlines=True)
+        return result.returncode, result.stdout
+
+    # Executes a PALMAT file, returning what it printed.
+    def execute(self, filename):
+        from palmatAux import readPALMAT
+        from executePALMAT import executePALMAT, linkPALMAT
+        PALMAT = readPALMAT(self.path(filename))
+        self.assertIsNotNone(PALMAT)
+        linkPALMAT(PALMAT)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            executePALMAT(PALMAT)
+        return output.getvalue()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   test_palmatObject.py
+Requires:   Python 3.7 or later.
+Purpose:    Regression tests for separate compilation into PALMAT object 
+            files (yaHAL-S-FC.py --object) and linking (palmatLink.py).
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+            PALMAT.md, "PALMAT Object Files".
+"""
+
+import unittest
+from halsTesting import HalsTestCase, needsCompiler
+
+@needsCompiler
+class TestObjects(HalsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.writeSource("a.hal", [
+            " A: FUNCTION(N) INTEGER;",
+            "    DECLARE INTEGER, N;",
+            "    RETURN N + 1;",
+            " CLOSE A;"])
+        self.writeSource("cp.hal", [
+            " CP: COMPOOL;",
+            "    DECLARE INTEGER, BIAS INITIAL(100);",
+            " CLOSE CP;"])
+        self.writeSource("f1.hal", [
+            " F1: FUNCTION(N) INTEGER;",
+            "    DECLARE INTEGER, N;",
+            "    RETURN N + BIAS;",
+            " CLOSE F1;"])
+        self.writeSource("loop.hal", [
+            " DECLARE INTEGER, K;",
+            " DO FOR K = 1 TO 2;",
+            "    IF K = 2 THEN WRITE(6) 'TWO';",
+            "    ELSE WRITE(6) 'ONE';",
+            " END;"])
+
+    def compile(self, unit, imports=[]):
+        status, output = self.runProgram("yaHAL-S-FC.py", 
+                                  ["--object=%s.obj" % unit] + \
+                                  ["--import=%s.obj" % i for i in imports] + \
+                                  ["%s.hal" % unit])
+        self.assertEqual(status, 0, output)
+
+    def link(self, units):
+        status, output = self.runProgram("palmatLink.py", ["--output=linked.palmat"] +
+                                  ["%s.obj" % unit for unit in units])
+        self.assertEqual(status, 0, output)
+        return self.execute("linked.palmat")
+
+    # The main program calling a FUNCTION compiled separately.
+    def testTopLevelCall(self):
+        self.writeSource("main.hal", [
+            " DECLARE Y INTEGER;",
+            " Y = A(3);",
+            " WRITE(6) Y;"])
+        self.compile("a")
+        self.compile("main", ["a"])
+        self.assertIn(" 4 ", self.link(["a", "main"]))
+
+    # DO and IF at the top level, whose labels are in the root scope, and 
+    # must be relocated when linked after other top-level code.
+    def testTopLevelLoop(self):
+        self.writeSource("main.hal", [
+            " WRITE(6) A(0);"])
+        self.compile("a")
+        self.compile("main", ["a"])
+        self.compile("loop")
+        output = self.link(["a", "main", "loop"])
+        self.assertEqual(output.split()[:3], ["1", "ONE", "TWO"])
+
+    # The order of the --import options doesn't matter, since COMPOOLs are 
+    # linked first.
+    def testImportOrder(self):
+        self.writeSource("main.hal", [
+            " DECLARE INTEGER, R;",
+            " R = F1(5);",
+            " WRITE(6) R;"])
+        self.compile("cp")
+        self.compile("f1", ["cp"])
+        self.compile("main", ["f1", "cp"])
+        self.assertIn(" 105 ", self.link(["f1", "main", "cp"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   test_parallelCompile.py
+Requires:   Python 3.7 or later.
+Purpose:    Regression tests for compiling source files in parallel
+            (yaHAL-S-FC.py --jobs=N) into a PALMAT file (--output=F).
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+"""
+
+import unittest
+from halsTesting import HalsTestCase, needsCompiler
+
+@needsCompiler
+class TestParallel(HalsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.files = []
+        for i in range(1, 7):
+            self.writeSource("p%d.hal" % i, [
+                " DECLARE INTEGER, K%d;" % i,
+                " DO FOR K%d = 1 TO %d;" % (i, i),
+                " END;",
+                " WRITE(6) %d, K%d;" % (100 * i, i)])
+            self.files.append("p%d.hal" % i)
+
+    def compile(self, options, output):
+        status, messages = self.runProgram("yaHAL-S-FC.py",
+                                           options + ["--output=" + output] +
+                                           self.files)
+        self.assertEqual(status, 0, messages)
+        return self.execute(output)
+
+    # The merged PALMAT is written, and behaves just like that of the source
+    # files compiled one after another.  (Only the line number in the final
+    # "Normal program termination" message differs, since with --jobs the
+    # lines of each file are counted separately.)
+    def testOutput(self):
+        expected = [str(n) for i in range(1, 7) for n in (100 * i, i + 1)]
+        for options, output in [([], "serial.palmat"),
+                                (["--jobs=4"], "parallel.palmat"),
+                                (["--jobs=4", "--binary"], "parallel.bin")]:
+            printed = self.compile(options, output).split()
+            self.assertEqual(printed[:len(expected)], expected, options)
+
+if __name__ == "__main__":
+    unittest.main()
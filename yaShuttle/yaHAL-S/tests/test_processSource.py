@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   test_processSource.py
+Requires:   Python 3.7 or later.
+Purpose:    Regression tests for compiling HAL/S source code with 
+            processSource(), via the interpreter.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+"""
+
+import unittest
+from halsTesting import HalsTestCase, needsCompiler
+
+@needsCompiler
+class TestProcessSource(HalsTestCase):
+    # A unit of more statements than Python's recursion limit compiles and
+    # runs, since neither the parser nor the code generator recurses once 
+    # per statement.
+    def testLongUnit(self):
+        lines = ["`SPOOL", " DECLARE INTEGER, X INITIAL(0);"] + \
+                [" X = X + 1;"] * 1200 + \
+                [" WRITE(6) X;", "`UNSPOOL", " WRITE(6) 42;", "`QUIT"]
+        status, output = self.runProgram("yaHAL-S-FC.py", ["--interactive"],
+                                  "\n".join(lines) + "\n")
+        self.assertNotIn("Traceback", output)
+        self.assertNotIn("failure", output)
+        self.assertIn(" 1200 ", output)
+        self.assertIn(" 42 ", output)
+
+    # A unit nested too deeply for the (recursive) code generator fails to
+    # compile, but the interpreter session survives it.
+    def testDeeplyNestedUnit(self):
+        lines = ["`SPOOL", " DECLARE INTEGER, Y INITIAL(0);"] + \
+                [" DO;"] * 700 + [" Y = 1;"] + [" END;"] * 700 + \
+                [" WRITE(6) Y;", "`UNSPOOL", " WRITE(6) 42;", "`QUIT"]
+        status, output = self.runProgram("yaHAL-S-FC.py", ["--interactive"],
+                                  "\n".join(lines) + "\n")
+        self.assertNotIn("Traceback", output)
+        self.assertIn("Compiler pass 2 failure", output)
+        self.assertIn(" 42 ", output)
+        self.assertNotIn(" 1 ", output)
+
+if __name__ == "__main__":
+    unittest.main()
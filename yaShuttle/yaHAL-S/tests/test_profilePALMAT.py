@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   test_profilePALMAT.py
+Requires:   Python 3.7 or later.
+Purpose:    Regression tests for the execution profiler (yaHAL-S-FC.py
+            --profile, `HOTSPOTS).
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+"""
+
+import unittest
+from halsTesting import HalsTestCase, needsCompiler
+
+@needsCompiler
+class TestProfile(HalsTestCase):
+    # Nothing is charged to the placeholder source position the emulator
+    # starts from, which would otherwise appear as Interpreter:-1.
+    def testNoPlaceholderPosition(self):
+        lines = [" DECLARE INTEGER, K;",
+                 " DO FOR K = 1 TO 3;",
+                 "    WRITE(6) K;",
+                 " END;",
+                 "`HOTSPOTS", "`QUIT"]
+        status, output = self.runProgram("yaHAL-S-FC.py",
+                                  ["--interactive", "--profile=p.folded"],
+                                  "\n".join(lines) + "\n")
+        self.assertIn("Hot spots by source-code position", output)
+        self.assertNotIn(":-1", output)
+        f = open(self.path("p.folded"), "r")
+        folded = f.read()
+        f.close()
+        self.assertIn("(main);Interpreter:", folded)
+        self.assertNotIn(":-1", folded)
+
+if __name__ == "__main__":
+    unittest.main()
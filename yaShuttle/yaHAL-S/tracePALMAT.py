@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   tracePALMAT.py
+Requires:   Python 3.7 or later.
+Purpose:    A bounded-memory execution trace for the PALMAT emulator, for
+            post-mortem debugging of runs much too long for TRACE3, plus
+            an offline decoder for the trace.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+
+When executePALMAT() is given a ring (as created by newRing()), it runs the
+emulation with emulateRinged() rather than emulate().  After each instruction
+is executed, that writes a fixed-size binary record of it into the ring, a
+circular buffer holding only the most-recent records, so the memory used is
+fixed however long the run, and the cost is just that of packing a record.
+Each record consists of:
+
+    *   The scope number and offset of the instruction.
+    *   The opcode it was decoded to (see opcodeNames in executePALMAT.py).
+    *   The source-code position (file index and line number) current at
+        the time.
+    *   The depth of the computation stack afterward.
+    *   A summary of the value then atop the stack:  its kind (see kindNames
+        below), along with its value for an INTEGER, SCALAR, or BIT, its
+        length for a CHARACTER or VECTOR, its number of rows for a MATRIX,
+        its number of elements for an ARRAY, or the scope number for a
+        pointer to a variable.
+
+The ring is dumped to a file when the emulation ends by an error or a 'halt',
+or by a Python exception, and whenever dumpRing() is called (the `DUMPRING
+command of the interpreter).  The file consists of a line identifying the
+format, a line of JSON describing the records (including the names of the
+opcodes and of the source files, so that no PALMAT is needed to decode it),
+and the records themselves, oldest first.  Running this module as a program,
+    tracePALMAT.py FILE [N]
+decodes and prints the last N (by default, all) records of the file FILE.
+Nothing is collected for programs run by the real-time scheduler
+(schedulePALMAT.py), for TRACE3 runs, or for profiled runs.
+"""
+
+import sys
+import os
+import json
+import struct
+
+formatLine = b"PALMAT ring 1\n"
+# scope, offset, line, file, depth, opcode, kind, summary
+recordFormat = struct.Struct("<IIihHBBd")
+
+kindNames = ["empty", "None", "INTEGER", "SCALAR", "CHARACTER", "BIT",
+             "VECTOR", "MATRIX", "pointer", "ARRAY", "other"]
+kinds = {}
+for i in range(len(kindNames)):
+    kinds[kindNames[i]] = i
+
+def newRing(entries=65536, filename="yaHAL-S-FC.ring"):
+    return {
+        "buffer": bytearray(entries * recordFormat.size),
+        "entries": entries,
+        "next": 0,          # Total number of records written.
+        "filename": filename,
+        "opcodes": [],      # Filled in by emulateRinged().
+        "sourceFiles": []   # Ditto.
+        }
+
+# The kind and summary of the value atop the computation stack.
+def summarize(computationStack):
+    if len(computationStack) == 0:
+        return kinds["empty"], 0.0
+    value = computationStack[-1]
+    c = value.__class__
+    if c is int:
+        if abs(value) < 2**53:
+            return kinds["INTEGER"], float(value)
+        return kinds["INTEGER"], 0.0
+    if c is float:
+        return kinds["SCALAR"], value
+    if c is str:
+        return kinds["CHARACTER"], float(len(value))
+    if value is None:
+        return kinds["None"], 0.0
+    if c is list:
+        if len(value) == 0:
+            return kinds["other"], 0.0
+        if value[-1] == "b":
+            return kinds["BIT"], float(value[0] or 0)
+        if value[-1] == "p":
+            return kinds["pointer"], float(value[0])
+        if value[0].__class__ is list:
+            return kinds["MATRIX"], float(len(value))
+        return kinds["VECTOR"], float(len(value))
+    if hasattr(value, "buffer") and hasattr(value, "shape"):
+        return kinds["ARRAY"], float(len(value.buffer))
+    return kinds["other"], 0.0
+
+# Records the execution of the instruction at offset in scope scopeNumber.
+def recordRing(ring, scopeNumber, offset, opcode, source, computationStack):
+    kind, summary = summarize(computationStack)
+    depth = len(computationStack)
+    if depth > 0xFFFF:
+        depth = 0xFFFF
+    recordFormat.pack_into(ring["buffer"],
+                           (ring["next"] % ring["entries"]) * recordFormat.size,
+                           scopeNumber, offset, source[1], source[0], depth,
+                           opcode, kind, summary)
+    ring["next"] += 1
+
+# Writes the ring to the file (by default, the ring's own "filename").
+# Returns True on success, False on failure.
+def dumpRing(ring, filename=None):
+    if filename == None:
+        filename = ring["filename"]
+    size = recordFormat.size
+    buffer = ring["buffer"]
+    count = min(ring["next"], ring["entries"])
+    start = (ring["next"] - count) % ring["entries"]
+    header = {
+        "recordSize": size,
+        "records": count,
+        "total": ring["next"],
+        "opcodes": ring["opcodes"],
+        "kinds": kindNames,
+        "sourceFiles": ring["sourceFiles"]
+        }
+    try:
+        f = open(filename, "wb")
+        f.write(formatLine)
+        f.write((json.dumps(header) + "\n").encode())
+        end = start + count
+        if end <= ring["entries"]:
+            f.write(buffer[start * size : end * size])
+        else:
+            f.write(buffer[start * size :])
+            f.write(buffer[: (end - ring["entries"]) * size])
+        f.close()
+    except OSError:
+        return False
+    return True
+
+#-----------------------------------------------------------------------------
+# The offline decoder.
+
+# Reads a dumped ring.  Returns the header and the list of records, each a
+# tuple (scope, offset, line, file, depth, opcode, kind, summary), or None,
+# None on failure.
+def readRing(filename):
+    try:
+        f = open(filename, "rb")
+        if f.readline() != formatLine:
+            f.close()
+            return None, None
+        header = json.loads(f.readline().decode())
+        data = f.read()
+        f.close()
+    except (OSError, ValueError):
+        return None, None
+    if header["recordSize"] != recordFormat.size:
+        return None, None
+    records = list(recordFormat.iter_unpack(data[:header["records"] * \
+                                                 recordFormat.size]))
+    return header, records
+
+def printRing(header, records, count=None):
+    opcodeNames = header["opcodes"]
+    sourceFiles = header["sourceFiles"]
+    first = header["total"] - len(records)
+    if count != None and count < len(records):
+        first += len(records) - count
+        records = records[len(records) - count:]
+    print("%d instructions executed, of which the last %d follow." % \
+          (header["total"], len(records)))
+    print("%10s  %-11s  %-20s  %-24s  %5s  %s" % \
+          ("#", "scope,offset", "opcode", "position", "depth", "top of stack"))
+    for i in range(len(records)):
+        scope, offset, line, file, depth, opcode, kind, summary = records[i]
+        if opcode < len(opcodeNames):
+            opcodeName = opcodeNames[opcode]
+        else:
+            opcodeName = str(opcode)
+        if file >= 0 and file < len(sourceFiles):
+            position = "%s:%d" % (os.path.basename(sourceFiles[file]), line)
+        else:
+            position = "%d:%d" % (file, line)
+        kindName = header["kinds"][kind]
+        if kindName in ["INTEGER", "BIT", "pointer"]:
+            top = "%s %d" % (kindName, summary)
+        elif kindName == "SCALAR":
+            top = "%s %.15g" % (kindName, summary)
+        elif kindName in ["CHARACTER", "VECTOR"]:
+            top = "%s(%d)" % (kindName, summary)
+        elif kindName == "MATRIX":
+            top = "%s(%d,...)" % (kindName, summary)
+        elif kindName == "ARRAY":
+            top = "%s of %d" % (kindName, summary)
+        else:
+            top = kindName
+        print("%10d  %-11s  %-20s  %-24s  %5d  %s" % \
+              (first + i, "%d,%d" % (scope, offset), opcodeName, position,
+               depth, top))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or len(sys.argv) > 3 or \
+            (len(sys.argv) == 3 and not sys.argv[2].isdigit()):
+        print("Usage:  tracePALMAT.py FILE [N]")
+        sys.exit(1)
+    header, records = readRing(sys.argv[1])
+    if header == None:
+        print("Cannot read the trace ring", sys.argv[1])
+        sys.exit(1)
+    if len(sys.argv) == 3:
+        printRing(header, records, int(sys.argv[2]))
+    else:
+        printRing(header, records)
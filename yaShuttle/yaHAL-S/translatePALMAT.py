@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copyright:  None - the author (Ron Burkey) declares this software to
+            be in the Public Domain, with no rights reserved.
+Filename:   translatePALMAT.py
+Requires:   Python 3.7 or later.
+Purpose:    An ahead-of-time translator of linked PALMAT into Python, so that
+            the emulator runs generated Python code rather than dispatching
+            on the decoded instructions one at a time.
+References: https://www.ibiblio.org/apollo/hal-s-compiler.html#PALMAT
+
+translatePALMAT() is run after linkPALMAT() (see executePALMAT.py), and
+attaches PALMAT["translated"] to the PALMAT, where any subsequent
+executePALMAT() will use it.  It relates each scope number to a dictionary
+relating instruction offsets to "block" functions:
+    block(vm)
+each of which executes the instructions from its offset up to the start of the
+next block (or the end of the scope), and returns:
+    offset          The offset of the next instruction to be executed in the
+                    same scope, when control falls through or jumps to it.
+    (scope,offset)  To transfer control anywhere else, as for the handlers.
+    False           If emulation is to end.
+The blocks start at offset 0, at the scope's labels and jump targets, at the
+return address of every 'call', 'calloffset', or 'run', and after every
+unconditional jump.  Control can still arrive elsewhere (for example, if
+executePALMAT() is told to start in the middle of a scope), in which case
+emulateTranslated() interprets instructions one at a time until it arrives at
+a block.
+
+The code for a scope is generated as the source code of a "factory" function
+    factory(d, N)
+where d is the decoded scope (as in PALMAT["linked"]) and N is the scope
+number, which binds the operands of the decoded instructions to local
+variables and returns the dictionary of blocks.  Within the blocks:
+    *   The dispatch through handlers[] is replaced by direct calls of the
+        handlers, with the operands, the instructions (for error messages),
+        and the return addresses all bound in advance.
+    *   Literals, resolved jumps, and the 'number' and 'fetch' operands of
+        superinstructions, which are the bulk of all instructions executed,
+        are inlined rather than calling handlers at all.  A 'fetch' of a
+        simple variable whose value is an integer, a non-NaN float, or a
+        string is inlined as well, and falls back on opFetch() otherwise.
+    *   The typed kernels of 'compute' superinstructions (see 
+        binaryKernels in binaryFunctions.py) are called directly, falling
+        back on opBinary() when they decline.
+    *   The "source" of each instruction is stored into the VM only for
+        those instructions which have one, exactly as emulate() does.
+So the behavior (including error messages) is identical to that of emulate(),
+which is the only way to run real-time programs, tracing, or profiling. The
+computation stack is still vm["stack"], since the handlers which operate on
+its contents in place are shared with emulate().
+
+Since the source code of a factory depends only on the "shape" of a scope
+(its opcodes, which operands resolved, and where its jumps go) rather than
+on the PALMAT's data, it's keyed on the SHA-256 digest of that source, and
+scopes of the same shape share the same factory.  The factories already
+compiled are retained in memory, so that the interpreter (which translates
+the new scopes after every statement) doesn't compile them again.  If the
+compiler's cache is enabled (see setCacheDirectory() in compileCache.py),
+each set of newly-generated factories is also written there as a Python
+module, palmat_DIGEST.py, which is then imported, so that Python's own
+bytecode cache (the __pycache__ subdirectory) spares later runs from
+compiling it again.
+
+Like the linkage, the translation must be discarded (see unlinkPALMAT() in
+palmatAux.py) whenever the PALMAT's instructions or identifiers change, and it
+is not saved by writePALMAT().
+"""
+
+import os
+import re
+import hashlib
+import importlib.util
+from compileCache import cache
+from executePALMAT import opcodes, jumpOpcodes, linkPALMAT
+
+# Imported by the generated modules.
+header = "from executePALMAT import handlers, opFetch, opBinary, " + \
+         "opIncrementAndTest, storeCommon\n"
+
+# Factories already compiled, by name.
+factories = {}
+
+literalOpcodes = { opcodes[name] for name in ["string", "boolean", "number",
+                                              "vector", "matrix", "array"] }
+setOpcodes = { opcodes["fill"]: "fill", opcodes["sentinel"]: "sentinel",
+               opcodes["partition"]: "semicolon" }
+ignoredOpcodes = { opcodes["debug"], opcodes["noop"] }
+# Instructions which leave values in the registers for structure
+# qualifications and subscripts, for the instruction which follows them.
+registerOpcodes = { opcodes["operatorDotted"], opcodes["operatorSubscripts"] }
+# Instructions after which control never falls through, and those whose
+# following instruction is a return address.
+unconditionalOpcodes = { opcodes["goto"], opcodes["calloffset"],
+                         opcodes["returnoffset"], opcodes["case"],
+                         opcodes["run"], opcodes["call"], opcodes["return"],
+                         opcodes["halt"] }
+# The superinstructions, and the positions of the "operands" and of the
+# jump targets within their decoded operands.
+operandsPosition = { opcodes["compute"]: 1, opcodes["computestore"]: 1,
+                     opcodes["computeiffalse"]: 1,
+                     opcodes["computeiftrue"]: 1, opcodes["fetchiffalse"]: 0,
+                     opcodes["fetchiftrue"]: 0, opcodes["loopstep"]: 0 }
+computeOpcodes = { opcodes["compute"], opcodes["computestore"],
+                   opcodes["computeiffalse"], opcodes["computeiftrue"] }
+targetPosition = { opcodes["computeiffalse"]: 3, opcodes["computeiftrue"]: 3,
+                   opcodes["fetchiffalse"]: 1, opcodes["fetchiftrue"]: 1,
+                   opcodes["loopstep"]: 3 }
+
+# The offsets at which the blocks of each of the scopes start, as far as can
+# be told from the labels and jumps of those scopes themselves.
+def findLeaders(PALMAT, decodedScopes, scopeNumbers):
+    leaders = {}
+    for scopeNumber in scopeNumbers:
+        leaders[scopeNumber] = {0}
+    for scopeNumber in scopeNumbers:
+        for attributes in PALMAT["scopes"][scopeNumber]["identifiers"].values():
+            if "label" in attributes:
+                si, offset = attributes["label"]
+                if si in leaders:
+                    leaders[si].add(offset)
+    for scopeNumber in scopeNumbers:
+        decoded = decodedScopes[scopeNumber]
+        for i in range(len(decoded)):
+            opcode, operand = decoded[i][:2]
+            if opcode in unconditionalOpcodes:
+                leaders[scopeNumber].add(i + 1)
+            if opcode in targetPosition:
+                operand = operand[targetPosition[opcode]]
+            elif opcode not in jumpOpcodes:
+                continue
+            if operand != None and operand[0] in leaders:
+                leaders[operand[0]].add(operand[1])
+    return leaders
+
+'''
+Generates the source code of the factory for the decoded scope, whose blocks
+start at the offsets in leaders.  Returns the name of the factory and its
+source code.
+'''
+def generateFactory(scopeNumber, decoded, leaders):
+    bindings = []
+    blocks = []
+    lines = []
+
+    def emit(indent, text):
+        lines.append("    " * indent + text)
+
+    # The code for a transfer of control to target, a resolved (scope,
+    # offset) bound to the variable named in the generated code.
+    def transfer(target, name):
+        if target[0] == scopeNumber:
+            return "return %d" % target[1]
+        return "return " + name
+
+    # The code for pushing a decoded 'fetch' operand (si, identifier,
+    # attributes) bound to variable name, with the fetch instruction bound to
+    # variable instruction, falling back on opFetch() unless it's a simple
+    # variable whose value is a non-NaN number or a string. registers is True
+    # if the preceding instruction may have left qualifications or
+    # subscripts for it.
+    def fetch(indent, operand, name, instruction, index, registers):
+        if operand[2] == None or registers:
+            emit(indent, "if opFetch(vm, %s, %s, N, %d) is False:" % \
+                         (name, instruction, index))
+            emit(indent + 1, "return False")
+            return
+        bindings.append("a_%s = %s[2]" % (name, name))
+        emit(indent, "if 'constant' in a_%s:" % name)
+        emit(indent + 1, "v = a_%s['constant']" % name)
+        emit(indent, "else:")
+        emit(indent + 1, "v = a_%s['value']" % name)
+        emit(indent, "c = v.__class__")
+        emit(indent, "if c is int or c is str or (c is float and v == v):")
+        emit(indent + 1, "stack.append(v)")
+        emit(indent, "elif opFetch(vm, %s, %s, N, %d) is False:" % \
+                     (name, instruction, index))
+        emit(indent + 1, "return False")
+
+    # The code for iffalse (test == 0) or iftrue (test == 1) on the value
+    # atop the stack, with the decoded target and jump instruction bound to
+    # variables of the given names.
+    def conditional(indent, target, name, instruction, index, test):
+        if target == None:
+            emit(indent, "t = handlers[%d](vm, None, %s, N, %d)" % \
+                         (opcodes[["iffalse", "iftrue"][test]], instruction,
+                          index))
+            emit(indent, "if t is not None:")
+            emit(indent + 1, "return t")
+            return
+        if test:
+            emit(indent, "if stack.pop()[0] & 1:")
+        else:
+            emit(indent, "if not stack.pop()[0] & 1:")
+        emit(indent + 1, transfer(target, name))
+
+    i = 0
+    while i < len(decoded):
+        blocks.append(i)
+        emit(1, "def b%d(vm):" % i)
+        emit(2, "stack = vm['stack']")
+        ended = False
+        while True:
+            opcode, operand, instruction, source = decoded[i]
+            index = i + 1
+            o = "o%d" % i
+            ins = "i%d" % i
+            bindings.append("%s, %s = d[%d][1], d[%d][2]" % (o, ins, i, i))
+            if source != None:
+                bindings.append("s%d = d[%d][3]" % (i, i))
+                emit(2, "vm['source'] = s%d" % i)
+            registers = i > 0 and decoded[i - 1][0] in registerOpcodes
+            if opcode in ignoredOpcodes:
+                pass
+            elif opcode in literalOpcodes:
+                emit(2, "stack.append(%s)" % o)
+            elif opcode == opcodes["empty"]:
+                emit(2, "stack.append(None)")
+            elif opcode in setOpcodes:
+                emit(2, "stack.append({%r})" % setOpcodes[opcode])
+            elif opcode == opcodes["fetch"]:
+                fetch(2, operand, o, ins, index, registers)
+            elif opcode == opcodes["goto"] and operand != None:
+                emit(2, transfer(operand, o))
+                ended = True
+            elif opcode in [opcodes["iffalse"], opcodes["iftrue"]]:
+                conditional(2, operand, o, ins, index,
+                            opcode == opcodes["iftrue"])
+            elif opcode == opcodes["storeconstant"]:
+                bindings.append("%s_0, %s_1, %s_2 = %s" % (o, o, o, o))
+                emit(2, "stack.append(%s_0)" % o)
+                emit(2, "if storeCommon(vm, %s_1, %s_2, N, True, False) " \
+                        "is False:" % (o, o))
+                emit(3, "return False")
+            elif opcode in operandsPosition:
+                # A superinstruction.  The constituent instructions it fused
+                # are bound as o_0, o_1, ..., and its operands as o_0_0, ...
+                fields = ", ".join("%s_%d" % (o, j) \
+                                   for j in range(len(operand)))
+                bindings.append("%s, = %s" % (fields, o))
+                operands = "%s_%d" % (o, operandsPosition[opcode])
+                for j in range(len(operand[operandsPosition[opcode]])):
+                    isNumber, value, dummy = \
+                        operand[operandsPosition[opcode]][j]
+                    name = "%s_%d" % (operands, j)
+                    bindings.append("%s, %s_i = %s[%d][1], %s[%d][2]" % \
+                                    (name, name, operands, j, operands, j))
+                    if isNumber:
+                        emit(2, "stack.append(%s)" % name)
+                    else:
+                        fetch(2, value, name, name + "_i", 0,
+                              registers and j == 0)
+                # The 'compute' superinstructions end with the typed kernel
+                # for their operator, if any (see annotateOperators() in
+                # executePALMAT.py), which is tried before opBinary().
+                kernel = None
+                if opcode in computeOpcodes and operand[-1] != None:
+                    kernel = "%s_%d" % (o, len(operand) - 1)
+                    emit(2, "r = %s(stack[-1], stack[-2])" % kernel)
+                    emit(2, "if r is NotImplemented:")
+                    indent = 3
+                else:
+                    indent = 2
+                if opcode == opcodes["loopstep"]:
+                    emit(2, "if opIncrementAndTest(vm, %s_1, %s_2, N, %d) " \
+                            "is False:" % (o, o, index))
+                    emit(3, "return False")
+                elif opcode == opcodes["compute"]:
+                    emit(indent, "t = opBinary(vm, %s_0, %s_2, N, %d)" % \
+                                 (o, o, index))
+                    emit(indent, "if t is not None:")
+                    emit(indent + 1, "return t")
+                elif opcode in computeOpcodes:
+                    emit(indent, "if opBinary(vm, %s_0, %s_2, N, %d) " \
+                                 "is False:" % (o, o, index))
+                    emit(indent + 1, "return False")
+                if kernel != None:
+                    emit(2, "else:")
+                    emit(3, "stack.pop()")
+                    emit(3, "stack[-1] = r")
+                if opcode == opcodes["computestore"]:
+                    emit(2, "if storeCommon(vm, %s_3, %s_4, N, True, False) " \
+                            "is False:" % (o, o))
+                    emit(3, "return False")
+                elif opcode in targetPosition:
+                    position = targetPosition[opcode]
+                    conditional(2, operand[position], "%s_%d" % (o, position),
+                                "%s_%d" % (o, position + 1), index,
+                                "iftrue" in operand[position + 1])
+            else:
+                emit(2, "t = handlers[%d](vm, %s, %s, N, %d)" % \
+                        (opcode, o, ins, index))
+                emit(2, "if t is not None:")
+                emit(3, "return t")
+            i = index
+            if i >= len(decoded) or i in leaders:
+                if not ended:
+                    emit(2, "return %d" % i)
+                break
+    emit(1, "return {%s}" % ", ".join("%d: b%d" % (b, b) for b in blocks))
+    # Only the bindings actually used, directly or by later bindings, are 
+    # kept.
+    used = set(re.findall("\\w+", "\n".join(lines)))
+    kept = []
+    for binding in reversed(bindings):
+        names, value = binding.split(" = ")
+        if not used.isdisjoint(names.replace(",", " ").split()):
+            kept.append("    " + binding)
+            used.update(re.findall("\\w+", value))
+    kept.reverse()
+    text = "\n".join(kept + lines) + "\n"
+    name = "factory_" + hashlib.sha256(text.encode()).hexdigest()[:32]
+    return name, "def %s(d, N):\n%s" % (name, text)
+
+# Compiles the source code of a module of factories, and returns its
+# namespace.
+def compileFactories(source):
+    digest = hashlib.sha256(source.encode()).hexdigest()
+    if cache["directory"] == None:
+        namespace = {}
+        exec(compile(source, "<palmat_%s>" % digest, "exec"), namespace)
+        return namespace
+    moduleName = "palmat_" + digest
+    filename = os.path.join(cache["directory"], moduleName + ".py")
+    if not os.path.exists(filename):
+        temporary = "%s.%d" % (filename, os.getpid())
+        f = open(temporary, "w")
+        f.write(source)
+        f.close()
+        os.replace(temporary, filename)
+    spec = importlib.util.spec_from_file_location(moduleName, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return vars(module)
+
+'''
+Translates every linked scope not already translated.  The PALMAT is linked
+first, if necessary.
+'''
+def translatePALMAT(PALMAT):
+    linkPALMAT(PALMAT)
+    linked = PALMAT["linked"]
+    translated = PALMAT.get("translated", {})
+    pending = [i for i in linked if i not in translated]
+    if len(pending) == 0:
+        PALMAT["translated"] = translated
+        return
+    leaders = findLeaders(PALMAT, linked, pending)
+    names = {}
+    sources = []
+    for i in pending:
+        name, source = generateFactory(i, linked[i], leaders[i])
+        names[i] = name
+        if name not in factories:
+            factories[name] = None
+            sources.append(source)
+    if len(sources) > 0:
+        namespace = compileFactories(header + "\n" + "\n".join(sources))
+        for name in namespace:
+            if name[:8] == "factory_":
+                factories[name] = namespace[name]
+    for i in pending:
+        translated[i] = factories[names[i]](linked[i], i)
+    PALMAT["translated"] = translated
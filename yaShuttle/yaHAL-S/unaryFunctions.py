@@ -27,6 +27,7 @@ indeterminate results due to uninitialized inputs), or else NaN on error.
 import math
 import copy
 from palmatAux import *
+from arrayBackend import arrayDET, arrayINVERSE
 
 #-----------------------------------------------------------------------
 # But first, here are some utility functions the unary functions need.
@@ -312,6 +313,9 @@ def unaryDET(PALMAT, matrix):
     try:
         if not isMatrix(matrix) or len(matrix) != len(matrix[0]):
             return NaN
+        result = arrayDET(matrix)
+        if result is not NotImplemented:
+            return result
         return determinant(matrix)
     except:
         return NaN
@@ -320,6 +324,9 @@ def unaryINVERSE(PALMAT, matrix):
     try:
         if not isMatrix(matrix) or len(matrix) != len(matrix[0]):
             return NaN
+        inverse = arrayINVERSE(matrix)
+        if inverse is not NotImplemented:
+            return inverse
         inverse = matrixInverse(matrix)
         if inverse == None:
             return NaN
@@ -54,21 +54,36 @@ and updates if it discovers new STRUCTURE statements not already in the library.
 """
 
 import sys
+import os
 
 #import unEMS
 #import replaceBy
 #import reorganizer
 #from pass1 import tokenizeAndParse, tmpFile, compiler, astPrint, captured
 from processSource import processSource
-from palmatAux import constructPALMAT, astSourceFile
+from palmatAux import constructPALMAT, astSourceFile, writePALMAT
 from pass1 import parms
 from optimizePALMAT import optimizePALMAT
+from arrayBackend import backend
+from compileCache import setCacheDirectory
+from parallelCompile import compileInParallel
+from palmatObject import compileObject
+from ioChannels import attachFromOption
 
 #Parse the command-line arguments.
+PALMAT = constructPALMAT()
 tabSize = 8
 halsSource = []
 metadata = []
 files = []
+jobs = 1
+objectFile = None
+outputFile = None
+binary = False
+profileFile = None
+translate = False
+ringFile = None
+imports = []
 noCompile = False
 lbnf = False
 bnf = False
@@ -105,9 +120,63 @@ for param in sys.argv[1:]:
         --no-compile    Merely output preprocessed source, and do not attempt
                         to invoke the compiler.
         --compiler=F    Name of compiler's phase 1 (default %s).
+        --cache=D       Cache compiled code in directory D (which is created
+                        if necessary), so that when the same source is
+                        compiled again, only the top-level PROGRAMs, 
+                        FUNCTIONs, PROCEDUREs, COMPOOLs, and TASKs which have
+                        been changed (or which are affected by changes
+                        elsewhere) need to be compiled.  The default is not
+                        to cache anything.
+        --jobs=N        Compile each of the source files as a separate
+                        compilation unit, using up to N processes at once
+                        (or one per CPU if N is 0).  Files containing COMPOOLs
+                        are compiled first, and the others are then compiled
+                        in parallel, except where one depends on another.
+                        The result is the same as compiling the files one
+                        after another, but line numbers in messages are
+                        counted from the start of each file.  Ignored with
+                        --object, --no-compile, --lbnf, --bnf, or --trace.
+        --object=F      Compile the source files as a single compilation
+                        unit into the PALMAT object file F, rather than
+                        compiling and executing them.  The object files of
+                        all of a program's units are combined into a PALMAT
+                        file by palmatLink.py.  If F is already up to date
+                        with respect to the source files and the interfaces
+                        of its imports, it isn't compiled again.
+        --import=F      When compiling with --object, the PALMAT object file
+                        F of some other unit (such as a COMPOOL, FUNCTION,
+                        or PROCEDURE) which the source files refer to.  
+                        Can be used multiple times.
+        --output=F      Write the compiled (and optimized) PALMAT of the
+                        source files, as a whole, to the file F, which the
+                        interpreter can load (`READ F) and execute.  The
+                        default is merely to compile the source files and
+                        report any errors.
+        --binary        Used only with --output.  Write binary rather than
+                        JSON PALMAT.
         --lbnf, --bnf   Display the abstract syntax trees (AST) in LBNF or
                         in BNF.  Default is not to display the ASTs.
         --trace         Enable tracing for compiler front-end parser.
+        --profile[=F]   In interactive mode, profile the execution of 
+                        the HAL/S code from the start (as if by `PROFILE), 
+                        and when quitting, display the hot spots (as by 
+                        `HOTSPOTS) and write the call stacks to the file F 
+                        (by default, yaHAL-S-FC.folded) in the "folded" form 
+                        used for flame graphs (as by `FLAMEGRAPH F).
+        --translate     In interactive mode, translate the PALMAT to Python
+                        (as if by `TRANSLATE) and run that, rather than
+                        emulating it instruction by instruction.  With 
+                        --cache, the translations are cached as well.
+        --lun=N:F       Attach the logical unit number N of READ and WRITE
+                        statements to the file F, rather than to the 
+                        console (for LUNs 5 and 6) or to nothing (for 
+                        others).  The file is read by READ(N) and written
+                        by WRITE(N).  Can be used for any number of LUNs.
+        --ring[=F]      In interactive mode, keep a compact binary record 
+                        of the last instructions executed (as if by `RING),
+                        written to the file F (by default, 
+                        yaHAL-S-FC.ring) on error or halt.  Decode it with
+                        tracePALMAT.py.
         --interactive   Normally, the HAL/S source-code comes from a file or
                         files specified on the command line.  However, in 
                         interactive mode, HAL/S statements are entered from
@@ -122,6 +191,11 @@ for param in sys.argv[1:]:
                         not execute source code input interactively, 
                         although it processes it normally in all other
                         ways.
+        --no-numpy      If NumPy is installed, it's used by default for
+                        arithmetic on large enough VECTOR and MATRIX 
+                        values.  This option forces the pure-Python code
+                        to be used instead.  The results are identical 
+                        either way.
         """ % parms["compiler"])
         '''
         Here are some former OPTIONS I've at least temporarily discontinued
@@ -144,6 +218,8 @@ for param in sys.argv[1:]:
         ansiWrapper = False
     elif param == "--noexec":
         noexec = True
+    elif param == "--no-numpy":
+        backend["enabled"] = False
     elif param[:6] == "--tab=":
         tabSize = int(param[6:])
     elif param == "--no-compile":
@@ -156,8 +232,36 @@ for param in sys.argv[1:]:
         lbnf = False
     elif param[:11] == "--compiler=":
         parms["compiler"] = param[11:]
+    elif param[:8] == "--cache=":
+        setCacheDirectory(param[8:])
+    elif param[:7] == "--jobs=":
+        jobs = int(param[7:])
+        if jobs <= 0:
+            jobs = os.cpu_count()
+    elif param[:9] == "--object=":
+        objectFile = param[9:]
+    elif param[:9] == "--import=":
+        imports.append(param[9:])
+    elif param[:9] == "--output=":
+        outputFile = param[9:]
+    elif param == "--binary":
+        binary = True
+    elif param == "--profile":
+        profileFile = "yaHAL-S-FC.folded"
+    elif param[:10] == "--profile=":
+        profileFile = param[10:]
+    elif param == "--translate":
+        translate = True
+    elif param == "--ring":
+        ringFile = "yaHAL-S-FC.ring"
+    elif param[:7] == "--ring=":
+        ringFile = param[7:]
     elif param == "--trace":
         trace = True
+    elif param[:6] == "--lun=":
+        if not attachFromOption(param[6:]):
+            print("Malformed parameter:", param)
+            sys.exit(1)
     elif param == "--no-library":
         print("Note: The --no-library option is no longer of use.")
     elif param[:10] == "--library=":
@@ -173,6 +277,7 @@ for param in sys.argv[1:]:
         halsFile.close()
         if len(halsSource) == start:
             continue
+        files.append((start, len(halsSource)))
         for i in range(len(metadata), len(halsSource)):
             m = { "file": fileIndex, "lineNumber" : i + 1 } # Lines numbered from 1.
             if halsSource[i][:1] == "C":
@@ -181,11 +286,28 @@ for param in sys.argv[1:]:
 
 # Interpret or compile.
 if not interactive:
-    PALMAT = constructPALMAT()
-    PALMAT["sourceFiles"] = files
-    processSource(PALMAT, halsSource, metadata, noCompile, lbnf, bnf, trace)
-    optimizePALMAT(PALMAT)
+    if objectFile != None and not (noCompile or lbnf or bnf or trace):
+        if not compileObject(PALMAT, halsSource, metadata, objectFile, 
+                             imports, tabSize):
+            sys.exit(1)
+        sys.exit(0)
+    elif jobs > 1 and not (noCompile or lbnf or bnf or trace):
+        success = compileInParallel(PALMAT, halsSource, metadata, files, jobs,
+                                    tabSize)
+    else:
+        success, ast = processSource(PALMAT, halsSource, metadata, noCompile,
+                                     lbnf, bnf, trace)
+    if outputFile != None and not noCompile:
+        if not success:
+            print("Not writing PALMAT file %s, since compilation failed." % \
+                  outputFile)
+            sys.exit(1)
+        optimizePALMAT(PALMAT, True)
+        if not writePALMAT(PALMAT, outputFile, binary):
+            print("Cannot write PALMAT file %s." % outputFile)
+            sys.exit(1)
 else:
     from interpreterLoop import interpreterLoop
-    interpreterLoop(colorize, not noexec, lbnf, bnf, ansiWrapper)
+    interpreterLoop(colorize, not noexec, lbnf, bnf, ansiWrapper, profileFile,
+                    translate, ringFile)
 